@@ -30,8 +30,16 @@ def create_app(config_class=Config):
     login_manager.init_app(app)
     migrate.init_app(app, db)
     
-    # Inicializa o SocketIO com o app
-    socketio.init_app(app)
+    # Eventos de Socket.IO: importados antes do init_app para que os handlers fiquem
+    # registrados no SocketIO e sejam reaplicados a cada create_app (não só no primeiro)
+    from . import socket_events
+
+    # Inicializa o SocketIO com o app (com fila de mensagens quando há vários workers).
+    # O SocketIO é do módulo: descarta o gerenciador de clientes de um create_app anterior
+    # (ex.: nos testes), senão a fila antiga seria reaproveitada mesmo com outra configuração
+    socketio.server_options.pop('client_manager', None)
+    socketio.init_app(app, message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'),
+                      channel=app.config.get('SOCKETIO_CHANNEL', 'flask-socketio'))
 
     # Configurações do LoginManager
     login_manager.login_view = 'auth.login'
@@ -66,8 +74,41 @@ def create_app(config_class=Config):
     from . import management
     app.register_blueprint(management.bp)
     
-    # Eventos de Socket.IO
-    from . import socket_events
+    # Cache das chaves de API do agente de desktop
+    from .services.credential_cache import credential_cache
+    credential_cache.init_app(app)
+
+    # Feriados próprios das empresas (calendário de dias úteis da folha)
+    from .rh.calendario import regras_feriados_cache
+    regras_feriados_cache.init_app(app)
+
+    # Presença (sessões web, heartbeats do agente de desktop) e o agendador de inatividade
+    from .services.presence_service import presence_service
+    presence_service.init_app(app)
+    from .services.inactivity_scheduler import inactivity_scheduler
+    inactivity_scheduler.init_app(app)
+
+    # Classificação de produtividade por IA (e o cache das classificações)
+    from .services.ai_productivity_service import ai_productivity_service
+    ai_productivity_service.init_app(app)
+
+    # Fila de ingestão dos logs do agente de desktop
+    from .services.productivity_ingestion_service import productivity_ingestion_service
+    productivity_ingestion_service.init_app(app)
+
+    # Caixa de entrada do webhook do WhatsApp (processada em segundo plano) e o cache das conversas
+    from .services.conversa_cache import conversa_cache
+    conversa_cache.init_app(app)
+    from .services.whatsapp_inbox_service import whatsapp_inbox_service
+    whatsapp_inbox_service.init_app(app)
+
+    # Despachante dos envios para os provedores (WhatsApp Cloud API e SendGrid)
+    from .services.envio_service import envio_service
+    envio_service.init_app(app)
+
+    # Comandos de CLI (flask estatisticas ...)
+    from . import commands
+    commands.init_app(app)
 
     # --- ROTA DE REDIRECIONAMENTO ---
     @app.route('/')
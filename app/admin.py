@@ -7,6 +7,7 @@ from functools import wraps
 from datetime import datetime
 import requests
 from .ai_service import add_to_knowledge_base
+from .services.credential_cache import credential_cache
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -193,6 +194,7 @@ def excluir_empresa(id):
         return redirect(url_for('admin.index'))
     db.session.delete(empresa)
     db.session.commit()
+    credential_cache.invalidar_empresa(id)
     flash(f'A empresa "{empresa.nome_empresa}" e todos os seus dados foram excluídos permanentemente.', 'danger')
     return redirect(url_for('admin.index'))
 
@@ -1,21 +1,27 @@
 # call_center_project/app/api.py
 
 from flask import Blueprint, request, jsonify, current_app, g
-from .models import db, Avaliacao, ConversaWhatsApp, MensagemWhatsApp, Empresa, Usuario, ActivityLog, ProductivityRules
-from app.models_rh import Funcionario, Departamento
-from app.rh.calculos import calcular_folha_pagamento
+from .models import db, Avaliacao, ConversaWhatsApp, Empresa, Usuario, ProductivityRules
+from app.models_rh import Departamento
+from app.services.folha_service import resumo_da_folha, resumo_calculado
 from flask_login import login_required, current_user
-from datetime import datetime, time, date, timedelta
-from sqlalchemy import func, cast, Date, desc
+from datetime import datetime, date, timedelta
 import requests
 import json
+import zlib
 from .admin import admin_required
-from . import socketio
 # --- Importações para a nova lógica de status e monitoramento ---
 from .decorators import agent_api_key_required
-from app.services.ai_productivity_service import ai_productivity_service
-from app.services.realtime_service import notify_dashboard_update
-from .socket_events import update_desktop_agent_status
+from app.services.productivity_ingestion_service import productivity_ingestion_service
+from app.services.classification_cache import classification_cache
+from app.services.rule_matcher import rule_matcher_cache
+from app.services.realtime_service import dashboard_invalidator
+from app.services.dashboard_service import estatisticas_agentes_do_dia, resumo_do_dia, fila_de_atendimento
+from app.services.estatisticas_service import totais_da_empresa, avaliacoes_por_canal, csat_por_agente, media
+from app.services.produtividade_rollup_service import serie_produtividade, PERIODOS
+from app.services.whatsapp_inbox_service import whatsapp_inbox_service
+from app.services.historico_conversa_service import pagina_de_mensagens, etag_da_conversa, CursorInvalido
+from app.services.envio_service import envio_service
 
 
 bp = Blueprint('api', __name__, url_prefix='/api')
@@ -47,26 +53,40 @@ def desktop_agent_link():
 @bp.route('/conversa/<int:conversa_id>')
 @login_required
 def get_conversa(conversa_id):
-    """Busca o histórico de mensagens de uma conversa específica."""
+    """
+    Busca uma página do histórico de mensagens de uma conversa específica.
+    Query params: limite; antes=<cursor> (mensagens anteriores) ou depois=<cursor> (só as novas).
+    Responde 304 se o ETag enviado em If-None-Match ainda for o atual.
+    """
     conversa = ConversaWhatsApp.query.filter_by(id=conversa_id, empresa_id=current_user.empresa_id).first_or_404()
-    
-    mensagens = [
-        {
-            'remetente': msg.remetente,
-            'conteudo': msg.conteudo,
-            'timestamp': msg.timestamp.strftime('%H:%M')
-        } for msg in conversa.mensagens
-    ]
-    
-    return jsonify({
-        'cliente': conversa.nome_cliente,
-        'mensagens': mensagens
-    })
+    maximo = current_app.config.get('WHATSAPP_HISTORY_MAX_PAGE_SIZE', 200)
+    limite = min(max(request.args.get('limite', current_app.config.get('WHATSAPP_HISTORY_PAGE_SIZE', 50), type=int), 1), maximo)
+    antes, depois = request.args.get('antes'), request.args.get('depois')
+    if antes and depois:
+        return jsonify({'status': 'error', 'message': 'Use apenas um dos cursores: antes ou depois.'}), 400
+
+    etag = etag_da_conversa(conversa, {'limite': limite, 'antes': antes, 'depois': depois})
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        try:
+            pagina = pagina_de_mensagens(conversa.id, limite, antes=antes, depois=depois)
+        except CursorInvalido as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        response = jsonify({'cliente': conversa.nome_cliente, **pagina})
+    response.set_etag(etag)
+    # O navegador pode guardar a resposta, mas revalida (If-None-Match) antes de reutilizá-la
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 @bp.route('/conversa/<int:conversa_id>/enviar', methods=['POST'])
 @login_required
 def enviar_mensagem_conversa(conversa_id):
-    """Envia uma mensagem de um agente para um cliente."""
+    """
+    Envia uma mensagem de um agente para um cliente. A mensagem é gravada como pendente e enviada
+    ao provedor em segundo plano; o resultado chega pelo evento 'status_mensagem'.
+    """
     conversa = ConversaWhatsApp.query.filter_by(id=conversa_id, empresa_id=current_user.empresa_id).first_or_404()
     data = request.json
     conteudo_mensagem = data.get('mensagem')
@@ -74,20 +94,13 @@ def enviar_mensagem_conversa(conversa_id):
     if not conteudo_mensagem:
         return jsonify({'status': 'error', 'message': 'A mensagem não pode estar vazia.'}), 400
 
-    sucesso = True 
-
-    if sucesso:
-        nova_mensagem = MensagemWhatsApp(
-            conversa_id=conversa.id,
-            remetente='agente',
-            conteudo=conteudo_mensagem,
-            empresa_id=current_user.empresa_id
-        )
-        db.session.add(nova_mensagem)
-        db.session.commit()
-        return jsonify({'status': 'ok', 'message': 'Mensagem enviada com sucesso.'})
-    else:
-        return jsonify({'status': 'error', 'message': 'Falha ao enviar a mensagem pelo provedor.'}), 500
+    nova_mensagem = envio_service.enviar_whatsapp(conversa, conteudo_mensagem)
+    return jsonify({
+        'status': 'ok',
+        'message': 'Mensagem na fila de envio.',
+        'mensagem_id': nova_mensagem.id,
+        'status_envio': nova_mensagem.status_envio
+    }), 202
 
 
 @bp.route("/dados_dashboard_graficos")
@@ -95,24 +108,18 @@ def enviar_mensagem_conversa(conversa_id):
 def dados_dashboard_graficos():
     empresa_id_do_usuario = current_user.empresa_id
 
-    atendimentos_por_canal = db.session.query(
-        Avaliacao.canal, func.count(Avaliacao.id)
-    ).filter(Avaliacao.empresa_id == empresa_id_do_usuario).group_by(Avaliacao.canal).all()
+    atendimentos_por_canal = avaliacoes_por_canal(empresa_id_do_usuario)
     
     dados_canal = {
-        'labels': [item[0] for item in atendimentos_por_canal],
-        'data': [item[1] for item in atendimentos_por_canal]
+        'labels': [item[0] or None for item in atendimentos_por_canal],
+        'data': [int(item[1]) for item in atendimentos_por_canal]
     }
 
-    csat_por_agente = db.session.query(
-        Usuario.nome, func.avg(Avaliacao.csat)
-    ).join(Usuario, Avaliacao.agente_id == Usuario.id)\
-     .filter(Avaliacao.empresa_id == empresa_id_do_usuario)\
-     .group_by(Usuario.nome).order_by(func.avg(Avaliacao.csat).desc()).all()
+    csat_agentes = csat_por_agente(empresa_id_do_usuario)
 
     dados_csat_agente = {
-        'labels': [item[0] for item in csat_por_agente],
-        'data': [round(item[1] or 0, 2) for item in csat_por_agente]
+        'labels': [item[0] for item in csat_agentes],
+        'data': [round(item[1] or 0, 2) for item in csat_agentes]
     }
 
     return jsonify({
@@ -142,53 +149,26 @@ def webhook_whatsapp(empresa_id):
             return request.args.get("hub.challenge")
         return "Token de verificação inválido", 403
     
-    data = request.json
-    if data.get("object") == "whatsapp_business_account":
-        try:
-            for entry in data.get("entry", []):
-                for change in entry.get("changes", []):
-                    if "messages" in change.get("value", {}):
-                        for message in change["value"]["messages"]:
-                            processar_mensagem_recebida(message, empresa)
-        except (KeyError, IndexError) as e:
-            current_app.logger.error(f"Erro ao processar payload do webhook para empresa {empresa.id}: {e}")
-            pass
-            
+    # Só grava o corpo bruto e responde: o processamento fica com os consumidores da caixa de entrada
+    whatsapp_inbox_service.receber(empresa.id, request.get_data(as_text=True))
     return jsonify({"status": "ok"}), 200
 
-def processar_mensagem_recebida(message, empresa):
-    wa_id = message["from"]
-    conteudo = message["text"]["body"] if "text" in message else "Mídia recebida"
-    timestamp = datetime.fromtimestamp(int(message['timestamp']))
 
-    conversa = ConversaWhatsApp.query.filter_by(wa_id=wa_id, empresa_id=empresa.id).first()
-    
-    if not conversa:
-        conversa = ConversaWhatsApp(wa_id=wa_id, nome_cliente=f"Cliente {wa_id[-4:]}", status='pendente', empresa_id=empresa.id)
-        db.session.add(conversa)
-        db.session.flush()
-
-    nova_mensagem = MensagemWhatsApp(
-        conversa_id=conversa.id,
-        remetente='cliente',
-        conteudo=conteudo,
-        timestamp=timestamp,
-        empresa_id=empresa.id
-    )
-    db.session.add(nova_mensagem)
-    db.session.commit()
-    
-    socketio.emit('nova_mensagem_cliente', {
-        'conversa_id': conversa.id,
-        'conteudo': conteudo,
-        'timestamp': timestamp.strftime('%H:%M')
-    }, room=f"conversa_{conversa.id}")
-    
-    socketio.emit('atualizar_dashboard')
+@bp.route("/webhook/inbox/metricas", methods=["GET"])
+@login_required
+@admin_required
+def metricas_inbox_whatsapp():
+    """Fila pendente, atraso e vazão do processamento dos webhooks do WhatsApp."""
+    return jsonify(whatsapp_inbox_service.metricas())
 
 
-def enviar_mensagem_whatsapp(wa_id, mensagem, empresa):
-    pass
+@bp.route("/envios/metricas", methods=["GET"])
+@login_required
+@admin_required
+def metricas_envios():
+    """Envios concluídos, falhas, novas tentativas e fila do despachante deste processo."""
+    return jsonify(envio_service.metricas())
+
 
 @bp.route("/registro_chamada", methods=["POST"])
 def registro_chamada():
@@ -200,122 +180,67 @@ def dados_produtividade():
     empresa_id = current_user.empresa_id
     hoje = datetime.utcnow().date()
     
-    total_atendimentos = ConversaWhatsApp.query.filter(
-        ConversaWhatsApp.empresa_id == empresa_id,
-        cast(ConversaWhatsApp.created_at, Date) == hoje
-    ).count()
-    
-    tma_query = db.session.query(
-        func.avg(func.extract('epoch', ConversaWhatsApp.fim - ConversaWhatsApp.inicio))
-    ).filter(
-        ConversaWhatsApp.empresa_id == empresa_id,
-        ConversaWhatsApp.fim.isnot(None),
-        cast(ConversaWhatsApp.fim, Date) == hoje
-    ).scalar() or 0
-    tma_minutos = int(tma_query // 60)
-    tma_segundos = int(tma_query % 60)
-    tma_formatado = f"{tma_minutos:02d}:{tma_segundos:02d}"
-    
-    fila_query = ConversaWhatsApp.query.filter(
-        ConversaWhatsApp.empresa_id == empresa_id,
-        ConversaWhatsApp.agente_atribuido_id.is_(None),
-        ConversaWhatsApp.status == 'ativo'
-    ).order_by(ConversaWhatsApp.created_at.asc()).all()
-    
-    fila = [
-        {
-            "assunto": c.assunto,
-            "cliente": c.nome_cliente,
-            "tempo": c.created_at.strftime('%H:%M'),
-            "status": "Aguardando"
-        } for c in fila_query
-    ]
+    resumo = resumo_do_dia(empresa_id, hoje)
+    fila = fila_de_atendimento(empresa_id)
     
-    csat_geral = db.session.query(func.avg(Avaliacao.csat)).filter(
-        Avaliacao.empresa_id == empresa_id
-    ).scalar() or 0.0
+    totais_historico = totais_da_empresa(empresa_id)
+    csat_geral = media(totais_historico.soma_csat, totais_historico.avaliacoes_com_csat)
     
-    agentes_query = Usuario.query.filter(
-        Usuario.empresa_id == empresa_id,
-        Usuario.role.in_(['agente', 'admin_empresa'])
-    )
-
-    agentes = []
-    for agente in agentes_query.all():
-        atendimentos_hoje = ConversaWhatsApp.query.filter(
-            ConversaWhatsApp.agente_atribuido_id == agente.id,
-            cast(ConversaWhatsApp.created_at, Date) == hoje
-        ).count()
-        
-        agente_tma_query = db.session.query(
-            func.avg(func.extract('epoch', ConversaWhatsApp.fim - ConversaWhatsApp.inicio))
-        ).filter(
-            ConversaWhatsApp.agente_atribuido_id == agente.id,
-            ConversaWhatsApp.fim.isnot(None),
-            cast(ConversaWhatsApp.fim, Date) == hoje
-        ).scalar() or 0
-        agente_tma_min = int(agente_tma_query // 60)
-        agente_tma_sec = int(agente_tma_query % 60)
-
-        top_assuntos_query = db.session.query(
-            ConversaWhatsApp.assunto, func.count(ConversaWhatsApp.id).label('total')
-        ).filter(
-            ConversaWhatsApp.agente_atribuido_id == agente.id,
-            cast(ConversaWhatsApp.created_at, Date) == hoje
-        ).group_by(ConversaWhatsApp.assunto).order_by(func.count(ConversaWhatsApp.id).desc()).limit(5).all()
-
-        top_assuntos = [{"assunto": a.assunto, "total": a.total} for a in top_assuntos_query]
-        
-        # --- [CORREÇÃO MANTIDA] ---
-        # A lógica de "Ativo" vs "Inativo" foi removida desta rota.
-        # Agora, nós simplesmente lemos os valores 'status_agente' e 'is_monitoring'
-        # que são mantidos no banco de dados pela rota /log_activity (para online)
-        # e pelo realtime_service (para offline).
-        agentes.append({
-            "id": agente.id,
-            "nome": agente.nome,
-            "setor": agente.departamento.nome if agente.departamento else "Sem Setor",
-            "atendimentos": atendimentos_hoje,
-            "tma": f"{agente_tma_min:02d}:{agente_tma_sec:02d}",
-            "status": agente.status_agente, # Apenas lemos o status do banco
-            "is_monitoring": agente.is_monitoring, # Apenas lemos o status do banco
-            "top_assuntos": top_assuntos
-        })
-        # --- [FIM DA CORREÇÃO] ---
+    # As estatísticas por agente são calculadas em consultas agregadas
+    # (número de consultas constante, independente da quantidade de agentes).
+    # 'status' e 'is_monitoring' continuam sendo apenas lidos do banco: são mantidos
+    # pela rota /log_activity (para online) e pelo realtime_service (para offline).
+    agentes = estatisticas_agentes_do_dia(empresa_id, hoje)
     
     return jsonify({
-        "totalAtendimentos": total_atendimentos,
-        "tma": tma_formatado,
+        "totalAtendimentos": resumo["totalAtendimentos"],
+        "tma": resumo["tma"],
         "fila": fila,
         "csatGeral": round(csat_geral, 1),
         "agentes": agentes
     })
 
+@bp.route("/dashboard/produtividade/serie")
+@login_required
+def serie_produtividade_dashboard():
+    """
+    Série de tempo produtivo / improdutivo para os gráficos: ?periodo=dia|semana|mes&data=AAAA-MM-DD
+    (padrão: hoje) e, opcionalmente, &usuario_id=. Lida do rollup por hora (produtividade_horaria).
+    Agentes só veem os próprios dados.
+    """
+    periodo = request.args.get('periodo', 'dia')
+    if periodo not in PERIODOS:
+        return jsonify({"error": "Período inválido. Use dia, semana ou mes."}), 400
+    try:
+        dia = date.fromisoformat(request.args['data']) if request.args.get('data') else datetime.utcnow().date()
+    except ValueError:
+        return jsonify({"error": "Data inválida. Use AAAA-MM-DD."}), 400
+
+    usuario_id = request.args.get('usuario_id', type=int)
+    if current_user.role == 'agente':
+        usuario_id = current_user.id
+
+    return jsonify(serie_produtividade(current_user.empresa_id, periodo, dia, usuario_id=usuario_id))
+
 @bp.route('/rh/dados_dashboard_financeiro')
 @login_required
 def dados_dashboard_financeiro():
     empresa_id = current_user.empresa_id
-    funcionarios_ativos = Funcionario.query.filter_by(empresa_id=empresa_id, status='ativo').all()
+    hoje = date.today()
 
-    if not funcionarios_ativos:
+    # Mês já fechado (flask folha fechar): lê os totais gravados; senão, calcula com as mesmas entradas
+    resumo = resumo_da_folha(empresa_id, hoje.year, hoje.month) or resumo_calculado(empresa_id, hoje.year, hoje.month)
+    if not resumo:
         return jsonify({
             "total_funcionarios": 0, "custo_total_empresa": 0,
             "total_salarios_liquidos": 0, "total_beneficios": 0,
             "total_impostos": 0, "distribuicao_custos": {'labels': [], 'data': []}
         })
-
-    custo_total = 0
-    salarios_liquidos = 0
-    beneficios = 0
-    impostos = 0
-    
-    for func in funcionarios_ativos:
-        resultado = calcular_folha_pagamento(func)
-        if resultado['success']:
-            custo_total += resultado['totais']['custo_total_empresa']
-            salarios_liquidos += resultado['totais']['liquido_funcionario']
-            beneficios += resultado['proventos']['vale_alimentacao'] + resultado['proventos']['vale_refeicao']
-            impostos += resultado['custos_empresa']['fgts'] + resultado['custos_empresa']['inss_patronal']
+    total_funcionarios = resumo['funcionarios']
+    custo_total = resumo['custo_total_empresa']
+    salarios_liquidos = resumo['salario_liquido']
+    beneficios = resumo['vale_alimentacao'] + resumo['vale_refeicao']
+    impostos = resumo['fgts'] + resumo['inss_patronal']
 
     distribuicao_custos = {
         'labels': ['Salários Líquidos', 'Benefícios (VA/VR)', 'Impostos (FGTS/INSS Patronal)'],
@@ -327,15 +252,12 @@ def dados_dashboard_financeiro():
     }
     
     return jsonify({
-        "total_funcionarios": len(funcionarios_ativos),
+        "total_funcionarios": total_funcionarios,
         "custo_total_empresa": round(float(custo_total), 2),
         "total_salarios_liquidos": round(float(salarios_liquidos), 2),
         "total_beneficios": round(float(beneficios), 2),
         "total_impostos": round(float(impostos), 2),
-        # --- [INÍCIO DA CORREÇÃO DO SYNTAXERROR] ---
-        # O espaço foi removido daqui:
         "distribuicao_custos": distribuicao_custos
-        # --- [FIM DA CORREÇÃO DO SYNTAXERROR] ---
     })
 
 
@@ -350,7 +272,7 @@ def mudar_status_agente():
     agente.status_agente = novo_status
     db.session.commit()
     
-    socketio.emit('atualizar_dashboard')
+    dashboard_invalidator.invalidar(agente.empresa_id, agentes=[agente.id])
     
     return jsonify({'status': 'ok', 'message': f'Status alterado para {novo_status}.'})
 
@@ -368,61 +290,91 @@ def definir_assunto_conversa(conversa_id):
     conversa.assunto = novo_assunto
     db.session.commit()
     
-    socketio.emit('atualizar_dashboard')
+    dashboard_invalidator.invalidar(conversa.empresa_id, agentes=[conversa.agente_atribuido_id], fila=True)
     
     return jsonify({'status': 'ok', 'message': f'Assunto da conversa alterado para {novo_assunto}.'})
 
+@bp.route('/conversa/<int:conversa_id>/finalizar', methods=['POST'])
+@login_required
+def finalizar_conversa(conversa_id):
+    conversa = ConversaWhatsApp.query.filter_by(id=conversa_id, empresa_id=current_user.empresa_id).first_or_404()
+    if conversa.fim:
+        return jsonify({'status': 'error', 'message': 'A conversa já foi finalizada.'}), 400
+
+    conversa.status = 'finalizado'
+    conversa.fim = datetime.utcnow()
+    # O rollup diário (TMA) é atualizado no mesmo commit pelo estatisticas_service
+    db.session.commit()
+    
+    dashboard_invalidator.invalidar(conversa.empresa_id, agentes=[conversa.agente_atribuido_id], totais=True, fila=True)
+    
+    return jsonify({'status': 'ok', 'message': 'Conversa finalizada.'})
+
+def _amostra_valida(data):
+    """Uma amostra do agente de desktop precisa ser um objeto com timestamp ISO 8601."""
+    if not isinstance(data, dict) or 'timestamp' not in data:
+        return False
+    try:
+        datetime.fromisoformat(data['timestamp'])
+    except (TypeError, ValueError):
+        return False
+    return True
+
 @bp.route('/productivity/log', methods=['POST'])
 @agent_api_key_required
 def log_activity():
     data = request.json
     agent_user = g.current_user
     
-    if not data or 'timestamp' not in data:
+    if not _amostra_valida(data):
         return jsonify({"status": "error", "message": "Dados inválidos."}), 400
 
-    rules = ProductivityRules.query.filter_by(empresa_id=agent_user.empresa_id).first()
-    rules_dict = {"process_rules": rules.process_rules if rules else [], "url_rules": rules.url_rules if rules else [], "custom_ai_prompt": rules.custom_ai_prompt if rules else None}
-    analysis = ai_productivity_service.analyze_activity(data, rules_dict)
-    
-    new_log = ActivityLog(
-        usuario_id=agent_user.id, 
-        empresa_id=agent_user.empresa_id, 
-        timestamp=datetime.fromisoformat(data['timestamp']), 
-        window_title=data.get('window_title'), 
-        process_name=data.get('process_name'), 
-        url=data.get('url'), 
-        is_productive=analysis.get('is_productive'), 
-        category=analysis.get('category'), 
-        ai_analysis=analysis
-    )
-    db.session.add(new_log)
-    
-    # --- [LÓGICA CORRETA MANTIDA] ---
-    # Atualiza o status do usuário para "Ativo" e "Monitorando"
-    # e registra o último "ping"
-    agent_user.is_monitoring = True
-    agent_user.last_agent_activity = datetime.utcnow()
-    # Se o status manual dele era 'Inativo', muda para 'Disponível'
-    if agent_user.status_agente == 'Inativo':
-        agent_user.status_agente = 'Disponível'
-    # --- [FIM DA LÓGICA MANTIDA] ---
+    # Classificação, gravação e notificações são feitas pelos workers da fila de ingestão
+    productivity_ingestion_service.enfileirar(agent_user, [data])
 
-    db.session.commit()
-    
-    realtime_data = {
-        "usuario_id": agent_user.id,
-        "usuario_nome": agent_user.nome,
-        **data,
-        **analysis
-    }
-    notify_dashboard_update(agent_user.empresa_id, realtime_data)
-    
-    # Notifica sobre o STATUS (confirma que o desktop está enviando dados)
-    # Isso fará o dashboard web atualizar
-    update_desktop_agent_status(agent_user.id, True)
+    return jsonify({"status": "accepted", "message": "Log recebido."}), 202
 
-    return jsonify({"status": "success", "message": "Log recebido."}), 201
+@bp.route('/productivity/log/batch', methods=['POST'])
+@agent_api_key_required
+def log_activity_batch():
+    """
+    Recebe várias amostras do agente de desktop em uma requisição (lista JSON, opcionalmente
+    com Content-Encoding: gzip). O lote é validado por inteiro e gravado com um único INSERT.
+    """
+    limite = current_app.config.get('PRODUCTIVITY_BATCH_MAX_SAMPLES', 500)
+    corpo = request.get_data()
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        # Limita o tamanho descompactado para não aceitar "bombas" de compressão
+        descompactador = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            corpo = descompactador.decompress(corpo, limite * 4096)
+        except zlib.error:
+            return jsonify({"status": "error", "message": "Corpo gzip inválido."}), 400
+        if descompactador.unconsumed_tail:
+            return jsonify({"status": "error", "message": "Lote muito grande."}), 413
+    try:
+        amostras = json.loads(corpo)
+    except ValueError:
+        return jsonify({"status": "error", "message": "JSON inválido."}), 400
+
+    if not isinstance(amostras, list) or not amostras:
+        return jsonify({"status": "error", "message": "Envie uma lista de amostras."}), 400
+    if len(amostras) > limite:
+        return jsonify({"status": "error", "message": f"Máximo de {limite} amostras por lote."}), 413
+    invalidas = [i for i, amostra in enumerate(amostras) if not _amostra_valida(amostra)]
+    if invalidas:
+        return jsonify({"status": "error", "message": "Amostras inválidas.", "indices": invalidas}), 400
+
+    productivity_ingestion_service.enfileirar(g.current_user, amostras)
+
+    return jsonify({"status": "accepted", "message": f"{len(amostras)} logs recebidos.", "recebidos": len(amostras)}), 202
+
+@bp.route('/productivity/classification_cache', methods=['GET'])
+@login_required
+@admin_required
+def metricas_cache_classificacao():
+    """Métricas do cache de classificação por IA (hit rate, itens, remoções do LRU)."""
+    return jsonify(classification_cache.metricas())
 
 @bp.route('/productivity/rules', methods=['GET', 'POST'])
 @login_required
@@ -436,5 +388,6 @@ def manage_rules():
         rules.url_rules = data.get('url_rules', [])
         rules.custom_ai_prompt = data.get('custom_ai_prompt')
         db.session.commit()
+        rule_matcher_cache.invalidar(current_user.empresa_id)
         return jsonify({"message": "Regras atualizadas."})
     return jsonify({"process_rules": rules.process_rules or [], "url_rules": rules.url_rules or [], "custom_ai_prompt": rules.custom_ai_prompt or ""})
\ No newline at end of file
@@ -0,0 +1,126 @@
+# call_center_project/app/commands.py
+
+import click
+from flask.cli import AppGroup
+
+# --- Comandos de manutenção (executados com `flask <grupo> <comando>`) ---
+
+estatisticas_cli = AppGroup('estatisticas', help='Manutenção do rollup de estatísticas diárias.')
+
+
+@estatisticas_cli.command('reconstruir')
+@click.option('--empresa-id', type=int, default=None, help='Reconstrói apenas a empresa informada.')
+@click.option('--desde', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Data inicial (AAAA-MM-DD).')
+@click.option('--ate', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Data final (AAAA-MM-DD).')
+def reconstruir_estatisticas_command(empresa_id, desde, ate):
+    """Reconstrói o histórico do rollup diário a partir dos dados brutos."""
+    from app.services.estatisticas_service import reconstruir_estatisticas
+    reconstruir_estatisticas(
+        empresa_id=empresa_id,
+        desde=desde.date() if desde else None,
+        ate=ate.date() if ate else None
+    )
+    click.echo('Estatísticas diárias reconstruídas com sucesso.')
+
+
+atividades_cli = AppGroup('atividades', help='Partições, retenção e rollup dos logs do agente de desktop (activity_log).')
+
+
+@atividades_cli.command('particoes')
+@click.option('--meses-a-frente', type=int, default=None, help='Meses futuros com partição (padrão: ACTIVITY_LOG_PARTITIONS_AHEAD).')
+def garantir_particoes_command(meses_a_frente):
+    """Cria as partições mensais do mês atual e dos próximos meses (rodar diariamente)."""
+    from app.services.activity_log_partitions import garantir_particoes
+    criadas = garantir_particoes(meses_a_frente)
+    click.echo(f"Partições criadas: {', '.join(criadas)}" if criadas else 'Nenhuma partição nova.')
+
+
+@atividades_cli.command('retencao')
+@click.option('--meses', type=int, default=None, help='Meses mantidos além do atual (padrão: ACTIVITY_LOG_RETENTION_MONTHS).')
+def aplicar_retencao_command(meses):
+    """Remove as partições (e as linhas da partição padrão) mais antigas que o prazo de retenção."""
+    from app.services.activity_log_partitions import aplicar_retencao
+    removidas = aplicar_retencao(meses)
+    click.echo(f"Partições removidas: {', '.join(removidas)}" if removidas else 'Nenhuma partição removida.')
+
+
+@atividades_cli.command('reconstruir')
+@click.option('--empresa-id', type=int, default=None, help='Reconstrói apenas a empresa informada.')
+@click.option('--desde', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Data inicial (AAAA-MM-DD).')
+@click.option('--ate', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Data final (AAAA-MM-DD).')
+def reconstruir_produtividade_command(empresa_id, desde, ate):
+    """Reconstrói o rollup de produtividade por hora a partir dos spans de activity_log."""
+    from app.services.produtividade_rollup_service import reconstruir_produtividade
+    reconstruir_produtividade(
+        empresa_id=empresa_id,
+        desde=desde.date() if desde else None,
+        ate=ate.date() if ate else None
+    )
+    click.echo('Rollup de produtividade reconstruído com sucesso.')
+
+
+folha_cli = AppGroup('folha', help='Fechamento mensal da folha de pagamento.')
+
+
+@folha_cli.command('fechar')
+@click.option('--empresa-id', type=int, default=None, help='Fecha apenas a empresa informada (padrão: todas com funcionários empregados no mês).')
+@click.option('--ano', type=int, default=None, help='Ano (padrão: o atual).')
+@click.option('--mes', type=click.IntRange(1, 12), default=None, help='Mês (padrão: o atual).')
+@click.option('--forcar', is_flag=True, help='Recalcula todos os funcionários, mesmo sem alterações.')
+def fechar_folha_command(empresa_id, ano, mes, forcar):
+    """Calcula e grava a folha do mês; no fechamento seguinte, só recalcula quem mudou."""
+    from datetime import date
+    from app.models import db
+    from app.models_rh import Funcionario
+    from app.services.folha_service import fechar_folha, empregados_no_mes
+    hoje = date.today()
+    ano, mes = ano or hoje.year, mes or hoje.month
+    if empresa_id:
+        empresas = [empresa_id]
+    else:
+        empresas = [e for (e,) in db.session.query(Funcionario.empresa_id).filter(
+            empregados_no_mes(ano, mes)).distinct().order_by(Funcionario.empresa_id)]
+    for empresa in empresas:
+        resultado = fechar_folha(empresa, ano, mes, forcar=forcar)
+        click.echo(f"Empresa {empresa} ({mes:02d}/{ano}): {resultado['calculados']} calculados, "
+                   f"{resultado['inalterados']} inalterados, {resultado['removidos']} removidos.")
+
+
+whatsapp_cli = AppGroup('whatsapp', help='Caixa de entrada do webhook e envios do WhatsApp.')
+
+
+@whatsapp_cli.command('processar-inbox')
+def processar_inbox_command():
+    """Processa agora todos os webhooks pendentes da caixa de entrada."""
+    from flask import current_app
+    from app.services.whatsapp_inbox_service import whatsapp_inbox_service
+    processadas = whatsapp_inbox_service.drenar(current_app._get_current_object())
+    click.echo(f"{processadas} webhooks processados.")
+
+
+@whatsapp_cli.command('limpar-inbox')
+@click.option('--dias', type=int, default=None, help='Dias mantidos após o processamento (padrão: WHATSAPP_INBOX_RETENTION_DAYS).')
+def limpar_inbox_command(dias):
+    """Remove da caixa de entrada os webhooks já processados (rodar diariamente)."""
+    from app.services.whatsapp_inbox_service import whatsapp_inbox_service
+    click.echo(f"{whatsapp_inbox_service.limpar(dias)} webhooks removidos.")
+
+
+@whatsapp_cli.command('enviar-pendentes')
+def enviar_pendentes_command():
+    """Envia agora as mensagens dos agentes que ficaram pendentes (fila cheia ou reinício)."""
+    from flask import current_app
+    from app.services.envio_service import envio_service
+    app = current_app._get_current_object()
+    recuperadas = envio_service.recuperar_pendentes(app, idade=0)
+    envio_service.drenar(app)
+    envio_service.parar(app)
+    click.echo(f"{recuperadas} mensagens recolocadas na fila: {envio_service.metricas(app)}")
+
+
+def init_app(app):
+    """Registra os grupos de comandos na CLI do Flask."""
+    app.cli.add_command(estatisticas_cli)
+    app.cli.add_command(atividades_cli)
+    app.cli.add_command(folha_cli)
+    app.cli.add_command(whatsapp_cli)
@@ -25,4 +25,122 @@ class Config:
     # --- Configurações do WhatsApp Business API ---
     WHATSAPP_TOKEN = os.environ.get('WHATSAPP_TOKEN', "SEU_TOKEN_WHATSAPP_BUSINESS_API")
     WHATSAPP_URL = os.environ.get('WHATSAPP_URL', "https://graph.facebook.com/v17.0/SEU_NUMERO_ID/messages" )
-    WEBHOOK_VERIFY_TOKEN = os.environ.get('WEBHOOK_VERIFY_TOKEN', "SEU_TOKEN_WEBHOOK")
\ No newline at end of file
+    WEBHOOK_VERIFY_TOKEN = os.environ.get('WEBHOOK_VERIFY_TOKEN', "SEU_TOKEN_WEBHOOK")
+    # O webhook só grava o corpo na caixa de entrada (webhook_inbox); consumidores em segundo plano
+    # processam as linhas pendentes: quantidade, linhas por lote, intervalo de consulta (linhas de
+    # outros processos), tentativas antes de descartar uma linha e o intervalo (segundos) entre elas,
+    # dias que as linhas processadas são mantidas (`flask whatsapp limpar-inbox`) e janela (segundos)
+    # das métricas de vazão e atraso
+    WHATSAPP_INBOX_WORKERS = int(os.environ.get('WHATSAPP_INBOX_WORKERS', 2))
+    WHATSAPP_INBOX_BATCH_SIZE = int(os.environ.get('WHATSAPP_INBOX_BATCH_SIZE', 50))
+    WHATSAPP_INBOX_POLL_SECONDS = float(os.environ.get('WHATSAPP_INBOX_POLL_SECONDS', 1.0))
+    WHATSAPP_INBOX_MAX_ATTEMPTS = int(os.environ.get('WHATSAPP_INBOX_MAX_ATTEMPTS', 5))
+    WHATSAPP_INBOX_RETRY_SECONDS = float(os.environ.get('WHATSAPP_INBOX_RETRY_SECONDS', 30))
+    WHATSAPP_INBOX_RETENTION_DAYS = int(os.environ.get('WHATSAPP_INBOX_RETENTION_DAYS', 7))
+    WHATSAPP_INBOX_METRICS_WINDOW_SECONDS = int(os.environ.get('WHATSAPP_INBOX_METRICS_WINDOW_SECONDS', 60))
+    # Mensagens por página no histórico de uma conversa (/api/conversa/<id>) e o máximo aceito em `limite`
+    WHATSAPP_HISTORY_PAGE_SIZE = int(os.environ.get('WHATSAPP_HISTORY_PAGE_SIZE', 50))
+    WHATSAPP_HISTORY_MAX_PAGE_SIZE = int(os.environ.get('WHATSAPP_HISTORY_MAX_PAGE_SIZE', 200))
+    # Tamanho do LRU (empresa, wa_id) -> conversa usado pelos consumidores da caixa de entrada
+    WHATSAPP_CONVERSA_CACHE_MAX_ITEMS = int(os.environ.get('WHATSAPP_CONVERSA_CACHE_MAX_ITEMS', 50000))
+
+    # --- Envio de mensagens (WhatsApp Cloud API e SendGrid) ---
+    # URLs base dos provedores (aponte para o servidor falso de tests/fake_provider_server.py em testes)
+    WHATSAPP_API_BASE_URL = os.environ.get('WHATSAPP_API_BASE_URL', 'https://graph.facebook.com/v17.0')
+    SENDGRID_API_BASE_URL = os.environ.get('SENDGRID_API_BASE_URL', 'https://api.sendgrid.com')
+    # Envios por segundo de cada empresa, em cada processo: a Meta aceita 80 mensagens/s por número
+    # e o SendGrid 600 requisições/min por chave. Com vários processos, divida a cota entre eles
+    WHATSAPP_SEND_RATE_PER_SECOND = float(os.environ.get('WHATSAPP_SEND_RATE_PER_SECOND', 80))
+    EMAIL_SEND_RATE_PER_SECOND = float(os.environ.get('EMAIL_SEND_RATE_PER_SECOND', 10))
+    # Despachante: requisições simultâneas (também o tamanho do pool de conexões keep-alive), envios
+    # aguardando na fila, timeouts de conexão e de leitura, tentativas (backoff exponencial a partir de
+    # OUTBOUND_RETRY_BACKOFF_SECONDS) e idade (segundos) a partir da qual um envio pendente no banco
+    # é recolocado na fila (fila cheia ou reinício do processo)
+    OUTBOUND_WORKERS = int(os.environ.get('OUTBOUND_WORKERS', 8))
+    OUTBOUND_QUEUE_MAX_SIZE = int(os.environ.get('OUTBOUND_QUEUE_MAX_SIZE', 10000))
+    OUTBOUND_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('OUTBOUND_CONNECT_TIMEOUT_SECONDS', 3))
+    OUTBOUND_READ_TIMEOUT_SECONDS = float(os.environ.get('OUTBOUND_READ_TIMEOUT_SECONDS', 10))
+    OUTBOUND_MAX_ATTEMPTS = int(os.environ.get('OUTBOUND_MAX_ATTEMPTS', 5))
+    OUTBOUND_RETRY_BACKOFF_SECONDS = float(os.environ.get('OUTBOUND_RETRY_BACKOFF_SECONDS', 1))
+    OUTBOUND_RECOVERY_SECONDS = float(os.environ.get('OUTBOUND_RECOVERY_SECONDS', 60))
+
+    # --- Dashboard em tempo real ---
+    # Janela (em segundos) em que as invalidações do dashboard de uma empresa são agrupadas
+    # em uma única notificação 'atualizar_dashboard'. Use 0 para enviar imediatamente.
+    DASHBOARD_INVALIDATION_WINDOW_SECONDS = float(os.environ.get('DASHBOARD_INVALIDATION_WINDOW_SECONDS', 2.0))
+
+    # --- RH ---
+    # Por quanto tempo (segundos) as regras de feriado de cada empresa ficam em cache (dias úteis da folha)
+    CALENDARIO_CACHE_TTL_SECONDS = int(os.environ.get('CALENDARIO_CACHE_TTL_SECONDS', 300))
+
+    # --- Agente de desktop ---
+    # Por quanto tempo (segundos) a validação da chave de API do agente fica em cache
+    API_KEY_CACHE_TTL_SECONDS = int(os.environ.get('API_KEY_CACHE_TTL_SECONDS', 60))
+
+    # --- Ingestão dos logs do agente de desktop ---
+    # Backend da fila: 'memoria' (no próprio processo) ou 'redis' (compartilhada entre nós)
+    PRODUCTIVITY_QUEUE_BACKEND = os.environ.get('PRODUCTIVITY_QUEUE_BACKEND', 'memoria')
+    REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    # Quantidade de workers que drenam a fila e tamanho máximo de cada lote gravado
+    PRODUCTIVITY_QUEUE_WORKERS = int(os.environ.get('PRODUCTIVITY_QUEUE_WORKERS', 2))
+    PRODUCTIVITY_QUEUE_BATCH_SIZE = int(os.environ.get('PRODUCTIVITY_QUEUE_BATCH_SIZE', 100))
+    # Um lote que falhou ao gravar volta para a fila; depois de PRODUCTIVITY_QUEUE_MAX_ATTEMPTS
+    # tentativas seus itens vão para a lista de descartados. Depois de um erro (fila ou banco) o worker
+    # espera PRODUCTIVITY_QUEUE_RETRY_BACKOFF_SECONDS, dobrando a cada erro seguido até o máximo
+    PRODUCTIVITY_QUEUE_MAX_ATTEMPTS = int(os.environ.get('PRODUCTIVITY_QUEUE_MAX_ATTEMPTS', 5))
+    PRODUCTIVITY_QUEUE_RETRY_BACKOFF_SECONDS = float(os.environ.get('PRODUCTIVITY_QUEUE_RETRY_BACKOFF_SECONDS', 1))
+    PRODUCTIVITY_QUEUE_MAX_BACKOFF_SECONDS = float(os.environ.get('PRODUCTIVITY_QUEUE_MAX_BACKOFF_SECONDS', 30))
+    # Máximo de amostras aceitas por requisição em /api/productivity/log/batch
+    PRODUCTIVITY_BATCH_MAX_SAMPLES = int(os.environ.get('PRODUCTIVITY_BATCH_MAX_SAMPLES', 500))
+    # Amostras consecutivas idênticas viram um único span em activity_log: intervalo entre as amostras
+    # do agente (cada uma cobre esse tempo; uma a mais de atraso ainda estende o span) e duração máxima
+    # de um span (depois disso, um novo é aberto)
+    ACTIVITY_SAMPLE_INTERVAL_SECONDS = int(os.environ.get('ACTIVITY_SAMPLE_INTERVAL_SECONDS', 15))
+    ACTIVITY_SPAN_MAX_SECONDS = int(os.environ.get('ACTIVITY_SPAN_MAX_SECONDS', 3600))
+    # activity_log é particionada por mês: partições criadas adiante pelo `flask atividades particoes`
+    # e meses mantidos (além do atual) pelo `flask atividades retencao`; 0 desativa a retenção
+    ACTIVITY_LOG_PARTITIONS_AHEAD = int(os.environ.get('ACTIVITY_LOG_PARTITIONS_AHEAD', 2))
+    ACTIVITY_LOG_RETENTION_MONTHS = int(os.environ.get('ACTIVITY_LOG_RETENTION_MONTHS', 13))
+
+    # --- Presença (sessões web e heartbeats do agente de desktop) ---
+    # Backend: 'memoria' (no próprio processo) ou 'redis' (compartilhado entre os workers, em REDIS_URL)
+    PRESENCE_BACKEND = os.environ.get('PRESENCE_BACKEND', 'memoria')
+    # Intervalo (segundos) em que os heartbeats do agente são gravados em lote em Usuario.last_agent_activity
+    PRESENCE_FLUSH_INTERVAL_SECONDS = float(os.environ.get('PRESENCE_FLUSH_INTERVAL_SECONDS', 30))
+    # Sem heartbeats por esse tempo (segundos), o status do desktop some da presença
+    PRESENCE_DESKTOP_TTL_SECONDS = int(os.environ.get('PRESENCE_DESKTOP_TTL_SECONDS', 3600))
+    # Fila de mensagens do Socket.IO (modo multi-nó): os emits de um worker (ou de um processo
+    # sem Flask app, via realtime_service.criar_emissor_externo) chegam aos clientes conectados nos
+    # outros. Todos os workers e emissores precisam usar a mesma URL e o mesmo canal. Com vários
+    # workers, o balanceador precisa de sessões fixas (ex.: ip_hash no nginx), porque o long-polling
+    # do Engine.IO manda todas as requisições de uma sessão para o worker que a criou
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or (REDIS_URL if PRESENCE_BACKEND == 'redis' else None)
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'flask-socketio')
+    # Agente sem heartbeat por esse tempo (segundos) é marcado como inativo. O agendador roda em todos
+    # os workers, mas só o líder (mandato renovado a cada terço do TTL) faz as transições
+    INACTIVITY_THRESHOLD_SECONDS = int(os.environ.get('INACTIVITY_THRESHOLD_SECONDS', 180))
+    INACTIVITY_LEADER_TTL_SECONDS = int(os.environ.get('INACTIVITY_LEADER_TTL_SECONDS', 30))
+    INACTIVITY_SCHEDULER_ENABLED = os.environ.get('INACTIVITY_SCHEDULER_ENABLED', 'true').lower() == 'true'
+
+    # --- Classificação de produtividade por IA ---
+    OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+    # Cache das classificações (por empresa e versão das regras): TTL, tamanho do LRU em memória
+    # e se também deve usar o Redis (REDIS_URL) como segunda camada compartilhada
+    CLASSIFICATION_CACHE_TTL_SECONDS = int(os.environ.get('CLASSIFICATION_CACHE_TTL_SECONDS', 24 * 3600))
+    CLASSIFICATION_CACHE_MAX_ITEMS = int(os.environ.get('CLASSIFICATION_CACHE_MAX_ITEMS', 10000))
+    CLASSIFICATION_CACHE_REDIS = os.environ.get('CLASSIFICATION_CACHE_REDIS', 'false').lower() == 'true'
+    # Classificador em lote: janela de agrupamento, atividades por prompt, chamadas simultâneas,
+    # timeout, novas tentativas (com backoff exponencial) e circuit breaker
+    LLM_MODEL = os.environ.get('LLM_MODEL', 'gpt-4-turbo')
+    LLM_BASE_URL = os.environ.get('LLM_BASE_URL')  # None = API da OpenAI
+    LLM_BATCH_WINDOW_SECONDS = float(os.environ.get('LLM_BATCH_WINDOW_SECONDS', 0.5))
+    LLM_BATCH_MAX_ITEMS = int(os.environ.get('LLM_BATCH_MAX_ITEMS', 20))
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 4))
+    LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', 20))
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 2))
+    LLM_RETRY_BACKOFF_SECONDS = float(os.environ.get('LLM_RETRY_BACKOFF_SECONDS', 0.5))
+    LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('LLM_CIRCUIT_FAILURE_THRESHOLD', 5))
+    LLM_CIRCUIT_RESET_SECONDS = float(os.environ.get('LLM_CIRCUIT_RESET_SECONDS', 60))
+    # Espera máxima de classificar() pelos resultados (fila do pool incluída); o que não chegar a
+    # tempo fica como "Não Classificado". Deve cobrir a janela e todas as tentativas com backoff
+    LLM_RESULT_TIMEOUT_SECONDS = float(os.environ.get('LLM_RESULT_TIMEOUT_SECONDS', 90))
@@ -4,6 +4,7 @@ from functools import wraps
 from flask import flash, redirect, url_for, request, jsonify, g
 from flask_login import current_user
 from .models import Usuario
+from .services.credential_cache import credential_cache
 
 def require_plan(plan_level):
     """
@@ -71,17 +72,27 @@ def rh_access_required(f):
 # --- [FIM DA NOVA ATUALIZAÇÃO] ---
 
 def agent_api_key_required(f):
-    """Valida a chave de API enviada pelo agente de desktop."""
+    """
+    Valida a chave de API enviada pelo agente de desktop.
+    A consulta ao usuário é cacheada por um TTL curto (credential_cache); g.current_user
+    recebe um AgenteAutenticado (id, empresa_id, status).
+    """
     @wraps(f)
     def decorated_function(*args, **kwargs):
         api_key = request.headers.get('X-API-KEY')
         if not api_key:
             return jsonify({"error": "Header 'X-API-KEY' não fornecido."}), 401
-            
-        user = Usuario.query.filter_by(email=api_key).first()
-        if not user or user.status != 'ativo':
+
+        agente = credential_cache.get(api_key)
+        if agente is None:
+            user = Usuario.query.filter_by(email=api_key).first()
+            if not user:
+                return jsonify({"error": "Chave de API inválida ou usuário inativo."}), 401
+            agente = credential_cache.set(api_key, user)
+
+        if agente.status != 'ativo':
             return jsonify({"error": "Chave de API inválida ou usuário inativo."}), 401
             
-        g.current_user = user 
+        g.current_user = agente
         return f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return decorated_function
@@ -7,6 +7,7 @@ from flask_login import login_required, current_user
 from functools import wraps
 from .ai_service import load_knowledge_base, get_ai_response
 from . import socketio # <<< LINHA ADICIONADA
+from .services.credential_cache import credential_cache
 
 bp = Blueprint('management', __name__, url_prefix='/management' )
 
@@ -126,6 +127,7 @@ def editar_usuario(id):
             flash('Senha atualizada com sucesso.', 'info')
 
         db.session.commit()
+        credential_cache.invalidar_usuario(usuario.id)
         flash(f'Dados do usuário "{usuario.nome}" atualizados com sucesso!', 'success')
         return redirect(url_for('management.listar_usuarios'))
     
@@ -150,6 +152,7 @@ def toggle_status_usuario(id):
         usuario.status = 'ativo'
         flash(f'O acesso do usuário "{usuario.nome}" foi reativado.', 'success')
     db.session.commit()
+    credential_cache.invalidar_usuario(usuario.id)
     return redirect(url_for('management.listar_usuarios'))
 
 @bp.route('/usuarios/<int:id>/excluir', methods=['POST'])
@@ -165,6 +168,7 @@ def excluir_usuario(id):
         return redirect(url_for('management.listar_usuarios'))
     db.session.delete(usuario)
     db.session.commit()
+    credential_cache.invalidar_usuario(id)
     flash(f'O usuário "{usuario.nome}" foi excluído permanentemente.', 'danger')
     return redirect(url_for('management.listar_usuarios'))
 
@@ -176,6 +176,10 @@ class Avaliacao(BaseModel):
     
 class ConversaWhatsApp(BaseModel):
     __tablename__ = 'conversa_whats_app'
+    __table_args__ = (
+        # Uma conversa por cliente em cada empresa (também é o índice da busca pelo wa_id)
+        db.UniqueConstraint('empresa_id', 'wa_id', name='uq_conversa_whats_app_empresa_wa_id'),
+    )
     wa_id = db.Column(db.String(50), nullable=False)
     nome_cliente = db.Column(db.String(100))
     status = db.Column(db.String(20), default='ativo')
@@ -189,12 +193,95 @@ class ConversaWhatsApp(BaseModel):
 
 class MensagemWhatsApp(BaseModel):
     __tablename__ = 'mensagem_whats_app'
+    __table_args__ = (
+        # Id da mensagem no WhatsApp (wamid): torna idempotente o reprocessamento de webhooks repetidos
+        db.UniqueConstraint('wamid', name='uq_mensagem_whats_app_wamid'),
+        # Histórico paginado por (timestamp, id) dentro da conversa
+        db.Index('ix_mensagem_whats_app_conversa_timestamp', 'conversa_id', 'timestamp', 'id'),
+        # Mensagens gravadas depois de um id (cursor `depois`) e o maior id da conversa (ETag)
+        db.Index('ix_mensagem_whats_app_conversa_id', 'conversa_id', 'id'),
+        # Envios ainda não concluídos, recolocados na fila pelo despachante depois de um reinício
+        db.Index('ix_mensagem_whats_app_envio_pendente', 'id',
+                 postgresql_where=db.text("status_envio IN ('pendente', 'reenvio')")),
+    )
     conversa_id = db.Column(db.Integer, db.ForeignKey('conversa_whats_app.id'), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     remetente = db.Column(db.String(20))
     conteudo = db.Column(db.Text)
     lida = db.Column(db.Boolean, default=False)
     empresa_id = db.Column(db.Integer, db.ForeignKey('empresa.id'), nullable=False)
+    wamid = db.Column(db.String(128), nullable=True)
+    # Entrega das mensagens dos agentes (app/services/envio_service.py): pendente, enviando,
+    # reenvio, enviada ou falhou; nulo nas mensagens recebidas dos clientes
+    status_envio = db.Column(db.String(20), nullable=True)
+    tentativas_envio = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    erro_envio = db.Column(db.Text, nullable=True)
+    enviada_em = db.Column(db.DateTime, nullable=True)
+
+class WebhookInbox(BaseModel):
+    """
+    Caixa de entrada do webhook do WhatsApp: o corpo bruto de cada chamada, gravado antes da resposta.
+    Os consumidores (app/services/whatsapp_inbox_service.py) processam as linhas pendentes
+    (processado_em nulo) em ordem de chegada; uma linha que falha volta para a fila até
+    WHATSAPP_INBOX_MAX_ATTEMPTS tentativas e então é encerrada com o erro.
+    """
+    __tablename__ = 'webhook_inbox'
+    __table_args__ = (
+        db.Index('ix_webhook_inbox_pendentes', 'id', postgresql_where=db.text('processado_em IS NULL')),
+    )
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresa.id'), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    processado_em = db.Column(db.DateTime)
+    tentativas = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    erro = db.Column(db.Text)
+
+class EstatisticaDiaria(BaseModel):
+    """
+    Estatísticas diárias pré-agregadas do call center (rollup).
+    Cada linha guarda os contadores de uma combinação (empresa, dia, agente, assunto, canal).
+    agente_id = 0 indica "sem agente"; assunto/canal vazios indicam que a dimensão não se aplica.
+    Mantida de forma incremental por app/services/estatisticas_service.py.
+    """
+    __tablename__ = 'estatistica_diaria'
+    __table_args__ = (
+        db.UniqueConstraint('empresa_id', 'data', 'agente_id', 'assunto', 'canal', name='uq_estatistica_diaria_chave'),
+    )
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresa.id'), nullable=False)
+    data = db.Column(db.Date, nullable=False)
+    agente_id = db.Column(db.Integer, nullable=False, default=0)
+    assunto = db.Column(db.String(100), nullable=False, default='')
+    canal = db.Column(db.String(20), nullable=False, default='')
+
+    atendimentos = db.Column(db.Integer, nullable=False, default=0)
+    mensagens_recebidas = db.Column(db.Integer, nullable=False, default=0)
+    conversas_finalizadas = db.Column(db.Integer, nullable=False, default=0)
+    duracao_total_segundos = db.Column(db.Float, nullable=False, default=0.0)
+    avaliacoes = db.Column(db.Integer, nullable=False, default=0)
+    avaliacoes_com_csat = db.Column(db.Integer, nullable=False, default=0)
+    soma_csat = db.Column(db.Float, nullable=False, default=0.0)
+
+class ProdutividadeHoraria(BaseModel):
+    """
+    Tempo produtivo / improdutivo por hora (rollup dos spans de ActivityLog).
+    Cada linha guarda os segundos e as amostras de uma combinação (empresa, agente, hora, categoria,
+    classificação). categoria vazia indica "sem categoria"; classificacao é 'produtivo', 'improdutivo'
+    ou 'neutro' (is_productive nulo). O tempo de um span é dividido entre as horas que ele cobre e as
+    amostras contam na hora em que o span começou.
+    Mantida pela ingestão (app/services/produtividade_rollup_service.py).
+    """
+    __tablename__ = 'produtividade_horaria'
+    __table_args__ = (
+        db.UniqueConstraint('empresa_id', 'usuario_id', 'hora', 'categoria', 'classificacao', name='uq_produtividade_horaria_chave'),
+        db.Index('ix_produtividade_horaria_empresa_hora', 'empresa_id', 'hora'),
+    )
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresa.id'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
+    hora = db.Column(db.DateTime, nullable=False)
+    categoria = db.Column(db.String(100), nullable=False, default='')
+    classificacao = db.Column(db.String(12), nullable=False)
+
+    segundos = db.Column(db.Float, nullable=False, default=0.0)
+    amostras = db.Column(db.Integer, nullable=False, default=0)
 
 class TicketSuporte(BaseModel):
     __tablename__ = 'ticket_suporte'
@@ -248,21 +335,60 @@ class Notificacao(BaseModel):
     mensagem = db.Column(db.Text, nullable=False)
     lida = db.Column(db.Boolean, default=False)
 
+from sqlalchemy import event, func, DDL
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.hybrid import hybrid_property
+
+# Linhas de activity_log anteriores aos spans representam uma amostra do agente (LOG_INTERVAL_SECONDS)
+INTERVALO_AMOSTRA_LEGADO = 15
 
 class ActivityLog(BaseModel):
+    """
+    Logs do agente de desktop, como spans: amostras consecutivas idênticas (mesma janela, processo
+    e URL) do mesmo agente viram uma linha, de `timestamp` (início) até `end_timestamp`, com
+    `sample_count` amostras. Linhas gravadas antes dos spans têm end_timestamp nulo (uma amostra).
+
+    Particionada por mês em `timestamp` (PostgreSQL): a chave primária inclui o timestamp, as
+    partições mensais e a retenção ficam em activity_log_partitions e o que cair fora delas vai
+    para a partição activity_log_default.
+    """
     __tablename__ = 'activity_log'
+    __table_args__ = (
+        db.Index('ix_activity_log_empresa_usuario_timestamp', 'empresa_id', 'usuario_id', 'timestamp'),
+        db.Index('ix_activity_log_empresa_timestamp', 'empresa_id', 'timestamp'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'}
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
     empresa_id = db.Column(db.Integer, db.ForeignKey('empresa.id'), nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, primary_key=True, default=datetime.utcnow)
     window_title = db.Column(db.String(512))
     process_name = db.Column(db.String(255))
     url = db.Column(db.String(1024))
     is_productive = db.Column(db.Boolean)
     category = db.Column(db.String(100))
     ai_analysis = db.Column(JSONB)
+    end_timestamp = db.Column(db.DateTime)
+    sample_count = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     usuario = db.relationship('Usuario', backref=db.backref('activity_logs', lazy=True, cascade="all, delete-orphan"))
 
+    @hybrid_property
+    def duracao_segundos(self):
+        """Tempo coberto pelo span (somável nos relatórios de tempo por aplicativo)."""
+        fim = self.end_timestamp or self.timestamp + timedelta(seconds=INTERVALO_AMOSTRA_LEGADO)
+        return (fim - self.timestamp).total_seconds()
+
+    @duracao_segundos.expression
+    def duracao_segundos(cls):
+        fim = func.coalesce(cls.end_timestamp, cls.timestamp + timedelta(seconds=INTERVALO_AMOSTRA_LEGADO))
+        return func.extract('epoch', fim - cls.timestamp)
+
+# Partição que recebe as linhas sem partição mensal (criada junto com a tabela no create_all;
+# nos bancos existentes, pela migração)
+event.listen(ActivityLog.__table__, 'after_create', DDL(
+    'CREATE TABLE IF NOT EXISTS activity_log_default PARTITION OF activity_log DEFAULT'
+).execute_if(dialect='postgresql'))
+
 class ProductivityRules(BaseModel):
     __tablename__ = 'productivity_rules'
     empresa_id = db.Column(db.Integer, db.ForeignKey('empresa.id'), nullable=False, unique=True)
@@ -3,6 +3,7 @@
 from datetime import date, datetime
 from app import db
 from app.models import BaseModel
+from sqlalchemy.orm import validates
 
 class Funcionario(BaseModel):
     __tablename__ = 'funcionarios'
@@ -62,7 +63,7 @@ class Departamento(BaseModel):
     __tablename__ = 'departamentos'
     nome = db.Column(db.String(100), nullable=False)
     descricao = db.Column(db.Text)
-    gestor_id = db.Column(db.Integer, db.ForeignKey('funcionarios.id'), nullable=True)
+    gestor_id = db.Column(db.Integer, db.ForeignKey('funcionarios.id', name='fk_departamentos_gestor_id_funcionarios', use_alter=True), nullable=True)
     empresa_id = db.Column(db.Integer, db.ForeignKey('empresa.id'), nullable=False)
     funcionarios = db.relationship('Funcionario', foreign_keys='Funcionario.departamento_id', back_populates='departamento')
     gestor = db.relationship('Funcionario', foreign_keys=[gestor_id], post_update=True)
@@ -105,20 +106,39 @@ class AvaliacaoDesempenho(BaseModel):
     avaliador = db.relationship('Funcionario', foreign_keys=[avaliador_id])
 
 class FolhaPagamento(BaseModel):
+    """
+    Folha fechada de um funcionário em um mês (app/services/folha_service.py, `flask folha fechar`).
+    Valores arredondados ao centavo; horas_extras em horas (do ponto) e valor_horas_extras em reais.
+    `assinatura` é o hash das entradas do cálculo (salário, benefícios, jornada, dias úteis,
+    afastamentos e ponto do mês): um novo fechamento só recalcula os funcionários cuja assinatura
+    mudou.
+    """
     __tablename__ = 'folha_pagamento'
+    __table_args__ = (
+        db.UniqueConstraint('funcionario_id', 'ano', 'mes', name='uq_folha_pagamento_funcionario_mes'),
+        db.Index('ix_folha_pagamento_empresa_ano_mes', 'empresa_id', 'ano', 'mes'),
+    )
     funcionario_id = db.Column(db.Integer, db.ForeignKey('funcionarios.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresa.id'), nullable=False)
     mes = db.Column(db.Integer, nullable=False)
     ano = db.Column(db.Integer, nullable=False)
     salario_base = db.Column(db.Numeric(10, 2), nullable=False)
     horas_extras = db.Column(db.Numeric(10, 2), default=0)
+    valor_horas_extras = db.Column(db.Numeric(10, 2), default=0)
     inss = db.Column(db.Numeric(10, 2), default=0)
     irrf = db.Column(db.Numeric(10, 2), default=0)
     vale_transporte = db.Column(db.Numeric(10, 2), default=0)
     vale_refeicao = db.Column(db.Numeric(10, 2), default=0)
+    vale_alimentacao = db.Column(db.Numeric(10, 2), default=0)
+    fgts = db.Column(db.Numeric(10, 2), default=0)
+    inss_patronal = db.Column(db.Numeric(10, 2), default=0)
     total_proventos = db.Column(db.Numeric(10, 2), default=0)
     total_descontos = db.Column(db.Numeric(10, 2), default=0)
     salario_liquido = db.Column(db.Numeric(10, 2), default=0)
+    custo_total_empresa = db.Column(db.Numeric(10, 2), default=0)
+    dias_uteis = db.Column(db.Integer, default=0)
     dias_trabalhados = db.Column(db.Integer, default=0)
+    assinatura = db.Column(db.String(64), nullable=True)
 
 class BeneficioFuncionario(BaseModel):
     __tablename__ = 'beneficios_funcionarios'
@@ -129,6 +149,47 @@ class BeneficioFuncionario(BaseModel):
     data_inicio = db.Column(db.Date, nullable=False)
     data_fim = db.Column(db.Date, nullable=True)
 
+class FeriadoEmpresa(BaseModel):
+    """
+    Feriado próprio da empresa, somado aos nacionais no cálculo de dias úteis (app/rh/calendario.py).
+    Cada linha usa um dos campos: `data` (uma vez, ou todo ano se `recorrente`), `movel` (feriado
+    calculado pela Páscoa: 'carnaval', 'sexta_feira_santa' ou 'corpus_christi') ou `uf` (adota os
+    feriados estaduais da UF). `movel` e `uf` são validados na atribuição (ValueError se desconhecidos).
+    """
+    __tablename__ = 'feriados_empresa'
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresa.id'), nullable=False, index=True)
+    descricao = db.Column(db.String(100), nullable=False)
+    data = db.Column(db.Date, nullable=True)
+    recorrente = db.Column(db.Boolean, default=False)
+    movel = db.Column(db.String(30), nullable=True)
+    uf = db.Column(db.String(2), nullable=True)
+
+    @validates('movel')
+    def _validar_movel(self, chave, valor):
+        from app.rh.calendario import FERIADOS_MOVEIS
+        valor = (valor or '').strip().lower() or None
+        if valor is not None and valor not in FERIADOS_MOVEIS:
+            raise ValueError(f"Feriado móvel desconhecido: {valor!r} (use um de {', '.join(FERIADOS_MOVEIS)})")
+        return valor
+
+    @validates('uf')
+    def _validar_uf(self, chave, valor):
+        from app.rh.calendario import UFS
+        valor = (valor or '').strip().upper() or None
+        if valor is not None and valor not in UFS:
+            raise ValueError(f"UF desconhecida: {valor!r}")
+        return valor
+
+    def regra(self):
+        """A regra no formato de app.rh.calendario.feriados_do_ano, ou None se a linha estiver vazia."""
+        if self.movel:
+            return ('movel', self.movel.lower())
+        if self.uf:
+            return ('uf', self.uf.upper())
+        if self.data:
+            return ('anual', (self.data.month, self.data.day)) if self.recorrente else ('data', self.data)
+        return None
+
 class Afastamento(BaseModel):
     __tablename__ = 'afastamentos'
     id = db.Column(db.Integer, primary_key=True)
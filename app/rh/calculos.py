@@ -2,43 +2,15 @@
 
 from datetime import date, timedelta
 from decimal import Decimal, ROUND_UP
-import calendar
+from .calendario import dias_uteis_no_mes
 
 # --- FUNÇÃO AUXILIAR PARA CALCULAR DIAS ÚTEIS ---
-def _get_dias_uteis_no_mes(ano, mes, jornada='5x2'):
-    """Calcula o número de dias úteis em um mês, com base na jornada."""
-    _, num_dias = calendar.monthrange(ano, mes)
-    dias_uteis = 0
-    
-    # Feriados nacionais fixos (simplificado)
-    feriados = [
-        date(ano, 1, 1),   # Confraternização Universal
-        date(ano, 4, 21),  # Tiradentes
-        date(ano, 5, 1),   # Dia do Trabalho
-        date(ano, 9, 7),   # Independência do Brasil
-        date(ano, 10, 12), # Nossa Senhora Aparecida
-        date(ano, 11, 2),  # Finados
-        date(ano, 11, 15), # Proclamação da República
-        date(ano, 12, 25)  # Natal
-    ]
-
-    for dia in range(1, num_dias + 1):
-        data_atual = date(ano, mes, dia)
-        dia_da_semana = data_atual.weekday() # Segunda-feira é 0 e Domingo é 6
-
-        if data_atual in feriados:
-            continue
-
-        if jornada == '5x2': # Trabalha de segunda a sexta
-            if dia_da_semana < 5: # 0-4 são Seg-Sex
-                dias_uteis += 1
-        elif jornada == '6x1': # Trabalha de segunda a sábado
-             if dia_da_semana < 6: # 0-5 são Seg-Sáb
-                dias_uteis += 1
-        else: # Para outras jornadas, considera todos os dias como "úteis"
-            dias_uteis +=1
-            
-    return dias_uteis
+def _get_dias_uteis_no_mes(ano, mes, jornada='5x2', empresa_id=None):
+    """
+    Calcula o número de dias úteis em um mês, com base na jornada. Lido do calendário
+    memorizado (app/rh/calendario.py), com os feriados da empresa se ela for informada.
+    """
+    return dias_uteis_no_mes(ano, mes, jornada, empresa_id)
 
 def calcular_rescisao(salario_bruto, data_admissao, data_demissao, motivo, aviso_previo_indenizado=False, ferias_vencidas=False):
     """
@@ -108,7 +80,7 @@ def calcular_folha_pagamento(funcionario, ano=None, mes=None):
         if mes is None: mes = date.today().month
 
         salario = Decimal(funcionario.salario)
-        dias_uteis = _get_dias_uteis_no_mes(ano, mes, funcionario.jornada_trabalho)
+        dias_uteis = _get_dias_uteis_no_mes(ano, mes, funcionario.jornada_trabalho, getattr(funcionario, 'empresa_id', None))
         
         # --- PROVENTOS (COM LÓGICA DE CÁLCULO ATUALIZADA) ---
         proventos = {"salario_base": salario}
@@ -175,4 +147,108 @@ def calcular_folha_pagamento(funcionario, ano=None, mes=None):
             }
         }
     except Exception as e:
-        return {"success": False, "error": str(e)}
\ No newline at end of file
+        return {"success": False, "error": str(e)}
+
+# --- FOLHA EM LOTE (EMPRESA INTEIRA) ---
+
+# Atributos de Funcionario usados pela folha, na ordem das colunas aceitas por calcular_folha_em_lote
+COLUNAS_FOLHA = (
+    'salario', 'jornada_trabalho', 'recebe_va', 'vale_alimentacao_diario', 'recebe_vr',
+    'vale_refeicao_diario', 'recebe_vt', 'vale_transporte_diario'
+)
+
+_ZERO = Decimal(0)
+
+# Horas extras: hora normal = salário / divisor mensal (jornada de 44 h semanais), paga com adicional de 50%
+DIVISOR_HORAS_MES = 220
+ADICIONAL_HORA_EXTRA = Decimal('1.5')
+
+# Faixas de INSS: (salário até, alíquota); acima da última, 14%
+_FAIXAS_INSS = ((1500, Decimal('0.075')), (2800, Decimal('0.09')), (4200, Decimal('0.12')))
+_ALIQUOTA_INSS_TETO = Decimal('0.14')
+
+
+def _inss(salario):
+    for limite, aliquota in _FAIXAS_INSS:
+        if salario <= limite:
+            return salario * aliquota
+    return salario * _ALIQUOTA_INSS_TETO
+
+
+def _irrf(base):
+    # Mesmos limites (float) de calcular_folha_pagamento, para comparar exatamente igual
+    if base <= 2259.20: return _ZERO
+    if base <= 2826.65: return max(_ZERO, (base * Decimal('0.075')) - Decimal('169.44'))
+    return max(_ZERO, (base * Decimal('0.15')) - Decimal('381.44'))
+
+
+def _coluna_decimal(valores):
+    return [Decimal(v or 0) for v in valores]
+
+
+def calcular_folha_em_lote(colunas, ano=None, mes=None, empresa_id=None):
+    """
+    Calcula a folha de vários funcionários de uma vez, no formato de colunas: `colunas` é um dict
+    {atributo: [valor por funcionário]} com os atributos de COLUNAS_FOLHA (ex.: as colunas de uma
+    consulta com zip(*linhas)), todos da empresa `empresa_id` (para os feriados dela). Os dias
+    úteis são lidos uma vez por jornada e cada verba é calculada coluna a coluna, com as mesmas
+    operações em Decimal de calcular_folha_pagamento, portanto com os mesmos valores, centavo a centavo.
+
+    Colunas opcionais do fechamento do mês: `dias_trabalhados` (VA, VR e VT são pagos por dia
+    trabalhado; padrão: os dias úteis) e `horas_extras` (pagas com o adicional e somadas à base
+    de INSS, IRRF e FGTS; padrão: nenhuma).
+
+    Retorna um dict de colunas: dias_uteis_mes, salario_base, horas_extras (valor), vale_alimentacao,
+    vale_refeicao, vale_transporte, inss, irrf, fgts, inss_patronal, total_proventos,
+    total_descontos, liquido_funcionario e custo_total_empresa.
+    """
+    if ano is None: ano = date.today().year
+    if mes is None: mes = date.today().month
+
+    salarios = _coluna_decimal(colunas['salario'])
+    jornadas = colunas['jornada_trabalho']
+    dias_por_jornada = {j: _get_dias_uteis_no_mes(ano, mes, j, empresa_id) for j in set(jornadas)}
+    dias = [dias_por_jornada[j] for j in jornadas]
+    trabalhados = colunas.get('dias_trabalhados') or dias
+
+    va = [d * v if recebe else _ZERO for d, v, recebe in
+          zip(trabalhados, _coluna_decimal(colunas['vale_alimentacao_diario']), colunas['recebe_va'])]
+    vr = [d * v if recebe else _ZERO for d, v, recebe in
+          zip(trabalhados, _coluna_decimal(colunas['vale_refeicao_diario']), colunas['recebe_vr'])]
+    vt_total = [d * v if recebe else _ZERO for d, v, recebe in
+                zip(trabalhados, _coluna_decimal(colunas['vale_transporte_diario']), colunas['recebe_vt'])]
+    vt = [min(total, s * Decimal('0.06')) if recebe else _ZERO
+          for total, s, recebe in zip(vt_total, salarios, colunas['recebe_vt'])]
+
+    horas = _coluna_decimal(colunas.get('horas_extras') or [0] * len(salarios))
+    extras = [s / DIVISOR_HORAS_MES * ADICIONAL_HORA_EXTRA * h if h else _ZERO for s, h in zip(salarios, horas)]
+    # Remuneração (salário + horas extras): base de INSS, IRRF e FGTS
+    remuneracao = [s + e for s, e in zip(salarios, extras)]
+
+    inss = [_inss(r) for r in remuneracao]
+    irrf = [_irrf(r - i) for r, i in zip(remuneracao, inss)]
+    fgts = [r * Decimal('0.08') for r in remuneracao]
+    inss_patronal = [r * Decimal('0.20') for r in remuneracao]
+
+    total_proventos = [r + a + v for r, a, v in zip(remuneracao, va, vr)]
+    total_descontos = [t + i + r for t, i, r in zip(vt, inss, irrf)]
+
+    return {
+        "dias_uteis_mes": dias,
+        "salario_base": salarios,
+        "horas_extras": extras,
+        "vale_alimentacao": va,
+        "vale_refeicao": vr,
+        "vale_transporte": vt,
+        "inss": inss,
+        "irrf": irrf,
+        "fgts": fgts,
+        "inss_patronal": inss_patronal,
+        "total_proventos": total_proventos,
+        "total_descontos": total_descontos,
+        "liquido_funcionario": [p - d for p, d in zip(total_proventos, total_descontos)],
+        "custo_total_empresa": [
+            s + f + p + a + r + (total - t)
+            for s, f, p, a, r, total, t in zip(remuneracao, fgts, inss_patronal, va, vr, vt_total, vt)
+        ],
+    }
@@ -0,0 +1,221 @@
+# app/rh/calendario.py
+
+"""
+Calendário de dias úteis usado pela folha.
+
+O calendário de um ano é montado uma vez por conjunto de regras de feriados e guardado (LRU):
+para cada jornada há uma soma acumulada (prefixo) dos dias úteis do ano, então "dias úteis no
+mês" e "dias úteis entre duas datas" são duas leituras da lista, sem percorrer o mês.
+
+Feriados:
+- nacionais fixos (sempre);
+- móveis, calculados a partir da Páscoa (Carnaval, Sexta-feira Santa, Corpus Christi);
+- estaduais, pela UF;
+- próprios da empresa (FeriadoEmpresa), que também escolhem os móveis e a UF adotados por ela.
+"""
+
+from app.models_rh import FeriadoEmpresa
+from datetime import date, timedelta
+from functools import lru_cache
+from sqlalchemy import event
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Feriados nacionais fixos (mês, dia)
+FERIADOS_NACIONAIS = (
+    (1, 1),    # Confraternização Universal
+    (4, 21),   # Tiradentes
+    (5, 1),    # Dia do Trabalho
+    (9, 7),    # Independência do Brasil
+    (10, 12),  # Nossa Senhora Aparecida
+    (11, 2),   # Finados
+    (11, 15),  # Proclamação da República
+    (12, 25),  # Natal
+)
+
+# Feriados móveis: dias em relação ao domingo de Páscoa
+FERIADOS_MOVEIS = {
+    'carnaval': (-48, -47),        # segunda e terça de Carnaval
+    'sexta_feira_santa': (-2,),
+    'corpus_christi': (60,),
+}
+
+UFS = (
+    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MT', 'MS', 'MG', 'PA',
+    'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO',
+)
+
+# Feriados estaduais fixos (mês, dia), por UF (as UFs ausentes não têm feriado estadual fixo aqui)
+FERIADOS_ESTADUAIS = {
+    'AC': ((6, 15), (9, 5), (11, 17)),
+    'AM': ((9, 5),),
+    'BA': ((7, 2),),
+    'CE': ((3, 25),),
+    'DF': ((11, 30),),
+    'MA': ((7, 28),),
+    'PA': ((8, 15),),
+    'PE': ((3, 6),),
+    'PI': ((10, 19),),
+    'RJ': ((4, 23), (11, 20)),
+    'RS': ((9, 20),),
+    'SC': ((8, 11),),
+    'SE': ((7, 8),),
+    'SP': ((7, 9),),
+    'TO': ((10, 5),),
+}
+
+# Dias da semana trabalhados por jornada (segunda = 0); outras jornadas trabalham todos os dias
+DIAS_DA_JORNADA = {'5x2': 5, '6x1': 6}
+
+
+@lru_cache(maxsize=None)
+def pascoa(ano):
+    """Domingo de Páscoa (algoritmo de Meeus/Jones/Butcher, calendário gregoriano)."""
+    a, b, c = ano % 19, ano // 100, ano % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes = (h + l - 7 * m + 114) // 31
+    dia = (h + l - 7 * m + 114) % 31 + 1
+    return date(ano, mes, dia)
+
+
+def feriados_do_ano(ano, regras=()):
+    """
+    Datas de feriado do ano: as nacionais fixas mais as das regras, uma tupla de pares:
+    ('movel', nome), ('uf', sigla), ('anual', (mes, dia)) ou ('data', date). Regras desconhecidas
+    (ex.: um móvel gravado antes da validação de FeriadoEmpresa) são registradas no log e ignoradas.
+    """
+    datas = {date(ano, mes, dia) for mes, dia in FERIADOS_NACIONAIS}
+    for tipo, valor in regras:
+        if tipo == 'movel' and valor not in FERIADOS_MOVEIS or tipo == 'uf' and valor not in UFS:
+            logger.warning(f"Regra de feriado desconhecida ignorada no calendário de {ano}: {tipo}={valor!r}")
+        elif tipo == 'movel':
+            datas.update(pascoa(ano) + timedelta(days=d) for d in FERIADOS_MOVEIS[valor])
+        elif tipo == 'uf':
+            datas.update(date(ano, mes, dia) for mes, dia in FERIADOS_ESTADUAIS.get(valor, ()))
+        elif tipo == 'anual':
+            mes, dia = valor
+            if mes != 2 or dia != 29 or ano % 4 == 0 and (ano % 100 != 0 or ano % 400 == 0):
+                datas.add(date(ano, mes, dia))
+        elif tipo == 'data' and valor.year == ano:
+            datas.add(valor)
+    return datas
+
+
+class CalendarioAno:
+    """Dias úteis de um ano com somas acumuladas por jornada (montadas na primeira consulta de cada jornada)."""
+
+    def __init__(self, ano, feriados):
+        self.ano = ano
+        self.inicio = date(ano, 1, 1)
+        self._feriados = feriados
+        self._prefixos = {}
+        self._lock = threading.Lock()
+
+    def _prefixo(self, jornada):
+        chave = DIAS_DA_JORNADA.get(jornada, 7)
+        prefixo = self._prefixos.get(chave)
+        if prefixo is None:
+            # prefixo[i] = dias úteis entre 1º de janeiro e o dia i do ano (exclusive)
+            prefixo = [0]
+            dia = self.inicio
+            while dia.year == self.ano:
+                util = dia.weekday() < chave and dia not in self._feriados
+                prefixo.append(prefixo[-1] + util)
+                dia += timedelta(days=1)
+            with self._lock:
+                self._prefixos[chave] = prefixo
+        return prefixo
+
+    def dias_uteis_entre(self, inicio, fim, jornada='5x2'):
+        """Dias úteis de `inicio` a `fim` (inclusive), ambos dentro deste ano."""
+        prefixo = self._prefixo(jornada)
+        return prefixo[(fim - self.inicio).days + 1] - prefixo[(inicio - self.inicio).days]
+
+    def dias_uteis_no_mes(self, mes, jornada='5x2'):
+        inicio = date(self.ano, mes, 1)
+        fim = date(self.ano + mes // 12, mes % 12 + 1, 1) - timedelta(days=1)
+        return self.dias_uteis_entre(inicio, fim, jornada)
+
+
+@lru_cache(maxsize=512)
+def calendario_do_ano(ano, regras=()):
+    return CalendarioAno(ano, frozenset(feriados_do_ano(ano, regras)))
+
+
+# --- Feriados próprios das empresas ---
+
+class RegrasFeriadosCache:
+    """
+    Regras de feriado de cada empresa (lidas de FeriadoEmpresa), com TTL. Alterações feitas por
+    este processo invalidam a empresa na hora (eventos do ORM); nos outros, valem após o TTL.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._regras = {}  # {empresa_id: (expira_em, regras)}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('CALENDARIO_CACHE_TTL_SECONDS', self.ttl)
+        self.invalidar()
+
+    def obter(self, empresa_id):
+        item = self._regras.get(empresa_id)
+        if item is not None and item[0] > time.monotonic():
+            return item[1]
+        regras = tuple(sorted(
+            (f.regra() for f in FeriadoEmpresa.query.filter_by(empresa_id=empresa_id) if f.regra()),
+            key=repr
+        ))
+        with self._lock:
+            self._regras[empresa_id] = (time.monotonic() + self.ttl, regras)
+        return regras
+
+    def invalidar(self, empresa_id=None):
+        with self._lock:
+            if empresa_id is None:
+                self._regras.clear()
+            else:
+                self._regras.pop(empresa_id, None)
+
+
+regras_feriados_cache = RegrasFeriadosCache()
+
+
+def _invalidar_empresa(mapper, connection, feriado):
+    regras_feriados_cache.invalidar(feriado.empresa_id)
+
+
+for _evento in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(FeriadoEmpresa, _evento, _invalidar_empresa)
+
+
+def calendario(ano, empresa_id=None):
+    """Calendário do ano com os feriados nacionais e, se informada, as regras da empresa."""
+    regras = regras_feriados_cache.obter(empresa_id) if empresa_id else ()
+    return calendario_do_ano(ano, regras)
+
+
+def dias_uteis_no_mes(ano, mes, jornada='5x2', empresa_id=None):
+    return calendario(ano, empresa_id).dias_uteis_no_mes(mes, jornada)
+
+
+def dias_uteis_entre(inicio, fim, jornada='5x2', empresa_id=None):
+    """Dias úteis de `inicio` a `fim` (inclusive); uma leitura por ano coberto."""
+    if fim < inicio:
+        return 0
+    total = 0
+    for ano in range(inicio.year, fim.year + 1):
+        total += calendario(ano, empresa_id).dias_uteis_entre(
+            max(inicio, date(ano, 1, 1)), min(fim, date(ano, 12, 31)), jornada
+        )
+    return total
@@ -4,7 +4,8 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for,
 from flask_login import login_required, current_user
 from datetime import datetime
 from app import db
-from app.models_rh import Funcionario, Cargo, Departamento, DocumentoFuncionario, Afastamento
+from app.models_rh import Funcionario, Cargo, Departamento, DocumentoFuncionario, Afastamento, FolhaPagamento
+from app.services.folha_service import resultado_da_folha
 from app.decorators import require_plan
 from .validators import is_cpf_valid
 from .calculos import calcular_rescisao, calcular_folha_pagamento, _get_dias_uteis_no_mes
@@ -161,7 +162,7 @@ def ver_funcionario(id):
     afastamentos = funcionario.afastamentos
 
     hoje = datetime.today()
-    dias_uteis = _get_dias_uteis_no_mes(hoje.year, hoje.month, funcionario.jornada_trabalho)
+    dias_uteis = _get_dias_uteis_no_mes(hoje.year, hoje.month, funcionario.jornada_trabalho, funcionario.empresa_id)
     
     total_vt = dias_uteis * (funcionario.vale_transporte_diario or 0)
     total_va = dias_uteis * (funcionario.vale_alimentacao_diario or 0)
@@ -283,7 +284,9 @@ def simular_folha_pagamento(id):
         mes = int(request.form.get('mes', mes))
         ano = int(request.form.get('ano', ano))
 
-    resultado = calcular_folha_pagamento(funcionario, ano=ano, mes=mes)
+    # Mês fechado: mostra a folha gravada; senão, simula
+    fechada = FolhaPagamento.query.filter_by(funcionario_id=funcionario.id, ano=ano, mes=mes).first()
+    resultado = resultado_da_folha(fechada) if fechada else calcular_folha_pagamento(funcionario, ano=ano, mes=mes)
 
     return render_template('rh/folha_pagamento_form.html', 
         funcionario=funcionario, 
@@ -165,7 +165,7 @@ def ver_funcionario(id):
     afastamentos = funcionario.afastamentos
 
     hoje = datetime.today()
-    dias_uteis = _get_dias_uteis_no_mes(hoje.year, hoje.month, funcionario.jornada_trabalho)
+    dias_uteis = _get_dias_uteis_no_mes(hoje.year, hoje.month, funcionario.jornada_trabalho, funcionario.empresa_id)
     
     total_vt = dias_uteis * (funcionario.vale_transporte_diario or 0)
     total_va = dias_uteis * (funcionario.vale_alimentacao_diario or 0)
@@ -0,0 +1,112 @@
+# call_center_project/app/services/activity_log_partitions.py
+"""
+Manutenção das partições mensais de activity_log (PostgreSQL, particionada por RANGE em timestamp).
+
+- garantir_particoes: cria a partição do mês atual e as dos próximos meses (rodar diariamente
+  pelo cron com `flask atividades particoes`). Linhas que já tenham caído na partição padrão
+  são movidas para a partição nova.
+- aplicar_retencao: remove (DROP TABLE, sem DELETE linha a linha) as partições inteiramente
+  anteriores ao prazo de retenção (`flask atividades retencao`).
+"""
+from app.models import db
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import text
+import re
+
+TABELA = 'activity_log'
+PARTICAO_PADRAO = 'activity_log_default'
+
+_LIMITES = re.compile(r"FROM \((MINVALUE|'[^']+')\) TO \((MAXVALUE|'[^']+')\)")
+
+
+def _inicio_do_mes(momento):
+    return datetime(momento.year, momento.month, 1)
+
+
+def somar_meses(inicio, meses):
+    mes = inicio.month - 1 + meses
+    return datetime(inicio.year + mes // 12, mes % 12 + 1, 1)
+
+
+def nome_particao(inicio):
+    return f'{TABELA}_p{inicio:%Y_%m}'
+
+
+def _limite(valor):
+    if valor in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.fromisoformat(valor.strip("'"))
+
+
+def listar_particoes():
+    """Partições de intervalo como [(nome, inicio, fim)], ordenadas; None = MINVALUE/MAXVALUE. A padrão fica de fora."""
+    linhas = db.session.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:tabela AS regclass)
+    """), {'tabela': TABELA}).all()
+    particoes = []
+    for nome, limites in linhas:
+        encontrado = _LIMITES.search(limites)
+        if encontrado:
+            particoes.append((nome, _limite(encontrado.group(1)), _limite(encontrado.group(2))))
+    return sorted(particoes, key=lambda p: p[1] or datetime.min)
+
+
+def _sobrepoe(particoes, inicio, fim):
+    return any((de is None or de < fim) and (ate is None or ate > inicio) for _, de, ate in particoes)
+
+
+def criar_particao(inicio):
+    """
+    Cria a partição do mês que começa em `inicio`. As linhas do mês que estejam na partição padrão
+    são movidas para a nova tabela antes do ATTACH (o PostgreSQL recusa a partição se a padrão já
+    tiver linhas no intervalo).
+    """
+    fim = somar_meses(inicio, 1)
+    nome = nome_particao(inicio)
+    db.session.execute(text(f'CREATE TABLE {nome} (LIKE {TABELA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    db.session.execute(text(f"""
+        WITH movidas AS (
+            DELETE FROM {PARTICAO_PADRAO} WHERE "timestamp" >= :inicio AND "timestamp" < :fim RETURNING *
+        )
+        INSERT INTO {nome} SELECT * FROM movidas
+    """), {'inicio': inicio, 'fim': fim})
+    db.session.execute(text(
+        f"ALTER TABLE {TABELA} ATTACH PARTITION {nome} FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fim.isoformat()}')"
+    ))
+    return nome
+
+
+def garantir_particoes(meses_a_frente=None, agora=None):
+    """Cria as partições do mês atual e dos próximos `meses_a_frente` que ainda não existem; devolve os nomes criados."""
+    if meses_a_frente is None:
+        meses_a_frente = current_app.config.get('ACTIVITY_LOG_PARTITIONS_AHEAD', 2)
+    mes_atual = _inicio_do_mes(agora or datetime.utcnow())
+    particoes = listar_particoes()
+    criadas = []
+    for i in range(meses_a_frente + 1):
+        inicio = somar_meses(mes_atual, i)
+        if not _sobrepoe(particoes, inicio, somar_meses(inicio, 1)):
+            criadas.append(criar_particao(inicio))
+    db.session.commit()
+    return criadas
+
+
+def aplicar_retencao(meses=None, agora=None):
+    """
+    Remove as partições cujo intervalo termina antes do corte (início do mês atual menos `meses`)
+    e as linhas anteriores ao corte que estejam na partição padrão. Devolve os nomes removidos.
+    """
+    if meses is None:
+        meses = current_app.config.get('ACTIVITY_LOG_RETENTION_MONTHS', 13)
+    if meses <= 0:
+        return []
+    corte = somar_meses(_inicio_do_mes(agora or datetime.utcnow()), -meses)
+    removidas = [nome for nome, _, fim in listar_particoes() if fim is not None and fim <= corte]
+    for nome in removidas:
+        db.session.execute(text(f'DROP TABLE {nome}'))
+    db.session.execute(text(f'DELETE FROM {PARTICAO_PADRAO} WHERE "timestamp" < :corte'), {'corte': corte})
+    db.session.commit()
+    return removidas
@@ -1,7 +1,23 @@
 # call_center_project/app/services/ai_productivity_service.py
-import openai
-from flask import current_app
-import json
+from app.services.classification_cache import classification_cache, chave_classificacao
+from app.services.llm_classifier import llm_classifier
+from app.services.rule_matcher import rule_matcher_cache
+
+
+def montar_regras(productivity_rules, empresa_id):
+    """
+    Converte o registro ProductivityRules da empresa no dicionário usado por analyze_activity.
+    A versão (updated_at) muda a cada alteração das regras e separa as entradas do cache.
+    """
+    if not productivity_rules:
+        return {"empresa_id": empresa_id, "versao": None, "process_rules": [], "url_rules": [], "custom_ai_prompt": None}
+    return {
+        "empresa_id": empresa_id,
+        "versao": productivity_rules.updated_at.isoformat() if productivity_rules.updated_at else None,
+        "process_rules": productivity_rules.process_rules or [],
+        "url_rules": productivity_rules.url_rules or [],
+        "custom_ai_prompt": productivity_rules.custom_ai_prompt
+    }
 
 class AiProductivityService:
     def __init__(self, app=None):
@@ -10,50 +26,47 @@ class AiProductivityService:
             self.init_app(app)
 
     def init_app(self, app):
+        classification_cache.init_app(app)
+        llm_classifier.init_app(app)
         self.api_key = app.config.get('OPENAI_API_KEY')
         if self.api_key:
-            openai.api_key = self.api_key
             print("INFO: Serviço de IA da OpenAI configurado.")
         else:
             print("AVISO: Chave da OpenAI não configurada. A análise por IA está desativada.")
 
     def analyze_activity(self, activity_data: dict, rules: dict) -> dict:
-        process_name = activity_data.get('process_name', '')
-        url = activity_data.get('url', '')
-
-        for rule in rules.get('process_rules', []):
-            if rule.get('process', '').lower() in process_name.lower():
-                return {"is_productive": rule.get('classification') == 'productive', "category": rule.get('category', 'N/A'), "reason": "Classificado por regra de processo."}
-        
-        for rule in rules.get('url_rules', []):
-            if rule.get('keyword', '').lower() in url.lower():
-                return {"is_productive": rule.get('classification') == 'productive', "category": rule.get('category', 'N/A'), "reason": "Classificado por regra de URL."}
-
-        if not self.api_key:
-            return {"is_productive": None, "category": "Não Classificado", "reason": "IA não configurada."}
-
-        prompt_template = rules.get('custom_ai_prompt') or """
-        Você é um analista de produtividade de um call center. Analise a atividade e classifique-a.
-        Contexto: O trabalho envolve atender clientes, usar CRM, comunicar via Slack/Email. WhatsApp Business é produtivo. Redes sociais são improdutivas.
-        Atividade: Título: {window_title}, Processo: {process_name}, URL: {url}
-        Responda APENAS em JSON com as chaves: "is_productive" (true, false, ou null para neutro), "category" (uma palavra), "reason" (frase curta).
+        return self.analyze_activities([(activity_data, rules)])[0]
+
+    def analyze_activities(self, itens: list) -> list:
+        """
+        Classifica uma lista de (activity_data, rules), devolvendo os resultados na mesma ordem.
+        Regras e cache resolvem o que puderem; o restante vai, de uma vez, para o classificador em lote.
         """
-        
-        prompt = prompt_template.format(
-            window_title=activity_data.get('window_title', 'N/A'),
-            process_name=activity_data.get('process_name', 'N/A'),
-            url=activity_data.get('url', 'N/A')
-        )
-        
-        try:
-            response = openai.chat.completions.create(
-                model="gpt-4-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                response_format={"type": "json_object"}
-            )
-            return json.loads(response.choices[0].message.content)
-        except Exception as e:
-            current_app.logger.error(f"Erro na API OpenAI: {e}")
-            return {"error": str(e), "is_productive": None, "category": "Erro IA"}
-
-ai_productivity_service = AiProductivityService()
\ No newline at end of file
+        resultados = [None] * len(itens)
+        pendentes = []  # [(posicao, chave)]
+        for posicao, (activity_data, rules) in enumerate(itens):
+            # Regras compiladas uma vez por versão (primeira regra que casar vence)
+            classificacao = rule_matcher_cache.obter(rules).classificar(activity_data)
+            if classificacao is None and not self.api_key:
+                classificacao = {"is_productive": None, "category": "Não Classificado", "reason": "IA não configurada."}
+            if classificacao is None:
+                # Agentes passam minutos na mesma janela: a mesma atividade normalizada reaproveita a classificação
+                chave = chave_classificacao(activity_data)
+                classificacao = classification_cache.get(rules.get('empresa_id'), rules.get('versao'), chave)
+                if classificacao is None:
+                    pendentes.append((posicao, chave))
+            resultados[posicao] = classificacao
+
+        if pendentes:
+            classificacoes = self._classificar_com_ia([itens[posicao] for posicao, _ in pendentes])
+            for (posicao, chave), classificacao in zip(pendentes, classificacoes):
+                rules = itens[posicao][1]
+                if 'error' not in classificacao:
+                    classification_cache.set(rules.get('empresa_id'), rules.get('versao'), chave, classificacao)
+                resultados[posicao] = classificacao
+        return resultados
+
+    def _classificar_com_ia(self, itens: list) -> list:
+        return llm_classifier.classificar(itens)
+
+ai_productivity_service = AiProductivityService()
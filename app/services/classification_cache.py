@@ -0,0 +1,145 @@
+# call_center_project/app/services/classification_cache.py
+from collections import OrderedDict
+from flask import current_app
+from urllib.parse import urlsplit
+import hashlib
+import json
+import re
+import threading
+import time
+
+# Trechos voláteis do título da janela que não mudam a classificação da atividade
+_CONTADOR_NOTIFICACOES = re.compile(r'^\s*[\(\[]\d+[\)\]]\s*')   # "(3) WhatsApp", "[12] Inbox"
+_MARCADOR_NAO_SALVO = re.compile(r'^\s*[\*●•]\s*')               # "* documento.txt"
+_NUMEROS = re.compile(r'\d+')                                      # horários, datas, ids, contagens
+_ESPACOS = re.compile(r'\s+')
+TAMANHO_MAXIMO_TITULO = 200
+
+
+def normalizar_titulo(titulo):
+    titulo = (titulo or '').strip()
+    titulo = _CONTADOR_NOTIFICACOES.sub('', titulo)
+    titulo = _MARCADOR_NAO_SALVO.sub('', titulo)
+    titulo = _NUMEROS.sub('#', titulo.lower())
+    return _ESPACOS.sub(' ', titulo).strip()[:TAMANHO_MAXIMO_TITULO]
+
+
+def normalizar_url(url):
+    """Reduz a URL a host + caminho (sem esquema, query, fragmento e ids numéricos)."""
+    url = (url or '').strip()
+    if not url:
+        return ''
+    partes = urlsplit(url if '//' in url else f'//{url}')
+    host = (partes.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    caminho = _NUMEROS.sub('#', partes.path.lower()).rstrip('/')
+    return f'{host}{caminho}'
+
+
+def chave_classificacao(activity_data):
+    """Chave normalizada da atividade: (processo, título sem trechos voláteis, host + caminho)."""
+    return '\x1f'.join((
+        (activity_data.get('process_name') or '').strip().lower(),
+        normalizar_titulo(activity_data.get('window_title')),
+        normalizar_url(activity_data.get('url'))
+    ))
+
+
+class ClassificationCache:
+    """
+    Cache das classificações feitas pela IA, por empresa e versão das regras.
+
+    Camada 1: LRU com TTL em memória do processo.
+    Camada 2 (opcional): Redis, compartilhado entre processos/nós.
+    Mudar as regras da empresa muda a versão e, com isso, todas as chaves dela.
+    """
+
+    def __init__(self):
+        self.ttl = 24 * 3600
+        self.max_itens = 10000
+        self.redis = None
+        self._itens = OrderedDict()  # {chave: (expira_em, classificacao)}
+        self._lock = threading.Lock()
+        self._zerar_metricas()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('CLASSIFICATION_CACHE_TTL_SECONDS', self.ttl)
+        self.max_itens = app.config.get('CLASSIFICATION_CACHE_MAX_ITEMS', self.max_itens)
+        self.redis = None
+        if app.config.get('CLASSIFICATION_CACHE_REDIS'):
+            from redis import Redis
+            self.redis = Redis.from_url(app.config['REDIS_URL'])
+        self.limpar()
+
+    def _zerar_metricas(self):
+        self._metricas = {'hits_memoria': 0, 'hits_redis': 0, 'misses': 0, 'gravacoes': 0, 'remocoes_lru': 0}
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._zerar_metricas()
+
+    @staticmethod
+    def _chave(empresa_id, versao, chave):
+        resumo = hashlib.sha1(chave.encode('utf-8')).hexdigest()
+        return f'classificacao:{empresa_id}:{versao}:{resumo}'
+
+    def get(self, empresa_id, versao, chave):
+        chave = self._chave(empresa_id, versao, chave)
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item and item[0] > agora:
+                self._itens.move_to_end(chave)
+                self._metricas['hits_memoria'] += 1
+                return item[1]
+            if item:
+                del self._itens[chave]
+
+        if self.redis is not None:
+            try:
+                valor = self.redis.get(chave)
+            except Exception as e:
+                current_app.logger.warning(f"Cache de classificação: Redis indisponível ({e})")
+                valor = None
+            if valor:
+                classificacao = json.loads(valor)
+                self._guardar_local(chave, classificacao)
+                with self._lock:
+                    self._metricas['hits_redis'] += 1
+                return classificacao
+
+        with self._lock:
+            self._metricas['misses'] += 1
+        return None
+
+    def set(self, empresa_id, versao, chave, classificacao):
+        chave = self._chave(empresa_id, versao, chave)
+        self._guardar_local(chave, classificacao)
+        if self.redis is not None:
+            try:
+                self.redis.setex(chave, int(self.ttl), json.dumps(classificacao))
+            except Exception as e:
+                current_app.logger.warning(f"Cache de classificação: Redis indisponível ({e})")
+        with self._lock:
+            self._metricas['gravacoes'] += 1
+
+    def _guardar_local(self, chave, classificacao):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, classificacao)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self._metricas['remocoes_lru'] += 1
+
+    def metricas(self):
+        with self._lock:
+            metricas = dict(self._metricas)
+            metricas['itens'] = len(self._itens)
+        consultas = metricas['hits_memoria'] + metricas['hits_redis'] + metricas['misses']
+        metricas['hit_rate'] = (metricas['hits_memoria'] + metricas['hits_redis']) / consultas if consultas else 0.0
+        return metricas
+
+
+classification_cache = ClassificationCache()
@@ -0,0 +1,76 @@
+# call_center_project/app/services/conversa_cache.py
+from app.models import ConversaWhatsApp
+from collections import OrderedDict
+from sqlalchemy import event
+import threading
+
+
+class ConversaCache:
+    """
+    LRU em memória do processo: (empresa_id, wa_id) -> id da ConversaWhatsApp.
+
+    A chave (empresa_id, wa_id) é única na tabela e uma conversa nunca muda de cliente, então
+    a entrada não expira; clientes frequentes resolvem a conversa sem consultar o banco.
+    Conversas excluídas pelo ORM saem do cache na hora (exclusões em massa devem chamar limpar).
+    """
+
+    def __init__(self, max_itens=50000):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()  # {(empresa_id, wa_id): conversa_id}
+        self._lock = threading.Lock()
+        self._zerar_metricas()
+
+    def init_app(self, app):
+        self.max_itens = app.config.get('WHATSAPP_CONVERSA_CACHE_MAX_ITEMS', self.max_itens)
+        self.limpar()
+
+    def _zerar_metricas(self):
+        self._metricas = {'hits': 0, 'misses': 0, 'remocoes_lru': 0}
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._zerar_metricas()
+
+    def obter(self, empresa_id, wa_ids):
+        """{wa_id: conversa_id} dos wa_ids que estão no cache."""
+        encontradas = {}
+        with self._lock:
+            for wa_id in wa_ids:
+                conversa_id = self._itens.get((empresa_id, wa_id))
+                if conversa_id is not None:
+                    self._itens.move_to_end((empresa_id, wa_id))
+                    encontradas[wa_id] = conversa_id
+            self._metricas['hits'] += len(encontradas)
+            self._metricas['misses'] += len(wa_ids) - len(encontradas)
+        return encontradas
+
+    def guardar(self, empresa_id, conversas):
+        """Guarda um dict {wa_id: conversa_id} da empresa."""
+        with self._lock:
+            for wa_id, conversa_id in conversas.items():
+                self._itens[(empresa_id, wa_id)] = conversa_id
+                self._itens.move_to_end((empresa_id, wa_id))
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self._metricas['remocoes_lru'] += 1
+
+    def invalidar(self, empresa_id, wa_id):
+        with self._lock:
+            self._itens.pop((empresa_id, wa_id), None)
+
+    def metricas(self):
+        with self._lock:
+            metricas = dict(self._metricas)
+            metricas['itens'] = len(self._itens)
+        consultas = metricas['hits'] + metricas['misses']
+        metricas['hit_rate'] = metricas['hits'] / consultas if consultas else 0.0
+        return metricas
+
+
+conversa_cache = ConversaCache()
+
+
+@event.listens_for(ConversaWhatsApp, 'after_delete')
+def _invalidar_conversa(mapper, connection, conversa):
+    conversa_cache.invalidar(conversa.empresa_id, conversa.wa_id)
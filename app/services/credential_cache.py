@@ -0,0 +1,73 @@
+# call_center_project/app/services/credential_cache.py
+from collections import namedtuple
+import hashlib
+import threading
+import time
+
+# O que as rotas do agente de desktop precisam saber do usuário autenticado
+AgenteAutenticado = namedtuple('AgenteAutenticado', 'id empresa_id status')
+
+
+class CredentialCache:
+    """
+    Cache curto (TTL) das chaves de API do agente de desktop.
+
+    A chave é guardada apenas como hash (SHA-256) e aponta para o id, a empresa e o status
+    do usuário, então o decorador agent_api_key_required vai ao banco no máximo uma vez por
+    TTL por chave. As rotas que alteram o usuário invalidam a entrada na hora; em outros
+    processos a entrada expira pelo TTL.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._credenciais = {}   # {hash_da_chave: (expira_em, AgenteAutenticado)}
+        self._por_usuario = {}   # {usuario_id: hash_da_chave}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('API_KEY_CACHE_TTL_SECONDS', self.ttl)
+        with self._lock:
+            self._credenciais.clear()
+            self._por_usuario.clear()
+
+    @staticmethod
+    def _hash(api_key):
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+    def get(self, api_key):
+        chave = self._hash(api_key)
+        with self._lock:
+            item = self._credenciais.get(chave)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                del self._credenciais[chave]
+                return None
+            return item[1]
+
+    def set(self, api_key, usuario):
+        credencial = AgenteAutenticado(usuario.id, usuario.empresa_id, usuario.status)
+        chave = self._hash(api_key)
+        with self._lock:
+            antiga = self._por_usuario.get(usuario.id)
+            if antiga and antiga != chave:
+                self._credenciais.pop(antiga, None)
+            self._credenciais[chave] = (time.monotonic() + self.ttl, credencial)
+            self._por_usuario[usuario.id] = chave
+        return credencial
+
+    def invalidar_usuario(self, usuario_id):
+        with self._lock:
+            chave = self._por_usuario.pop(usuario_id, None)
+            if chave:
+                self._credenciais.pop(chave, None)
+
+    def invalidar_empresa(self, empresa_id):
+        with self._lock:
+            for chave, (_, credencial) in list(self._credenciais.items()):
+                if credencial.empresa_id == empresa_id:
+                    del self._credenciais[chave]
+                    self._por_usuario.pop(credencial.id, None)
+
+
+credential_cache = CredentialCache()
@@ -0,0 +1,145 @@
+# call_center_project/app/services/dashboard_service.py
+from app.models import db, Usuario, ConversaWhatsApp, EstatisticaDiaria
+from app.models_rh import Departamento
+from app.services.estatisticas_service import media, totais_da_empresa
+from datetime import datetime
+from sqlalchemy import func
+
+# Quantidade de assuntos exibidos no card de cada agente
+TOP_ASSUNTOS_POR_AGENTE = 5
+
+
+def formatar_tma(segundos):
+    """Formata o TMA (em segundos) como MM:SS."""
+    segundos = segundos or 0
+    return f"{int(segundos // 60):02d}:{int(segundos % 60):02d}"
+
+
+def resumo_do_dia(empresa_id, dia):
+    """Total de atendimentos e TMA da empresa no dia, lidos do rollup diário."""
+    totais = totais_da_empresa(empresa_id, dia)
+    return {
+        "totalAtendimentos": int(totais.atendimentos),
+        "tma": formatar_tma(media(totais.duracao_total_segundos, totais.conversas_finalizadas))
+    }
+
+
+def fila_de_atendimento(empresa_id):
+    """Conversas ativas ainda sem agente, da mais antiga para a mais recente."""
+    fila_query = ConversaWhatsApp.query.filter(
+        ConversaWhatsApp.empresa_id == empresa_id,
+        ConversaWhatsApp.agente_atribuido_id.is_(None),
+        ConversaWhatsApp.status == 'ativo'
+    ).order_by(ConversaWhatsApp.created_at.asc()).all()
+
+    return [
+        {
+            "assunto": c.assunto,
+            "cliente": c.nome_cliente,
+            "tempo": c.created_at.strftime('%H:%M'),
+            "status": "Aguardando"
+        } for c in fila_query
+    ]
+
+
+def estatisticas_agentes_do_dia(empresa_id, dia, agente_ids=None):
+    """
+    Calcula, em consultas agregadas sobre o rollup diário (EstatisticaDiaria), as estatísticas
+    de todos os agentes da empresa no dia: atendimentos, TMA e os assuntos mais frequentes.
+
+    Retorna uma lista de dicionários no formato esperado por /api/dashboard/produtividade.
+    O número de consultas é constante, independente da quantidade de agentes.
+    Se agente_ids for informado, calcula apenas os agentes da lista.
+    """
+    filtro_agentes = [Usuario.id.in_(agente_ids)] if agente_ids is not None else []
+    filtro_rollup = [EstatisticaDiaria.agente_id.in_(agente_ids)] if agente_ids is not None else []
+
+    # 1. Agentes da empresa com o nome do setor (LEFT JOIN evita uma consulta por agente)
+    agentes = db.session.query(
+        Usuario.id, Usuario.nome, Usuario.status_agente, Usuario.is_monitoring,
+        Departamento.nome.label('setor')
+    ).outerjoin(
+        Departamento, Usuario.departamento_id == Departamento.id
+    ).filter(
+        Usuario.empresa_id == empresa_id,
+        Usuario.role.in_(['agente', 'admin_empresa']),
+        *filtro_agentes
+    ).order_by(Usuario.id).all()
+
+    if not agentes:
+        return []
+
+    # 2. Atendimentos e TMA do dia agrupados por agente, lidos do rollup diário
+    totais_query = db.session.query(
+        EstatisticaDiaria.agente_id,
+        func.sum(EstatisticaDiaria.atendimentos).label('atendimentos'),
+        func.sum(EstatisticaDiaria.conversas_finalizadas).label('finalizadas'),
+        func.sum(EstatisticaDiaria.duracao_total_segundos).label('duracao')
+    ).filter(
+        EstatisticaDiaria.empresa_id == empresa_id,
+        EstatisticaDiaria.data == dia,
+        EstatisticaDiaria.agente_id != 0,
+        *filtro_rollup
+    ).group_by(EstatisticaDiaria.agente_id).all()
+
+    totais = {row.agente_id: row for row in totais_query}
+
+    # 3. Top assuntos por agente, usando ROW_NUMBER() particionado por agente
+    total_assunto = func.sum(EstatisticaDiaria.atendimentos)
+    ranking = db.session.query(
+        EstatisticaDiaria.agente_id.label('agente_id'),
+        EstatisticaDiaria.assunto.label('assunto'),
+        total_assunto.label('total'),
+        func.row_number().over(
+            partition_by=EstatisticaDiaria.agente_id,
+            order_by=(total_assunto.desc(), EstatisticaDiaria.assunto)
+        ).label('posicao')
+    ).filter(
+        EstatisticaDiaria.empresa_id == empresa_id,
+        EstatisticaDiaria.data == dia,
+        EstatisticaDiaria.agente_id != 0,
+        *filtro_rollup
+    ).group_by(
+        EstatisticaDiaria.agente_id, EstatisticaDiaria.assunto
+    ).having(total_assunto > 0).subquery()
+
+    top_assuntos_query = db.session.query(
+        ranking.c.agente_id, ranking.c.assunto, ranking.c.total
+    ).filter(
+        ranking.c.posicao <= TOP_ASSUNTOS_POR_AGENTE
+    ).order_by(ranking.c.agente_id, ranking.c.posicao).all()
+
+    top_assuntos = {}
+    for row in top_assuntos_query:
+        top_assuntos.setdefault(row.agente_id, []).append({"assunto": row.assunto, "total": int(row.total)})
+
+    resultado = []
+    for agente in agentes:
+        stats = totais.get(agente.id)
+        resultado.append({
+            "id": agente.id,
+            "nome": agente.nome,
+            "setor": agente.setor or "Sem Setor",
+            "atendimentos": int(stats.atendimentos) if stats else 0,
+            "tma": formatar_tma(media(stats.duracao, stats.finalizadas) if stats else 0),
+            "status": agente.status_agente,
+            "is_monitoring": agente.is_monitoring,
+            "top_assuntos": top_assuntos.get(agente.id, [])
+        })
+    return resultado
+
+
+def montar_delta_dashboard(empresa_id, agentes=(), totais=False, fila=False):
+    """
+    Monta o payload parcial do evento 'atualizar_dashboard': apenas as seções invalidadas
+    (totais do dia, fila e/ou os agentes alterados), no mesmo formato de /api/dashboard/produtividade.
+    """
+    hoje = datetime.utcnow().date()
+    delta = {"empresa_id": empresa_id}
+    if totais:
+        delta.update(resumo_do_dia(empresa_id, hoje))
+    if fila:
+        delta["fila"] = fila_de_atendimento(empresa_id)
+    if agentes:
+        delta["agentes"] = estatisticas_agentes_do_dia(empresa_id, hoje, agente_ids=list(agentes))
+    return delta
@@ -0,0 +1,448 @@
+# call_center_project/app/services/envio_service.py
+"""
+Despachante dos envios para os provedores: mensagens dos agentes pela WhatsApp Cloud API (Meta)
+e emails pelo SendGrid.
+
+A rota não espera o provedor: a mensagem é gravada como 'pendente' e entra numa fila limitada em
+memória. Um pool de OUTBOUND_WORKERS threads faz as requisições por uma única requests.Session,
+cujo pool de conexões keep-alive tem o mesmo tamanho: a concorrência e o número de conexões com
+cada provedor ficam limitados juntos, e as conexões são reaproveitadas entre os envios.
+
+Cada empresa tem um balde de tokens por canal (a cota do provedor). Um envio acima da cota não
+ocupa um worker esperando: é agendado para o instante em que o seu token estará disponível.
+Falhas temporárias (erro de rede, 429, 5xx) voltam para a fila de novas tentativas com backoff
+exponencial (ou o Retry-After do provedor) até OUTBOUND_MAX_ATTEMPTS; as demais encerram o envio.
+
+O resultado é gravado na própria MensagemWhatsApp (status_envio, tentativas_envio, erro_envio,
+enviada_em e o wamid devolvido pela Meta) e avisado à sala da conversa ('status_mensagem').
+Antes de enviar, o worker reivindica a mensagem (pendente/reenvio -> enviando) com um UPDATE
+condicional: vários processos podem recolocar os mesmos pendentes na fila sem envio duplicado.
+Uma mensagem que ficou em 'enviando' (processo encerrado no meio da requisição) não é reenviada
+automaticamente, porque o provedor pode tê-la recebido. Emails não têm linha no banco: o
+resultado vai para o log.
+"""
+from app import socketio
+from app.models import db, Empresa, ConversaWhatsApp, MensagemWhatsApp
+from datetime import datetime, timedelta
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from sqlalchemy import select, update, bindparam
+import heapq
+import itertools
+import queue
+import requests
+import threading
+import time
+
+PENDENTE, ENVIANDO, REENVIO, ENVIADA, FALHOU = 'pendente', 'enviando', 'reenvio', 'enviada', 'falhou'
+
+
+class BaldeDeTokens:
+    """
+    Até `taxa` envios por segundo, com rajadas de até `capacidade`. reservar() sempre consome um
+    token e devolve em quantos segundos ele estará disponível (0 = agora): os envios acima da cota
+    são espaçados, não recusados.
+    """
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = taxa
+        self.capacidade = capacidade or max(taxa, 1)
+        self._tokens = self.capacidade
+        self._atualizado = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reservar(self):
+        with self._lock:
+            agora = time.monotonic()
+            self._tokens = min(self.capacidade, self._tokens + (agora - self._atualizado) * self.taxa)
+            self._atualizado = agora
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.taxa
+
+
+def _requisicao_whatsapp(config, envio):
+    url = f"{config['WHATSAPP_API_BASE_URL'].rstrip('/')}/{envio['remetente']}/messages"
+    corpo = {
+        'messaging_product': 'whatsapp',
+        'recipient_type': 'individual',
+        'to': envio['destino'],
+        'type': 'text',
+        'text': {'preview_url': False, 'body': envio['conteudo']},
+    }
+    return url, {'Authorization': f"Bearer {envio['token']}"}, corpo
+
+
+def _id_whatsapp(resposta):
+    return ((resposta.json().get('messages') or [{}])[0]).get('id')
+
+
+def _requisicao_email(config, envio):
+    url = f"{config['SENDGRID_API_BASE_URL'].rstrip('/')}/v3/mail/send"
+    corpo = {
+        'personalizations': [{'to': [{'email': envio['destino']}]}],
+        'from': {'email': envio['remetente'], 'name': config.get('MAIL_SENDER_NAME', 'Suporte')},
+        'subject': envio['assunto'],
+        'content': [{'type': 'text/html', 'value': envio['conteudo']}],
+    }
+    return url, {'Authorization': f"Bearer {envio['token']}"}, corpo
+
+
+def _id_email(resposta):
+    return resposta.headers.get('X-Message-Id')
+
+
+# canal -> (monta a requisição, extrai o id do provedor da resposta, chave da cota na config)
+PROVEDORES = {
+    'whatsapp': (_requisicao_whatsapp, _id_whatsapp, 'WHATSAPP_SEND_RATE_PER_SECOND'),
+    'email': (_requisicao_email, _id_email, 'EMAIL_SEND_RATE_PER_SECOND'),
+}
+
+
+def _retry_after(resposta):
+    try:
+        return float(resposta.headers.get('Retry-After', 0))
+    except ValueError:
+        return 0.0
+
+
+class EnvioService:
+    """Fila de envio, workers, novas tentativas e cotas por empresa de cada app."""
+
+    def init_app(self, app):
+        workers = app.config.get('OUTBOUND_WORKERS', 8)
+        sessao = requests.Session()
+        # Uma conexão keep-alive por requisição simultânea com cada provedor; pool_block impede
+        # que um pico abra conexões extras que seriam descartadas depois
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=max(workers, 1), pool_block=True)
+        sessao.mount('https://', adaptador)
+        sessao.mount('http://', adaptador)
+        app.extensions['envio'] = {
+            'sessao': sessao,
+            'fila': queue.Queue(maxsize=app.config.get('OUTBOUND_QUEUE_MAX_SIZE', 10000)),
+            'agendados': [],  # heap (instante, sequência, envio): novas tentativas e envios acima da cota
+            'sequencia': itertools.count(),
+            'condicao': threading.Condition(),
+            'baldes': {},     # {(canal, empresa_id): BaldeDeTokens}
+            'workers': [],
+            'lock': threading.Lock(),
+            'parar': threading.Event(),
+            'metricas': {'enviadas': 0, 'falhas': 0, 'novas_tentativas': 0, 'limitadas': 0,
+                         'fila_cheia': 0, 'recuperadas': 0, 'requisicoes': 0, 'tempo_requisicoes': 0.0},
+        }
+
+    def _estado(self, app=None):
+        return (app or current_app).extensions['envio']
+
+    def _contar(self, estado, **valores):
+        with estado['lock']:
+            for chave, valor in valores.items():
+                estado['metricas'][chave] += valor
+
+    # --- Entrada ---
+
+    def enviar_whatsapp(self, conversa, conteudo):
+        """Grava a mensagem do agente como pendente e a coloca na fila de envio; devolve a mensagem."""
+        mensagem = MensagemWhatsApp(conversa_id=conversa.id, empresa_id=conversa.empresa_id, remetente='agente',
+                                    conteudo=conteudo, status_envio=PENDENTE)
+        db.session.add(mensagem)
+        db.session.commit()
+        empresa = db.session.get(Empresa, conversa.empresa_id)
+        self._enfileirar(current_app._get_current_object(), {
+            'canal': 'whatsapp', 'empresa_id': conversa.empresa_id, 'mensagem_id': mensagem.id,
+            'conversa_id': conversa.id, 'destino': conversa.wa_id, 'conteudo': conteudo,
+            'token': empresa.whatsapp_token, 'remetente': empresa.whatsapp_phone_number_id, 'tentativas': 0,
+        })
+        return mensagem
+
+    def enviar_email(self, empresa, destinatario, assunto, corpo_html):
+        """
+        Coloca um email na fila de envio, com a chave de API e o remetente da empresa. Devolve False
+        se a empresa não tiver credenciais ou a fila estiver cheia.
+        """
+        app = current_app._get_current_object()
+        if not empresa.email_api_key or not empresa.email_sender:
+            app.logger.error(f"Empresa {empresa.id} não possui credenciais de email configuradas.")
+            return False
+        return self._enfileirar(app, {
+            'canal': 'email', 'empresa_id': empresa.id, 'mensagem_id': None, 'destino': destinatario,
+            'assunto': assunto, 'conteudo': corpo_html, 'token': empresa.email_api_key,
+            'remetente': empresa.email_sender, 'tentativas': 0,
+        })
+
+    def _enfileirar(self, app, envio):
+        estado = self._estado(app)
+        self._iniciar_workers(app)
+        try:
+            estado['fila'].put_nowait(envio)
+            return True
+        except queue.Full:
+            # A mensagem continua pendente no banco e volta na próxima recuperação
+            self._contar(estado, fila_cheia=1)
+            app.logger.warning(f"Fila de envio cheia: envio {envio['canal']} da empresa {envio['empresa_id']} adiado.")
+            return False
+
+    def _agendar(self, estado, envio, atraso):
+        with estado['condicao']:
+            heapq.heappush(estado['agendados'], (time.monotonic() + atraso, next(estado['sequencia']), envio))
+            estado['condicao'].notify()
+
+    def _mover_vencidos(self, estado):
+        """Passa os agendados vencidos para a fila; devolve os segundos até o próximo (ou None)."""
+        with estado['condicao']:
+            agendados = estado['agendados']
+            agora = time.monotonic()
+            while agendados and agendados[0][0] <= agora:
+                _, _, envio = heapq.heappop(agendados)
+                try:
+                    estado['fila'].put_nowait(envio)
+                except queue.Full:
+                    heapq.heappush(agendados, (agora + 1, next(estado['sequencia']), envio))
+                    break
+            return agendados[0][0] - agora if agendados else None
+
+    def recuperar_pendentes(self, app, idade=None):
+        """
+        Recoloca na fila as mensagens pendentes (ou aguardando nova tentativa) há mais de `idade`
+        segundos: as que não couberam na fila e as de uma execução anterior. Devolve quantas.
+        """
+        estado = self._estado(app)
+        idade = app.config.get('OUTBOUND_RECOVERY_SECONDS', 60) if idade is None else idade
+        vagas = estado['fila'].maxsize - estado['fila'].qsize() if estado['fila'].maxsize else 1000
+        if vagas <= 0:
+            return 0
+        with app.app_context():
+            try:
+                # Renova o updated_at das escolhidas para que não voltem na próxima recuperação
+                escolhidas = select(MensagemWhatsApp.id).where(
+                    MensagemWhatsApp.status_envio.in_([PENDENTE, REENVIO]),
+                    MensagemWhatsApp.updated_at <= datetime.utcnow() - timedelta(seconds=idade)
+                ).order_by(MensagemWhatsApp.id).limit(vagas).with_for_update(skip_locked=True)
+                ids = db.session.execute(
+                    update(MensagemWhatsApp).where(MensagemWhatsApp.id.in_(escolhidas.scalar_subquery()))
+                    .values(updated_at=datetime.utcnow()).returning(MensagemWhatsApp.id)
+                ).scalars().all()
+                db.session.commit()
+                if not ids:
+                    return 0
+                linhas = db.session.execute(
+                    select(MensagemWhatsApp.id, MensagemWhatsApp.conversa_id, MensagemWhatsApp.empresa_id,
+                           MensagemWhatsApp.conteudo, MensagemWhatsApp.tentativas_envio, ConversaWhatsApp.wa_id,
+                           Empresa.whatsapp_token, Empresa.whatsapp_phone_number_id)
+                    .join(ConversaWhatsApp, ConversaWhatsApp.id == MensagemWhatsApp.conversa_id)
+                    .join(Empresa, Empresa.id == MensagemWhatsApp.empresa_id)
+                    .where(MensagemWhatsApp.id.in_(ids)).order_by(MensagemWhatsApp.id)
+                ).all()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Erro ao recuperar os envios pendentes: {e}")
+                return 0
+            finally:
+                db.session.remove()
+        recuperadas = sum(self._enfileirar(app, {
+            'canal': 'whatsapp', 'empresa_id': linha.empresa_id, 'mensagem_id': linha.id,
+            'conversa_id': linha.conversa_id, 'destino': linha.wa_id, 'conteudo': linha.conteudo,
+            'token': linha.whatsapp_token, 'remetente': linha.whatsapp_phone_number_id,
+            'tentativas': linha.tentativas_envio,
+        }) for linha in linhas)
+        self._contar(estado, recuperadas=recuperadas)
+        return recuperadas
+
+    # --- Workers ---
+
+    def _iniciar_workers(self, app):
+        """Inicia os workers e o agendador na primeira vez que algo é enviado por este app."""
+        estado = self._estado(app)
+        if estado['workers']:
+            return
+        with estado['lock']:
+            if estado['workers'] or not app.config.get('OUTBOUND_WORKERS', 8):
+                return
+            for _ in range(app.config['OUTBOUND_WORKERS']):
+                estado['workers'].append(socketio.start_background_task(self._worker, app))
+            estado['workers'].append(socketio.start_background_task(self._agendador, app))
+
+    def _worker(self, app):
+        estado = self._estado(app)
+        while not estado['parar'].is_set():
+            try:
+                envio = estado['fila'].get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._processar(app, envio)
+
+    def _agendador(self, app):
+        """Libera os agendados no horário e, a cada OUTBOUND_RECOVERY_SECONDS, recupera os pendentes."""
+        estado = self._estado(app)
+        intervalo = app.config.get('OUTBOUND_RECOVERY_SECONDS', 60)
+        proxima_recuperacao = time.monotonic()
+        while not estado['parar'].is_set():
+            if time.monotonic() >= proxima_recuperacao:
+                self.recuperar_pendentes(app)
+                proxima_recuperacao = time.monotonic() + intervalo
+            with estado['condicao']:
+                espera = self._mover_vencidos(estado)
+                ate_recuperacao = proxima_recuperacao - time.monotonic()
+                estado['condicao'].wait(max(0.0, min(ate_recuperacao, espera if espera is not None else intervalo)))
+
+    def parar(self, app, timeout=5):
+        """Para os workers e o agendador deste app (usado em testes e no shutdown)."""
+        estado = self._estado(app)
+        estado['parar'].set()
+        with estado['condicao']:
+            estado['condicao'].notify_all()
+        for worker in estado['workers']:
+            worker.join(timeout)
+        estado['workers'].clear()
+        estado['parar'].clear()
+
+    def drenar(self, app, timeout=30):
+        """Processa, na thread atual, a fila e os agendados até esvaziarem; devolve quantos envios foram tentados."""
+        estado = self._estado(app)
+        limite = time.monotonic() + timeout
+        tentados = 0
+        while time.monotonic() < limite:
+            espera = self._mover_vencidos(estado)
+            try:
+                envio = estado['fila'].get_nowait()
+            except queue.Empty:
+                if espera is None:
+                    break
+                time.sleep(min(espera, 0.05))
+                continue
+            tentados += self._processar(app, envio)
+        return tentados
+
+    # --- Envio ---
+
+    def _processar(self, app, envio):
+        """Uma tentativa de envio; devolve 1 se o provedor foi chamado (ou o envio encerrado), senão 0."""
+        estado = self._estado(app)
+        if not envio.pop('reservado', False):
+            espera = self._reservar(app, estado, envio)
+            if espera > 0:
+                envio['reservado'] = True
+                self._contar(estado, limitadas=1)
+                self._agendar(estado, envio, espera)
+                return 0
+        with app.app_context():
+            try:
+                if envio['mensagem_id'] and not self._reivindicar(envio):
+                    return 0
+                self._concluir(app, estado, envio, self._requisitar(app, estado, envio))
+                return 1
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Erro no envio {envio['canal']} da empresa {envio['empresa_id']}: {e}")
+                return 0
+            finally:
+                db.session.remove()
+
+    def _reservar(self, app, estado, envio):
+        taxa = app.config.get(PROVEDORES[envio['canal']][2])
+        if not taxa or taxa <= 0:
+            return 0.0
+        chave = (envio['canal'], envio['empresa_id'])
+        with estado['lock']:
+            balde = estado['baldes'].get(chave)
+            if balde is None or balde.taxa != taxa:
+                balde = estado['baldes'][chave] = BaldeDeTokens(taxa)
+        return balde.reservar()
+
+    def _reivindicar(self, envio):
+        """Marca a mensagem como 'enviando' se ela ainda estiver esperando envio (outro worker pode tê-la pego)."""
+        reivindicada = db.session.execute(_REIVINDICAR, {'b_id': envio['mensagem_id'], 'b_agora': datetime.utcnow()}).first()
+        db.session.commit()
+        if reivindicada is None:
+            return False
+        envio['tentativas'] = reivindicada.tentativas_envio
+        return True
+
+    def _requisitar(self, app, estado, envio):
+        """Chama o provedor; devolve (status, id no provedor, erro, Retry-After)."""
+        if not envio['token'] or not envio['remetente']:
+            return FALHOU, None, f"Empresa {envio['empresa_id']} sem credenciais de {envio['canal']}.", None
+        montar, extrair_id, _ = PROVEDORES[envio['canal']]
+        url, headers, corpo = montar(app.config, envio)
+        timeout = (app.config.get('OUTBOUND_CONNECT_TIMEOUT_SECONDS', 3), app.config.get('OUTBOUND_READ_TIMEOUT_SECONDS', 10))
+        envio['tentativas'] += 1
+        inicio = time.monotonic()
+        try:
+            resposta = estado['sessao'].post(url, headers=headers, json=corpo, timeout=timeout)
+        except requests.RequestException as e:
+            return REENVIO, None, f"{type(e).__name__}: {e}", None
+        finally:
+            self._contar(estado, requisicoes=1, tempo_requisicoes=time.monotonic() - inicio)
+        if resposta.ok:
+            return ENVIADA, extrair_id(resposta), None, None
+        erro = f"HTTP {resposta.status_code}: {resposta.text[:500]}"
+        if resposta.status_code == 429 or resposta.status_code >= 500:
+            return REENVIO, None, erro, _retry_after(resposta)
+        return FALHOU, None, erro, None
+
+    def _concluir(self, app, estado, envio, resultado):
+        """Grava o resultado da tentativa na mensagem e agenda a próxima, se houver."""
+        status, id_provedor, erro, retry_after = resultado
+        if status == REENVIO and envio['tentativas'] >= app.config.get('OUTBOUND_MAX_ATTEMPTS', 5):
+            status = FALHOU
+
+        if envio['mensagem_id']:
+            agora = datetime.utcnow()
+            db.session.execute(_REGISTRAR_RESULTADO, {
+                'b_id': envio['mensagem_id'], 'b_status': status, 'b_tentativas': envio['tentativas'], 'b_erro': erro,
+                'b_wamid': id_provedor, 'b_enviada_em': agora if status == ENVIADA else None, 'b_agora': agora,
+            })
+            db.session.commit()
+            socketio.emit('status_mensagem', {
+                'conversa_id': envio['conversa_id'], 'mensagem_id': envio['mensagem_id'], 'status': status
+            }, room=f"conversa_{envio['conversa_id']}")
+        elif status == ENVIADA:
+            app.logger.info(f"Email para {envio['destino']} enviado via API da empresa {envio['empresa_id']}.")
+        elif status == FALHOU:
+            app.logger.error(f"Falha ao enviar email para {envio['destino']} (empresa {envio['empresa_id']}): {erro}")
+
+        if status == ENVIADA:
+            self._contar(estado, enviadas=1)
+        elif status == FALHOU:
+            self._contar(estado, falhas=1)
+        else:
+            self._contar(estado, novas_tentativas=1)
+            backoff = app.config.get('OUTBOUND_RETRY_BACKOFF_SECONDS', 1) * 2 ** (envio['tentativas'] - 1)
+            self._agendar(estado, envio, max(backoff, retry_after or 0))
+
+    def metricas(self, app=None):
+        estado = self._estado(app)
+        with estado['lock']:
+            metricas = dict(estado['metricas'])
+        with estado['condicao']:
+            metricas['agendados'] = len(estado['agendados'])
+        metricas['fila'] = estado['fila'].qsize()
+        requisicoes = metricas['requisicoes']
+        metricas['tempo_medio_requisicao_ms'] = round(1000 * metricas.pop('tempo_requisicoes') / requisicoes, 1) if requisicoes else None
+        return metricas
+
+
+_tabela = MensagemWhatsApp.__table__
+
+# Statements prontos (Core, com bindparam): são executados duas vezes por mensagem enviada
+_REIVINDICAR = (
+    update(_tabela)
+    .where(_tabela.c.id == bindparam('b_id'), _tabela.c.status_envio.in_([PENDENTE, REENVIO]))
+    .values(status_envio=ENVIANDO, updated_at=bindparam('b_agora'))
+    .returning(_tabela.c.tentativas_envio)
+)
+
+_REGISTRAR_RESULTADO = (
+    update(_tabela)
+    .where(_tabela.c.id == bindparam('b_id'))
+    .values(
+        status_envio=bindparam('b_status'),
+        tentativas_envio=bindparam('b_tentativas'),
+        erro_envio=bindparam('b_erro'),
+        wamid=bindparam('b_wamid'),
+        enviada_em=bindparam('b_enviada_em'),
+        updated_at=bindparam('b_agora')
+    )
+)
+
+
+envio_service = EnvioService()
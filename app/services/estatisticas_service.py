@@ -0,0 +1,292 @@
+# call_center_project/app/services/estatisticas_service.py
+from app.models import db, EstatisticaDiaria, ConversaWhatsApp, MensagemWhatsApp, Avaliacao, Usuario
+from datetime import datetime, time, timedelta
+from sqlalchemy import event, inspect, func, cast, Date, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+# Colunas da chave do rollup e colunas de métricas (somáveis)
+CHAVE = ('empresa_id', 'data', 'agente_id', 'assunto', 'canal')
+METRICAS = (
+    'atendimentos', 'mensagens_recebidas', 'conversas_finalizadas', 'duracao_total_segundos',
+    'avaliacoes', 'avaliacoes_com_csat', 'soma_csat'
+)
+
+_tabela = EstatisticaDiaria.__table__
+
+
+def _chave(empresa_id, dia, agente_id=None, assunto=None, canal=None):
+    return (empresa_id, dia, agente_id or 0, assunto or '', canal or '')
+
+
+# --- Contribuição de cada registro para o rollup ---
+# Cada função recebe os valores de um registro e devolve [(chave, {metrica: valor})].
+# Em uma alteração, a contribuição do estado antigo é subtraída e a do novo é somada.
+
+def _contribuicoes_conversa(v):
+    contribuicoes = []
+    if v['created_at']:
+        chave = _chave(v['empresa_id'], v['created_at'].date(), v['agente_atribuido_id'], v['assunto'])
+        contribuicoes.append((chave, {'atendimentos': 1}))
+    if v['fim'] and v['inicio']:
+        chave = _chave(v['empresa_id'], v['fim'].date(), v['agente_atribuido_id'], v['assunto'])
+        contribuicoes.append((chave, {
+            'conversas_finalizadas': 1,
+            'duracao_total_segundos': (v['fim'] - v['inicio']).total_seconds()
+        }))
+    return contribuicoes
+
+
+def _contribuicoes_mensagem(v):
+    if v['remetente'] != 'cliente' or not v['timestamp']:
+        return []
+    return [(_chave(v['empresa_id'], v['timestamp'].date()), {'mensagens_recebidas': 1})]
+
+
+def _contribuicoes_avaliacao(v):
+    if not v['created_at']:
+        return []
+    metricas = {'avaliacoes': 1}
+    if v['csat'] is not None:
+        metricas['avaliacoes_com_csat'] = 1
+        metricas['soma_csat'] = v['csat']
+    return [(_chave(v['empresa_id'], v['created_at'].date(), v['agente_id'], canal=v['canal']), metricas)]
+
+
+_CONTRIBUICOES = {
+    ConversaWhatsApp: (
+        ('empresa_id', 'created_at', 'agente_atribuido_id', 'assunto', 'inicio', 'fim'),
+        _contribuicoes_conversa
+    ),
+    MensagemWhatsApp: (('empresa_id', 'timestamp', 'remetente'), _contribuicoes_mensagem),
+    Avaliacao: (('empresa_id', 'created_at', 'agente_id', 'canal', 'csat'), _contribuicoes_avaliacao),
+}
+
+
+def _valores(target, campos, antigos=False):
+    """Lê os valores atuais (ou anteriores à alteração) dos campos do registro."""
+    estado = inspect(target)
+    valores = {}
+    for campo in campos:
+        historico = estado.attrs[campo].history
+        if antigos and historico.deleted:
+            valores[campo] = historico.deleted[0]
+        elif antigos and historico.added:
+            # Com active_history o valor anterior é sempre carregado: sem `deleted`, ele era None
+            valores[campo] = None
+        else:
+            valores[campo] = getattr(target, campo)
+    return valores
+
+
+def _ignorar(target, valor, anterior, iniciador):
+    pass
+
+
+def _acumular(deltas, contribuicoes, sinal):
+    for chave, metricas in contribuicoes:
+        acumulado = deltas.setdefault(chave, {})
+        for metrica, valor in metricas.items():
+            acumulado[metrica] = acumulado.get(metrica, 0) + sinal * valor
+
+
+def aplicar_deltas(connection, deltas):
+    """Soma os deltas ao rollup com INSERT ... ON CONFLICT DO UPDATE (uma instrução por chave)."""
+    agora = datetime.utcnow()
+    for chave, metricas in deltas.items():
+        metricas = {m: v for m, v in metricas.items() if v}
+        if not metricas:
+            continue
+        stmt = pg_insert(_tabela).values(
+            created_at=agora, updated_at=agora, **dict(zip(CHAVE, chave)), **metricas
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint='uq_estatistica_diaria_chave',
+            set_={**{m: _tabela.c[m] + stmt.excluded[m] for m in metricas}, 'updated_at': agora}
+        )
+        connection.execute(stmt)
+
+
+def _registrar_eventos(modelo, campos, contribuicoes):
+    # active_history: ao alterar um campo de um registro expirado (depois de um commit), o valor
+    # anterior é lido do banco antes da troca. Sem isso o histórico só teria o valor novo e a
+    # contribuição antiga seria subtraída da linha errada (ex.: agente_id 0 em vez do agente anterior)
+    for campo in campos:
+        event.listen(getattr(modelo, campo), 'set', _ignorar, active_history=True)
+
+    @event.listens_for(modelo, 'after_insert')
+    def _apos_inserir(mapper, connection, target):
+        deltas = {}
+        _acumular(deltas, contribuicoes(_valores(target, campos)), 1)
+        aplicar_deltas(connection, deltas)
+
+    @event.listens_for(modelo, 'after_update')
+    def _apos_atualizar(mapper, connection, target):
+        estado = inspect(target)
+        if not any(estado.attrs[campo].history.has_changes() for campo in campos):
+            return
+        deltas = {}
+        _acumular(deltas, contribuicoes(_valores(target, campos, antigos=True)), -1)
+        _acumular(deltas, contribuicoes(_valores(target, campos)), 1)
+        aplicar_deltas(connection, deltas)
+
+    @event.listens_for(modelo, 'after_delete')
+    def _apos_excluir(mapper, connection, target):
+        deltas = {}
+        _acumular(deltas, contribuicoes(_valores(target, campos)), -1)
+        aplicar_deltas(connection, deltas)
+
+
+for _modelo, (_campos, _funcao) in _CONTRIBUICOES.items():
+    _registrar_eventos(_modelo, _campos, _funcao)
+
+
+def registrar_insercoes(modelo, linhas):
+    """
+    Soma ao rollup as linhas inseridas em lote (INSERT do Core, que não dispara os eventos do ORM).
+    `linhas` são dicts com ao menos os campos do modelo usados no rollup.
+    """
+    campos, contribuicoes = _CONTRIBUICOES[modelo]
+    deltas = {}
+    for linha in linhas:
+        _acumular(deltas, contribuicoes({campo: linha.get(campo) for campo in campos}), 1)
+    aplicar_deltas(db.session.connection(), deltas)
+
+
+# --- Reconstrução em lote (backfill) ---
+
+def _intervalo(coluna, desde, ate):
+    filtros = []
+    if desde:
+        filtros.append(coluna >= datetime.combine(desde, time.min))
+    if ate:
+        filtros.append(coluna < datetime.combine(ate + timedelta(days=1), time.min))
+    return filtros
+
+
+def _inserir_agregado(select_agregado, metricas):
+    """INSERT ... SELECT com soma em caso de conflito (as fontes compartilham chaves)."""
+    agora = datetime.utcnow()
+    colunas = ['created_at', 'updated_at', *CHAVE, *metricas]
+    stmt = pg_insert(_tabela).from_select(colunas, select_agregado)
+    stmt = stmt.on_conflict_do_update(
+        constraint='uq_estatistica_diaria_chave',
+        set_={**{m: _tabela.c[m] + stmt.excluded[m] for m in metricas}, 'updated_at': agora}
+    )
+    db.session.execute(stmt)
+
+
+def reconstruir_estatisticas(empresa_id=None, desde=None, ate=None):
+    """
+    Reconstrói o rollup a partir dos dados brutos, com consultas set-based
+    (um INSERT ... SELECT agrupado por fonte), numa única transação.
+    Sem filtros, reconstrói todo o histórico de todas as empresas.
+    """
+    agora = literal(datetime.utcnow())
+
+    def _filtro_empresa(coluna):
+        return [coluna == empresa_id] if empresa_id else []
+
+    apagar = db.session.query(EstatisticaDiaria).filter(*_filtro_empresa(EstatisticaDiaria.empresa_id))
+    if desde:
+        apagar = apagar.filter(EstatisticaDiaria.data >= desde)
+    if ate:
+        apagar = apagar.filter(EstatisticaDiaria.data <= ate)
+    apagar.delete(synchronize_session=False)
+
+    agente = func.coalesce(ConversaWhatsApp.agente_atribuido_id, 0)
+    assunto = func.coalesce(ConversaWhatsApp.assunto, '')
+
+    # Atendimentos (pelo dia de criação da conversa)
+    dia = cast(ConversaWhatsApp.created_at, Date)
+    _inserir_agregado(
+        db.session.query(
+            agora, agora, ConversaWhatsApp.empresa_id, dia, agente, assunto, literal(''),
+            func.count(ConversaWhatsApp.id)
+        ).filter(
+            *_filtro_empresa(ConversaWhatsApp.empresa_id),
+            *_intervalo(ConversaWhatsApp.created_at, desde, ate)
+        ).group_by(ConversaWhatsApp.empresa_id, dia, agente, assunto).statement,
+        ('atendimentos',)
+    )
+
+    # Conversas finalizadas e duração (pelo dia de finalização)
+    dia = cast(ConversaWhatsApp.fim, Date)
+    _inserir_agregado(
+        db.session.query(
+            agora, agora, ConversaWhatsApp.empresa_id, dia, agente, assunto, literal(''),
+            func.count(ConversaWhatsApp.id),
+            func.sum(func.extract('epoch', ConversaWhatsApp.fim - ConversaWhatsApp.inicio))
+        ).filter(
+            ConversaWhatsApp.fim.isnot(None),
+            ConversaWhatsApp.inicio.isnot(None),
+            *_filtro_empresa(ConversaWhatsApp.empresa_id),
+            *_intervalo(ConversaWhatsApp.fim, desde, ate)
+        ).group_by(ConversaWhatsApp.empresa_id, dia, agente, assunto).statement,
+        ('conversas_finalizadas', 'duracao_total_segundos')
+    )
+
+    # Mensagens recebidas de clientes
+    dia = cast(MensagemWhatsApp.timestamp, Date)
+    _inserir_agregado(
+        db.session.query(
+            agora, agora, MensagemWhatsApp.empresa_id, dia, literal(0), literal(''), literal(''),
+            func.count(MensagemWhatsApp.id)
+        ).filter(
+            MensagemWhatsApp.remetente == 'cliente',
+            *_filtro_empresa(MensagemWhatsApp.empresa_id),
+            *_intervalo(MensagemWhatsApp.timestamp, desde, ate)
+        ).group_by(MensagemWhatsApp.empresa_id, dia).statement,
+        ('mensagens_recebidas',)
+    )
+
+    # Avaliações (CSAT) por agente e canal
+    dia = cast(Avaliacao.created_at, Date)
+    canal = func.coalesce(Avaliacao.canal, '')
+    _inserir_agregado(
+        db.session.query(
+            agora, agora, Avaliacao.empresa_id, dia, Avaliacao.agente_id, literal(''), canal,
+            func.count(Avaliacao.id),
+            func.count(Avaliacao.csat),
+            func.coalesce(func.sum(Avaliacao.csat), 0)
+        ).filter(
+            *_filtro_empresa(Avaliacao.empresa_id),
+            *_intervalo(Avaliacao.created_at, desde, ate)
+        ).group_by(Avaliacao.empresa_id, dia, Avaliacao.agente_id, canal).statement,
+        ('avaliacoes', 'avaliacoes_com_csat', 'soma_csat')
+    )
+
+    db.session.commit()
+
+
+# --- Consultas usadas pelos dashboards ---
+
+def totais_da_empresa(empresa_id, dia=None):
+    """Soma das métricas da empresa em um dia (ou em todo o histórico, se dia for None)."""
+    query = db.session.query(
+        *[func.coalesce(func.sum(getattr(EstatisticaDiaria, m)), 0).label(m) for m in METRICAS]
+    ).filter(EstatisticaDiaria.empresa_id == empresa_id)
+    if dia is not None:
+        query = query.filter(EstatisticaDiaria.data == dia)
+    return query.one()
+
+
+def media(soma, quantidade):
+    return float(soma) / quantidade if quantidade else 0.0
+
+
+def avaliacoes_por_canal(empresa_id):
+    total = func.sum(EstatisticaDiaria.avaliacoes)
+    return db.session.query(EstatisticaDiaria.canal, total).filter(
+        EstatisticaDiaria.empresa_id == empresa_id
+    ).group_by(EstatisticaDiaria.canal).having(total > 0).all()
+
+
+def csat_por_agente(empresa_id):
+    """Retorna [(nome_agente, csat_medio)] ordenado pelo CSAT médio."""
+    quantidade = func.sum(EstatisticaDiaria.avaliacoes_com_csat)
+    csat_medio = func.sum(EstatisticaDiaria.soma_csat) / quantidade
+    return db.session.query(Usuario.nome, csat_medio).join(
+        Usuario, EstatisticaDiaria.agente_id == Usuario.id
+    ).filter(
+        EstatisticaDiaria.empresa_id == empresa_id
+    ).group_by(Usuario.nome).having(quantidade > 0).order_by(csat_medio.desc()).all()
@@ -0,0 +1,243 @@
+# call_center_project/app/services/folha_service.py
+"""
+Fechamento mensal da folha de pagamento (FolhaPagamento).
+
+fechar_folha calcula e grava a folha do mês de todos os funcionários empregados no mês (admitidos
+até o fim dele e não demitidos antes do início) de uma empresa em uma única transação (cálculo
+em lote + um upsert em lote). Cada linha guarda a assinatura das entradas do cálculo; no
+fechamento seguinte do mesmo mês só são recalculados os funcionários cuja assinatura mudou
+(salário, benefícios, jornada, feriados, afastamentos ou ponto). VA, VR e VT são pagos pelos
+dias trabalhados (sem os afastamentos e os dias fora do vínculo) e as horas extras do ponto
+entram na folha com o adicional (app/rh/calculos.py).
+
+Dashboards e relatórios leem a folha gravada (resumo_da_folha, resultado_da_folha) e só
+calculam na hora quando o mês ainda não foi fechado (resumo_calculado, com as mesmas entradas).
+"""
+from app.models import db
+from app.models_rh import Funcionario, Afastamento, ControlePonto, FolhaPagamento
+from app.rh.calculos import calcular_folha_em_lote, COLUNAS_FOLHA
+from app.rh.calendario import dias_uteis_no_mes, dias_uteis_entre
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import func, and_, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import hashlib
+
+# Mude ao alterar as fórmulas da folha: força o recálculo de todos os funcionários
+VERSAO_CALCULO = 2
+
+CENTAVO = Decimal('0.01')
+
+# Coluna de FolhaPagamento -> coluna do resultado de calcular_folha_em_lote
+VALORES = {
+    'salario_base': 'salario_base',
+    'valor_horas_extras': 'horas_extras',
+    'inss': 'inss',
+    'irrf': 'irrf',
+    'vale_transporte': 'vale_transporte',
+    'vale_refeicao': 'vale_refeicao',
+    'vale_alimentacao': 'vale_alimentacao',
+    'fgts': 'fgts',
+    'inss_patronal': 'inss_patronal',
+    'total_proventos': 'total_proventos',
+    'total_descontos': 'total_descontos',
+    'salario_liquido': 'liquido_funcionario',
+    'custo_total_empresa': 'custo_total_empresa',
+}
+
+# Colunas somadas nos totais do mês (dashboard)
+COLUNAS_RESUMO = ('salario_liquido', 'custo_total_empresa', 'vale_alimentacao', 'vale_refeicao', 'fgts', 'inss_patronal')
+
+_tabela = FolhaPagamento.__table__
+
+
+def _centavos(valor):
+    return Decimal(valor).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+def _intervalo_do_mes(ano, mes):
+    inicio = date(ano, mes, 1)
+    return inicio, date(ano + mes // 12, mes % 12 + 1, 1) - timedelta(days=1)
+
+
+def _juntar_intervalos(intervalos):
+    """Une intervalos de datas sobrepostos ou adjacentes (afastamentos que se sobrepõem não contam duas vezes)."""
+    unidos = []
+    for de, ate in sorted(intervalos):
+        if unidos and de <= unidos[-1][1] + timedelta(days=1):
+            unidos[-1] = (unidos[-1][0], max(unidos[-1][1], ate))
+        else:
+            unidos.append((de, ate))
+    return unidos
+
+
+def empregados_no_mes(ano, mes):
+    """
+    Filtro dos funcionários empregados em algum dia do mês, pelas datas de admissão e demissão (o
+    status é o de hoje: quem foi desligado depois continua na folha dos meses em que trabalhou).
+    Sem data de demissão registrada, só o status indica o desligamento.
+    """
+    inicio, fim = _intervalo_do_mes(ano, mes)
+    return and_(Funcionario.data_admissao <= fim, or_(
+        Funcionario.data_demissao >= inicio,
+        and_(Funcionario.data_demissao.is_(None), Funcionario.status == 'ativo')
+    ))
+
+
+def _entradas(empresa_id, ano, mes):
+    """
+    Entradas do cálculo de cada funcionário da empresa empregado no mês, em três consultas
+    (funcionários, afastamentos do mês e horas extras do ponto do mês), já com os dias trabalhados
+    (dias úteis fora dos afastamentos e dentro do vínculo: admissão e demissão no meio do mês
+    contam) e a assinatura.
+    """
+    inicio, fim = _intervalo_do_mes(ano, mes)
+    funcionarios = db.session.query(
+        Funcionario.id, Funcionario.data_admissao, Funcionario.data_demissao, *[getattr(Funcionario, c) for c in COLUNAS_FOLHA]
+    ).filter(
+        Funcionario.empresa_id == empresa_id, empregados_no_mes(ano, mes)
+    ).order_by(Funcionario.id).all()
+
+    afastamentos = {}
+    for funcionario_id, de, ate in db.session.query(
+        Afastamento.funcionario_id, Afastamento.data_inicio, Afastamento.data_fim
+    ).join(Funcionario, Afastamento.funcionario_id == Funcionario.id).filter(
+        Funcionario.empresa_id == empresa_id, Afastamento.data_inicio <= fim, Afastamento.data_fim >= inicio
+    ):
+        afastamentos.setdefault(funcionario_id, []).append((max(de, inicio), min(ate, fim)))
+
+    horas_extras = dict(db.session.query(
+        ControlePonto.funcionario_id, func.coalesce(func.sum(ControlePonto.horas_extras), 0)
+    ).join(Funcionario, ControlePonto.funcionario_id == Funcionario.id).filter(
+        Funcionario.empresa_id == empresa_id, ControlePonto.data >= inicio, ControlePonto.data <= fim
+    ).group_by(ControlePonto.funcionario_id))
+
+    entradas = []
+    for linha in funcionarios:
+        entrada = dict(zip(('id', 'data_admissao', 'data_demissao') + COLUNAS_FOLHA, linha))
+        jornada = entrada['jornada_trabalho']
+        fora = list(afastamentos.get(entrada['id'], []))
+        if entrada['data_admissao'] > inicio:
+            fora.append((inicio, entrada['data_admissao'] - timedelta(days=1)))
+        if entrada['data_demissao'] and entrada['data_demissao'] < fim:
+            fora.append((entrada['data_demissao'] + timedelta(days=1), fim))
+        periodos = _juntar_intervalos(fora)
+        entrada['dias_uteis'] = dias_uteis_no_mes(ano, mes, jornada, empresa_id)
+        entrada['dias_trabalhados'] = max(0, entrada['dias_uteis'] - sum(
+            dias_uteis_entre(de, ate, jornada, empresa_id) for de, ate in periodos
+        ))
+        entrada['horas_extras'] = _centavos(horas_extras.get(entrada['id'], 0))
+        entrada['assinatura'] = hashlib.sha256(repr((
+            VERSAO_CALCULO, [entrada[c] for c in COLUNAS_FOLHA], entrada['dias_uteis'], periodos,
+            entrada['horas_extras']
+        )).encode()).hexdigest()
+        entradas.append(entrada)
+    return entradas
+
+
+def _calcular(entradas, empresa_id, ano, mes):
+    return calcular_folha_em_lote(
+        {c: [e[c] for e in entradas] for c in COLUNAS_FOLHA + ('dias_trabalhados', 'horas_extras')},
+        ano, mes, empresa_id
+    )
+
+
+def fechar_folha(empresa_id, ano, mes, forcar=False):
+    """
+    Fecha (ou atualiza) a folha do mês da empresa. Recalcula só os funcionários novos ou com
+    entradas alteradas desde o último fechamento (todos, com `forcar`) e remove as linhas de quem,
+    pelas datas de admissão e demissão, não trabalhou no mês. Devolve {'calculados', 'inalterados',
+    'removidos'}.
+    """
+    entradas = _entradas(empresa_id, ano, mes)
+    gravadas = dict(db.session.query(FolhaPagamento.funcionario_id, FolhaPagamento.assinatura).filter(
+        FolhaPagamento.empresa_id == empresa_id, FolhaPagamento.ano == ano, FolhaPagamento.mes == mes
+    ))
+    alterados = [e for e in entradas if forcar or gravadas.get(e['id']) != e['assinatura']]
+
+    if alterados:
+        folha = _calcular(alterados, empresa_id, ano, mes)
+        agora = datetime.utcnow()
+        linhas = [{
+            'created_at': agora, 'updated_at': agora, 'funcionario_id': e['id'], 'empresa_id': empresa_id,
+            'ano': ano, 'mes': mes, 'horas_extras': e['horas_extras'], 'dias_uteis': e['dias_uteis'],
+            'dias_trabalhados': e['dias_trabalhados'], 'assinatura': e['assinatura'],
+            **{coluna: _centavos(folha[origem][i]) for coluna, origem in VALORES.items()}
+        } for i, e in enumerate(alterados)]
+        stmt = pg_insert(_tabela)
+        atualizadas = [c for c in linhas[0] if c not in ('created_at', 'funcionario_id', 'ano', 'mes')]
+        db.session.execute(stmt.on_conflict_do_update(
+            constraint='uq_folha_pagamento_funcionario_mes',
+            set_={c: stmt.excluded[c] for c in atualizadas}
+        ), linhas)
+
+    # Só sai da folha quem comprovadamente não estava empregado no mês; um desligado sem data de
+    # demissão registrada mantém a linha já fechada (não é recalculado, mas pode ter trabalhado)
+    inicio, fim = _intervalo_do_mes(ano, mes)
+    fora_do_mes = select(Funcionario.id).where(
+        Funcionario.empresa_id == empresa_id,
+        or_(Funcionario.data_admissao > fim, Funcionario.data_demissao < inicio)
+    )
+    removidos = FolhaPagamento.query.filter(
+        FolhaPagamento.empresa_id == empresa_id, FolhaPagamento.ano == ano, FolhaPagamento.mes == mes,
+        FolhaPagamento.funcionario_id.in_(fora_do_mes)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return {'calculados': len(alterados), 'inalterados': len(entradas) - len(alterados), 'removidos': removidos}
+
+
+def resumo_da_folha(empresa_id, ano, mes):
+    """Totais da folha gravada do mês (uma consulta agregada), ou None se o mês não foi fechado."""
+    linha = db.session.query(
+        func.count(FolhaPagamento.id), *[func.coalesce(func.sum(getattr(FolhaPagamento, c)), 0) for c in COLUNAS_RESUMO]
+    ).filter(
+        FolhaPagamento.empresa_id == empresa_id, FolhaPagamento.ano == ano, FolhaPagamento.mes == mes
+    ).one()
+    if not linha[0]:
+        return None
+    return {'funcionarios': linha[0], **dict(zip(COLUNAS_RESUMO, linha[1:]))}
+
+
+def resumo_calculado(empresa_id, ano, mes):
+    """
+    Os mesmos totais de resumo_da_folha para um mês ainda não fechado, calculados na hora com as
+    entradas do fechamento (empregados no mês, dias trabalhados e horas extras) e arredondados ao
+    centavo por funcionário, como na folha gravada. None se ninguém foi empregado no mês.
+    """
+    entradas = _entradas(empresa_id, ano, mes)
+    if not entradas:
+        return None
+    folha = _calcular(entradas, empresa_id, ano, mes)
+    return {'funcionarios': len(entradas), **{
+        coluna: sum(_centavos(valor) for valor in folha[VALORES[coluna]]) for coluna in COLUNAS_RESUMO
+    }}
+
+
+def resultado_da_folha(folha):
+    """Uma FolhaPagamento gravada no mesmo formato de calcular_folha_pagamento (para os templates)."""
+    return {
+        "success": True,
+        "fechada": True,
+        "dias_uteis_mes": folha.dias_uteis,
+        "proventos": {
+            "salario_base": folha.salario_base,
+            "horas_extras": folha.valor_horas_extras,
+            "vale_alimentacao": folha.vale_alimentacao,
+            "vale_refeicao": folha.vale_refeicao,
+        },
+        "descontos": {
+            "vale_transporte": folha.vale_transporte,
+            "inss": folha.inss,
+            "irrf": folha.irrf,
+        },
+        "custos_empresa": {
+            "fgts": folha.fgts,
+            "inss_patronal": folha.inss_patronal,
+        },
+        "totais": {
+            "proventos": folha.total_proventos,
+            "descontos": folha.total_descontos,
+            "liquido_funcionario": folha.salario_liquido,
+            "custo_total_empresa": folha.custo_total_empresa,
+        },
+    }
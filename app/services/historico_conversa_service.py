@@ -0,0 +1,122 @@
+# call_center_project/app/services/historico_conversa_service.py
+"""
+Histórico paginado das mensagens de uma conversa do WhatsApp.
+
+A primeira página traz as mensagens mais recentes e `antes` traz as anteriores a um cursor
+(rolar para cima); essas páginas são por chave (timestamp, id), lidas pelo índice
+ix_mensagem_whats_app_conversa_timestamp. `depois` traz só o que foi gravado desde a última
+leitura do cliente e, como o ETag, usa o id, que cresce na ordem de gravação: o timestamp não
+cresce (o da Meta chega em hora local, o dos agentes em UTC, e a caixa de entrada grava
+mensagens atrasadas depois de novas tentativas), então uma mensagem gravada com timestamp
+anterior ao cursor seria perdida. O custo de uma página não depende do tamanho da conversa.
+
+versao_da_conversa é o maior id da conversa (uma leitura no índice
+ix_mensagem_whats_app_conversa_id) e serve de base para o ETag: se nada foi gravado, a rota
+responde 304 sem carregar mensagens.
+"""
+from app.models import db, MensagemWhatsApp
+from datetime import datetime
+from sqlalchemy import tuple_
+import base64
+import hashlib
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def _codificar(texto):
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def _decodificar(cursor):
+    try:
+        return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CursorInvalido(f"Cursor inválido: {cursor!r}") from e
+
+
+def codificar_cursor(timestamp, mensagem_id):
+    """Cursor das páginas anteriores (`antes`): a chave (timestamp, id) da mensagem mais antiga exibida."""
+    return _codificar(f"{timestamp.isoformat()}|{mensagem_id}")
+
+
+def decodificar_cursor(cursor):
+    """(timestamp, id) de um cursor de codificar_cursor; CursorInvalido se não for um."""
+    try:
+        timestamp, mensagem_id = _decodificar(cursor).split('|')
+        return datetime.fromisoformat(timestamp), int(mensagem_id)
+    except ValueError as e:
+        raise CursorInvalido(f"Cursor inválido: {cursor!r}") from e
+
+
+def codificar_cursor_novas(mensagem_id):
+    """Cursor das mensagens novas (`depois`): o maior id já entregue ao cliente."""
+    return _codificar(str(mensagem_id))
+
+
+def decodificar_cursor_novas(cursor):
+    """Id de um cursor de codificar_cursor_novas (aceita também os cursores "timestamp|id" antigos)."""
+    try:
+        return int(_decodificar(cursor).rsplit('|', 1)[-1])
+    except ValueError as e:
+        raise CursorInvalido(f"Cursor inválido: {cursor!r}") from e
+
+
+def versao_da_conversa(conversa_id):
+    """Maior id de mensagem da conversa, ou None se ela não tiver mensagens."""
+    return db.session.query(MensagemWhatsApp.id).filter(
+        MensagemWhatsApp.conversa_id == conversa_id
+    ).order_by(MensagemWhatsApp.id.desc()).limit(1).scalar()
+
+
+def etag_da_conversa(conversa, parametros):
+    """ETag de uma resposta do histórico: conversa, nome do cliente, última mensagem e parâmetros."""
+    versao = versao_da_conversa(conversa.id)
+    base = repr((conversa.id, conversa.nome_cliente, versao, sorted(parametros.items())))
+    return hashlib.sha1(base.encode()).hexdigest()
+
+
+def pagina_de_mensagens(conversa_id, limite, antes=None, depois=None):
+    """
+    Uma página do histórico. Com `depois`, as primeiras mensagens gravadas depois do cursor, na
+    ordem de gravação; senão, as últimas em ordem cronológica (anteriores a `antes`, se informado).
+    Devolve {'mensagens', 'tem_mais' (há mais mensagens na direção pedida), 'cursor_anterior'
+    (pede a página anterior a esta), 'cursor' (pede o que for gravado depois desta)}.
+    """
+    consulta = db.session.query(
+        MensagemWhatsApp.id, MensagemWhatsApp.timestamp, MensagemWhatsApp.remetente, MensagemWhatsApp.conteudo
+    ).filter(MensagemWhatsApp.conversa_id == conversa_id)
+
+    if depois:
+        linhas = consulta.filter(MensagemWhatsApp.id > decodificar_cursor_novas(depois)).order_by(
+            MensagemWhatsApp.id
+        ).limit(limite + 1).all()
+        tem_mais, linhas = len(linhas) > limite, linhas[:limite]
+        cursor = codificar_cursor_novas(linhas[-1].id) if linhas else depois
+    else:
+        # O cursor das novas é o maior id da conversa, não o da última mensagem exibida (a mais
+        # recente pelo timestamp pode não ser a última gravada). Lido antes da página, que fica
+        # limitada a ele: o que for gravado entre as duas leituras vem no próximo `depois`
+        ultimo_id = versao_da_conversa(conversa_id) or 0
+        consulta = consulta.filter(MensagemWhatsApp.id <= ultimo_id)
+        if antes:
+            chave = tuple_(MensagemWhatsApp.timestamp, MensagemWhatsApp.id)
+            consulta = consulta.filter(chave < tuple_(*decodificar_cursor(antes)))
+        linhas = consulta.order_by(
+            MensagemWhatsApp.timestamp.desc(), MensagemWhatsApp.id.desc()
+        ).limit(limite + 1).all()
+        tem_mais, linhas = len(linhas) > limite, linhas[:limite][::-1]
+        cursor = codificar_cursor_novas(ultimo_id)
+
+    return {
+        'mensagens': [{
+            'id': linha.id,
+            'remetente': linha.remetente,
+            'conteudo': linha.conteudo,
+            'timestamp': linha.timestamp.strftime('%H:%M'),
+        } for linha in linhas],
+        'tem_mais': tem_mais,
+        'cursor_anterior': codificar_cursor(linhas[0].timestamp, linhas[0].id) if linhas and not depois else antes,
+        'cursor': cursor,
+    }
@@ -0,0 +1,94 @@
+# call_center_project/app/services/inactivity_scheduler.py
+from app import socketio
+from app.models import db, Usuario
+from app.services.presence_service import presence_service
+from datetime import datetime, timedelta
+import threading
+import uuid
+
+# Folga somada ao prazo para que o agente já tenha de fato passado do limite ao acordar
+FOLGA_SEGUNDOS = 0.01
+
+
+class InactivityScheduler:
+    """
+    Marca os agentes como inativos no momento em que o último heartbeat passa do limite
+    (INACTIVITY_THRESHOLD_SECONDS).
+
+    Em vez de varrer a tabela de usuários a cada 30 segundos, dorme até o próximo prazo: o
+    heartbeat mais antigo entre os agentes monitorando, mantido pelo presence_service (um heap
+    em memória ou um sorted set no Redis). Todos os workers iniciam o agendador, mas só o
+    líder (eleito por uma chave com TTL no backend de presença) faz as transições; os demais
+    só tentam assumir a liderança a cada terço do TTL.
+    """
+
+    def init_app(self, app):
+        app.extensions['inactivity_scheduler'] = {
+            'id': uuid.uuid4().hex,
+            'lider': False,
+            'tarefa': None,
+            'lock': threading.Lock()
+        }
+
+    def _estado(self, app):
+        return app.extensions['inactivity_scheduler']
+
+    def iniciar(self, app):
+        """Inicia o agendador neste worker (uma vez por app); chamado no primeiro heartbeat recebido."""
+        estado = self._estado(app)
+        if estado['tarefa'] or not app.config.get('INACTIVITY_SCHEDULER_ENABLED', True):
+            return
+        with estado['lock']:
+            if estado['tarefa']:
+                return
+            estado['tarefa'] = socketio.start_background_task(self._executar, app)
+
+    def _executar(self, app):
+        app.logger.info("Iniciando o agendador de inatividade dos agentes...")
+        while True:
+            with app.app_context():
+                try:
+                    espera = self.executar_ciclo(app)
+                except Exception as e:
+                    app.logger.error(f"Erro no agendador de inatividade: {e}")
+                    db.session.rollback()
+                    espera = app.config.get('INACTIVITY_LEADER_TTL_SECONDS', 30) / 3
+                finally:
+                    db.session.remove()
+            socketio.sleep(espera)
+
+    def executar_ciclo(self, app):
+        """
+        Uma volta do agendador: renova a liderança, marca os agentes que expiraram e devolve
+        quantos segundos dormir até o próximo prazo (ou até a próxima renovação da liderança).
+        Deve ser chamado dentro de um app context.
+        """
+        from app.services.realtime_service import verificar_agentes_inativos
+
+        estado = self._estado(app)
+        limite = app.config.get('INACTIVITY_THRESHOLD_SECONDS', 180)
+        renovacao = app.config.get('INACTIVITY_LEADER_TTL_SECONDS', 30) / 3
+
+        if not presence_service.tentar_lideranca(estado['id'], renovacao * 3):
+            estado['lider'] = False
+            return renovacao
+
+        if not estado['lider']:
+            # Assumiu agora: agentes que o banco ainda marca como monitorando (ex.: após um restart
+            # ou a queda do líder anterior) entram na presença com o último horário gravado
+            presence_service.carregar(db.session.query(
+                Usuario.id, Usuario.empresa_id, Usuario.last_agent_activity
+            ).filter(Usuario.is_monitoring == True).all())
+            db.session.commit()
+            estado['lider'] = True
+
+        verificar_agentes_inativos()
+
+        proximo = presence_service.proximo_heartbeat()
+        if proximo is None:
+            return renovacao
+        prazo = (proximo + timedelta(seconds=limite) - datetime.utcnow()).total_seconds()
+        return min(max(prazo, 0) + FOLGA_SEGUNDOS, renovacao)
+
+
+inactivity_scheduler = InactivityScheduler()
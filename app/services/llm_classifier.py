@@ -0,0 +1,255 @@
+# call_center_project/app/services/llm_classifier.py
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from app.services.classification_cache import chave_classificacao
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROMPT_PADRAO = """
+Você é um analista de produtividade de um call center. Analise cada atividade da lista e classifique-a.
+Contexto: O trabalho envolve atender clientes, usar CRM, comunicar via Slack/Email. WhatsApp Business é produtivo. Redes sociais são improdutivas.
+"""
+
+INSTRUCOES_DE_RESPOSTA = """
+Atividades (uma por linha, em JSON):
+{atividades}
+Responda APENAS em JSON com a chave "resultados": uma lista com um objeto por atividade, contendo
+"id" (o mesmo id da atividade), "is_productive" (true, false, ou null para neutro), "category" (uma palavra) e "reason" (frase curta).
+"""
+
+
+def resultado_fallback(motivo):
+    """Resultado usado quando a IA falha; a chave "error" impede que ele vá para o cache."""
+    return {"is_productive": None, "category": "Não Classificado", "reason": motivo, "error": motivo}
+
+
+def _resolver(futuro, resultado):
+    """Entrega o resultado, a menos que o futuro já tenha sido resolvido (ex.: pelo fallback de _descarregar)."""
+    try:
+        futuro.set_result(resultado)
+    except InvalidStateError:
+        pass
+
+
+class CircuitBreaker:
+    """
+    Abre após `limite_falhas` chamadas seguidas com erro. Aberto, recusa chamadas por
+    `tempo_reabertura` segundos; depois deixa uma chamada de teste passar (meio-aberto).
+    """
+
+    def __init__(self, limite_falhas=5, tempo_reabertura=60):
+        self.limite_falhas = limite_falhas
+        self.tempo_reabertura = tempo_reabertura
+        self._falhas = 0
+        self._aberto_ate = None
+        self._testando = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        with self._lock:
+            if self._aberto_ate is None:
+                return 'fechado'
+            return 'aberto' if time.monotonic() < self._aberto_ate else 'meio-aberto'
+
+    def permitir(self):
+        with self._lock:
+            if self._aberto_ate is None:
+                return True
+            if time.monotonic() < self._aberto_ate or self._testando:
+                return False
+            self._testando = True
+            return True
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._aberto_ate = None
+            self._testando = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            self._testando = False
+            if self._aberto_ate is not None or self._falhas >= self.limite_falhas:
+                self._aberto_ate = time.monotonic() + self.tempo_reabertura
+
+
+class BatchingLLMClassifier:
+    """
+    Classificador por IA que agrupa as atividades ainda não classificadas.
+
+    As atividades submetidas (de vários agentes e workers) são acumuladas durante uma janela
+    curta e enviadas em prompts com várias atividades cada (uma requisição por empresa/versão
+    das regras e por bloco de até `max_itens` atividades). As chamadas rodam com concorrência
+    limitada, timeout, novas tentativas com backoff exponencial e circuit breaker; em caso de
+    falha a atividade recebe "Não Classificado".
+    """
+
+    def __init__(self):
+        self.client = None
+        self.modelo = 'gpt-4-turbo'
+        self.janela = 0.5
+        self.max_itens = 20
+        self.tentativas = 2
+        self.backoff = 0.5
+        self.timeout_resultado = 90
+        self.breaker = CircuitBreaker()
+        self._executor = None
+        self._pendentes = []  # [(chave_agrupamento, chave_atividade, activity_data, rules, Future)]
+        self._lock = threading.Lock()
+        self._agendado = False
+
+    def init_app(self, app):
+        import openai
+        api_key = app.config.get('OPENAI_API_KEY')
+        self.client = openai.OpenAI(
+            api_key=api_key, base_url=app.config.get('LLM_BASE_URL'),
+            timeout=app.config.get('LLM_TIMEOUT_SECONDS', 20), max_retries=0
+        ) if api_key else None
+        self.modelo = app.config.get('LLM_MODEL', self.modelo)
+        self.janela = app.config.get('LLM_BATCH_WINDOW_SECONDS', self.janela)
+        self.max_itens = app.config.get('LLM_BATCH_MAX_ITEMS', self.max_itens)
+        self.tentativas = app.config.get('LLM_MAX_RETRIES', self.tentativas)
+        self.backoff = app.config.get('LLM_RETRY_BACKOFF_SECONDS', self.backoff)
+        self.timeout_resultado = app.config.get('LLM_RESULT_TIMEOUT_SECONDS', self.timeout_resultado)
+        self.breaker = CircuitBreaker(
+            app.config.get('LLM_CIRCUIT_FAILURE_THRESHOLD', 5), app.config.get('LLM_CIRCUIT_RESET_SECONDS', 60)
+        )
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(
+            max_workers=app.config.get('LLM_MAX_CONCURRENCY', 4), thread_name_prefix='llm-classifier'
+        )
+
+    def submeter(self, activity_data, rules):
+        """Agenda a classificação de uma atividade e devolve um Future com o resultado."""
+        futuro = Future()
+        agrupamento = (rules.get('empresa_id'), rules.get('versao'))
+        with self._lock:
+            self._pendentes.append((agrupamento, chave_classificacao(activity_data), activity_data, rules, futuro))
+            agendar = not self._agendado
+            self._agendado = True
+        if agendar:
+            threading.Timer(self.janela, self._descarregar).start()
+        return futuro
+
+    def classificar(self, itens):
+        """
+        Classifica uma lista de (activity_data, rules), na mesma ordem, esperando os resultados por
+        até `timeout_resultado` segundos no total; os que não chegarem a tempo ficam como "Não Classificado".
+        """
+        futuros = [self.submeter(activity_data, rules) for activity_data, rules in itens]
+        prazo = time.monotonic() + self.timeout_resultado
+        resultados, esgotados = [], 0
+        for futuro in futuros:
+            try:
+                resultados.append(futuro.result(timeout=max(0, prazo - time.monotonic())))
+            except FuturesTimeoutError:
+                esgotados += 1
+                resultados.append(resultado_fallback("Tempo esgotado aguardando a classificação por IA."))
+        if esgotados:
+            logger.warning(f"{esgotados} atividades sem classificação após {self.timeout_resultado}s de espera")
+        return resultados
+
+    def _descarregar(self):
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, []
+            self._agendado = False
+
+        # Roda em um threading.Timer: um erro aqui (ex.: pool encerrado por um novo init_app) não
+        # pode deixar os futuros sem resultado
+        try:
+            # Agrupa por empresa/versão (o prompt pode ser personalizado) e remove atividades repetidas
+            grupos = {}
+            for agrupamento, chave, activity_data, rules, futuro in pendentes:
+                grupo = grupos.setdefault(agrupamento, {'rules': rules, 'atividades': {}})
+                grupo['atividades'].setdefault(chave, (activity_data, []))[1].append(futuro)
+
+            for grupo in grupos.values():
+                atividades = list(grupo['atividades'].values())
+                for inicio in range(0, len(atividades), self.max_itens):
+                    bloco = atividades[inicio:inicio + self.max_itens]
+                    self._executor.submit(self._processar_bloco, bloco, grupo['rules'])
+        except Exception as e:
+            logger.error(f"Erro ao despachar {len(pendentes)} atividades para o classificador em lote: {e}")
+            for *_, futuro in pendentes:
+                _resolver(futuro, resultado_fallback("Erro na classificação por IA."))
+
+    def _processar_bloco(self, bloco, rules):
+        try:
+            resultados = self._classificar_bloco([activity_data for activity_data, _ in bloco], rules)
+        except Exception as e:
+            logger.error(f"Erro inesperado no classificador em lote: {e}")
+            resultados = [resultado_fallback("Erro na classificação por IA.")] * len(bloco)
+        for (_, futuros), resultado in zip(bloco, resultados):
+            for futuro in futuros:
+                _resolver(futuro, resultado)
+
+    def _classificar_bloco(self, atividades, rules):
+        if self.client is None:
+            return [{"is_productive": None, "category": "Não Classificado", "reason": "IA não configurada."}] * len(atividades)
+        if not self.breaker.permitir():
+            return [resultado_fallback("IA indisponível (circuit breaker aberto).")] * len(atividades)
+
+        prompt = self._montar_prompt(atividades, rules)
+        espera = self.backoff
+        for tentativa in range(self.tentativas + 1):
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.modelo,
+                    messages=[{"role": "user", "content": prompt}],
+                    response_format={"type": "json_object"}
+                )
+                resultados = self._interpretar(response.choices[0].message.content, len(atividades))
+                self.breaker.registrar_sucesso()
+                return resultados
+            except Exception as e:
+                logger.warning(f"Erro na API de IA (tentativa {tentativa + 1}/{self.tentativas + 1}): {e}")
+                if tentativa < self.tentativas:
+                    time.sleep(espera)
+                    espera *= 2
+        self.breaker.registrar_falha()
+        return [resultado_fallback("Erro na classificação por IA.")] * len(atividades)
+
+    @staticmethod
+    def _montar_prompt(atividades, rules):
+        prompt = PROMPT_PADRAO
+        if rules.get('custom_ai_prompt'):
+            # O prompt personalizado foi escrito para uma atividade; os campos apontam para a lista
+            try:
+                prompt = rules['custom_ai_prompt'].format(
+                    window_title='(ver lista)', process_name='(ver lista)', url='(ver lista)'
+                )
+            except (KeyError, IndexError, ValueError):
+                prompt = rules['custom_ai_prompt']
+        linhas = [
+            json.dumps({
+                "id": i,
+                "titulo": a.get('window_title') or 'N/A',
+                "processo": a.get('process_name') or 'N/A',
+                "url": a.get('url') or 'N/A'
+            }, ensure_ascii=False)
+            for i, a in enumerate(atividades)
+        ]
+        return prompt + INSTRUCOES_DE_RESPOSTA.format(atividades='\n'.join(linhas))
+
+    @staticmethod
+    def _interpretar(conteudo, quantidade):
+        """Associa cada resultado à atividade de origem pelo id; ids ausentes ficam como "Não Classificado"."""
+        resultados = [resultado_fallback("A IA não retornou esta atividade.")] * quantidade
+        for item in json.loads(conteudo).get('resultados', []):
+            indice = item.get('id')
+            if isinstance(indice, int) and 0 <= indice < quantidade:
+                resultados[indice] = {
+                    "is_productive": item.get('is_productive'),
+                    "category": item.get('category') or 'Não Classificado',
+                    "reason": item.get('reason', '')
+                }
+        return resultados
+
+
+llm_classifier = BatchingLLMClassifier()
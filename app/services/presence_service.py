@@ -0,0 +1,428 @@
+# call_center_project/app/services/presence_service.py
+from app import socketio
+from app.models import db, Usuario
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update, bindparam, or_
+import heapq
+import threading
+
+EPOCA = datetime(1970, 1, 1)
+
+
+def _segundos(quando):
+    """Datetime UTC (naive) -> segundos desde a época, usado como score no Redis."""
+    return (quando - EPOCA).total_seconds() if quando else 0
+
+
+# --- Backends de presença ---
+# Cada backend guarda as sessões web (SIDs do Socket.IO) e os heartbeats do agente de desktop
+# e expõe a mesma interface. O índice reverso SID -> (usuário, empresa) torna o disconnect O(1)
+# e dispensa a consulta ao banco.
+
+class InMemoryPresenceBackend:
+    """Presença no próprio processo (desenvolvimento / um único worker do gunicorn)."""
+
+    def __init__(self, ttl_desktop=3600):
+        self.ttl_desktop = ttl_desktop
+        self._lock = threading.Lock()
+        self._sids = {}          # {usuario_id: set(sid)}
+        self._sid_usuario = {}   # {sid: (usuario_id, empresa_id)}
+        self._desktop = {}       # {usuario_id: {'empresa_id': int, 'ultimo': datetime, 'monitorando': bool}}
+        self._pendentes = {}     # {usuario_id: datetime} -- heartbeats ainda não gravados no banco
+        # Heap (ultimo, usuario_id) dos agentes monitorando; entradas antigas são descartadas ao chegar ao topo
+        self._prazos = []
+
+    # Sessões web
+    def adicionar_sid(self, usuario_id, sid, empresa_id=None):
+        with self._lock:
+            self._sids.setdefault(usuario_id, set()).add(sid)
+            self._sid_usuario[sid] = (usuario_id, empresa_id)
+            return len(self._sids[usuario_id])
+
+    def remover_sid(self, sid):
+        """
+        Remove a sessão e devolve (usuario_id, empresa_id, sessões restantes);
+        usuario_id é None se o SID não existir.
+        """
+        with self._lock:
+            usuario_id, empresa_id = self._sid_usuario.pop(sid, (None, None))
+            if usuario_id is None:
+                return None, None, 0
+            sids = self._sids.get(usuario_id, set())
+            sids.discard(sid)
+            if not sids:
+                self._sids.pop(usuario_id, None)
+            return usuario_id, empresa_id, len(sids)
+
+    def total_sids(self, usuario_id):
+        with self._lock:
+            return len(self._sids.get(usuario_id, ()))
+
+    # Agente de desktop
+    def registrar_heartbeat(self, usuario_id, empresa_id, quando):
+        with self._lock:
+            atual = self._desktop.get(usuario_id)
+            if atual and atual['ultimo'] and atual['ultimo'] > quando:
+                quando = atual['ultimo']
+            self._desktop[usuario_id] = {'empresa_id': empresa_id, 'ultimo': quando, 'monitorando': True}
+            self._pendentes[usuario_id] = quando
+            heapq.heappush(self._prazos, (quando, usuario_id))
+
+    def status_desktop(self, usuario_id):
+        with self._lock:
+            agente = self._desktop.get(usuario_id)
+            if not agente or (agente['ultimo'] and agente['ultimo'] < datetime.utcnow() - timedelta(seconds=self.ttl_desktop)):
+                return {'monitoring': False, 'last_seen': None}
+            return {'monitoring': agente['monitorando'], 'last_seen': agente['ultimo']}
+
+    def carregar(self, agentes):
+        with self._lock:
+            for usuario_id, empresa_id, ultimo in agentes:
+                atual = self._desktop.get(usuario_id)
+                if atual is None or (ultimo and (atual['ultimo'] is None or atual['ultimo'] < ultimo)):
+                    self._desktop[usuario_id] = {'empresa_id': empresa_id, 'ultimo': ultimo, 'monitorando': True}
+                    heapq.heappush(self._prazos, (ultimo or EPOCA, usuario_id))
+
+    def _vigente(self, entrada):
+        """A entrada do heap ainda é o último heartbeat de um agente monitorando?"""
+        quando, usuario_id = entrada
+        agente = self._desktop.get(usuario_id)
+        return bool(agente and agente['monitorando'] and (agente['ultimo'] or EPOCA) == quando)
+
+    def _limpar_topo(self):
+        while self._prazos and not self._vigente(self._prazos[0]):
+            heapq.heappop(self._prazos)
+
+    def proximo_heartbeat(self):
+        with self._lock:
+            self._limpar_topo()
+            return self._prazos[0][0] if self._prazos else None
+
+    def expirados(self, limite):
+        with self._lock:
+            self._limpar_topo()
+            expirados, vigentes = {}, []
+            while self._prazos and self._prazos[0][0] < limite:
+                entrada = heapq.heappop(self._prazos)
+                if self._vigente(entrada) and entrada[1] not in expirados:
+                    expirados[entrada[1]] = self._desktop[entrada[1]]['empresa_id']
+                    vigentes.append(entrada)
+            # Continuam no heap até serem marcados como inativos (ou receberem novo heartbeat)
+            for entrada in vigentes:
+                heapq.heappush(self._prazos, entrada)
+            return expirados
+
+    def marcar_inativos(self, usuario_ids):
+        with self._lock:
+            for usuario_id in usuario_ids:
+                agente = self._desktop.get(usuario_id)
+                if agente:
+                    agente['monitorando'] = False
+
+    def tentar_lideranca(self, candidato, ttl):
+        # Um único processo: ele é sempre o líder
+        return True
+
+    def retirar_pendentes(self):
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, {}
+            return pendentes
+
+    def devolver_pendentes(self, pendentes):
+        """Devolve heartbeats que não puderam ser gravados, sem sobrescrever os mais novos."""
+        with self._lock:
+            for usuario_id, ultimo in pendentes.items():
+                if self._pendentes.get(usuario_id, ultimo) <= ultimo:
+                    self._pendentes[usuario_id] = ultimo
+
+
+class RedisPresenceBackend:
+    """
+    Presença compartilhada entre workers/nós no Redis.
+
+    Chaves (com o prefixo configurado):
+      web:{usuario_id}   SET com os SIDs abertos do usuário (SADD / SREM atômicos)
+      sid:{sid}          "usuario_id:empresa_id" do SID (índice reverso, expira em `ttl_sid`)
+      desktop:{id}       HASH empresa_id / ultimo / monitorando, que expira após `ttl_desktop` sem heartbeats
+      desktop:prazos     ZSET dos agentes monitorando, com o horário do último heartbeat como score
+      desktop:pendentes  HASH usuario_id -> último heartbeat ainda não gravado no banco
+      lider:inatividade  id do worker que roda o agendador de inatividade (expira em `ttl`)
+    """
+
+    def __init__(self, client, prefixo='presence:', ttl_desktop=3600, ttl_sid=86400):
+        self.client = client
+        self.prefixo = prefixo
+        self.ttl_desktop = ttl_desktop
+        self.ttl_sid = ttl_sid
+
+    def _k(self, *partes):
+        return self.prefixo + ':'.join(str(p) for p in partes)
+
+    # Sessões web
+    def adicionar_sid(self, usuario_id, sid, empresa_id=None):
+        pipe = self.client.pipeline()
+        pipe.sadd(self._k('web', usuario_id), sid)
+        pipe.set(self._k('sid', sid), f"{usuario_id}:{empresa_id or ''}", ex=self.ttl_sid)
+        pipe.scard(self._k('web', usuario_id))
+        return pipe.execute()[-1]
+
+    def remover_sid(self, sid):
+        pipe = self.client.pipeline()
+        pipe.get(self._k('sid', sid))
+        pipe.delete(self._k('sid', sid))
+        metadados = pipe.execute()[0]
+        if metadados is None:
+            return None, None, 0
+        usuario_id, empresa_id = metadados.decode().split(':')
+        usuario_id, empresa_id = int(usuario_id), int(empresa_id) if empresa_id else None
+        pipe = self.client.pipeline()
+        pipe.srem(self._k('web', usuario_id), sid)
+        pipe.scard(self._k('web', usuario_id))
+        return usuario_id, empresa_id, pipe.execute()[-1]
+
+    def total_sids(self, usuario_id):
+        return self.client.scard(self._k('web', usuario_id))
+
+    # Agente de desktop
+    def registrar_heartbeat(self, usuario_id, empresa_id, quando):
+        chave = self._k('desktop', usuario_id)
+
+        # Como no backend em memória, `ultimo` e a entrada pendente nunca voltam no tempo: um heartbeat
+        # atrasado grava o último já conhecido. WATCH no HASH do agente torna a comparação e a escrita
+        # um passo só (a transação é refeita se outro worker alterar o HASH no meio).
+        def _gravar(pipe):
+            atual = pipe.hget(chave, 'ultimo')
+            ultimo = max(quando, datetime.fromisoformat(atual.decode())) if atual else quando
+            pipe.multi()
+            pipe.hset(chave, mapping={'empresa_id': empresa_id, 'ultimo': ultimo.isoformat(), 'monitorando': '1'})
+            pipe.expire(chave, self.ttl_desktop)
+            pipe.zadd(self._k('desktop', 'prazos'), {usuario_id: _segundos(ultimo)}, gt=True)
+            pipe.hset(self._k('desktop', 'pendentes'), usuario_id, ultimo.isoformat())
+
+        self.client.transaction(_gravar, chave)
+
+    def status_desktop(self, usuario_id):
+        dados = self.client.hgetall(self._k('desktop', usuario_id))
+        if not dados:
+            return {'monitoring': False, 'last_seen': None}
+        ultimo = dados.get(b'ultimo')
+        return {
+            'monitoring': dados.get(b'monitorando') == b'1',
+            'last_seen': datetime.fromisoformat(ultimo.decode()) if ultimo else None
+        }
+
+    def carregar(self, agentes):
+        pipe = self.client.pipeline()
+        for usuario_id, empresa_id, ultimo in agentes:
+            chave = self._k('desktop', usuario_id)
+            pipe.hset(chave, mapping={'empresa_id': empresa_id, 'monitorando': '1'})
+            if ultimo:
+                pipe.hsetnx(chave, 'ultimo', ultimo.isoformat())
+            pipe.expire(chave, self.ttl_desktop)
+            pipe.zadd(self._k('desktop', 'prazos'), {usuario_id: _segundos(ultimo)}, gt=True)
+        pipe.execute()
+
+    def expirados(self, limite):
+        ids = [int(i) for i in self.client.zrangebyscore(self._k('desktop', 'prazos'), '-inf', f'({_segundos(limite)}')]
+        if not ids:
+            return {}
+        pipe = self.client.pipeline()
+        for usuario_id in ids:
+            pipe.hget(self._k('desktop', usuario_id), 'empresa_id')
+        return {usuario_id: int(e) if e else None for usuario_id, e in zip(ids, pipe.execute())}
+
+    def proximo_heartbeat(self):
+        primeiro = self.client.zrange(self._k('desktop', 'prazos'), 0, 0, withscores=True)
+        return EPOCA + timedelta(seconds=primeiro[0][1]) if primeiro else None
+
+    def tentar_lideranca(self, candidato, ttl):
+        chave = self._k('lider', 'inatividade')
+        if self.client.set(chave, candidato, nx=True, px=int(ttl * 1000)):
+            return True
+        # Já é o líder: renova o mandato. GET + PEXPIRE não é atômico; no pior caso (worker travado
+        # por mais que o TTL) dois líderes coexistem por um ciclo, e as transições são idempotentes.
+        if self.client.get(chave) == candidato.encode():
+            self.client.pexpire(chave, int(ttl * 1000))
+            return True
+        return False
+
+    def marcar_inativos(self, usuario_ids):
+        if not usuario_ids:
+            return
+        pipe = self.client.pipeline()
+        pipe.zrem(self._k('desktop', 'prazos'), *usuario_ids)
+        for usuario_id in usuario_ids:
+            # Só altera o HASH se ele ainda existir (para não recriá-lo sem TTL)
+            if self.client.exists(self._k('desktop', usuario_id)):
+                pipe.hset(self._k('desktop', usuario_id), 'monitorando', '0')
+        pipe.execute()
+
+    def retirar_pendentes(self):
+        # Leitura e remoção na mesma transação (MULTI/EXEC): nenhum heartbeat se perde entre as duas
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hgetall(self._k('desktop', 'pendentes'))
+        pipe.delete(self._k('desktop', 'pendentes'))
+        dados = pipe.execute()[0]
+        return {int(k): datetime.fromisoformat(v.decode()) for k, v in dados.items()}
+
+    def devolver_pendentes(self, pendentes):
+        """Devolve heartbeats que não puderam ser gravados, sem sobrescrever os mais novos."""
+        if not pendentes:
+            return
+        chave = self._k('desktop', 'pendentes')
+        usuario_ids = list(pendentes)
+
+        # Mesma comparação do registrar_heartbeat: um heartbeat que chegou depois do retirar_pendentes
+        # já está no HASH e é mais novo que o devolvido
+        def _devolver(pipe):
+            atuais = pipe.hmget(chave, usuario_ids)
+            devolvidos = {
+                usuario_id: pendentes[usuario_id].isoformat()
+                for usuario_id, atual in zip(usuario_ids, atuais)
+                if atual is None or datetime.fromisoformat(atual.decode()) <= pendentes[usuario_id]
+            }
+            pipe.multi()
+            if devolvidos:
+                pipe.hset(chave, mapping=devolvidos)
+
+        self.client.transaction(_devolver, chave)
+
+
+def _criar_backend(app):
+    tipo = app.config.get('PRESENCE_BACKEND', 'memoria')
+    ttl_desktop = app.config.get('PRESENCE_DESKTOP_TTL_SECONDS', 3600)
+    if tipo == 'redis':
+        from redis import Redis
+        return RedisPresenceBackend(Redis.from_url(app.config['REDIS_URL']), ttl_desktop=ttl_desktop)
+    if tipo == 'memoria':
+        return InMemoryPresenceBackend(ttl_desktop=ttl_desktop)
+    raise ValueError(f"Backend de presença desconhecido: {tipo}")
+
+
+class PresenceService:
+    """
+    Presença dos usuários: sessões web abertas (SIDs do Socket.IO) e heartbeats do agente de desktop.
+
+    O backend é configurável (PRESENCE_BACKEND): em memória, para um único processo, ou Redis,
+    compartilhado entre os workers. Os heartbeats não atualizam a linha do usuário a cada envio:
+    Usuario.last_agent_activity é gravado em UPDATEs em lote a cada PRESENCE_FLUSH_INTERVAL_SECONDS;
+    só as transições (voltou a monitorar / ficou inativo) continuam sendo gravadas na hora.
+    O verificador de inatividade lê daqui, sem varrer a tabela.
+    """
+
+    def init_app(self, app):
+        app.extensions['presence'] = {
+            'backend': _criar_backend(app),
+            'lock': threading.Lock(),
+            'flusher': None
+        }
+
+    def _estado(self, app=None):
+        return (app or current_app).extensions['presence']
+
+    def _backend(self, app=None):
+        return self._estado(app)['backend']
+
+    # --- Sessões web ---
+    def adicionar_sid(self, usuario_id, sid, empresa_id=None):
+        """Registra uma conexão Socket.IO do usuário (e a empresa dele) e devolve o total de conexões do usuário."""
+        return self._backend().adicionar_sid(usuario_id, sid, empresa_id)
+
+    def remover_sid(self, sid):
+        """
+        Remove a conexão e devolve (usuario_id, empresa_id, conexões restantes) em tempo
+        constante, sem percorrer os usuários nem consultar o banco.
+        """
+        return self._backend().remover_sid(sid)
+
+    def online_web(self, usuario_id):
+        return self._backend().total_sids(usuario_id) > 0
+
+    # --- Agente de desktop ---
+    def registrar_heartbeat(self, usuario_id, empresa_id, quando):
+        """Registra que o agente enviou dados em `quando`. Deve ser chamado dentro de um app context."""
+        app = current_app._get_current_object()
+        self._backend(app).registrar_heartbeat(usuario_id, empresa_id, quando)
+        self._iniciar_flusher(app)
+        from app.services.inactivity_scheduler import inactivity_scheduler
+        inactivity_scheduler.iniciar(app)
+
+    def status_desktop(self, usuario_id):
+        """{'monitoring': bool, 'last_seen': datetime | None} do agente de desktop."""
+        return self._backend().status_desktop(usuario_id)
+
+    def ultimo_heartbeat(self, usuario_id):
+        return self.status_desktop(usuario_id)['last_seen']
+
+    def carregar(self, agentes):
+        """
+        Preenche a presença com (usuario_id, empresa_id, ultimo) de agentes que o banco marca como
+        monitorando. Só substitui o que já existe aqui quando o horário do banco é mais recente.
+        """
+        self._backend().carregar(agentes)
+
+    def expirados(self, limite):
+        """Agentes marcados como monitorando cujo último heartbeat é anterior a `limite`: {usuario_id: empresa_id}."""
+        return self._backend().expirados(limite)
+
+    def proximo_heartbeat(self):
+        """O heartbeat mais antigo entre os agentes monitorando (o próximo a expirar), ou None."""
+        return self._backend().proximo_heartbeat()
+
+    def tentar_lideranca(self, candidato, ttl):
+        """Tenta obter (ou renovar por `ttl` segundos) a liderança das tarefas que só um worker deve rodar."""
+        return self._backend().tentar_lideranca(candidato, ttl)
+
+    def marcar_inativos(self, usuario_ids):
+        self._backend().marcar_inativos(list(usuario_ids))
+
+    def descarregar(self, app=None):
+        """Grava os heartbeats pendentes em Usuario.last_agent_activity com um único UPDATE em lote."""
+        backend = self._backend(app)
+        pendentes = backend.retirar_pendentes()
+        if not pendentes:
+            return 0
+
+        tabela = Usuario.__table__
+        # O WHERE impede que um heartbeat mais antigo (de outro worker) volte o horário para trás
+        stmt = (
+            update(tabela)
+            .where(tabela.c.id == bindparam('b_id'))
+            .where(or_(tabela.c.last_agent_activity.is_(None), tabela.c.last_agent_activity < bindparam('b_ultimo')))
+            .values(last_agent_activity=bindparam('b_ultimo'))
+        )
+        try:
+            db.session.execute(stmt, [{'b_id': usuario_id, 'b_ultimo': ultimo} for usuario_id, ultimo in pendentes.items()])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Devolve os heartbeats para a próxima tentativa
+            backend.devolver_pendentes(pendentes)
+            raise
+        return len(pendentes)
+
+    def _iniciar_flusher(self, app):
+        """Inicia a tarefa de gravação periódica na primeira vez que um heartbeat chega neste app."""
+        estado = self._estado(app)
+        intervalo = app.config.get('PRESENCE_FLUSH_INTERVAL_SECONDS', 30)
+        if estado['flusher'] or intervalo <= 0:
+            return
+        with estado['lock']:
+            if estado['flusher']:
+                return
+            estado['flusher'] = socketio.start_background_task(self._flusher, app, intervalo)
+
+    def _flusher(self, app, intervalo):
+        while True:
+            socketio.sleep(intervalo)
+            with app.app_context():
+                try:
+                    self.descarregar(app)
+                except Exception as e:
+                    app.logger.error(f"Erro ao gravar os heartbeats dos agentes: {e}")
+                finally:
+                    db.session.remove()
+
+
+presence_service = PresenceService()
@@ -0,0 +1,378 @@
+# call_center_project/app/services/productivity_ingestion_service.py
+from app import socketio
+from app.models import db, Usuario, ActivityLog, ProductivityRules, INTERVALO_AMOSTRA_LEGADO
+from app.services.ai_productivity_service import ai_productivity_service, montar_regras
+from app.services.presence_service import presence_service
+from app.services.realtime_service import notify_dashboard_update, dashboard_invalidator
+from app.services.produtividade_rollup_service import acumular_span, aplicar_deltas
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import insert, update, select, func, tuple_, bindparam, text
+import json
+import queue
+import threading
+
+
+# --- Backends da fila ---
+# Cada backend guarda itens serializáveis em JSON e expõe put(item), get_batch(max_itens, timeout)
+# e descartar(item), que guarda à parte (para análise) um item que esgotou as tentativas.
+
+class InProcessQueueBackend:
+    """Fila em memória do próprio processo (desenvolvimento / um único worker do gunicorn)."""
+
+    def __init__(self):
+        self._fila = queue.Queue()
+        self.descartados = []
+
+    def put(self, item):
+        self._fila.put(json.dumps(item))
+
+    def descartar(self, item):
+        self.descartados.append(item)
+
+    def get_batch(self, max_itens, timeout):
+        """Espera até `timeout` segundos pelo primeiro item e devolve até `max_itens` itens."""
+        try:
+            itens = [self._fila.get(timeout=timeout) if timeout else self._fila.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(itens) < max_itens:
+            try:
+                itens.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return [json.loads(i) for i in itens]
+
+
+class RedisQueueBackend:
+    """Fila compartilhada entre processos/nós, em uma lista do Redis (RPUSH / BLPOP)."""
+
+    def __init__(self, client, key='productivity:logs'):
+        self.client = client
+        self.key = key
+
+    def put(self, item):
+        self.client.rpush(self.key, json.dumps(item))
+
+    def descartar(self, item):
+        self.client.rpush(f'{self.key}:descartados', json.dumps(item))
+
+    def get_batch(self, max_itens, timeout):
+        if timeout:
+            primeiro = self.client.blpop(self.key, timeout=timeout)
+            if not primeiro:
+                return []
+            itens = [primeiro[1]]
+        else:
+            itens = self.client.lpop(self.key, 1) or []
+            if not itens:
+                return []
+        if max_itens > 1:
+            itens.extend(self.client.lpop(self.key, max_itens - 1) or [])
+        return [json.loads(i) for i in itens]
+
+
+def _criar_backend(app):
+    tipo = app.config.get('PRODUCTIVITY_QUEUE_BACKEND', 'memoria')
+    if tipo == 'redis':
+        from redis import Redis
+        return RedisQueueBackend(Redis.from_url(app.config['REDIS_URL']))
+    if tipo == 'memoria':
+        return InProcessQueueBackend()
+    raise ValueError(f"Backend de fila desconhecido: {tipo}")
+
+
+class ProductivityIngestionService:
+    """
+    Recebe os logs do agente de desktop fora do caminho da requisição.
+
+    O endpoint apenas valida e enfileira o log; um pool de workers drena a fila em lotes
+    e faz a classificação (regras / IA), a gravação dos ActivityLog (amostras consecutivas
+    idênticas viram um span, estendido no lugar enquanto a atividade continua) e as
+    notificações em tempo real.
+    """
+
+    def init_app(self, app):
+        app.extensions['productivity_ingestion'] = {
+            'backend': _criar_backend(app),
+            'workers': [],
+            'lock': threading.Lock()
+        }
+
+    def _estado(self, app=None):
+        return (app or current_app).extensions['productivity_ingestion']
+
+    def enfileirar(self, agente, amostras):
+        """
+        Enfileira as amostras de atividade enviadas pelo agente (uma requisição vira um item da fila).
+        Deve ser chamado dentro de uma requisição, com as amostras já validadas.
+        """
+        app = current_app._get_current_object()
+        self._estado(app)['backend'].put({
+            'usuario_id': agente.id,
+            'empresa_id': agente.empresa_id,
+            'recebido_em': datetime.utcnow().isoformat(),
+            'amostras': amostras
+        })
+        self._iniciar_workers(app)
+
+    def _iniciar_workers(self, app):
+        """Inicia o pool de workers na primeira vez que algo é enfileirado neste app."""
+        estado = self._estado(app)
+        if estado['workers']:
+            return
+        with estado['lock']:
+            if estado['workers']:
+                return
+            for _ in range(app.config.get('PRODUCTIVITY_QUEUE_WORKERS', 2)):
+                estado['workers'].append(socketio.start_background_task(self._worker, app))
+
+    def _worker(self, app):
+        backend = self._estado(app)['backend']
+        tamanho_lote = app.config.get('PRODUCTIVITY_QUEUE_BATCH_SIZE', 100)
+        espera_inicial = app.config.get('PRODUCTIVITY_QUEUE_RETRY_BACKOFF_SECONDS', 1)
+        espera_maxima = app.config.get('PRODUCTIVITY_QUEUE_MAX_BACKOFF_SECONDS', 30)
+        espera = espera_inicial
+        while True:
+            # Um erro da fila (Redis fora do ar) ou do banco não pode encerrar o worker: ele espera,
+            # cada vez mais, e tenta de novo
+            try:
+                itens = backend.get_batch(tamanho_lote, timeout=1)
+                if not itens or self.processar_lote(app, itens):
+                    espera = espera_inicial
+                    continue
+            except Exception as e:
+                app.logger.error(f"Erro no worker da fila de produtividade: {e}")
+            socketio.sleep(espera)
+            espera = min(espera * 2, espera_maxima)
+
+    def drenar(self, app):
+        """Processa, na thread atual, tudo o que estiver na fila (usado em testes e no shutdown)."""
+        backend = self._estado(app)['backend']
+        tamanho_lote = app.config.get('PRODUCTIVITY_QUEUE_BATCH_SIZE', 100)
+        while True:
+            itens = backend.get_batch(tamanho_lote, timeout=0)
+            if not itens:
+                return
+            self.processar_lote(app, itens)
+
+    def processar_lote(self, app, itens):
+        """
+        Classifica e grava um lote de logs em uma única transação e emite as notificações.
+        Se a gravação falhar, os itens voltam para a fila (ou são descartados depois de
+        PRODUCTIVITY_QUEUE_MAX_ATTEMPTS tentativas) e devolve False.
+        """
+        with app.app_context():
+            try:
+                notificacoes, voltaram = self._gravar_lote(itens)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Erro ao processar lote de {len(itens)} logs de produtividade: {e}")
+                self._devolver(app, itens)
+                return False
+            finally:
+                db.session.remove()
+
+            for empresa_id, realtime_data in notificacoes:
+                notify_dashboard_update(empresa_id, realtime_data)
+            # Agentes que voltaram a monitorar mudam a lista de agentes do dashboard
+            for empresa_id, agente_ids in voltaram.items():
+                dashboard_invalidator.invalidar(empresa_id, agentes=agente_ids)
+
+            # Notifica sobre o STATUS (confirma que o desktop está enviando dados), uma vez por agente
+            from app.socket_events import update_desktop_agent_status
+            for usuario_id, empresa_id in {(item['usuario_id'], item['empresa_id']) for item in itens}:
+                update_desktop_agent_status(usuario_id, True, empresa_id=empresa_id)
+        return True
+
+    def _devolver(self, app, itens):
+        """Recoloca na fila os itens de um lote que falhou; os que esgotaram as tentativas são descartados."""
+        backend = self._estado(app)['backend']
+        maximo = app.config.get('PRODUCTIVITY_QUEUE_MAX_ATTEMPTS', 5)
+        descartados = 0
+        for item in itens:
+            item = {**item, 'tentativas': item.get('tentativas', 0) + 1}
+            if item['tentativas'] >= maximo:
+                backend.descartar(item)
+                descartados += 1
+            else:
+                backend.put(item)
+        if descartados:
+            app.logger.error(f"{descartados} logs de produtividade descartados depois de {maximo} tentativas")
+
+    def _gravar_lote(self, itens):
+        empresa_ids = {item['empresa_id'] for item in itens}
+        usuario_ids = {item['usuario_id'] for item in itens}
+
+        # Regras das empresas do lote em uma consulta; a conexão é liberada antes da classificação,
+        # que pode esperar pela IA
+        registros = {r.empresa_id: r for r in ProductivityRules.query.filter(ProductivityRules.empresa_id.in_(empresa_ids))}
+        regras = {empresa_id: montar_regras(registros.get(empresa_id), empresa_id) for empresa_id in empresa_ids}
+        db.session.rollback()
+
+        # Todas as amostras do lote classificadas de uma vez (a IA recebe só o que regras e cache não resolverem)
+        amostras = [(item, data) for item in itens for data in item['amostras']]
+        analises = ai_productivity_service.analyze_activities(
+            [(data, regras[item['empresa_id']]) for item, data in amostras]
+        )
+
+        agentes = {u.id: u for u in Usuario.query.filter(Usuario.id.in_(usuario_ids))}
+        voltaram = {}  # {empresa_id: [usuario_id, ...]}
+        for item in itens:
+            agente = agentes.get(item['usuario_id'])
+            if not agente:
+                continue
+            # O último "ping" vai para o presence_service (gravado no banco em lote, periodicamente)
+            recebido_em = datetime.fromisoformat(item['recebido_em'])
+            presence_service.registrar_heartbeat(agente.id, agente.empresa_id, recebido_em)
+            # A linha do usuário só é escrita na transição para "Monitorando"
+            if not agente.is_monitoring:
+                agente.is_monitoring = True
+                agente.last_agent_activity = recebido_em
+                voltaram.setdefault(agente.empresa_id, []).append(agente.id)
+            # Se o status manual dele era 'Inativo', muda para 'Disponível'
+            if agente.status_agente == 'Inativo':
+                agente.status_agente = 'Disponível'
+
+        por_agente = {}  # {usuario_id: [(timestamp, data, analysis)]}
+        ultimas = {}  # {usuario_id: (timestamp, empresa_id, realtime_data)} -- o dashboard só exibe a atividade atual
+        for (item, data), analysis in zip(amostras, analises):
+            agente = agentes.get(item['usuario_id'])
+            if not agente:
+                continue
+            timestamp = datetime.fromisoformat(data['timestamp'])
+            por_agente.setdefault(agente.id, []).append((timestamp, data, analysis))
+            if agente.id not in ultimas or ultimas[agente.id][0] <= timestamp:
+                ultimas[agente.id] = (timestamp, agente.empresa_id, {
+                    "usuario_id": agente.id,
+                    "usuario_nome": agente.nome,
+                    **data,
+                    **analysis
+                })
+
+        # Um único INSERT em lote (executemany) para os spans novos, um UPDATE em lote para os
+        # spans abertos que foram estendidos e um upsert no rollup por hora, na mesma transação
+        novos, estendidos, deltas = self._montar_spans(agentes, por_agente)
+        if novos:
+            db.session.execute(insert(ActivityLog), novos)
+        if estendidos:
+            db.session.execute(_ESTENDER_SPAN, estendidos)
+        aplicar_deltas(deltas)
+        db.session.commit()
+        return [(empresa_id, data) for _, empresa_id, data in ultimas.values()], voltaram
+
+    def _travar_agentes(self, usuario_ids):
+        """
+        Serializa por agente, entre workers e nós, a leitura do span aberto e a gravação dos spans:
+        sem isso dois lotes do mesmo agente leem o mesmo span aberto e ambos inserem um span novo
+        ou somam o mesmo trecho ao rollup. Os advisory locks são da transação (soltos no commit ou
+        rollback do lote) e pegos em ordem crescente de id, para dois lotes não se travarem mutuamente.
+        """
+        db.session.execute(_TRAVAR_AGENTES, {'classe': _CLASSE_LOCK_SPANS, 'ids': sorted(usuario_ids)})
+
+    def _spans_abertos(self, agentes, por_agente, janela):
+        """Último span de cada agente do lote (o que pode ser estendido), em uma consulta pelo índice composto."""
+        desde = min(timestamp for amostras in por_agente.values() for timestamp, _, _ in amostras) - janela
+        pares = [(agentes[usuario_id].empresa_id, usuario_id) for usuario_id in por_agente]
+        linhas = db.session.execute(
+            select(ActivityLog.id, ActivityLog.empresa_id, ActivityLog.usuario_id, ActivityLog.timestamp,
+                   ActivityLog.end_timestamp, ActivityLog.window_title, ActivityLog.process_name, ActivityLog.url,
+                   ActivityLog.is_productive, ActivityLog.category)
+            .where(tuple_(ActivityLog.empresa_id, ActivityLog.usuario_id).in_(pares), ActivityLog.timestamp >= desde)
+            .order_by(ActivityLog.usuario_id, ActivityLog.timestamp.desc())
+            .distinct(ActivityLog.usuario_id)
+        )
+        return {
+            linha.usuario_id: {
+                'id': linha.id,
+                'chave': (linha.window_title, linha.process_name, linha.url),
+                'empresa_id': linha.empresa_id,
+                'usuario_id': linha.usuario_id,
+                'timestamp': linha.timestamp,
+                'end_timestamp': linha.end_timestamp or linha.timestamp + timedelta(seconds=INTERVALO_AMOSTRA_LEGADO),
+                'sample_count': 0,
+                'is_productive': linha.is_productive,
+                'category': linha.category
+            }
+            for linha in linhas
+        }
+
+    def _montar_spans(self, agentes, por_agente):
+        """
+        Junta as amostras consecutivas idênticas (janela, processo e URL) de cada agente em spans.
+        A primeira pode estender o span aberto do agente no banco. Devolve (linhas a inserir,
+        parâmetros do UPDATE dos spans estendidos, deltas do rollup por hora).
+        """
+        if not por_agente:
+            return [], [], {}
+        intervalo = timedelta(seconds=current_app.config.get('ACTIVITY_SAMPLE_INTERVAL_SECONDS', 15))
+        maximo = timedelta(seconds=current_app.config.get('ACTIVITY_SPAN_MAX_SECONDS', 3600))
+        self._travar_agentes(por_agente)
+        abertos = self._spans_abertos(agentes, por_agente, maximo + intervalo)
+
+        novos, estendidos, deltas = [], {}, {}
+        for usuario_id, amostras in por_agente.items():
+            agente = agentes[usuario_id]
+            span = abertos.get(usuario_id)
+            for timestamp, data, analysis in sorted(amostras, key=lambda a: a[0]):
+                chave = (data.get('window_title'), data.get('process_name'), data.get('url'))
+                # Continua o span se for a mesma atividade, sem lacuna maior que uma amostra perdida
+                # e sem passar da duração máxima
+                if (span and span['chave'] == chave
+                        and span['timestamp'] <= timestamp <= span['end_timestamp'] + intervalo
+                        and timestamp + intervalo - span['timestamp'] <= maximo):
+                    anterior = span['end_timestamp']
+                    span['end_timestamp'] = max(anterior, timestamp + intervalo)
+                    span['sample_count'] += 1
+                    acumular_span(deltas, span, anterior, span['end_timestamp'], 1)
+                    if 'id' in span:
+                        estendidos[span['id']] = span
+                    continue
+                span = {
+                    "chave": chave,
+                    "usuario_id": agente.id,
+                    "empresa_id": agente.empresa_id,
+                    "timestamp": timestamp,
+                    "end_timestamp": timestamp + intervalo,
+                    "sample_count": 1,
+                    "window_title": data.get('window_title'),
+                    "process_name": data.get('process_name'),
+                    "url": data.get('url'),
+                    "is_productive": analysis.get('is_productive'),
+                    "category": analysis.get('category'),
+                    "ai_analysis": analysis
+                }
+                novos.append(span)
+                acumular_span(deltas, span, timestamp, span['end_timestamp'], 1)
+
+        agora = datetime.utcnow()
+        return (
+            [{k: v for k, v in span.items() if k != 'chave'} for span in novos],
+            [{'b_id': span['id'], 'b_timestamp': span['timestamp'], 'b_end': span['end_timestamp'],
+              'b_novas': span['sample_count'], 'b_agora': agora} for span in estendidos.values()],
+            deltas
+        )
+
+
+_tabela = ActivityLog.__table__
+
+# Advisory locks por agente (pg_advisory_xact_lock(classe, usuario_id)); a classe separa estes
+# locks de outros que usem o mesmo id
+_CLASSE_LOCK_SPANS = 1
+_TRAVAR_AGENTES = text(
+    "SELECT pg_advisory_xact_lock(:classe, id) FROM (SELECT unnest(CAST(:ids AS integer[])) AS id ORDER BY 1) AS agentes"
+)
+
+# Estende um span aberto; o timestamp no WHERE restringe a busca à partição do span
+_ESTENDER_SPAN = (
+    update(_tabela)
+    .where(_tabela.c.id == bindparam('b_id'), _tabela.c.timestamp == bindparam('b_timestamp'))
+    .values(
+        end_timestamp=func.greatest(func.coalesce(_tabela.c.end_timestamp, _tabela.c.timestamp), bindparam('b_end')),
+        sample_count=_tabela.c.sample_count + bindparam('b_novas'),
+        updated_at=bindparam('b_agora')
+    )
+)
+
+
+productivity_ingestion_service = ProductivityIngestionService()
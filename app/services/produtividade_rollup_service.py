@@ -0,0 +1,213 @@
+# call_center_project/app/services/produtividade_rollup_service.py
+from app.models import db, ProdutividadeHoraria, Usuario, INTERVALO_AMOSTRA_LEGADO
+from datetime import datetime, time, timedelta
+from flask import current_app
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+# Colunas da chave do rollup e colunas de métricas (somáveis)
+CHAVE = ('empresa_id', 'usuario_id', 'hora', 'categoria', 'classificacao')
+METRICAS = ('segundos', 'amostras')
+CLASSIFICACOES = ('produtivo', 'improdutivo', 'neutro')
+
+_tabela = ProdutividadeHoraria.__table__
+
+
+def classificacao(is_productive):
+    if is_productive is None:
+        return 'neutro'
+    return 'produtivo' if is_productive else 'improdutivo'
+
+
+def _inicio_da_hora(momento):
+    return momento.replace(minute=0, second=0, microsecond=0)
+
+
+def _por_hora(de, ate):
+    """Divide o intervalo [de, ate) pelas horas que ele cobre: [(hora, segundos)]."""
+    partes = []
+    while de < ate:
+        hora = _inicio_da_hora(de)
+        fim = min(ate, hora + timedelta(hours=1))
+        partes.append((hora, (fim - de).total_seconds()))
+        de = fim
+    return partes
+
+
+# --- Manutenção incremental (chamada pela ingestão) ---
+
+def acumular_span(deltas, span, de, ate, amostras):
+    """
+    Soma aos deltas o trecho [de, ate) de um span (novo ou estendido) e as amostras novas dele.
+    As amostras contam na hora de início do span, como na reconstrução.
+    """
+    categoria = span['category'] or ''
+    classe = classificacao(span['is_productive'])
+    base = (span['empresa_id'], span['usuario_id'])
+    for hora, segundos in _por_hora(de, ate):
+        acumulado = deltas.setdefault((*base, hora, categoria, classe), {'segundos': 0.0, 'amostras': 0})
+        acumulado['segundos'] += segundos
+    acumulado = deltas.setdefault(
+        (*base, _inicio_da_hora(span['timestamp']), categoria, classe), {'segundos': 0.0, 'amostras': 0}
+    )
+    acumulado['amostras'] += amostras
+
+
+def aplicar_deltas(deltas):
+    """
+    Soma os deltas ao rollup com um único INSERT ... ON CONFLICT DO UPDATE. As chaves vão
+    ordenadas, para que workers gravando lotes ao mesmo tempo travem as linhas na mesma ordem.
+    O upsert toma ROW EXCLUSIVE na tabela, que conflita com o lock de reconstruir_produtividade.
+    """
+    if not deltas:
+        return
+    agora = datetime.utcnow()
+    linhas = [
+        {'created_at': agora, 'updated_at': agora, **dict(zip(CHAVE, chave)), **metricas}
+        for chave, metricas in sorted(deltas.items())
+    ]
+    stmt = pg_insert(_tabela).values(linhas)
+    stmt = stmt.on_conflict_do_update(
+        constraint='uq_produtividade_horaria_chave',
+        set_={**{m: _tabela.c[m] + stmt.excluded[m] for m in METRICAS}, 'updated_at': agora}
+    )
+    db.session.execute(stmt)
+
+
+# --- Reconstrução em lote (catch-up) ---
+
+_RECONSTRUIR = """
+    INSERT INTO produtividade_horaria
+        (created_at, updated_at, empresa_id, usuario_id, hora, categoria, classificacao, segundos, amostras)
+    SELECT :agora, :agora, a.empresa_id, a.usuario_id, h.hora, COALESCE(a.category, ''),
+        CASE WHEN a.is_productive THEN 'produtivo' WHEN NOT a.is_productive THEN 'improdutivo' ELSE 'neutro' END,
+        SUM(EXTRACT(EPOCH FROM LEAST(f.fim, h.hora + INTERVAL '1 hour') - GREATEST(a."timestamp", h.hora))),
+        SUM(CASE WHEN h.hora = date_trunc('hour', a."timestamp") THEN a.sample_count ELSE 0 END)
+    FROM activity_log a
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(a.end_timestamp, a."timestamp" + make_interval(secs => :legado)) AS fim
+    ) f
+    CROSS JOIN LATERAL generate_series(
+        date_trunc('hour', a."timestamp"), f.fim - INTERVAL '1 microsecond', INTERVAL '1 hour'
+    ) AS h(hora)
+    WHERE {filtros}
+    GROUP BY a.empresa_id, a.usuario_id, h.hora, 6, 7
+"""
+
+
+_TRAVAR_ROLLUP = text("LOCK TABLE produtividade_horaria IN SHARE ROW EXCLUSIVE MODE")
+
+
+def reconstruir_produtividade(empresa_id=None, desde=None, ate=None):
+    """
+    Reconstrói o rollup das horas entre `desde` e `ate` (datas, inclusivas) a partir dos spans de
+    ActivityLog, com um INSERT ... SELECT, numa única transação. Sem filtros, reconstrói tudo.
+
+    A tabela fica travada (SHARE ROW EXCLUSIVE) do DELETE ao commit: conflita com o ROW EXCLUSIVE
+    do upsert de aplicar_deltas, então a reconstrução espera os lotes em andamento (e passa a ver
+    os spans deles) e os lotes seguintes somam os deltas ao rollup já reconstruído, sem criar no
+    meio dela uma chave que o INSERT ... SELECT também vai inserir.
+    """
+    inicio = datetime.combine(desde, time.min) if desde else None
+    fim = datetime.combine(ate + timedelta(days=1), time.min) if ate else None
+    # Spans que começaram antes do intervalo (até a duração máxima) também cobrem as primeiras horas dele
+    folga = timedelta(seconds=max(current_app.config.get('ACTIVITY_SPAN_MAX_SECONDS', 3600), INTERVALO_AMOSTRA_LEGADO))
+
+    apagar = db.session.query(ProdutividadeHoraria)
+    filtros, parametros = ['TRUE'], {'agora': datetime.utcnow(), 'legado': INTERVALO_AMOSTRA_LEGADO}
+    if empresa_id:
+        apagar = apagar.filter(ProdutividadeHoraria.empresa_id == empresa_id)
+        filtros.append('a.empresa_id = :empresa_id')
+        parametros['empresa_id'] = empresa_id
+    if inicio:
+        apagar = apagar.filter(ProdutividadeHoraria.hora >= inicio)
+        filtros += ['a."timestamp" >= :desde_spans', 'h.hora >= :desde']
+        parametros.update(desde_spans=inicio - folga, desde=inicio)
+    if fim:
+        apagar = apagar.filter(ProdutividadeHoraria.hora < fim)
+        filtros += ['a."timestamp" < :ate', 'h.hora < :ate']
+        parametros['ate'] = fim
+    db.session.execute(_TRAVAR_ROLLUP)
+    apagar.delete(synchronize_session=False)
+
+    db.session.execute(text(_RECONSTRUIR.format(filtros=' AND '.join(filtros))), parametros)
+    db.session.commit()
+
+
+# --- Consultas usadas pelos gráficos ---
+
+PERIODOS = {
+    # periodo: (granularidade do date_trunc, tamanho do balde)
+    'dia': ('hour', timedelta(hours=1)),
+    'semana': ('day', timedelta(days=1)),
+    'mes': ('day', timedelta(days=1)),
+}
+
+
+def intervalo_do_periodo(periodo, dia):
+    """Início e fim (exclusivo) do dia, da semana (segunda a domingo) ou do mês que contém `dia`."""
+    inicio = datetime.combine(dia, time.min)
+    if periodo == 'dia':
+        return inicio, inicio + timedelta(days=1)
+    if periodo == 'semana':
+        inicio -= timedelta(days=dia.weekday())
+        return inicio, inicio + timedelta(days=7)
+    inicio = inicio.replace(day=1)
+    return inicio, (inicio + timedelta(days=32)).replace(day=1)
+
+
+def _zerado():
+    return {c: 0.0 for c in CLASSIFICACOES}
+
+
+def serie_produtividade(empresa_id, periodo, dia, usuario_id=None):
+    """
+    Gráfico de produtividade do período: segundos por classificação em cada balde (hora no dia,
+    dia na semana e no mês), totais por categoria e por agente. Três consultas agregadas sobre
+    o rollup, independentes da quantidade de logs.
+    """
+    granularidade, passo = PERIODOS[periodo]
+    inicio, fim = intervalo_do_periodo(periodo, dia)
+    filtros = [
+        ProdutividadeHoraria.empresa_id == empresa_id,
+        ProdutividadeHoraria.hora >= inicio,
+        ProdutividadeHoraria.hora < fim,
+    ]
+    if usuario_id:
+        filtros.append(ProdutividadeHoraria.usuario_id == usuario_id)
+    segundos = func.sum(ProdutividadeHoraria.segundos)
+
+    balde = func.date_trunc(granularidade, ProdutividadeHoraria.hora)
+    baldes = {}
+    momento = inicio
+    while momento < fim:
+        baldes[momento] = _zerado()
+        momento += passo
+    for inicio_balde, classe, total in db.session.query(balde, ProdutividadeHoraria.classificacao, segundos).filter(
+        *filtros
+    ).group_by(balde, ProdutividadeHoraria.classificacao):
+        baldes[inicio_balde][classe] = float(total)
+
+    categorias = db.session.query(ProdutividadeHoraria.categoria, ProdutividadeHoraria.classificacao, segundos).filter(
+        *filtros
+    ).group_by(ProdutividadeHoraria.categoria, ProdutividadeHoraria.classificacao).order_by(segundos.desc()).all()
+
+    agentes = {}
+    for agente_id, nome, classe, total in db.session.query(
+        ProdutividadeHoraria.usuario_id, Usuario.nome, ProdutividadeHoraria.classificacao, segundos
+    ).join(Usuario, ProdutividadeHoraria.usuario_id == Usuario.id).filter(
+        *filtros
+    ).group_by(ProdutividadeHoraria.usuario_id, Usuario.nome, ProdutividadeHoraria.classificacao):
+        agentes.setdefault(agente_id, {'usuario_id': agente_id, 'nome': nome, **_zerado()})[classe] = float(total)
+
+    return {
+        'periodo': periodo,
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'serie': [{'inicio': momento.isoformat(), **valores} for momento, valores in baldes.items()],
+        'categorias': [
+            {'categoria': categoria, 'classificacao': classe, 'segundos': float(total)}
+            for categoria, classe, total in categorias
+        ],
+        'agentes': sorted(agentes.values(), key=lambda a: a['nome']),
+    }
@@ -1,88 +1,139 @@
 # call_center_project/app/services/realtime_service.py
 from app import socketio
+from app.config import Config
 from app.models import db, Usuario
 from datetime import datetime, timedelta
-import time
 import threading
 from flask import current_app
+from flask_socketio import SocketIO
 
-# Define o tempo limite de inatividade em minutos
-INACTIVITY_THRESHOLD_MINUTES = 3
+def criar_emissor_externo(message_queue=None, channel=None):
+    """
+    SocketIO só de escrita para processos sem Flask app (scripts, workers de fila, cron): os
+    eventos são publicados na fila de mensagens e cada worker web os entrega aos seus clientes.
+    Sem argumentos, usa SOCKETIO_MESSAGE_QUEUE e SOCKETIO_CHANNEL do Config.
+    """
+    url = message_queue or Config.SOCKETIO_MESSAGE_QUEUE
+    if not url:
+        raise RuntimeError("SOCKETIO_MESSAGE_QUEUE não configurada: sem a fila, só o próprio worker alcança os clientes.")
+    return SocketIO(message_queue=url, channel=channel or Config.SOCKETIO_CHANNEL)
 
-def notify_dashboard_update(empresa_id: int, data: dict):
-    """Envia uma notificação via WebSocket para a sala da empresa."""
+def notify_dashboard_update(empresa_id: int, data: dict, emissor=None):
+    """Envia uma notificação via WebSocket para a sala da empresa (fora do app, passe um criar_emissor_externo())."""
     room_name = f'empresa_{empresa_id}'
-    socketio.emit('productivity_update', data, room=room_name)
+    (emissor or socketio).emit('productivity_update', data, room=room_name)
+
+
+class DashboardInvalidator:
+    """
+    Agrupa as invalidações do dashboard por empresa.
+
+    Em vez de emitir 'atualizar_dashboard' para todos os navegadores a cada evento,
+    as invalidações de uma empresa são acumuladas durante a janela configurada
+    (DASHBOARD_INVALIDATION_WINDOW_SECONDS) e enviadas uma única vez, apenas para a
+    sala empresa_{id}, com o delta já calculado (os clientes não precisam refazer o fetch).
+    """
+
+    def __init__(self):
+        self._pendentes = {}  # {empresa_id: {'app': app, 'agentes': set(), 'totais': bool, 'fila': bool}}
+        self._lock = threading.Lock()
+
+    def invalidar(self, empresa_id, agentes=(), totais=False, fila=False):
+        """Marca partes do dashboard da empresa como desatualizadas. Deve ser chamado após o commit."""
+        if not empresa_id:
+            return
+        app = current_app._get_current_object()
+        janela = app.config.get('DASHBOARD_INVALIDATION_WINDOW_SECONDS', 2.0)
+
+        with self._lock:
+            pendente = self._pendentes.get(empresa_id)
+            agendar = pendente is None
+            if agendar:
+                pendente = self._pendentes[empresa_id] = {'app': app, 'agentes': set(), 'totais': False, 'fila': False}
+            pendente['agentes'].update(a for a in agentes if a)
+            pendente['totais'] = pendente['totais'] or totais
+            pendente['fila'] = pendente['fila'] or fila
+
+        if not agendar:
+            return
+        if janela <= 0:
+            self._enviar(empresa_id)
+        else:
+            socketio.start_background_task(self._enviar_apos_janela, empresa_id, janela)
 
-def check_inactive_agents():
+    def _enviar_apos_janela(self, empresa_id, janela):
+        socketio.sleep(janela)
+        self._enviar(empresa_id)
+
+    def _enviar(self, empresa_id):
+        with self._lock:
+            pendente = self._pendentes.pop(empresa_id, None)
+        if not pendente:
+            return
+
+        from app.services.dashboard_service import montar_delta_dashboard
+        try:
+            with pendente['app'].app_context():
+                delta = montar_delta_dashboard(
+                    empresa_id, agentes=pendente['agentes'], totais=pendente['totais'], fila=pendente['fila']
+                )
+                db.session.remove()
+        except Exception as e:
+            pendente['app'].logger.error(f"Erro ao montar delta do dashboard da empresa {empresa_id}: {e}")
+            # Sem o delta, os clientes refazem o fetch completo
+            delta = {'empresa_id': empresa_id}
+        socketio.emit('atualizar_dashboard', delta, room=f'empresa_{empresa_id}')
+
+
+dashboard_invalidator = DashboardInvalidator()
+
+def verificar_agentes_inativos():
     """
-    Função que roda em loop para verificar agentes inativos.
-    Esta função precisa ser executada dentro do contexto da aplicação Flask.
+    Marca como inativos os agentes sem heartbeat há mais de INACTIVITY_THRESHOLD_SECONDS.
+    Chamada pelo inactivity_scheduler quando o próximo prazo vence; os agentes vêm da
+    presença, e o banco só é consultado (pelo id) para os que expiraram.
     """
-    
-    # --- [CORREÇÃO DO NameError APLICADA AQUI] ---
-    # Importamos o create_app aqui dentro da função,
-    # para evitar o erro de importação circular.
-    from app import create_app
-    app = create_app()  # Cria uma instância da app para ter o contexto
-    # --- [FIM DA CORREÇÃO] ---
-    
-    with app.app_context():
-        current_app.logger.info("Iniciando thread de verificação de agentes inativos...")
-        while True:
-            try:
-                # Define o timestamp limite
-                threshold = datetime.utcnow() - timedelta(minutes=INACTIVITY_THRESHOLD_MINUTES)
-                
-                # Busca usuários que estão marcados como monitorando, 
-                # mas cuja última atividade é mais antiga que o limite
-                agentes_inativos = Usuario.query.filter(
-                    Usuario.is_monitoring == True,
-                    Usuario.last_agent_activity < threshold
-                ).all()
-
-                agentes_que_voltaram = Usuario.query.filter(
-                    Usuario.is_monitoring == False,
-                    Usuario.last_agent_activity >= threshold
-                ).all()
-
-                db_changed = False
-
-                for agente in agentes_inativos:
-                    agente.is_monitoring = False
-                    agente.status_agente = 'Inativo' # Define o status principal como Inativo
-                    db_changed = True
-                    current_app.logger.info(f"Agente {agente.nome} (ID: {agente.id}) marcado como Inativo.")
-                    # Emite um evento para o dashboard atualizar
-                    socketio.emit('agent_status_update', {'user_id': agente.id, 'status': 'Inativo', 'is_monitoring': False}, room=f'empresa_{agente.empresa_id}')
-
-                for agente in agentes_que_voltaram:
-                    agente.is_monitoring = True
-                    # Não mudamos o status_agente aqui, pois ele pode estar em "Pausa", etc.
-                    # A rota /log_activity já define para "Disponível" se estava "Inativo"
-                    db_changed = True
-                    current_app.logger.info(f"Agente {agente.nome} (ID: {agente.id}) detectado como Ativo.")
-                    socketio.emit('agent_status_update', {'user_id': agente.id, 'status': agente.status_agente, 'is_monitoring': True}, room=f'empresa_{agente.empresa_id}')
-
-
-                if db_changed:
-                    db.session.commit()
-                
-                # Emite um ping geral para todos os dashboards atualizarem
-                # A rota /dashboard/produtividade será chamada pelos clientes
-                if db_changed:
-                    socketio.emit('atualizar_dashboard')
-
-            except Exception as e:
-                current_app.logger.error(f"Erro no thread de verificação de agentes: {e}")
-                db.session.rollback() # Desfaz qualquer mudança em caso de erro
-            
-            # Espera 30 segundos antes de verificar novamente
-            time.sleep(30)
-
-def start_monitoring_thread():
+    from app.services.presence_service import presence_service
+
+    # Define o timestamp limite
+    threshold = datetime.utcnow() - timedelta(seconds=current_app.config.get('INACTIVITY_THRESHOLD_SECONDS', 180))
+    expirados = presence_service.expirados(threshold)
+    if not expirados:
+        return []
+
+    # Confirma pelo id: o heartbeat pode ter chegado a outro worker e já ter sido gravado no banco
+    agentes = Usuario.query.filter(Usuario.id.in_(list(expirados)), Usuario.is_monitoring == True).all()
+    presence_service.carregar([
+        (agente.id, agente.empresa_id, agente.last_agent_activity)
+        for agente in agentes if agente.last_agent_activity and agente.last_agent_activity >= threshold
+    ])
+    agentes_inativos = [a for a in agentes if not a.last_agent_activity or a.last_agent_activity < threshold]
+    inativos_ids = [a.id for a in agentes_inativos]
+    # Quem já estava inativo no banco (marcado por outro worker) também deixa de ser verificado
+    ja_inativos = [uid for uid in expirados if uid not in {a.id for a in agentes}]
+
+    agentes_alterados = {}  # {empresa_id: [agente_id, ...]}
+    for agente in agentes_inativos:
+        agente.is_monitoring = False
+        agente.status_agente = 'Inativo' # Define o status principal como Inativo
+        agentes_alterados.setdefault(agente.empresa_id, []).append(agente.id)
+        current_app.logger.info(f"Agente {agente.nome} (ID: {agente.id}) marcado como Inativo.")
+    db.session.commit()
+
+    presence_service.marcar_inativos(inativos_ids + ja_inativos)
+
+    for empresa_id, agente_ids in agentes_alterados.items():
+        for agente_id in agente_ids:
+            # Emite um evento para o dashboard atualizar
+            socketio.emit('agent_status_update', {'user_id': agente_id, 'status': 'Inativo', 'is_monitoring': False}, room=f'empresa_{empresa_id}')
+        # Invalida apenas o dashboard das empresas afetadas (com os agentes alterados)
+        dashboard_invalidator.invalidar(empresa_id, agentes=agente_ids)
+    return inativos_ids
+
+def start_monitoring_thread(app=None):
     """
-    Inicia o thread de monitoramento em segundo plano.
+    Inicia o agendador de inatividade neste worker. Pode ser chamado em todos os workers:
+    só o líder faz as transições (ver inactivity_scheduler).
     """
-    monitor_thread = threading.Thread(target=check_inactive_agents, daemon=True)
-    monitor_thread.start()
\ No newline at end of file
+    from app.services.inactivity_scheduler import inactivity_scheduler
+    inactivity_scheduler.iniciar(app or current_app._get_current_object())
@@ -0,0 +1,124 @@
+# call_center_project/app/services/rule_matcher.py
+from collections import deque
+import threading
+
+SEM_MATCH = float('inf')
+
+
+class AhoCorasick:
+    """
+    Autômato de Aho-Corasick sobre as palavras-chave das regras.
+
+    Cada nó guarda o menor índice de regra entre as palavras que terminam nele (incluindo as
+    alcançadas pelos links de falha), então uma única passada pelo texto devolve a primeira
+    regra da lista que aparece como substring -- a mesma semântica do `in` linear.
+    """
+
+    def __init__(self, palavras):
+        # Estruturas em listas paralelas (mais leves que um objeto por nó)
+        self._transicoes = [{}]
+        self._falha = [0]
+        self._menor = [SEM_MATCH]
+        self._menor_vazia = SEM_MATCH  # palavra vazia: '' in texto é sempre verdadeiro
+
+        for indice, palavra in enumerate(palavras):
+            if not palavra:
+                self._menor_vazia = min(self._menor_vazia, indice)
+                continue
+            no = 0
+            for caractere in palavra:
+                proximo = self._transicoes[no].get(caractere)
+                if proximo is None:
+                    proximo = len(self._transicoes)
+                    self._transicoes[no][caractere] = proximo
+                    self._transicoes.append({})
+                    self._falha.append(0)
+                    self._menor.append(SEM_MATCH)
+                no = proximo
+            self._menor[no] = min(self._menor[no], indice)
+
+        # Links de falha em largura; o menor índice é herdado do sufixo mais longo
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            no = fila.popleft()
+            for caractere, filho in self._transicoes[no].items():
+                falha = self._falha[no]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                destino = self._transicoes[falha].get(caractere, 0)
+                self._falha[filho] = destino if destino != filho else 0
+                self._menor[filho] = min(self._menor[filho], self._menor[self._falha[filho]])
+                fila.append(filho)
+
+    def primeira_regra(self, texto):
+        """Índice da primeira regra (na ordem da lista) cuja palavra aparece no texto, ou None."""
+        melhor = self._menor_vazia
+        transicoes, falha, menor = self._transicoes, self._falha, self._menor
+        no = 0
+        for caractere in texto:
+            while no and caractere not in transicoes[no]:
+                no = falha[no]
+            no = transicoes[no].get(caractere, 0)
+            if menor[no] < melhor:
+                melhor = menor[no]
+                if melhor == 0:
+                    break
+        return None if melhor == SEM_MATCH else melhor
+
+
+class CompiledRules:
+    """Regras de processo e de URL de uma empresa, compiladas uma vez por versão."""
+
+    def __init__(self, rules):
+        self.versao = rules.get('versao')
+        self._processos, self._resultados_processo = self._compilar(
+            rules.get('process_rules', []), 'process', "Classificado por regra de processo."
+        )
+        self._urls, self._resultados_url = self._compilar(
+            rules.get('url_rules', []), 'keyword', "Classificado por regra de URL."
+        )
+
+    @staticmethod
+    def _compilar(regras, campo, motivo):
+        palavras = [(regra.get(campo) or '').lower() for regra in regras]
+        resultados = [
+            {"is_productive": regra.get('classification') == 'productive', "category": regra.get('category', 'N/A'), "reason": motivo}
+            for regra in regras
+        ]
+        return AhoCorasick(palavras), resultados
+
+    def classificar(self, activity_data):
+        """Mesma precedência de antes: regras de processo primeiro, depois as de URL; a primeira que casar vence."""
+        indice = self._processos.primeira_regra((activity_data.get('process_name') or '').lower())
+        if indice is not None:
+            return dict(self._resultados_processo[indice])
+        indice = self._urls.primeira_regra((activity_data.get('url') or '').lower())
+        if indice is not None:
+            return dict(self._resultados_url[indice])
+        return None
+
+
+class RuleMatcherCache:
+    """Guarda as regras compiladas por empresa; recompila quando a versão das regras muda."""
+
+    def __init__(self):
+        self._compiladas = {}  # {empresa_id: CompiledRules}
+        self._lock = threading.Lock()
+
+    def obter(self, rules):
+        empresa_id = rules.get('empresa_id')
+        if empresa_id is None:
+            return CompiledRules(rules)
+        compiladas = self._compiladas.get(empresa_id)
+        if compiladas is None or compiladas.versao != rules.get('versao'):
+            compiladas = CompiledRules(rules)
+            with self._lock:
+                self._compiladas[empresa_id] = compiladas
+        return compiladas
+
+    def invalidar(self, empresa_id):
+        with self._lock:
+            self._compiladas.pop(empresa_id, None)
+
+
+rule_matcher_cache = RuleMatcherCache()
@@ -0,0 +1,251 @@
+# call_center_project/app/services/whatsapp_inbox_service.py
+"""
+Caixa de entrada durável do webhook do WhatsApp.
+
+O webhook só grava o corpo bruto da chamada em webhook_inbox (um INSERT) e responde 200 na hora:
+a Meta reenvia as chamadas que demoram a responder. Um pool de consumidores processa as linhas
+pendentes em ordem de chegada, em lotes reivindicados com FOR UPDATE SKIP LOCKED (vários
+consumidores e vários processos podem rodar juntos), grava as mensagens com
+whatsapp_webhook_service (idempotente pelo wamid: um webhook repetido não duplica mensagens) e
+marca as linhas como processadas na mesma transação. Se o lote falhar, as linhas são processadas
+uma a uma para isolar a que falhou, que volta para a fila (depois de WHATSAPP_INBOX_RETRY_SECONDS)
+até WHATSAPP_INBOX_MAX_ATTEMPTS tentativas.
+
+metricas() informa o atraso (fila pendente e tempo entre o recebimento e o processamento) e a
+vazão de cada processo.
+"""
+from app import socketio
+from app.models import db, WebhookInbox
+from app.services.conversa_cache import conversa_cache
+from app.services.whatsapp_webhook_service import extrair_mensagens, gravar_mensagens, notificar
+from collections import deque
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import insert, update, select, func, or_
+import json
+import threading
+import time
+
+
+class MetricasInbox:
+    """Contadores do processo e uma janela deslizante dos lotes processados (vazão e atraso)."""
+
+    def __init__(self, janela=60):
+        self.janela = janela
+        self._lock = threading.Lock()
+        self._lotes = deque()  # (instante, linhas, mensagens, soma dos atrasos em segundos, maior atraso)
+        self.totais = {'linhas': 0, 'mensagens': 0, 'duplicadas': 0, 'falhas': 0, 'descartadas': 0}
+
+    def registrar(self, linhas, mensagens, duplicadas, atrasos, falhas=0, descartadas=0):
+        agora = time.monotonic()
+        with self._lock:
+            self._lotes.append((agora, linhas, mensagens, sum(atrasos), max(atrasos, default=0)))
+            for chave, valor in (('linhas', linhas), ('mensagens', mensagens), ('duplicadas', duplicadas),
+                                 ('falhas', falhas), ('descartadas', descartadas)):
+                self.totais[chave] += valor
+            self._descartar_antigos(agora)
+
+    def _descartar_antigos(self, agora):
+        while self._lotes and self._lotes[0][0] < agora - self.janela:
+            self._lotes.popleft()
+
+    def resumo(self):
+        with self._lock:
+            self._descartar_antigos(time.monotonic())
+            linhas = sum(l[1] for l in self._lotes)
+            return {
+                **self.totais,
+                'janela_segundos': self.janela,
+                'vazao_linhas_por_segundo': round(linhas / self.janela, 3),
+                'vazao_mensagens_por_segundo': round(sum(l[2] for l in self._lotes) / self.janela, 3),
+                'atraso_medio_segundos': round(sum(l[3] for l in self._lotes) / linhas, 3) if linhas else None,
+                'atraso_maximo_segundos': round(max(l[4] for l in self._lotes), 3) if self._lotes else None,
+            }
+
+
+class WhatsAppInboxService:
+    """Recebe os webhooks do WhatsApp (gravação na caixa de entrada) e os processa em segundo plano."""
+
+    def init_app(self, app):
+        app.extensions['whatsapp_inbox'] = {
+            'workers': [],
+            'lock': threading.Lock(),
+            'acordar': threading.Event(),
+            'parar': threading.Event(),
+            'metricas': MetricasInbox(app.config.get('WHATSAPP_INBOX_METRICS_WINDOW_SECONDS', 60)),
+        }
+
+    def _estado(self, app=None):
+        return (app or current_app).extensions['whatsapp_inbox']
+
+    def receber(self, empresa_id, corpo):
+        """Grava o corpo bruto do webhook na caixa de entrada e acorda os consumidores."""
+        app = current_app._get_current_object()
+        agora = datetime.utcnow()
+        db.session.execute(insert(WebhookInbox).values(
+            created_at=agora, updated_at=agora, empresa_id=empresa_id, payload=corpo, tentativas=0
+        ))
+        db.session.commit()
+        self._iniciar_workers(app)
+        self._estado(app)['acordar'].set()
+
+    def _iniciar_workers(self, app):
+        """Inicia o pool de consumidores na primeira vez que algo chega neste app."""
+        estado = self._estado(app)
+        if estado['workers']:
+            return
+        with estado['lock']:
+            if estado['workers']:
+                return
+            for _ in range(app.config.get('WHATSAPP_INBOX_WORKERS', 2)):
+                estado['workers'].append(socketio.start_background_task(self._worker, app))
+
+    def _worker(self, app):
+        estado = self._estado(app)
+        intervalo = app.config.get('WHATSAPP_INBOX_POLL_SECONDS', 1.0)
+        while not estado['parar'].is_set():
+            if self.processar_pendentes(app):
+                continue
+            # Sem pendências: espera um novo webhook deste processo ou o próximo intervalo
+            # (linhas gravadas por outros processos ou que ficaram de uma execução anterior)
+            estado['acordar'].wait(intervalo)
+            estado['acordar'].clear()
+
+    def parar(self, app, timeout=5):
+        """Para os consumidores deste app (usado em testes e no shutdown)."""
+        estado = self._estado(app)
+        estado['parar'].set()
+        estado['acordar'].set()
+        for worker in estado['workers']:
+            worker.join(timeout)
+        estado['workers'].clear()
+        estado['parar'].clear()
+
+    def drenar(self, app):
+        """Processa, na thread atual, tudo o que estiver pendente (usado em testes e em manutenção)."""
+        total = 0
+        while True:
+            processadas = self.processar_pendentes(app)
+            if not processadas:
+                return total
+            total += processadas
+
+    def processar_pendentes(self, app):
+        """Reivindica e processa um lote de linhas pendentes; devolve quantas foram encerradas."""
+        with app.app_context():
+            try:
+                return self._processar_lote(app)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Erro ao processar a caixa de entrada do WhatsApp: {e}")
+                return 0
+            finally:
+                db.session.remove()
+
+    def _processar_lote(self, app):
+        tamanho_lote = app.config.get('WHATSAPP_INBOX_BATCH_SIZE', 50)
+        maximo_tentativas = app.config.get('WHATSAPP_INBOX_MAX_ATTEMPTS', 5)
+        # Uma linha que falhou só volta a ser reivindicada depois do intervalo entre tentativas
+        espera = timedelta(seconds=app.config.get('WHATSAPP_INBOX_RETRY_SECONDS', 30))
+        linhas = db.session.execute(
+            select(WebhookInbox.id, WebhookInbox.empresa_id, WebhookInbox.payload,
+                   WebhookInbox.created_at, WebhookInbox.tentativas)
+            .where(WebhookInbox.processado_em.is_(None),
+                   or_(WebhookInbox.tentativas == 0, WebhookInbox.updated_at <= datetime.utcnow() - espera))
+            .order_by(WebhookInbox.id)
+            .limit(tamanho_lote)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not linhas:
+            db.session.rollback()
+            return 0
+
+        # Corpo que não é JSON não vai melhorar com novas tentativas: é encerrado com o erro
+        mensagens, invalidas = {}, {}
+        for linha in linhas:
+            try:
+                mensagens[linha.id] = extrair_mensagens(json.loads(linha.payload))
+            except ValueError as e:
+                invalidas[linha.id] = f"Payload inválido: {e}"
+
+        validas = [l for l in linhas if l.id in mensagens]
+        try:
+            with db.session.begin_nested():
+                resultados = self._gravar(validas, mensagens)
+            falhas = {}
+        except Exception:
+            # Isola a linha com problema: as outras são gravadas uma a uma (sem confiar no cache
+            # de conversas, caso alguma tenha sido excluída por outro processo)
+            conversa_cache.limpar()
+            resultados, falhas = [], {}
+            for linha in validas:
+                try:
+                    with db.session.begin_nested():
+                        resultados.extend(self._gravar([linha], mensagens))
+                except Exception as e:
+                    falhas[linha.id] = repr(e)
+
+        agora = datetime.utcnow()
+        encerradas = [l.id for l in validas if l.id not in falhas] + list(invalidas)
+        if encerradas:
+            db.session.execute(update(WebhookInbox).where(WebhookInbox.id.in_(encerradas)).values(
+                processado_em=agora, updated_at=agora, erro=None
+            ))
+        for linha in linhas:
+            erro = invalidas.get(linha.id) or falhas.get(linha.id)
+            if not erro:
+                continue
+            tentativas = linha.tentativas + (linha.id in falhas)
+            desistir = linha.id in invalidas or tentativas >= maximo_tentativas
+            db.session.execute(update(WebhookInbox).where(WebhookInbox.id == linha.id).values(
+                tentativas=tentativas, erro=erro, updated_at=agora, processado_em=agora if desistir else None
+            ))
+            app.logger.error(f"Webhook {linha.id} da empresa {linha.empresa_id} "
+                             f"{'descartado' if desistir else 'volta para a fila'} ({tentativas} tentativas): {erro}")
+        db.session.commit()
+
+        for resultado in resultados:
+            notificar(resultado)
+        self._estado(app)['metricas'].registrar(
+            linhas=len(encerradas),
+            mensagens=sum(r['mensagens'] for r in resultados),
+            duplicadas=sum(r['duplicadas'] for r in resultados),
+            atrasos=[(agora - l.created_at).total_seconds() for l in linhas if l.id in encerradas],
+            falhas=len(falhas),
+            descartadas=len(invalidas) + sum(
+                1 for l in linhas if l.id in falhas and l.tentativas + 1 >= maximo_tentativas
+            ),
+        )
+        # Linhas que voltaram para a fila não contam: evita girar sem parar sobre uma falha
+        return len(encerradas)
+
+    def _gravar(self, linhas, mensagens):
+        """Grava as mensagens das linhas, com um INSERT de mensagens por empresa."""
+        por_empresa = {}
+        for linha in linhas:
+            por_empresa.setdefault(linha.empresa_id, []).extend(mensagens[linha.id])
+        return [gravar_mensagens(empresa_id, lista) for empresa_id, lista in por_empresa.items() if lista]
+
+    def metricas(self, app=None):
+        """Fila pendente no banco (todas as instâncias) e vazão / atraso deste processo."""
+        pendentes, mais_antiga = db.session.query(
+            func.count(WebhookInbox.id), func.min(WebhookInbox.created_at)
+        ).filter(WebhookInbox.processado_em.is_(None)).one()
+        return {
+            'pendentes': pendentes,
+            'atraso_pendente_segundos': round((datetime.utcnow() - mais_antiga).total_seconds(), 3) if mais_antiga else 0,
+            **self._estado(app)['metricas'].resumo(),
+            'cache_conversas': conversa_cache.metricas(),
+        }
+
+    def limpar(self, dias=None):
+        """Remove as linhas já processadas há mais de `dias` (padrão: WHATSAPP_INBOX_RETENTION_DAYS)."""
+        dias = current_app.config.get('WHATSAPP_INBOX_RETENTION_DAYS', 7) if dias is None else dias
+        removidas = WebhookInbox.query.filter(
+            WebhookInbox.processado_em < datetime.utcnow() - timedelta(days=dias)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return removidas
+
+
+whatsapp_inbox_service = WhatsAppInboxService()
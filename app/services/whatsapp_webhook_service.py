@@ -0,0 +1,141 @@
+# call_center_project/app/services/whatsapp_webhook_service.py
+"""
+Ingestão em lote das mensagens recebidas pelo webhook do WhatsApp.
+
+A Meta agrupa várias mensagens em uma chamada do webhook. O payload inteiro é lido antes de
+tocar no banco e as mensagens são agrupadas por wa_id; as conversas são resolvidas pelo cache
+(conversa_cache) ou com uma consulta (as que faltam são criadas com um INSERT em lote) e as
+mensagens entram com um único INSERT em lote, na transação de quem chama (o consumidor da caixa de entrada,
+app/services/whatsapp_inbox_service.py). Mensagens com um wamid já gravado são ignoradas, então
+reprocessar um webhook repetido não duplica nada. Depois do commit, notificar envia um evento por
+conversa (com todas as mensagens dela no lote) e, se houve conversa nova, uma invalidação do dashboard.
+"""
+from app import socketio
+from app.models import db, ConversaWhatsApp, MensagemWhatsApp
+from app.services.conversa_cache import conversa_cache
+from app.services.estatisticas_service import registrar_insercoes
+from app.services.realtime_service import dashboard_invalidator
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+
+def extrair_mensagens(payload):
+    """
+    Mensagens do payload do webhook, na ordem em que chegaram: dicts com wamid, wa_id, conteudo
+    e timestamp. Mensagens malformadas são ignoradas (e registradas no log) sem descartar as outras.
+    """
+    mensagens = []
+    if not isinstance(payload, dict) or payload.get("object") != "whatsapp_business_account":
+        return mensagens
+    for entry in payload.get("entry") or []:
+        for change in entry.get("changes") or []:
+            for message in (change.get("value") or {}).get("messages") or []:
+                try:
+                    mensagens.append({
+                        'wamid': message.get("id"),
+                        'wa_id': message["from"],
+                        'conteudo': message["text"]["body"] if "text" in message else "Mídia recebida",
+                        'timestamp': datetime.fromtimestamp(int(message["timestamp"])),
+                    })
+                except (KeyError, TypeError, ValueError) as e:
+                    current_app.logger.error(f"Mensagem do webhook ignorada ({e!r}): {message!r}")
+    return mensagens
+
+
+def _consultar_conversas(empresa_id, wa_ids):
+    return {wa_id: conversa_id for conversa_id, wa_id in db.session.query(ConversaWhatsApp.id, ConversaWhatsApp.wa_id).filter(
+        ConversaWhatsApp.empresa_id == empresa_id, ConversaWhatsApp.wa_id.in_(wa_ids)
+    )}
+
+
+def _resolver_conversas(empresa_id, wa_ids):
+    """
+    {wa_id: conversa_id} para os wa_ids do lote e a lista dos que ganharam uma conversa nova.
+    Clientes no cache não consultam o banco; os demais são buscados pela chave única
+    (empresa_id, wa_id) e os que faltam são criados com INSERT ... ON CONFLICT DO NOTHING.
+    Se outro consumidor criar a mesma conversa ao mesmo tempo, o conflito devolve a existente.
+    """
+    conversas = conversa_cache.obter(empresa_id, wa_ids)
+    faltantes = [w for w in wa_ids if w not in conversas]
+    if faltantes:
+        conversas.update(_consultar_conversas(empresa_id, faltantes))
+    faltantes = [w for w in faltantes if w not in conversas]
+
+    criadas = []
+    if faltantes:
+        agora = datetime.utcnow()
+        novas = {wa_id: {
+            'created_at': agora, 'updated_at': agora, 'inicio': agora, 'wa_id': wa_id,
+            'nome_cliente': f"Cliente {wa_id[-4:]}", 'status': 'pendente', 'assunto': 'Geral',
+            'agente_atribuido_id': None, 'fim': None, 'empresa_id': empresa_id,
+        } for wa_id in faltantes}
+        stmt = pg_insert(ConversaWhatsApp).on_conflict_do_nothing(constraint='uq_conversa_whats_app_empresa_wa_id')
+        for conversa_id, wa_id in db.session.execute(
+            stmt.returning(ConversaWhatsApp.id, ConversaWhatsApp.wa_id), list(novas.values())
+        ):
+            conversas[wa_id] = conversa_id
+            criadas.append(wa_id)
+        registrar_insercoes(ConversaWhatsApp, [novas[w] for w in criadas])
+        # Criadas por outra transação entre a consulta e o INSERT
+        concorrentes = [w for w in faltantes if w not in conversas]
+        if concorrentes:
+            conversas.update(_consultar_conversas(empresa_id, concorrentes))
+
+    # As criadas nesta transação só entram no cache quando forem lidas do banco (depois do commit)
+    conversa_cache.guardar(empresa_id, {w: c for w, c in conversas.items() if w not in criadas})
+    return conversas, criadas
+
+
+def gravar_mensagens(empresa_id, mensagens):
+    """
+    Grava as mensagens (de extrair_mensagens) de uma empresa, sem commit. Devolve o resultado
+    para notificar: {'empresa_id', 'eventos' ({conversa_id: [mensagens]}), 'mensagens',
+    'duplicadas', 'conversas_novas'}.
+    """
+    resultado = {'empresa_id': empresa_id, 'eventos': {}, 'mensagens': 0, 'duplicadas': 0, 'conversas_novas': 0}
+    # Um wamid repetido dentro do próprio lote conta como duplicado
+    vistos, unicas = set(), []
+    for mensagem in mensagens:
+        if mensagem['wamid']:
+            if mensagem['wamid'] in vistos:
+                continue
+            vistos.add(mensagem['wamid'])
+        unicas.append(mensagem)
+    if not unicas:
+        return resultado
+
+    conversas, novas = _resolver_conversas(empresa_id, list(dict.fromkeys(m['wa_id'] for m in unicas)))
+    agora = datetime.utcnow()
+    linhas = [{
+        'created_at': agora, 'updated_at': agora, 'conversa_id': conversas[m['wa_id']],
+        'timestamp': m['timestamp'], 'remetente': 'cliente', 'conteudo': m['conteudo'],
+        'lida': False, 'empresa_id': empresa_id, 'wamid': m['wamid'],
+    } for m in unicas]
+    stmt = pg_insert(MensagemWhatsApp).on_conflict_do_nothing(constraint='uq_mensagem_whats_app_wamid')
+    inseridos = {w for (w,) in db.session.execute(stmt.returning(MensagemWhatsApp.wamid), linhas)}
+    # Só as linhas que entraram (sem os wamids já gravados) contam no rollup e nas notificações
+    linhas = [l for l in linhas if l['wamid'] is None or l['wamid'] in inseridos]
+    registrar_insercoes(MensagemWhatsApp, linhas)
+
+    for linha in linhas:
+        resultado['eventos'].setdefault(linha['conversa_id'], []).append(
+            {'conteudo': linha['conteudo'], 'timestamp': linha['timestamp'].strftime('%H:%M')}
+        )
+    resultado.update(mensagens=len(linhas), duplicadas=len(mensagens) - len(linhas), conversas_novas=len(novas))
+    return resultado
+
+
+def notificar(resultado):
+    """Emite os eventos de um resultado de gravar_mensagens. Deve ser chamado após o commit."""
+    # Um evento por conversa com as mensagens do lote (os campos avulsos repetem a última,
+    # para clientes que ainda leem só conteudo/timestamp)
+    for conversa_id, itens in resultado['eventos'].items():
+        socketio.emit('nova_mensagem_cliente', {
+            'conversa_id': conversa_id, **itens[-1], 'mensagens': itens
+        }, room=f"conversa_{conversa_id}")
+
+    # Uma nova conversa altera os totais do dia e a fila; mensagens em conversas
+    # existentes não mudam nenhum indicador do dashboard.
+    if resultado['conversas_novas']:
+        dashboard_invalidator.invalidar(resultado['empresa_id'], totais=True, fila=True)
@@ -0,0 +1,134 @@
+# call_center_project/desktop_agent/log_buffer.py
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+
+class LogBuffer:
+    """
+    Buffer local das amostras de atividade, enviado em lotes para /api/productivity/log/batch.
+
+    - As amostras são gravadas em disco (uma por linha), então sobrevivem a quedas de
+      conexão e ao reinício do agente.
+    - O lote é enviado quando atinge `tamanho_lote` amostras ou quando a amostra mais
+      antiga passa de `idade_maxima` segundos.
+    - Se o envio falhar, as amostras continuam no buffer e são reenviadas, em ordem,
+      na próxima tentativa (com espera crescente entre as tentativas).
+    """
+
+    def __init__(self, caminho, server_url_base, api_key, tamanho_lote=20, idade_maxima=300,
+                 max_amostras=20000, timeout=15):
+        self.caminho = caminho
+        self.url = f"{server_url_base}/api/productivity/log/batch"
+        self.api_key = api_key
+        self.tamanho_lote = tamanho_lote
+        self.idade_maxima = idade_maxima
+        self.max_amostras = max_amostras
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._amostras = self._carregar()
+        self._primeira_em = time.monotonic() if self._amostras else None
+        self._proxima_tentativa = 0
+        self._espera = 0
+
+    def _carregar(self):
+        """Recupera as amostras que ficaram pendentes de uma execução anterior."""
+        amostras = []
+        if not os.path.exists(self.caminho):
+            return amostras
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                for linha in f:
+                    linha = linha.strip()
+                    if linha:
+                        try:
+                            amostras.append(json.loads(linha))
+                        except json.JSONDecodeError:
+                            logging.warning("Linha corrompida ignorada no buffer de logs.")
+        except OSError as e:
+            logging.error(f"Erro ao ler o buffer de logs em {self.caminho}: {e}")
+        if amostras:
+            logging.info(f"{len(amostras)} amostras pendentes recuperadas do buffer.")
+        return amostras[-self.max_amostras:]
+
+    def _persistir(self):
+        """Regrava o arquivo do buffer de forma atômica (arquivo temporário + replace)."""
+        temporario = f"{self.caminho}.tmp"
+        try:
+            with open(temporario, 'w', encoding='utf-8') as f:
+                for amostra in self._amostras:
+                    f.write(json.dumps(amostra) + '\n')
+            os.replace(temporario, self.caminho)
+        except OSError as e:
+            logging.error(f"Erro ao gravar o buffer de logs em {self.caminho}: {e}")
+
+    def adicionar(self, amostra):
+        with self._lock:
+            if not self._amostras:
+                self._primeira_em = time.monotonic()
+            self._amostras.append(amostra)
+            if len(self._amostras) > self.max_amostras:
+                # Sem conexão por muito tempo: descarta as mais antigas para limitar o disco
+                descartadas = len(self._amostras) - self.max_amostras
+                del self._amostras[:descartadas]
+                logging.warning(f"Buffer cheio: {descartadas} amostras antigas descartadas.")
+            try:
+                with open(self.caminho, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(amostra) + '\n')
+            except OSError as e:
+                logging.error(f"Erro ao gravar amostra no buffer: {e}")
+
+    def pendentes(self):
+        return len(self._amostras)
+
+    def deve_enviar(self):
+        if not self._amostras or time.monotonic() < self._proxima_tentativa:
+            return False
+        return len(self._amostras) >= self.tamanho_lote or time.monotonic() - self._primeira_em >= self.idade_maxima
+
+    def enviar_se_necessario(self):
+        if self.deve_enviar():
+            self.enviar()
+
+    def enviar(self):
+        """Envia todo o buffer em lotes de até `tamanho_lote` amostras. Retorna True se esvaziou."""
+        with self._lock:
+            while self._amostras:
+                lote = self._amostras[:self.tamanho_lote]
+                if not self._enviar_lote(lote):
+                    self._agendar_nova_tentativa()
+                    self._persistir()
+                    return False
+                del self._amostras[:len(lote)]
+                self._espera = 0
+            self._primeira_em = None
+            self._persistir()
+            return True
+
+    def _agendar_nova_tentativa(self):
+        # Espera crescente (30s, 60s, 120s ... até 10 min) enquanto o servidor estiver fora
+        self._espera = min(max(self._espera * 2, 30), 600)
+        self._proxima_tentativa = time.monotonic() + self._espera
+
+    def _enviar_lote(self, lote):
+        headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip', 'X-API-KEY': self.api_key}
+        corpo = gzip.compress(json.dumps(lote).encode('utf-8'))
+        try:
+            response = requests.post(self.url, data=corpo, headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Erro de conexão ao enviar lote ({len(lote)} amostras); mantidas no buffer: {e}")
+            return False
+        if response.status_code in (201, 202):
+            return True
+        if 400 <= response.status_code < 500 and response.status_code not in (401, 408, 429):
+            # Lote rejeitado pelo servidor: reenviar não adianta, descarta para não travar o buffer
+            logging.error(f"Lote descartado pelo servidor: Status={response.status_code}, Resposta={response.text[:100]}")
+            return True
+        logging.warning(f"Erro ao enviar lote: Status={response.status_code}, Resposta={response.text[:100]}")
+        return False
@@ -25,8 +25,16 @@ logging.basicConfig(filename=log_file_path, level=logging.INFO, format='%(asctim
 # --- FIM DA ALTERAÇÃO ---
 
 CONFIG_FILE = 'agent_config.json'
+BUFFER_FILE = 'agent_log_buffer.jsonl'
 SERVER_URL_BASE = "http://127.0.0.1:5000"
 
+# Envio em lote: as amostras (a cada 15s) vão para o servidor a cada LOG_BATCH_MAX_AGE_SECONDS
+# ou quando o buffer atingir LOG_BATCH_SIZE amostras. A idade máxima precisa ficar abaixo do
+# limite de inatividade do servidor (3 minutos).
+LOG_INTERVAL_SECONDS = 15
+LOG_BATCH_SIZE = 20
+LOG_BATCH_MAX_AGE_SECONDS = 120
+
 def get_token_from_args():
     logging.info(f"Argumentos recebidos: {sys.argv}")
     if len(sys.argv) > 1:
@@ -128,6 +136,8 @@ def link_agent(token=None):
         messagebox.showerror("Erro de Conexão", f"Não foi possível conectar ao servidor: {e}")
         return None
 
+from log_buffer import LogBuffer
+
 if platform.system() == "Windows":
     try:
         from monitors.windows_monitor import get_active_window_info
@@ -142,16 +152,10 @@ else:
     messagebox.showerror("Erro Crítico", f"Sistema operacional {platform.system()} não é suportado.")
     sys.exit(1)
 
-def send_log(activity_data, api_key):
-    headers = {'Content-Type': 'application/json', 'X-API-KEY': api_key}
-    try:
-        url = f"{SERVER_URL_BASE}/api/productivity/log"
-        response = requests.post(url, json=activity_data, headers=headers, timeout=10)
-        if response.status_code != 201:
-             logging.warning(f"Erro ao enviar log: Status={response.status_code}, Resposta={response.text[:100]}") # Limita o tamanho da resposta no log
-    except requests.exceptions.RequestException as e:
-        logging.warning(f"Erro de conexão ao enviar log: {e}")
-        pass # Continua tentando
+def create_log_buffer(api_key):
+    # O buffer fica na pasta do executável, junto do config, e sobrevive a reinícios
+    buffer_path = os.path.join(os.path.dirname(os.path.abspath(sys.executable if getattr(sys, 'frozen', False) else __file__)), BUFFER_FILE)
+    return LogBuffer(buffer_path, SERVER_URL_BASE, api_key, tamanho_lote=LOG_BATCH_SIZE, idade_maxima=LOG_BATCH_MAX_AGE_SECONDS)
 
 def main():
     logging.info("--- Agente de Monitoramento Iniciado ---")
@@ -199,6 +203,7 @@ def main():
         sys.exit(1)
 
     logging.info(f"Iniciando loop de monitoramento para o agente: {api_key}")
+    log_buffer = create_log_buffer(api_key)
     while True:
         try:
             info = get_active_window_info()
@@ -208,10 +213,12 @@ def main():
                 "process_name": info.get("process") if info else None,
                 "url": info.get("url") if info else None
             }
-            send_log(log_data, api_key)
-            time.sleep(15)
+            log_buffer.adicionar(log_data)
+            log_buffer.enviar_se_necessario()
+            time.sleep(LOG_INTERVAL_SECONDS)
         except KeyboardInterrupt:
              logging.info("Agente encerrado pelo usuário (Ctrl+C).")
+             log_buffer.enviar() # Tenta enviar o que restou; se falhar, fica no disco para a próxima execução
              break
         except Exception as e:
             logging.error(f"Erro inesperado no loop principal: {e}", exc_info=True)
@@ -0,0 +1,35 @@
+"""Status de entrega das mensagens enviadas pelos agentes no WhatsApp
+
+Revision ID: a3d5e7f9b1c4
+Revises: f2c4d6e8a0b3
+Create Date: 2025-11-21 09:48:12.304518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d5e7f9b1c4'
+down_revision = 'f2c4d6e8a0b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mensagem_whats_app', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status_envio', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('tentativas_envio', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('erro_envio', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('enviada_em', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_mensagem_whats_app_envio_pendente', ['id'], unique=False,
+                              postgresql_where=sa.text("status_envio IN ('pendente', 'reenvio')"))
+
+
+def downgrade():
+    with op.batch_alter_table('mensagem_whats_app', schema=None) as batch_op:
+        batch_op.drop_index('ix_mensagem_whats_app_envio_pendente', postgresql_where=sa.text("status_envio IN ('pendente', 'reenvio')"))
+        batch_op.drop_column('enviada_em')
+        batch_op.drop_column('erro_envio')
+        batch_op.drop_column('tentativas_envio')
+        batch_op.drop_column('status_envio')
@@ -0,0 +1,55 @@
+"""Fechamento da folha de pagamento: colunas, assinatura e chave única por funcionário e mês
+
+Revision ID: c9f1a3b5d7e0
+Revises: b8e0f2a4c6d9
+Create Date: 2025-11-12 11:07:52.418306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9f1a3b5d7e0'
+down_revision = 'b8e0f2a4c6d9'
+branch_labels = None
+depends_on = None
+
+VALORES = ('valor_horas_extras', 'vale_alimentacao', 'fgts', 'inss_patronal', 'custo_total_empresa')
+
+
+def upgrade():
+    with op.batch_alter_table('folha_pagamento', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('empresa_id', sa.Integer(), nullable=True))
+        for coluna in VALORES:
+            batch_op.add_column(sa.Column(coluna, sa.Numeric(precision=10, scale=2), nullable=True))
+        batch_op.add_column(sa.Column('dias_uteis', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('assinatura', sa.String(length=64), nullable=True))
+
+    # Linhas antigas (se houver): empresa do funcionário e, para cada funcionário e mês, só a mais recente
+    op.execute("""
+        UPDATE folha_pagamento f SET empresa_id = func.empresa_id
+        FROM funcionarios func WHERE func.id = f.funcionario_id
+    """)
+    op.execute("""
+        DELETE FROM folha_pagamento f USING folha_pagamento g
+        WHERE f.funcionario_id = g.funcionario_id AND f.ano = g.ano AND f.mes = g.mes AND f.id < g.id
+    """)
+
+    with op.batch_alter_table('folha_pagamento', schema=None) as batch_op:
+        batch_op.alter_column('empresa_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_folha_pagamento_empresa_id_empresa', 'empresa', ['empresa_id'], ['id'])
+        batch_op.create_unique_constraint('uq_folha_pagamento_funcionario_mes', ['funcionario_id', 'ano', 'mes'])
+        batch_op.create_index('ix_folha_pagamento_empresa_ano_mes', ['empresa_id', 'ano', 'mes'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('folha_pagamento', schema=None) as batch_op:
+        batch_op.drop_index('ix_folha_pagamento_empresa_ano_mes')
+        batch_op.drop_constraint('uq_folha_pagamento_funcionario_mes', type_='unique')
+        batch_op.drop_constraint('fk_folha_pagamento_empresa_id_empresa', type_='foreignkey')
+        batch_op.drop_column('assinatura')
+        batch_op.drop_column('dias_uteis')
+        for coluna in reversed(VALORES):
+            batch_op.drop_column(coluna)
+        batch_op.drop_column('empresa_id')
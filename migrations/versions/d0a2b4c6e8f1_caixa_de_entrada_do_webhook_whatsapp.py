@@ -0,0 +1,48 @@
+"""Caixa de entrada do webhook do WhatsApp e wamid único nas mensagens
+
+Revision ID: d0a2b4c6e8f1
+Revises: c9f1a3b5d7e0
+Create Date: 2025-11-14 09:41:17.206583
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd0a2b4c6e8f1'
+down_revision = 'c9f1a3b5d7e0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('webhook_inbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('empresa_id', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('processado_em', sa.DateTime(), nullable=True),
+    sa.Column('tentativas', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('erro', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['empresa_id'], ['empresa.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_webhook_inbox_pendentes', 'webhook_inbox', ['id'], unique=False,
+                    postgresql_where=sa.text('processado_em IS NULL'))
+
+    # Mensagens antigas ficam com wamid nulo (o PostgreSQL não compara nulos na chave única)
+    with op.batch_alter_table('mensagem_whats_app', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('wamid', sa.String(length=128), nullable=True))
+        batch_op.create_unique_constraint('uq_mensagem_whats_app_wamid', ['wamid'])
+
+
+def downgrade():
+    with op.batch_alter_table('mensagem_whats_app', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_mensagem_whats_app_wamid', type_='unique')
+        batch_op.drop_column('wamid')
+
+    op.drop_index('ix_webhook_inbox_pendentes', table_name='webhook_inbox',
+                  postgresql_where=sa.text('processado_em IS NULL'))
+    op.drop_table('webhook_inbox')
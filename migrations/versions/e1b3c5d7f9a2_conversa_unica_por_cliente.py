@@ -0,0 +1,40 @@
+"""Uma conversa do WhatsApp por cliente em cada empresa (chave única empresa_id, wa_id)
+
+Revision ID: e1b3c5d7f9a2
+Revises: d0a2b4c6e8f1
+Create Date: 2025-11-17 15:02:44.918370
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b3c5d7f9a2'
+down_revision = 'd0a2b4c6e8f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Conversas duplicadas (criadas por mensagens simultâneas do mesmo cliente novo) são unidas
+    # na mais antiga. O rollup diário ainda conta as removidas: rode `flask estatisticas reconstruir`.
+    op.execute("""
+        CREATE TEMPORARY TABLE conversas_duplicadas ON COMMIT DROP AS
+        SELECT id, manter FROM (
+            SELECT id, min(id) OVER (PARTITION BY empresa_id, wa_id) AS manter FROM conversa_whats_app
+        ) c WHERE id <> manter
+    """)
+    op.execute("""
+        UPDATE mensagem_whats_app m SET conversa_id = d.manter
+        FROM conversas_duplicadas d WHERE m.conversa_id = d.id
+    """)
+    op.execute("DELETE FROM conversa_whats_app c USING conversas_duplicadas d WHERE c.id = d.id")
+
+    with op.batch_alter_table('conversa_whats_app', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_conversa_whats_app_empresa_wa_id', ['empresa_id', 'wa_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('conversa_whats_app', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_conversa_whats_app_empresa_wa_id', type_='unique')
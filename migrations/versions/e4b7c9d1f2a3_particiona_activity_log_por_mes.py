@@ -0,0 +1,106 @@
+"""Particiona activity_log por mês, com índices compostos
+
+Revision ID: e4b7c9d1f2a3
+Revises: c3f1e2d4a5b6
+Create Date: 2025-11-03 09:40:12.184220
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from datetime import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c9d1f2a3'
+down_revision = 'c3f1e2d4a5b6'
+branch_labels = None
+depends_on = None
+
+# Partições mensais criadas adiante do limite da tabela legada (as seguintes vêm do `flask atividades particoes`)
+MESES_A_FRENTE = 2
+
+
+def _somar_meses(inicio, meses):
+    mes = inicio.month - 1 + meses
+    return datetime(inicio.year + mes // 12, mes % 12 + 1, 1)
+
+
+def upgrade():
+    """
+    Conversão online: a tabela existente não é copiada. Ela vira a partição activity_log_legado
+    (de MINVALUE até o mês seguinte ao último registro) da nova tabela particionada, e a retenção
+    a remove inteira quando todo o intervalo dela estiver fora do prazo.
+
+    O trabalho pesado (índices e validação do intervalo) roda antes, sem bloquear as escritas;
+    a troca em si só mexe no catálogo.
+    """
+    conexao = op.get_bind()
+    agora = datetime.utcnow()
+    maior = conexao.execute(sa.text('SELECT max("timestamp") FROM activity_log')).scalar()
+    inicio = max(maior or agora, agora)
+    limite = _somar_meses(datetime(inicio.year, inicio.month, 1), 1)
+
+    with op.get_context().autocommit_block():
+        # CHECK NOT VALID + VALIDATE: a validação não bloqueia as escritas, e o ATTACH PARTITION usa
+        # a constraint validada em vez de varrer a tabela com o lock exclusivo
+        op.execute(f"ALTER TABLE activity_log ADD CONSTRAINT activity_log_legado_limite "
+                   f"CHECK (\"timestamp\" < '{limite.isoformat()}') NOT VALID")
+        op.execute('ALTER TABLE activity_log VALIDATE CONSTRAINT activity_log_legado_limite')
+        # Índices com as mesmas definições dos da tabela particionada: o ATTACH os reaproveita
+        op.execute('CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS activity_log_legado_id_timestamp '
+                   'ON activity_log (id, "timestamp")')
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS activity_log_legado_empresa_usuario_timestamp '
+                   'ON activity_log (empresa_id, usuario_id, "timestamp")')
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS activity_log_legado_empresa_timestamp '
+                   'ON activity_log (empresa_id, "timestamp")')
+
+    # A partir daqui, só alterações de catálogo (locks curtos)
+    op.execute('ALTER TABLE activity_log ADD CONSTRAINT activity_log_legado_id_timestamp '
+               'UNIQUE USING INDEX activity_log_legado_id_timestamp')
+    op.execute('ALTER TABLE activity_log RENAME CONSTRAINT activity_log_pkey TO activity_log_legado_pkey')
+    op.rename_table('activity_log', 'activity_log_legado')
+
+    op.create_table('activity_log',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('activity_log_id_seq'::regclass)"), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.Column('empresa_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('window_title', sa.String(length=512), nullable=True),
+    sa.Column('process_name', sa.String(length=255), nullable=True),
+    sa.Column('url', sa.String(length=1024), nullable=True),
+    sa.Column('is_productive', sa.Boolean(), nullable=True),
+    sa.Column('category', sa.String(length=100), nullable=True),
+    sa.Column('ai_analysis', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.ForeignKeyConstraint(['empresa_id'], ['empresa.id'], ),
+    sa.ForeignKeyConstraint(['usuario_id'], ['usuario.id'], ),
+    sa.PrimaryKeyConstraint('id', 'timestamp'),
+    postgresql_partition_by='RANGE (timestamp)'
+    )
+    op.execute('ALTER SEQUENCE activity_log_id_seq OWNED BY activity_log.id')
+    op.create_index('ix_activity_log_empresa_usuario_timestamp', 'activity_log', ['empresa_id', 'usuario_id', 'timestamp'], unique=False)
+    op.create_index('ix_activity_log_empresa_timestamp', 'activity_log', ['empresa_id', 'timestamp'], unique=False)
+
+    op.execute(f"ALTER TABLE activity_log ATTACH PARTITION activity_log_legado "
+               f"FOR VALUES FROM (MINVALUE) TO ('{limite.isoformat()}')")
+    op.execute('ALTER TABLE activity_log_legado DROP CONSTRAINT activity_log_legado_limite')
+    op.execute('CREATE TABLE activity_log_default PARTITION OF activity_log DEFAULT')
+    for i in range(MESES_A_FRENTE):
+        inicio_mes, fim_mes = _somar_meses(limite, i), _somar_meses(limite, i + 1)
+        op.execute(f"CREATE TABLE activity_log_p{inicio_mes:%Y_%m} PARTITION OF activity_log "
+                   f"FOR VALUES FROM ('{inicio_mes.isoformat()}') TO ('{fim_mes.isoformat()}')")
+
+
+def downgrade():
+    # Volta para uma tabela comum (copia os dados: faça em janela de manutenção)
+    op.execute('ALTER SEQUENCE activity_log_id_seq OWNED BY NONE')
+    op.execute('CREATE TABLE activity_log_plana (LIKE activity_log INCLUDING DEFAULTS)')
+    op.execute('INSERT INTO activity_log_plana SELECT * FROM activity_log')
+    op.drop_table('activity_log')
+    op.rename_table('activity_log_plana', 'activity_log')
+    op.create_primary_key('activity_log_pkey', 'activity_log', ['id'])
+    op.create_foreign_key(None, 'activity_log', 'empresa', ['empresa_id'], ['id'])
+    op.create_foreign_key(None, 'activity_log', 'usuario', ['usuario_id'], ['id'])
+    op.execute('ALTER SEQUENCE activity_log_id_seq OWNED BY activity_log.id')
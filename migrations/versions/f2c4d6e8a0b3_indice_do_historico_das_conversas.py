@@ -0,0 +1,28 @@
+"""Índices do histórico paginado das mensagens: (conversa_id, timestamp, id) e (conversa_id, id)
+
+Revision ID: f2c4d6e8a0b3
+Revises: e1b3c5d7f9a2
+Create Date: 2025-11-19 10:26:31.557204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c4d6e8a0b3'
+down_revision = 'e1b3c5d7f9a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mensagem_whats_app', schema=None) as batch_op:
+        batch_op.create_index('ix_mensagem_whats_app_conversa_timestamp', ['conversa_id', 'timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_mensagem_whats_app_conversa_id', ['conversa_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('mensagem_whats_app', schema=None) as batch_op:
+        batch_op.drop_index('ix_mensagem_whats_app_conversa_id')
+        batch_op.drop_index('ix_mensagem_whats_app_conversa_timestamp')
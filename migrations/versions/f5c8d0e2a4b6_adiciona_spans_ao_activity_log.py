@@ -0,0 +1,28 @@
+"""Adiciona os campos de span (fim e quantidade de amostras) ao activity_log
+
+Revision ID: f5c8d0e2a4b6
+Revises: e4b7c9d1f2a3
+Create Date: 2025-11-05 14:02:37.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c8d0e2a4b6'
+down_revision = 'e4b7c9d1f2a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Sem reescrever a tabela: end_timestamp nulo e o default constante de sample_count só alteram o
+    # catálogo. As linhas existentes ficam como spans de uma amostra (ActivityLog.duracao_segundos)
+    op.add_column('activity_log', sa.Column('end_timestamp', sa.DateTime(), nullable=True))
+    op.add_column('activity_log', sa.Column('sample_count', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('activity_log', 'sample_count')
+    op.drop_column('activity_log', 'end_timestamp')
@@ -8,7 +8,7 @@ app = create_app()
 
 if __name__ == '__main__':
     # [NOVO] Inicie o thread de monitoramento antes de rodar a app
-    start_monitoring_thread()
+    start_monitoring_thread(app)
     
     # Use o socketio.run() para rodar sua aplicação
     socketio.run(app, debug=True, allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,136 @@
+# tests/bench_envio.py
+"""
+Benchmark do despachante de envios (app/services/envio_service.py) contra os provedores falsos
+de tests/fake_provider_server.py, sem acesso à internet.
+
+Cria 4 empresas de teste com uma conversa cada no banco em DATABASE_URL e mede: o envio antigo
+(requests.post sem sessão, uma conexão nova por mensagem, na thread da requisição) para uma
+amostra, o tempo da rota (gravar a mensagem pendente e colocá-la na fila), também para uma amostra,
+e a vazão do despachante para N mensagens pendentes gravadas em lote, até todas estarem gravadas
+como enviadas, com as conexões abertas e a concorrência vista pelo servidor. Remove as empresas no final. Use um banco de teste (as tabelas
+que faltarem são criadas com db.create_all). Uso:
+
+    python tests/bench_envio.py [mensagens] [workers] [latência em segundos]   (padrão: 2000 8 0.02)
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+
+import requests
+from sqlalchemy import insert
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.config import Config
+from app.models import Empresa, ConversaWhatsApp, MensagemWhatsApp, EstatisticaDiaria
+from app.services.envio_service import envio_service, _requisicao_whatsapp
+from fake_provider_server import FakeProviderServer
+
+EMPRESAS = 4
+AMOSTRA_SEM_SESSAO = 200
+AMOSTRA_ROTA = 200
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', Config.SQLALCHEMY_DATABASE_URI)
+    INACTIVITY_SCHEDULER_ENABLED = False
+    WHATSAPP_INBOX_WORKERS = 0
+    # Sem cota local: mede a vazão do despachante, não a da Meta
+    WHATSAPP_SEND_RATE_PER_SECOND = 0
+
+
+def popular():
+    conversas = []
+    for i in range(EMPRESAS):
+        empresa = Empresa(nome_empresa=f'Benchmark Envio {i}', cnpj=f'00.000.000/000{i}-99',
+                          whatsapp_token=f'bench-{i}', whatsapp_phone_number_id=f'900{i}')
+        db.session.add(empresa)
+        db.session.flush()
+        conversa = ConversaWhatsApp(wa_id=f'55119990000{i}', nome_cliente=f'Bench {i}', empresa_id=empresa.id)
+        db.session.add(conversa)
+        conversas.append(conversa)
+    db.session.commit()
+    return conversas
+
+
+def remover(conversas):
+    empresas = [c.empresa_id for c in conversas]
+    MensagemWhatsApp.query.filter(MensagemWhatsApp.empresa_id.in_(empresas)).delete(synchronize_session=False)
+    ConversaWhatsApp.query.filter(ConversaWhatsApp.empresa_id.in_(empresas)).delete(synchronize_session=False)
+    EstatisticaDiaria.query.filter(EstatisticaDiaria.empresa_id.in_(empresas)).delete(synchronize_session=False)
+    Empresa.query.filter(Empresa.id.in_(empresas)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def sem_sessao(app, servidor, conversa):
+    """Como enviar_email_via_api fazia: requests.post avulso, sem timeout, sem reaproveitar a conexão."""
+    envio = {'remetente': '9000', 'token': 'bench-0', 'destino': conversa.wa_id, 'conteudo': 'Olá'}
+    conexoes = servidor.conexoes
+    inicio = time.perf_counter()
+    for _ in range(AMOSTRA_SEM_SESSAO):
+        url, headers, corpo = _requisicao_whatsapp(app.config, envio)
+        requests.post(url, headers=headers, json=corpo).raise_for_status()
+    duracao = time.perf_counter() - inicio
+    print(f"requests.post sem sessão, sequencial: {AMOSTRA_SEM_SESSAO / duracao:.0f} msg/s "
+          f"({servidor.conexoes - conexoes} conexões para {AMOSTRA_SEM_SESSAO} mensagens)")
+
+
+def rota(conversas):
+    inicio = time.perf_counter()
+    for i in range(AMOSTRA_ROTA):
+        envio_service.enviar_whatsapp(conversas[i % len(conversas)], f'Pela rota {i}')
+    print(f"Rota (gravar pendente + enfileirar): {1000 * (time.perf_counter() - inicio) / AMOSTRA_ROTA:.2f} ms por mensagem")
+
+
+def despachante(app, servidor, conversas, quantidade):
+    """Mensagens pendentes gravadas em lote e recolocadas na fila pela recuperação: só o despacho é medido."""
+    agora = datetime.utcnow()
+    db.session.execute(insert(MensagemWhatsApp), [{
+        'created_at': agora, 'updated_at': agora, 'conversa_id': conversas[i % len(conversas)].id,
+        'empresa_id': conversas[i % len(conversas)].empresa_id, 'remetente': 'agente',
+        'conteudo': f'Mensagem {i}', 'timestamp': agora, 'status_envio': 'pendente', 'tentativas_envio': 0,
+    } for i in range(quantidade)])
+    db.session.commit()
+    conexoes, requisicoes = servidor.conexoes, servidor.requisicoes
+    inicio = time.perf_counter()
+    envio_service.recuperar_pendentes(app, idade=0)
+    while envio_service.metricas(app)['enviadas'] + envio_service.metricas(app)['falhas'] < quantidade + AMOSTRA_ROTA:
+        time.sleep(0.01)
+    duracao = time.perf_counter() - inicio
+    envio_service.parar(app)
+    enviadas = MensagemWhatsApp.query.filter(
+        MensagemWhatsApp.conversa_id.in_([c.id for c in conversas]), MensagemWhatsApp.status_envio == 'enviada'
+    ).count()
+    print(f"Despachante ({app.config['OUTBOUND_WORKERS']} workers): {quantidade / duracao:.0f} msg/s, "
+          f"{enviadas}/{quantidade + AMOSTRA_ROTA} enviadas, {servidor.requisicoes - requisicoes} requisições, "
+          f"{servidor.conexoes - conexoes} conexões, até {servidor.max_simultaneas} simultâneas")
+    print(envio_service.metricas(app))
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    latencia = float(sys.argv[3]) if len(sys.argv) > 3 else 0.02
+    BenchConfig.OUTBOUND_WORKERS = workers
+    BenchConfig.OUTBOUND_QUEUE_MAX_SIZE = max(quantidade, 10000)
+    app = create_app(BenchConfig)
+    with FakeProviderServer(latencia=latencia) as servidor, app.app_context():
+        app.config.update(WHATSAPP_API_BASE_URL=servidor.base_url, SENDGRID_API_BASE_URL=servidor.base_url)
+        db.create_all()
+        conversas = popular()
+        try:
+            print(f"{quantidade} mensagens, latência do provedor {latencia * 1000:.0f} ms")
+            sem_sessao(app, servidor, conversas[0])
+            rota(conversas)
+            despachante(app, servidor, conversas, quantidade)
+        finally:
+            db.session.rollback()
+            remover(conversas)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# tests/bench_folha.py
+"""
+Benchmark do fechamento da folha (app/services/folha_service.py) com muitos funcionários.
+
+Cria uma empresa de teste com N funcionários (com afastamentos e ponto) no banco em DATABASE_URL
+e mede: o cálculo individual (calcular_folha_pagamento para cada funcionário, como o dashboard
+fazia), o primeiro fechamento do mês, um novo fechamento sem alterações, um fechamento depois de
+alterar 1% dos salários e a leitura dos totais gravados. Remove a empresa no final. Use um banco
+de teste (as tabelas que faltarem são criadas com db.create_all). Uso:
+
+    python tests/bench_folha.py [funcionarios]      (padrão: 10000)
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import insert
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.config import Config
+from app.models import Empresa
+from app.models_rh import Funcionario, Cargo, Departamento, Afastamento, ControlePonto, FolhaPagamento
+from app.rh.calculos import calcular_folha_pagamento
+from app.services.folha_service import fechar_folha, resumo_da_folha
+
+ANO, MES = 2026, 10
+CNPJ = '00.000.000/0000-00'
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', Config.SQLALCHEMY_DATABASE_URI)
+    INACTIVITY_SCHEDULER_ENABLED = False
+
+
+def _medir(descricao, funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    print(f"{descricao}: {(time.perf_counter() - inicio) * 1000:.0f} ms" + (f" {resultado}" if isinstance(resultado, dict) else ''))
+    return resultado
+
+
+def popular(quantidade):
+    aleatorio = random.Random(42)
+    empresa = Empresa(nome_empresa='Benchmark Folha', cnpj=CNPJ)
+    db.session.add(empresa)
+    db.session.flush()
+    cargo = Cargo(nome='Analista', salario_base=3000, nivel='Pleno', empresa_id=empresa.id)
+    departamento = Departamento(nome='Operação', empresa_id=empresa.id)
+    db.session.add_all([cargo, departamento])
+    db.session.flush()
+    agora = datetime.utcnow()
+    db.session.execute(insert(Funcionario), [{
+        'created_at': agora, 'updated_at': agora, 'nome': f'Bench {i}', 'cpf': f'bench-{i}', 'rg': str(i),
+        'data_nascimento': date(1990, 1, 1), 'sexo': 'F', 'estado_civil': 'Solteira', 'telefone': '0',
+        'email': f'bench{i}@folha.bench', 'endereco': '-', 'cep': '-', 'cidade': '-', 'estado': 'SP',
+        'matricula': f'BENCH{i}', 'cargo_id': cargo.id, 'departamento_id': departamento.id,
+        'data_admissao': date(2024, 1, 1), 'empresa_id': empresa.id, 'status': 'ativo',
+        'salario': Decimal(f'{aleatorio.uniform(1400, 15000):.2f}'), 'jornada_trabalho': aleatorio.choice(['5x2', '6x1']),
+        'recebe_va': aleatorio.random() < 0.7, 'vale_alimentacao_diario': Decimal('32.50'),
+        'recebe_vr': aleatorio.random() < 0.5, 'vale_refeicao_diario': Decimal('28.00'),
+        'recebe_vt': aleatorio.random() < 0.6, 'vale_transporte_diario': Decimal('11.20'),
+    } for i in range(quantidade)])
+    ids = [i for (i,) in db.session.query(Funcionario.id).filter_by(empresa_id=empresa.id)]
+    db.session.execute(insert(Afastamento), [
+        {'created_at': agora, 'updated_at': agora, 'funcionario_id': i, 'motivo': 'Atestado',
+         'data_inicio': date(ANO, MES, 5), 'data_fim': date(ANO, MES, 7)}
+        for i in aleatorio.sample(ids, len(ids) // 20)
+    ])
+    db.session.execute(insert(ControlePonto), [
+        {'created_at': agora, 'updated_at': agora, 'funcionario_id': i, 'data': date(ANO, MES, dia), 'horas_extras': Decimal('1.50')}
+        for i in aleatorio.sample(ids, len(ids) // 10) for dia in (6, 13, 20)
+    ])
+    db.session.commit()
+    return empresa.id, ids
+
+
+def remover(empresa_id):
+    ids = db.session.query(Funcionario.id).filter_by(empresa_id=empresa_id).scalar_subquery()
+    for modelo in (FolhaPagamento, Afastamento, ControlePonto):
+        modelo.query.filter(modelo.funcionario_id.in_(ids)).delete(synchronize_session=False)
+    Funcionario.query.filter_by(empresa_id=empresa_id).delete()
+    Cargo.query.filter_by(empresa_id=empresa_id).delete()
+    Departamento.query.filter_by(empresa_id=empresa_id).delete()
+    Empresa.query.filter_by(id=empresa_id).delete()
+    db.session.commit()
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        antiga = Empresa.query.filter_by(cnpj=CNPJ).first()
+        if antiga:
+            remover(antiga.id)
+        empresa_id, ids = popular(quantidade)
+        print(f"{quantidade:,} funcionários")
+        try:
+            _medir('cálculo individual (ORM + calcular_folha_pagamento)', lambda: [
+                calcular_folha_pagamento(f, ANO, MES) for f in Funcionario.query.filter_by(empresa_id=empresa_id)
+            ])
+            db.session.expunge_all()
+            _medir('primeiro fechamento', lambda: fechar_folha(empresa_id, ANO, MES))
+            _medir('novo fechamento, sem alterações', lambda: fechar_folha(empresa_id, ANO, MES))
+            alterados = ids[::100]
+            Funcionario.query.filter(Funcionario.id.in_(alterados)).update(
+                {Funcionario.salario: Funcionario.salario + 100}, synchronize_session=False
+            )
+            db.session.commit()
+            _medir(f'fechamento depois de alterar {len(alterados)} salários', lambda: fechar_folha(empresa_id, ANO, MES))
+            _medir('totais do dashboard (folha gravada)', lambda: resumo_da_folha(empresa_id, ANO, MES))
+        finally:
+            remover(empresa_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# tests/bench_llm.py
+"""
+Benchmark do classificador em lote (app/services/llm_classifier.py) contra o servidor falso de
+tests/fake_llm_server.py, sem acesso à OpenAI nem ao banco.
+
+Mede N atividades distintas com uma chamada por atividade (uma amostra de 1/5 delas, extrapolada)
+e em lote (blocos de LLM_BATCH_MAX_ITEMS, com LLM_MAX_CONCURRENCY chamadas simultâneas), com a
+latência simulada por chamada, e o número de requisições feitas em lote. Uso:
+
+    python tests/bench_llm.py [atividades] [latência em segundos]      (padrão: 200 0.05)
+"""
+
+import os
+import sys
+import time
+
+from flask import Flask
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.llm_classifier import llm_classifier
+from fake_llm_server import FakeLLMServer
+
+
+def _configurar(servidor, **config):
+    app = Flask(__name__)
+    app.config.update({
+        'OPENAI_API_KEY': 'chave-falsa',
+        'LLM_BASE_URL': servidor.base_url,
+        'LLM_BATCH_WINDOW_SECONDS': 0.05,
+        'LLM_TIMEOUT_SECONDS': 5,
+        **config
+    })
+    llm_classifier.init_app(app)
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latencia = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    rules = {"empresa_id": 1, "versao": "v1", "process_rules": [], "url_rules": [], "custom_ai_prompt": None}
+    itens = [({'process_name': f'app{i}.exe', 'url': f'https://site{i}.com'}, rules) for i in range(quantidade)]
+
+    with FakeLLMServer(latencia=latencia) as servidor:
+        _configurar(servidor, LLM_BATCH_MAX_ITEMS=1, LLM_MAX_CONCURRENCY=1)
+        inicio = time.perf_counter()
+        for item in itens[:quantidade // 5]:
+            llm_classifier.classificar([item])
+        tempo_individual = (time.perf_counter() - inicio) * 5
+
+        _configurar(servidor, LLM_BATCH_MAX_ITEMS=20, LLM_MAX_CONCURRENCY=4)
+        requisicoes = servidor.requisicoes
+        inicio = time.perf_counter()
+        llm_classifier.classificar(itens)
+        tempo_lote = time.perf_counter() - inicio
+
+        print(f"{quantidade} atividades, latência {latencia * 1000:.0f} ms: uma chamada por atividade "
+              f"~{tempo_individual:.2f}s, em lote {tempo_lote:.2f}s ({servidor.requisicoes - requisicoes} requisições, "
+              f"{tempo_individual / tempo_lote:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# tests/bench_regras.py
+"""
+Benchmark das regras de produtividade compiladas (app/services/rule_matcher.py) contra a
+varredura linear anterior, sem banco.
+
+Gera N regras de processo e N de URL aleatórias e 200 amostras que, na maioria, não casam com
+nenhuma regra (o pior caso da varredura) e mede a compilação do autômato e a classificação das
+amostras pelos dois caminhos, conferindo que os resultados são os mesmos. Uso:
+
+    python tests/bench_regras.py [regras por tipo]      (padrão: 5000)
+"""
+
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.rule_matcher import CompiledRules
+from test_rule_matcher import _classificar_linear
+
+AMOSTRAS = 200
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    aleatorio = random.Random(7)
+    alfabeto = string.ascii_lowercase + string.digits
+    rules = {
+        "process_rules": [{"process": ''.join(aleatorio.choices(alfabeto, k=10)), "category": f"P{i}"} for i in range(quantidade)],
+        "url_rules": [{"keyword": ''.join(aleatorio.choices(alfabeto, k=12)), "category": f"U{i}"} for i in range(quantidade)]
+    }
+    amostras = [
+        {'process_name': f"{''.join(aleatorio.choices(alfabeto, k=8))}.exe", 'url': f"https://{''.join(aleatorio.choices(alfabeto, k=30))}.com/x"}
+        for _ in range(AMOSTRAS)
+    ]
+    amostras.append({'process_name': rules['process_rules'][-1]['process'] + '.exe', 'url': ''})
+
+    inicio = time.perf_counter()
+    compiladas = CompiledRules(rules)
+    tempo_compilacao = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    esperado = [_classificar_linear(a, rules) for a in amostras]
+    tempo_linear = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    obtido = [compiladas.classificar(a) for a in amostras]
+    tempo_compilado = time.perf_counter() - inicio
+
+    assert obtido == esperado
+    print(f"{len(amostras)} amostras x {2 * quantidade} regras: linear {tempo_linear * 1000:.1f} ms, "
+          f"compilado {tempo_compilado * 1000:.1f} ms ({tempo_linear / tempo_compilado:.0f}x; "
+          f"compilação {tempo_compilacao * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
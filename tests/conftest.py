@@ -22,12 +22,18 @@ def test_app():
         "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
         "WTF_CSRF_ENABLED": False,
         "SECRET_KEY": "test-secret-key-for-sessions",
-        "LOGIN_DISABLED": False
+        "LOGIN_DISABLED": False,
+        # Tarefas de fundo iniciadas no primeiro heartbeat: os testes que precisam delas as ligam
+        "PRESENCE_FLUSH_INTERVAL_SECONDS": 0,
+        "INACTIVITY_SCHEDULER_ENABLED": False,
+        "WHATSAPP_INBOX_WORKERS": 0,
+        "OUTBOUND_WORKERS": 0
     })
 
     with app.app_context():
         db.create_all()
         yield app
+        db.session.remove()
         db.drop_all()
 
 @pytest.fixture(scope='function')
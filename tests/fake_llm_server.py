@@ -0,0 +1,134 @@
+# tests/fake_llm_server.py
+"""
+Servidor HTTP local que imita o endpoint /v1/chat/completions da OpenAI, para testes e benchmarks
+do classificador em lote (aponte LLM_BASE_URL para `servidor.base_url`).
+
+Classifica cada atividade do prompt por palavras-chave e permite simular latência, erros 500
+e respostas incompletas. Também pode ser executado direto:  python tests/fake_llm_server.py 8999
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PRODUTIVAS = ('zendesk', 'crm', 'excel', 'whatsapp')
+IMPRODUTIVAS = ('youtube', 'facebook', 'instagram', 'netflix')
+
+
+def classificar(atividade):
+    texto = ' '.join(str(v) for v in atividade.values()).lower()
+    if any(p in texto for p in PRODUTIVAS):
+        return True, 'Trabalho'
+    if any(p in texto for p in IMPRODUTIVAS):
+        return False, 'Lazer'
+    return None, 'Neutro'
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clientes que desistem por timeout fecham a conexão antes da resposta: não é erro do servidor
+        pass
+
+
+class FakeLLMServer:
+    def __init__(self, latencia=0.0, porta=0):
+        self.latencia = latencia
+        self.falhas_restantes = 0      # próximas N requisições respondem 500
+        self.omitir_ids = set()        # ids de atividades que não voltam na resposta
+        self.requisicoes = 0
+        self.atividades_recebidas = 0
+        self.simultaneas = 0
+        self.max_simultaneas = 0
+        self._lock = threading.Lock()
+        self._httpd = _HTTPServer(('127.0.0.1', porta), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self._httpd.server_address[1]}/v1'
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.parar()
+
+    def _responder(self, corpo):
+        prompt = corpo['messages'][-1]['content']
+        atividades = [json.loads(linha) for linha in prompt.splitlines() if linha.startswith('{"id"')]
+        with self._lock:
+            self.requisicoes += 1
+            self.atividades_recebidas += len(atividades)
+            self.simultaneas += 1
+            self.max_simultaneas = max(self.max_simultaneas, self.simultaneas)
+            falhar = self.falhas_restantes > 0
+            if falhar:
+                self.falhas_restantes -= 1
+        try:
+            time.sleep(self.latencia)
+            if falhar:
+                return 500, {"error": {"message": "falha simulada", "type": "server_error"}}
+            resultados = []
+            for atividade in atividades:
+                if atividade['id'] in self.omitir_ids:
+                    continue
+                produtiva, categoria = classificar(atividade)
+                resultados.append({"id": atividade['id'], "is_productive": produtiva, "category": categoria, "reason": "Servidor falso."})
+            return 200, {
+                "id": f"chatcmpl-fake-{self.requisicoes}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": corpo.get('model', 'fake'),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": json.dumps({"resultados": resultados})},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 10 * len(resultados), "total_tokens": 0}
+            }
+        finally:
+            with self._lock:
+                self.simultaneas -= 1
+
+    def _handler(self):
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                tamanho = int(self.headers.get('Content-Length', 0))
+                status, resposta = servidor._responder(json.loads(self.rfile.read(tamanho)))
+                dados = json.dumps(resposta).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    porta = int(sys.argv[1]) if len(sys.argv) > 1 else 8999
+    latencia = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    servidor = FakeLLMServer(latencia=latencia, porta=porta)
+    print(f"Servidor LLM falso em {servidor.base_url} (latência {latencia}s). Ctrl+C para sair.")
+    try:
+        servidor._httpd.serve_forever()
+    except KeyboardInterrupt:
+        servidor.parar()
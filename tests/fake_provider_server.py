@@ -0,0 +1,157 @@
+# tests/fake_provider_server.py
+"""
+Servidor HTTP local que imita os provedores de envio, para testes e benchmarks do despachante
+(app/services/envio_service.py): aponte WHATSAPP_API_BASE_URL e SENDGRID_API_BASE_URL para
+`servidor.base_url`.
+
+Atende POST /<phone_number_id>/messages (WhatsApp Cloud API, responde com um wamid) e
+POST /v3/mail/send (SendGrid, 202 com X-Message-Id), com HTTP/1.1 keep-alive. Permite simular
+latência, erros 500, uma cota por token (429 com Retry-After acima dela) e destinatários
+recusados (400). Conta requisições, conexões TCP abertas e requisições simultâneas. Também pode
+ser executado direto:  python tests/fake_provider_server.py 8998 0.05
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clientes que desistem por timeout fecham a conexão antes da resposta: não é erro do servidor
+        pass
+
+
+class FakeProviderServer:
+    def __init__(self, latencia=0.0, porta=0, limite_por_segundo=None):
+        self.latencia = latencia
+        self.limite_por_segundo = limite_por_segundo  # requisições por segundo aceitas de cada token
+        self.falhas_restantes = 0      # próximas N requisições respondem 500
+        self.recusar = set()           # destinatários respondidos com 400
+        self.requisicoes = 0
+        self.conexoes = 0
+        self.limitadas = 0
+        self.simultaneas = 0
+        self.max_simultaneas = 0
+        self.recebidas = []            # (instante, token, caminho, corpo) das requisições aceitas
+        self._janelas = defaultdict(list)
+        self._lock = threading.Lock()
+        self._httpd = _HTTPServer(('127.0.0.1', porta), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self._httpd.server_address[1]}'
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.parar()
+
+    def enviadas_por_token(self, token):
+        return [r for r in self.recebidas if r[1] == token]
+
+    def _acima_do_limite(self, token, agora):
+        if not self.limite_por_segundo:
+            return False
+        janela = self._janelas[token]
+        while janela and janela[0] <= agora - 1:
+            janela.pop(0)
+        if len(janela) >= self.limite_por_segundo:
+            return True
+        janela.append(agora)
+        return False
+
+    def _responder(self, caminho, token, corpo):
+        with self._lock:
+            self.requisicoes += 1
+            self.simultaneas += 1
+            self.max_simultaneas = max(self.max_simultaneas, self.simultaneas)
+            agora = time.monotonic()
+            falhar = self.falhas_restantes > 0
+            if falhar:
+                self.falhas_restantes -= 1
+            limitada = not falhar and self._acima_do_limite(token, agora)
+            if limitada:
+                self.limitadas += 1
+        try:
+            time.sleep(self.latencia)
+            if falhar:
+                return 500, {}, {"error": {"message": "falha simulada", "code": 1}}
+            if limitada:
+                return 429, {'Retry-After': '1'}, {"error": {"message": "limite de envios", "code": 130429}}
+            email = caminho == '/v3/mail/send'
+            destino = corpo['personalizations'][0]['to'][0]['email'] if email else corpo.get('to')
+            if destino in self.recusar:
+                return 400, {}, {"error": {"message": f"destinatário inválido: {destino}", "code": 131026}}
+            with self._lock:
+                self.recebidas.append((agora, token, caminho, corpo))
+                numero = len(self.recebidas)
+            if email:
+                return 202, {'X-Message-Id': f'fake-email-{numero}'}, None
+            return 200, {}, {
+                "messaging_product": "whatsapp",
+                "contacts": [{"input": destino, "wa_id": destino}],
+                "messages": [{"id": f"wamid.fake-{numero}"}]
+            }
+        finally:
+            with self._lock:
+                self.simultaneas -= 1
+
+    def _handler(self):
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # mantém a conexão aberta entre as requisições
+            # Cabeçalhos e corpo saem em dois writes: com Nagle, o corpo esperaria o ACK atrasado
+            # do cliente (~40 ms) em toda resposta de uma conexão reaproveitada
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with servidor._lock:
+                    servidor.conexoes += 1
+
+            def do_POST(self):
+                tamanho = int(self.headers.get('Content-Length', 0))
+                token = self.headers.get('Authorization', '').removeprefix('Bearer ')
+                status, cabecalhos, resposta = servidor._responder(self.path, token, json.loads(self.rfile.read(tamanho)))
+                dados = json.dumps(resposta).encode() if resposta is not None else b''
+                self.send_response(status)
+                for nome, valor in cabecalhos.items():
+                    self.send_header(nome, valor)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    porta = int(sys.argv[1]) if len(sys.argv) > 1 else 8998
+    latencia = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    servidor = FakeProviderServer(latencia=latencia, porta=porta)
+    print(f"Provedores falsos em {servidor.base_url} (latência {latencia}s). Ctrl+C para sair.")
+    try:
+        servidor._httpd.serve_forever()
+    except KeyboardInterrupt:
+        servidor.parar()
@@ -0,0 +1,296 @@
+# tests/fake_redis.py
+"""
+Substituto local (em memória) do cliente redis-py, com os comandos usados pelos backends
+Redis da aplicação: listas (fila de ingestão), sets, hashes e sorted sets (presença),
+strings com expiração e pipelines (executados atomicamente, como MULTI/EXEC, com WATCH).
+Como o redis-py sem decode_responses, devolve bytes.
+"""
+
+import threading
+import time
+
+
+def _b(valor):
+    if isinstance(valor, bytes):
+        return valor
+    return str(valor).encode()
+
+
+class WatchError(Exception):
+    """Uma chave observada (WATCH) mudou antes do EXEC, como redis.exceptions.WatchError."""
+
+
+class FakePipeline:
+    """
+    Pipeline com WATCH: depois de watch() os comandos rodam na hora (para ler o estado atual)
+    até o multi(); daí em diante são enfileirados, e o execute() falha com WatchError se
+    alguma chave observada mudou desde o watch().
+    """
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._comandos = []
+        self._observadas = None
+        self._em_multi = False
+
+    def __getattr__(self, nome):
+        if self._observadas is not None and not self._em_multi:
+            return getattr(self._redis, nome)
+
+        def _enfileirar(*args, **kwargs):
+            self._comandos.append((nome, args, kwargs))
+            return self
+        return _enfileirar
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
+
+    def watch(self, *keys):
+        self._observadas = {k: self._redis._copia(k) for k in keys}
+        self._em_multi = False
+
+    def multi(self):
+        self._em_multi = True
+
+    def reset(self):
+        self._comandos = []
+        self._observadas = None
+
+    def execute(self):
+        try:
+            with self._redis.condicao:
+                for k, valor in (self._observadas or {}).items():
+                    if self._redis._copia(k) != valor:
+                        raise WatchError(k)
+                return [getattr(self._redis, nome)(*args, **kwargs) for nome, args, kwargs in self._comandos]
+        finally:
+            self.reset()
+
+
+class FakeRedis:
+    def __init__(self):
+        self.dados = {}
+        self.expira_em = {}
+        self.condicao = threading.Condition(threading.RLock())
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def transaction(self, func, *watches):
+        """Como Redis.transaction: WATCH nas chaves, func(pipe) e EXEC, repetindo se elas mudarem."""
+        with self.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(*watches)
+                    func(pipe)
+                    return pipe.execute()
+                except WatchError:
+                    continue
+
+    # --- Chaves ---
+    def _vivo(self, key):
+        prazo = self.expira_em.get(key)
+        if prazo is not None and prazo <= time.monotonic():
+            self.dados.pop(key, None)
+            self.expira_em.pop(key, None)
+        return key in self.dados
+
+    def _obter(self, key, tipo):
+        with self.condicao:
+            if not self._vivo(key):
+                self.dados[key] = tipo()
+            return self.dados[key]
+
+    def _copia(self, key):
+        with self.condicao:
+            if not self._vivo(key):
+                return None
+            valor = self.dados[key]
+            return valor.copy() if hasattr(valor, 'copy') else valor
+
+    def _limpar_se_vazio(self, key):
+        if key in self.dados and not self.dados[key]:
+            del self.dados[key]
+            self.expira_em.pop(key, None)
+
+    def exists(self, *keys):
+        with self.condicao:
+            return sum(1 for k in keys if self._vivo(k))
+
+    def delete(self, *keys):
+        with self.condicao:
+            removidas = sum(1 for k in keys if self._vivo(k))
+            for k in keys:
+                self.dados.pop(k, None)
+                self.expira_em.pop(k, None)
+            return removidas
+
+    def expire(self, key, segundos):
+        with self.condicao:
+            if not self._vivo(key):
+                return False
+            self.expira_em[key] = time.monotonic() + segundos
+            return True
+
+    def pexpire(self, key, milissegundos):
+        return self.expire(key, milissegundos / 1000)
+
+    # --- Strings ---
+    def set(self, key, valor, ex=None, px=None, nx=False):
+        with self.condicao:
+            if nx and self._vivo(key):
+                return None
+            self.dados[key] = _b(valor)
+            self.expira_em.pop(key, None)
+            if ex or px:
+                self.expira_em[key] = time.monotonic() + (ex or px / 1000)
+            return True
+
+    def get(self, key):
+        with self.condicao:
+            return self.dados[key] if self._vivo(key) else None
+
+    # --- Listas ---
+    def rpush(self, key, *valores):
+        with self.condicao:
+            lista = self._obter(key, list)
+            lista.extend(_b(v) for v in valores)
+            self.condicao.notify_all()
+            return len(lista)
+
+    def lpop(self, key, count=None):
+        with self.condicao:
+            if not self._vivo(key):
+                return None
+            lista = self.dados[key]
+            itens, self.dados[key] = lista[:count or 1], lista[count or 1:]
+            self._limpar_se_vazio(key)
+            if count is None:
+                return itens[0] if itens else None
+            return itens or None
+
+    def blpop(self, key, timeout):
+        with self.condicao:
+            self.condicao.wait_for(lambda: self._vivo(key), timeout=timeout)
+            item = self.lpop(key)
+            return (_b(key), item) if item is not None else None
+
+    # --- Sets ---
+    def sadd(self, key, *valores):
+        with self.condicao:
+            conjunto = self._obter(key, set)
+            novos = {_b(v) for v in valores} - conjunto
+            conjunto.update(novos)
+            return len(novos)
+
+    def srem(self, key, *valores):
+        with self.condicao:
+            if not self._vivo(key):
+                return 0
+            removidos = {_b(v) for v in valores} & self.dados[key]
+            self.dados[key] -= removidos
+            self._limpar_se_vazio(key)
+            return len(removidos)
+
+    def scard(self, key):
+        with self.condicao:
+            return len(self.dados[key]) if self._vivo(key) else 0
+
+    def smembers(self, key):
+        with self.condicao:
+            return set(self.dados[key]) if self._vivo(key) else set()
+
+    # --- Hashes ---
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self.condicao:
+            h = self._obter(key, dict)
+            campos = dict(mapping or {})
+            if field is not None:
+                campos[field] = value
+            novos = sum(1 for f in campos if _b(f) not in h)
+            h.update({_b(f): _b(v) for f, v in campos.items()})
+            return novos
+
+    def hsetnx(self, key, field, value):
+        with self.condicao:
+            h = self._obter(key, dict)
+            if _b(field) in h:
+                return 0
+            h[_b(field)] = _b(value)
+            return 1
+
+    def hmget(self, key, fields):
+        with self.condicao:
+            h = self.dados[key] if self._vivo(key) else {}
+            return [h.get(_b(f)) for f in fields]
+
+    def hget(self, key, field):
+        with self.condicao:
+            return self.dados[key].get(_b(field)) if self._vivo(key) else None
+
+    def hgetall(self, key):
+        with self.condicao:
+            return dict(self.dados[key]) if self._vivo(key) else {}
+
+    def hdel(self, key, *fields):
+        with self.condicao:
+            if not self._vivo(key):
+                return 0
+            removidos = sum(1 for f in fields if self.dados[key].pop(_b(f), None) is not None)
+            self._limpar_se_vazio(key)
+            return removidos
+
+    # --- Sorted sets ---
+    def zadd(self, key, mapping, gt=False):
+        with self.condicao:
+            z = self._obter(key, dict)
+            novos = 0
+            for membro, score in mapping.items():
+                membro = _b(membro)
+                if membro not in z:
+                    novos += 1
+                elif gt and float(score) <= z[membro]:
+                    continue
+                z[membro] = float(score)
+            return novos
+
+    def zrem(self, key, *membros):
+        with self.condicao:
+            if not self._vivo(key):
+                return 0
+            removidos = sum(1 for m in membros if self.dados[key].pop(_b(m), None) is not None)
+            self._limpar_se_vazio(key)
+            return removidos
+
+    def zscore(self, key, membro):
+        with self.condicao:
+            return self.dados[key].get(_b(membro)) if self._vivo(key) else None
+
+    @staticmethod
+    def _limite(valor):
+        valor = str(valor)
+        exclusivo = valor.startswith('(')
+        numero = float(valor.lstrip('(').replace('-inf', '-Infinity').replace('+inf', 'Infinity').replace('inf', 'Infinity'))
+        return numero, exclusivo
+
+    def zrange(self, key, inicio, fim, withscores=False):
+        with self.condicao:
+            if not self._vivo(key):
+                return []
+            itens = sorted(self.dados[key].items(), key=lambda i: (i[1], i[0]))
+            itens = itens[inicio:None if fim == -1 else fim + 1]
+            return itens if withscores else [m for m, _ in itens]
+
+    def zrangebyscore(self, key, minimo, maximo):
+        with self.condicao:
+            if not self._vivo(key):
+                return []
+            (lo, lo_ex), (hi, hi_ex) = self._limite(minimo), self._limite(maximo)
+            itens = sorted(self.dados[key].items(), key=lambda i: (i[1], i[0]))
+            return [
+                m for m, s in itens
+                if (s > lo if lo_ex else s >= lo) and (s < hi if hi_ex else s <= hi)
+            ]
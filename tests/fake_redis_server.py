@@ -0,0 +1,194 @@
+# tests/fake_redis_server.py
+"""
+Servidor TCP local que fala o protocolo do Redis (RESP2), para testes de vários processos:
+aponte a URL (`servidor.url`) para o redis-py ou para a fila de mensagens do Socket.IO.
+
+Implementa PUBLISH/SUBSCRIBE/UNSUBSCRIBE (o que a fila de mensagens do Socket.IO usa),
+PING/CLIENT/SELECT (enviados pelo redis-py ao conectar) e repassa os demais comandos ao
+FakeRedis. Também pode ser executado direto:  python tests/fake_redis_server.py 6399
+"""
+
+import socketserver
+import sys
+import threading
+
+from fake_redis import FakeRedis
+
+
+def _bulk(valor):
+    valor = valor if isinstance(valor, bytes) else str(valor).encode()
+    return b'$%d\r\n%s\r\n' % (len(valor), valor)
+
+
+def _codificar(valor):
+    if valor is None:
+        return b'$-1\r\n'
+    if valor is True:
+        return b'+OK\r\n'
+    if valor is False:
+        return b':0\r\n'
+    if isinstance(valor, int):
+        return b':%d\r\n' % valor
+    if isinstance(valor, (list, tuple, set)):
+        return b'*%d\r\n' % len(valor) + b''.join(_codificar(v) for v in valor)
+    if isinstance(valor, dict):
+        return _codificar([x for par in valor.items() for x in par])
+    return _bulk(valor)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeRedisServer:
+    def __init__(self, porta=0):
+        self.redis = FakeRedis()
+        self.publicadas = 0
+        self._assinantes = {}  # {canal: set(conexões)}
+        self._conexoes = set()
+        self._lock = threading.Lock()
+        self._tcp = _TCPServer(('127.0.0.1', porta), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'redis://127.0.0.1:{self._tcp.server_address[1]}/0'
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._tcp.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._tcp.shutdown()
+        self._tcp.server_close()
+        with self._lock:
+            conexoes = list(self._conexoes)
+        for conexao in conexoes:
+            conexao.fechar()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.parar()
+
+    def assinantes(self, canal):
+        """Quantas conexões estão inscritas no canal (para esperar os listeners antes de publicar)."""
+        with self._lock:
+            return len(self._assinantes.get(canal.encode(), ()))
+
+    # --- Pub/Sub ---
+    def _publicar(self, canal, mensagem):
+        with self._lock:
+            destinos = list(self._assinantes.get(canal, ()))
+            self.publicadas += 1
+        for conexao in destinos:
+            conexao.enviar(_codificar([b'message', canal, mensagem]))
+        return len(destinos)
+
+    def _inscrever(self, conexao, canais):
+        for canal in canais:
+            with self._lock:
+                self._assinantes.setdefault(canal, set()).add(conexao)
+                conexao.canais.add(canal)
+                total = len(conexao.canais)
+            conexao.enviar(_codificar([b'subscribe', canal, total]))
+
+    def _cancelar(self, conexao, canais):
+        for canal in canais or list(conexao.canais):
+            with self._lock:
+                self._assinantes.get(canal, set()).discard(conexao)
+                conexao.canais.discard(canal)
+                total = len(conexao.canais)
+            conexao.enviar(_codificar([b'unsubscribe', canal, total]))
+
+    # --- Comandos ---
+    def _executar(self, conexao, comando):
+        nome, args = comando[0].decode().lower(), comando[1:]
+        if nome == 'ping':
+            return b'+PONG\r\n'
+        if nome in ('client', 'select'):
+            return b'+OK\r\n'
+        if nome == 'publish':
+            return _codificar(self._publicar(args[0], args[1]))
+        if nome == 'subscribe':
+            self._inscrever(conexao, args)
+            return b''
+        if nome == 'unsubscribe':
+            self._cancelar(conexao, args)
+            return b''
+        metodo = getattr(self.redis, nome, None)
+        if metodo is None:
+            return b"-ERR unknown command '%s'\r\n" % nome.encode()
+        return _codificar(metodo(*args))
+
+    def _handler(self):
+        servidor = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                self.canais = set()
+                self._escrita = threading.Lock()
+                with servidor._lock:
+                    servidor._conexoes.add(self)
+
+            def enviar(self, dados):
+                with self._escrita:
+                    self.wfile.write(dados)
+                    self.wfile.flush()
+
+            def fechar(self):
+                try:
+                    self.request.shutdown(2)
+                except OSError:
+                    pass
+
+            def _ler_comando(self):
+                linha = self.rfile.readline()
+                if not linha:
+                    return None
+                if not linha.startswith(b'*'):
+                    return linha.split()  # comando inline (ex.: redis-cli / telnet)
+                partes = []
+                for _ in range(int(linha[1:])):
+                    tamanho = int(self.rfile.readline()[1:])
+                    partes.append(self.rfile.read(tamanho + 2)[:-2])
+                return partes
+
+            def handle(self):
+                try:
+                    while True:
+                        comando = self._ler_comando()
+                        if comando is None:
+                            break
+                        if comando:
+                            resposta = servidor._executar(self, comando)
+                            if resposta:
+                                self.enviar(resposta)
+                except (OSError, ValueError):
+                    pass
+
+            def finish(self):
+                with servidor._lock:
+                    for canal in self.canais:
+                        servidor._assinantes.get(canal, set()).discard(self)
+                    servidor._conexoes.discard(self)
+                try:
+                    super().finish()
+                except OSError:
+                    pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    porta = int(sys.argv[1]) if len(sys.argv) > 1 else 6399
+    servidor = FakeRedisServer(porta=porta)
+    print(f"Redis falso em {servidor.url}. Ctrl+C para sair.")
+    try:
+        servidor._tcp.serve_forever()
+    except KeyboardInterrupt:
+        servidor.parar()
@@ -0,0 +1,104 @@
+# tests/test_activity_log_partitions.py
+
+from datetime import datetime, timedelta
+from sqlalchemy import insert, text
+from app.models import db, ActivityLog, Usuario, Empresa
+from app.services.activity_log_partitions import (
+    garantir_particoes, aplicar_retencao, listar_particoes, nome_particao, PARTICAO_PADRAO
+)
+
+AGORA = datetime(2026, 10, 18, 12, 0)
+
+
+def _setup(agentes=2):
+    empresa = Empresa(nome_empresa="Empresa Particoes", cnpj="22.222.222/0001-22")
+    db.session.add(empresa)
+    db.session.commit()
+    usuarios = [
+        Usuario(email=f"agente{i}@particoes.com", nome=f"Agente {i}", empresa_id=empresa.id, role="agente", password_hash="x")
+        for i in range(agentes)
+    ]
+    db.session.add_all(usuarios)
+    db.session.commit()
+    return empresa.id, [u.id for u in usuarios]
+
+
+def _logs(empresa_id, usuario_ids, inicio, minutos):
+    """Um log por minuto para cada agente, a partir de `inicio`."""
+    db.session.execute(insert(ActivityLog), [
+        {'empresa_id': empresa_id, 'usuario_id': uid, 'timestamp': inicio + timedelta(minutes=m), 'process_name': 'excel.exe'}
+        for uid in usuario_ids for m in range(minutos)
+    ])
+    db.session.commit()
+
+
+def _contagem_por_particao():
+    return dict(db.session.execute(text(
+        'SELECT tableoid::regclass::text, count(*) FROM activity_log GROUP BY 1'
+    )).all())
+
+
+def test_particoes_mensais_recebem_as_linhas_da_padrao(test_app):
+    empresa_id, usuarios = _setup()
+    # Sem partição mensal, as linhas caem na partição padrão
+    _logs(empresa_id, usuarios, AGORA - timedelta(hours=1), 30)
+    assert _contagem_por_particao() == {PARTICAO_PADRAO: 60}
+
+    criadas = garantir_particoes(meses_a_frente=2, agora=AGORA)
+    assert criadas == ['activity_log_p2026_10', 'activity_log_p2026_11', 'activity_log_p2026_12']
+    assert _contagem_por_particao() == {'activity_log_p2026_10': 60}
+    assert garantir_particoes(meses_a_frente=2, agora=AGORA) == []  # idempotente
+
+    _logs(empresa_id, usuarios[:1], datetime(2026, 11, 30, 23, 50), 20)
+    assert _contagem_por_particao() == {'activity_log_p2026_10': 60, 'activity_log_p2026_11': 10, 'activity_log_p2026_12': 10}
+
+
+def test_particao_legada_conta_como_existente(test_app):
+    """Meses já cobertos por outra partição (ex.: activity_log_legado, criada pela migração) não são recriados."""
+    db.session.execute(text(
+        "CREATE TABLE activity_log_legado PARTITION OF activity_log FOR VALUES FROM (MINVALUE) TO ('2026-11-01')"
+    ))
+    db.session.commit()
+    assert garantir_particoes(meses_a_frente=1, agora=AGORA) == ['activity_log_p2026_11']
+    assert [p[0] for p in listar_particoes()] == ['activity_log_legado', 'activity_log_p2026_11']
+
+
+def test_retencao_remove_particoes_antigas(test_app):
+    empresa_id, usuarios = _setup()
+    for meses_atras in range(4):
+        garantir_particoes(meses_a_frente=0, agora=AGORA - timedelta(days=31 * meses_atras))
+    _logs(empresa_id, usuarios, datetime(2026, 7, 10), 5)
+    _logs(empresa_id, usuarios, datetime(2026, 8, 10), 5)
+    _logs(empresa_id, usuarios, datetime(2026, 10, 10), 5)
+    _logs(empresa_id, usuarios, datetime(2025, 1, 1), 5)  # sem partição: fica na padrão
+
+    removidas = aplicar_retencao(meses=2, agora=AGORA)
+    assert removidas == ['activity_log_p2026_07']
+    assert nome_particao(datetime(2026, 8, 1)) in [p[0] for p in listar_particoes()]
+    assert _contagem_por_particao() == {'activity_log_p2026_08': 10, 'activity_log_p2026_10': 10}
+    assert aplicar_retencao(meses=0, agora=AGORA) == []
+
+
+def test_consulta_do_dia_de_um_agente_usa_uma_particao_e_o_indice(test_app):
+    empresa_id, usuarios = _setup(agentes=20)
+    for meses_atras in range(3):
+        garantir_particoes(meses_a_frente=0, agora=AGORA - timedelta(days=31 * meses_atras))
+    for dia in (datetime(2026, 8, 18), datetime(2026, 9, 18), datetime(2026, 10, 17)):
+        _logs(empresa_id, usuarios, dia, 8 * 60)
+    db.session.execute(text('ANALYZE activity_log'))
+
+    inicio = datetime(2026, 10, 17)
+    consulta = (
+        ActivityLog.query.filter(
+            ActivityLog.empresa_id == empresa_id, ActivityLog.usuario_id == usuarios[3],
+            ActivityLog.timestamp >= inicio, ActivityLog.timestamp < inicio + timedelta(days=1)
+        ).order_by(ActivityLog.timestamp)
+    )
+    sql = str(consulta.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    plano = '\n'.join(linha for (linha,) in db.session.execute(text(f'EXPLAIN {sql}')))
+
+    assert 'activity_log_p2026_10' in plano
+    assert 'activity_log_p2026_09' not in plano and 'activity_log_p2026_08' not in plano
+    assert 'activity_log_p2026_10_empresa_id_usuario_id_timestamp_idx' in plano  # o índice composto, na partição
+    assert 'Seq Scan' not in plano
+    assert consulta.count() == 8 * 60
@@ -0,0 +1,108 @@
+# tests/test_calendario.py
+
+import calendar
+import pytest
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from app.models import Empresa
+from app.models_rh import FeriadoEmpresa
+from app.rh.calculos import _get_dias_uteis_no_mes, calcular_folha_pagamento
+from app.rh.calendario import pascoa, feriados_do_ano, calendario_do_ano, dias_uteis_entre, dias_uteis_no_mes
+from app import db
+from sqlalchemy import insert
+
+NACIONAIS = [(1, 1), (4, 21), (5, 1), (9, 7), (10, 12), (11, 2), (11, 15), (12, 25)]
+
+
+def _dias_uteis_dia_a_dia(inicio, fim, jornada, feriados=()):
+    """Referência: percorre os dias como a implementação antiga de _get_dias_uteis_no_mes."""
+    limite = {'5x2': 5, '6x1': 6}.get(jornada, 7)
+    total, dia = 0, inicio
+    while dia <= fim:
+        if (dia.month, dia.day) not in NACIONAIS and dia not in feriados and dia.weekday() < limite:
+            total += 1
+        dia += timedelta(days=1)
+    return total
+
+
+def test_dias_uteis_no_mes_iguais_ao_calculo_dia_a_dia():
+    for ano in range(2020, 2031):
+        for mes in range(1, 13):
+            fim = date(ano, mes, calendar.monthrange(ano, mes)[1])
+            for jornada in ('5x2', '6x1', '12x36'):
+                assert _get_dias_uteis_no_mes(ano, mes, jornada) == _dias_uteis_dia_a_dia(date(ano, mes, 1), fim, jornada)
+
+
+def test_intervalos_entre_datas():
+    assert dias_uteis_entre(date(2026, 10, 19), date(2026, 10, 23)) == 5
+    assert dias_uteis_entre(date(2026, 10, 12), date(2026, 10, 12)) == 0  # Nossa Senhora Aparecida
+    assert dias_uteis_entre(date(2026, 10, 20), date(2026, 10, 19)) == 0
+    # Atravessando anos: uma leitura por ano
+    for inicio, fim in [(date(2025, 12, 15), date(2026, 1, 15)), (date(2023, 3, 1), date(2026, 2, 28))]:
+        for jornada in ('5x2', '6x1'):
+            assert dias_uteis_entre(inicio, fim, jornada) == _dias_uteis_dia_a_dia(inicio, fim, jornada)
+
+
+def test_feriados_moveis_e_estaduais():
+    assert [pascoa(a) for a in (2024, 2025, 2026)] == [date(2024, 3, 31), date(2025, 4, 20), date(2026, 4, 5)]
+    moveis = feriados_do_ano(2026, (('movel', 'carnaval'), ('movel', 'corpus_christi'), ('movel', 'sexta_feira_santa')))
+    assert {date(2026, 2, 16), date(2026, 2, 17), date(2026, 4, 3), date(2026, 6, 4)} <= moveis
+    assert date(2026, 7, 9) in feriados_do_ano(2026, (('uf', 'SP'),))
+    assert date(2026, 7, 9) not in feriados_do_ano(2026)
+
+    # Fevereiro de 2026 tem 20 dias úteis; com Carnaval (segunda e terça), 18
+    assert calendario_do_ano(2026, (('movel', 'carnaval'),)).dias_uteis_no_mes(2) == 18
+    assert calendario_do_ano(2026, (('movel', 'carnaval'),)) is calendario_do_ano(2026, (('movel', 'carnaval'),))
+
+
+def test_feriados_da_empresa_entram_na_folha(test_app):
+    empresa = Empresa(nome_empresa="Empresa Calendario", cnpj="66.666.666/0001-66")
+    db.session.add(empresa)
+    db.session.commit()
+    funcionario = SimpleNamespace(
+        empresa_id=empresa.id, salario=Decimal('3000.00'), jornada_trabalho='5x2',
+        recebe_va=True, vale_alimentacao_diario=Decimal('30.00'), recebe_vr=False, vale_refeicao_diario=None,
+        recebe_vt=False, vale_transporte_diario=None
+    )
+    # Julho de 2026: 23 dias úteis
+    assert dias_uteis_no_mes(2026, 7, empresa_id=empresa.id) == 23
+    assert calcular_folha_pagamento(funcionario, 2026, 7)['proventos']['vale_alimentacao'] == Decimal('690.00')
+
+    # A empresa adota os feriados de SP (9 de julho) e um aniversário da cidade recorrente (20 de julho)
+    db.session.add_all([
+        FeriadoEmpresa(empresa_id=empresa.id, descricao="Feriados de SP", uf='sp'),
+        FeriadoEmpresa(empresa_id=empresa.id, descricao="Aniversário da cidade", data=date(2020, 7, 20), recorrente=True),
+        FeriadoEmpresa(empresa_id=empresa.id, descricao="Ponte", data=date(2025, 7, 10)),
+    ])
+    db.session.commit()
+
+    assert dias_uteis_no_mes(2026, 7, empresa_id=empresa.id) == 21
+    assert dias_uteis_no_mes(2025, 7, empresa_id=empresa.id) == 21  # 9 e 10 de julho (o dia 20 foi um domingo)
+    assert dias_uteis_no_mes(2026, 7) == 23  # as outras empresas continuam com o calendário nacional
+    resultado = calcular_folha_pagamento(funcionario, 2026, 7)
+    assert resultado['dias_uteis_mes'] == 21
+    assert resultado['proventos']['vale_alimentacao'] == Decimal('630.00')
+
+
+def test_regras_de_feriado_desconhecidas_validadas_e_ignoradas(test_app, caplog):
+    # Na gravação: normalizadas ou recusadas
+    assert FeriadoEmpresa(descricao="Carnaval", movel=' Carnaval ').movel == 'carnaval'
+    assert FeriadoEmpresa(descricao="Feriados do RJ", uf='rj').uf == 'RJ'
+    with pytest.raises(ValueError):
+        FeriadoEmpresa(descricao="Páscoa", movel='pascoa')
+    with pytest.raises(ValueError):
+        FeriadoEmpresa(descricao="Estado inexistente", uf='XX')
+
+    # Linhas gravadas sem passar pela validação não derrubam o calendário: ficam de fora, com aviso
+    empresa = Empresa(nome_empresa="Empresa Regras", cnpj="66.666.666/0002-66")
+    db.session.add(empresa)
+    db.session.commit()
+    db.session.execute(insert(FeriadoEmpresa), [
+        {'empresa_id': empresa.id, 'descricao': "Móvel antigo", 'movel': 'Carnaval'},
+        {'empresa_id': empresa.id, 'descricao': "Móvel inválido", 'movel': 'pascoa'},
+        {'empresa_id': empresa.id, 'descricao': "UF inválida", 'uf': 'XX'},
+    ])
+    db.session.commit()
+    assert dias_uteis_no_mes(2027, 2, empresa_id=empresa.id) == 18  # Carnaval (8 e 9 de fevereiro) continua valendo
+    assert "movel='pascoa'" in caplog.text and "uf='XX'" in caplog.text
@@ -0,0 +1,89 @@
+# tests/test_classification_cache.py
+
+from app.models import Usuario, Empresa, ProductivityRules
+from app.services.ai_productivity_service import ai_productivity_service, montar_regras
+from app.services.classification_cache import classification_cache, chave_classificacao
+from app import db
+
+
+def test_chave_ignora_trechos_volateis():
+    """Contadores, horários, query string e ids da URL não mudam a chave da atividade."""
+    a = {'process_name': 'chrome.exe', 'window_title': '(3) WhatsApp Business - 12:34', 'url': 'https://www.web.whatsapp.com/chat/5511?x=1'}
+    b = {'process_name': 'Chrome.exe', 'window_title': '(17) WhatsApp Business - 09:05', 'url': 'http://web.whatsapp.com/chat/5521/#topo'}
+    c = {'process_name': 'chrome.exe', 'window_title': 'YouTube', 'url': 'https://youtube.com/watch?v=abc'}
+    assert chave_classificacao(a) == chave_classificacao(b)
+    assert chave_classificacao(a) != chave_classificacao(c)
+
+
+def test_cache_evita_chamadas_repetidas_a_ia(test_app, monkeypatch):
+    """Amostras repetidas da mesma janela chamam a IA uma vez por empresa e versão das regras."""
+    chamadas = []
+
+    def _ia_falsa(itens):
+        chamadas.extend(itens)
+        return [{"is_productive": True, "category": "Atendimento", "reason": "IA"} for _ in itens]
+
+    monkeypatch.setattr(ai_productivity_service, 'api_key', 'chave-de-teste')
+    monkeypatch.setattr(ai_productivity_service, '_classificar_com_ia', _ia_falsa)
+    classification_cache.limpar()
+
+    empresas = []
+    for i in range(2):
+        empresa = Empresa(nome_empresa=f"Empresa Cache {i}", cnpj=f"1{i}.111.111/0001-11")
+        db.session.add(empresa)
+        db.session.commit()
+        regras = ProductivityRules(empresa_id=empresa.id, process_rules=[], url_rules=[])
+        db.session.add(regras)
+        db.session.commit()
+        empresas.append((empresa, regras))
+
+    # 2 empresas x 100 amostras (15s cada) na mesma janela, com o contador do título mudando
+    for empresa, regras in empresas:
+        rules = montar_regras(regras, empresa.id)
+        for i in range(100):
+            analise = ai_productivity_service.analyze_activity(
+                {'process_name': 'chrome.exe', 'window_title': f'({i % 7}) Zendesk', 'url': f'https://suporte.zendesk.com/tickets/{i}'},
+                rules
+            )
+            assert analise['category'] == 'Atendimento'
+    assert len(chamadas) == 2
+    metricas = classification_cache.metricas()
+    assert metricas['misses'] == 2
+    assert metricas['hit_rate'] == 0.99
+
+    # Alterar as regras muda a versão: a próxima amostra é classificada de novo
+    empresa, regras = empresas[0]
+    regras.custom_ai_prompt = "Novo prompt"
+    db.session.commit()
+    ai_productivity_service.analyze_activity({'process_name': 'chrome.exe', 'window_title': 'Zendesk'}, montar_regras(regras, empresa.id))
+    assert len(chamadas) == 3
+
+
+def test_lru_e_ttl(test_app):
+    classification_cache.limpar()
+    classification_cache.max_itens = 2
+    classification_cache.set(1, 'v1', 'a', {'category': 'A'})
+    classification_cache.set(1, 'v1', 'b', {'category': 'B'})
+    assert classification_cache.get(1, 'v1', 'a') == {'category': 'A'}  # 'a' passa a ser o mais recente
+    classification_cache.set(1, 'v1', 'c', {'category': 'C'})
+    assert classification_cache.get(1, 'v1', 'b') is None
+    assert classification_cache.metricas()['remocoes_lru'] == 1
+
+    classification_cache.ttl = 0
+    classification_cache.set(1, 'v1', 'd', {'category': 'D'})
+    assert classification_cache.get(1, 'v1', 'd') is None
+
+
+def test_metricas_expostas_para_super_admin(test_app, test_client):
+    empresa = Empresa(nome_empresa="Empresa Admin", cnpj="12.121.212/0001-12")
+    db.session.add(empresa)
+    db.session.commit()
+    admin = Usuario(email="super@cache.com", nome="Super", empresa_id=empresa.id, role="super_admin")
+    admin.set_password("password123")
+    db.session.add(admin)
+    db.session.commit()
+    test_client.post('/login', data={'email': 'super@cache.com', 'password': 'password123'})
+
+    response = test_client.get('/api/productivity/classification_cache')
+    assert response.status_code == 200
+    assert {'hit_rate', 'hits_memoria', 'hits_redis', 'misses', 'itens'} <= set(response.get_json())
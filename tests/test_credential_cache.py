@@ -0,0 +1,73 @@
+# tests/test_credential_cache.py
+
+import time
+from datetime import datetime
+from sqlalchemy import event
+from app.models import Usuario, Empresa
+from app.services.credential_cache import credential_cache
+from app import db
+
+
+def _setup():
+    empresa = Empresa(nome_empresa="Empresa Chave", cnpj="15.151.515/0001-15")
+    db.session.add(empresa)
+    db.session.commit()
+    admin = Usuario(email="admin@chave.com", nome="Admin", empresa_id=empresa.id, role="admin_empresa")
+    admin.set_password("password123")
+    agente = Usuario(email="agente@chave.com", nome="Agente", empresa_id=empresa.id, role="agente", password_hash="x")
+    db.session.add_all([admin, agente])
+    db.session.commit()
+    return empresa, agente
+
+
+def _consultas_de_usuario(test_app):
+    consultas = []
+
+    def _contar(conn, cursor, statement, *args):
+        if 'FROM usuario' in statement:
+            consultas.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', _contar)
+    return consultas
+
+
+def _enviar_log(test_client, api_key):
+    return test_client.post('/api/productivity/log', headers={'X-API-KEY': api_key},
+                            json={'timestamp': datetime.utcnow().isoformat(), 'process_name': 'excel.exe', 'window_title': 'Planilha'})
+
+
+def test_chave_consultada_uma_vez_por_ttl(test_app, test_client, monkeypatch):
+    test_app.config['PRODUCTIVITY_QUEUE_WORKERS'] = 0
+    _setup()
+    consultas = _consultas_de_usuario(test_app)
+
+    for _ in range(20):
+        assert _enviar_log(test_client, 'agente@chave.com').status_code == 202
+    assert len(consultas) == 1
+
+    # Chaves inválidas não são cacheadas
+    assert _enviar_log(test_client, 'nao@existe.com').status_code == 401
+    assert _enviar_log(test_client, 'nao@existe.com').status_code == 401
+    assert len(consultas) == 3
+
+    # Expirado o TTL, a chave é validada de novo no banco
+    agora = time.monotonic() + credential_cache.ttl
+    monkeypatch.setattr('app.services.credential_cache.time.monotonic', lambda: agora)
+    assert _enviar_log(test_client, 'agente@chave.com').status_code == 202
+    assert len(consultas) == 4
+
+
+def test_bloqueio_invalida_a_chave(test_app, test_client):
+    test_app.config['PRODUCTIVITY_QUEUE_WORKERS'] = 0
+    _, agente = _setup()
+    assert _enviar_log(test_client, 'agente@chave.com').status_code == 202
+
+    test_client.post('/login', data={'email': 'admin@chave.com', 'password': 'password123'})
+    test_client.post(f'/management/usuarios/{agente.id}/toggle_status')
+    assert _enviar_log(test_client, 'agente@chave.com').status_code == 401
+
+    test_client.post(f'/management/usuarios/{agente.id}/toggle_status')
+    assert _enviar_log(test_client, 'agente@chave.com').status_code == 202
+
+    test_client.post(f'/management/usuarios/{agente.id}/excluir')
+    assert _enviar_log(test_client, 'agente@chave.com').status_code == 401
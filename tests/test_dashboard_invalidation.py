@@ -0,0 +1,75 @@
+# tests/test_dashboard_invalidation.py
+
+import time
+from app.models import Usuario, Empresa
+from app.services.realtime_service import dashboard_invalidator
+from app import db, socketio
+
+
+def _criar_empresa(nome, cnpj, email):
+    empresa = Empresa(nome_empresa=nome, cnpj=cnpj)
+    db.session.add(empresa)
+    db.session.commit()
+    admin = Usuario(email=email, nome=f"Admin {nome}", empresa_id=empresa.id, role="admin_empresa")
+    admin.set_password("password123")
+    db.session.add(admin)
+    db.session.commit()
+    return empresa, admin
+
+
+def _conectar(test_app, email):
+    """Faz login via HTTP e abre um cliente Socket.IO com a mesma sessão (entra na sala da empresa)."""
+    # Contexto próprio: o Flask-Login guarda o usuário em g, que é do contexto da aplicação
+    with test_app.app_context():
+        http_client = test_app.test_client()
+        http_client.post('/login', data={'email': email, 'password': 'password123'})
+        cliente = socketio.test_client(test_app, flask_test_client=http_client)
+    assert cliente.is_connected()
+    cliente.get_received()  # descarta os eventos da conexão
+    return cliente
+
+
+def _eventos_dashboard(cliente):
+    return [e['args'][0] for e in cliente.get_received() if e['name'] == 'atualizar_dashboard']
+
+
+def test_invalidacoes_agrupadas_por_janela_e_por_empresa(test_app):
+    """Várias invalidações na mesma janela geram um único evento, só para a sala da empresa."""
+    test_app.config['DASHBOARD_INVALIDATION_WINDOW_SECONDS'] = 0.2
+    empresa_a, admin_a = _criar_empresa("A", "66.666.666/0001-66", "admin@a.com")
+    empresa_b, _ = _criar_empresa("B", "77.777.777/0001-77", "admin@b.com")
+    cliente_a = _conectar(test_app, "admin@a.com")
+    cliente_b = _conectar(test_app, "admin@b.com")
+
+    for _ in range(10):
+        dashboard_invalidator.invalidar(empresa_a.id, agentes=[admin_a.id])
+    dashboard_invalidator.invalidar(empresa_a.id, fila=True)
+    time.sleep(0.6)
+
+    eventos = _eventos_dashboard(cliente_a)
+    assert len(eventos) == 1
+    delta = eventos[0]
+    # Apenas as seções invalidadas são enviadas
+    assert delta['empresa_id'] == empresa_a.id
+    assert delta['fila'] == []
+    assert [a['id'] for a in delta['agentes']] == [admin_a.id]
+    assert 'totalAtendimentos' not in delta
+
+    assert _eventos_dashboard(cliente_b) == []
+
+
+def test_status_do_agente_invalida_apenas_o_agente(test_app):
+    """Mudar o status envia ao dashboard só o card do agente alterado."""
+    test_app.config['DASHBOARD_INVALIDATION_WINDOW_SECONDS'] = 0
+    empresa, admin = _criar_empresa("C", "88.888.888/0001-88", "admin@c.com")
+    cliente = _conectar(test_app, "admin@c.com")
+
+    http_client = test_app.test_client()
+    http_client.post('/login', data={'email': 'admin@c.com', 'password': 'password123'})
+    response = http_client.post('/api/agente/mudar_status', json={'status': 'Pausa'})
+    assert response.status_code == 200
+
+    eventos = _eventos_dashboard(cliente)
+    assert len(eventos) == 1
+    assert set(eventos[0]) == {'empresa_id', 'agentes'}
+    assert eventos[0]['agentes'][0]['status'] == 'Pausa'
@@ -0,0 +1,91 @@
+# tests/test_dashboard_produtividade.py
+
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app.models import Usuario, Empresa, ConversaWhatsApp
+from app import db
+
+
+def _criar_empresa_com_admin(cnpj="44.444.444/0001-44"):
+    empresa = Empresa(nome_empresa="Empresa Dashboard", cnpj=cnpj)
+    db.session.add(empresa)
+    db.session.commit()
+    admin = Usuario(email=f"admin_{cnpj[:2]}@test.com", nome="Admin", empresa_id=empresa.id, role="admin_empresa")
+    admin.set_password("password123")
+    db.session.add(admin)
+    db.session.commit()
+    return empresa, admin
+
+
+def _popular(empresa, num_agentes, conversas_por_agente, prefixo="agente"):
+    """Cria N agentes e M conversas por agente, todas de hoje."""
+    agora = datetime.utcnow()
+    assuntos = ['Geral', 'Financeiro', 'Suporte', 'Vendas', 'Cancelamento', 'Outros']
+    agentes = [
+        Usuario(email=f"{prefixo}{i}_{empresa.id}@test.com", nome=f"Agente {i}", empresa_id=empresa.id,
+                role="agente", password_hash="x")
+        for i in range(num_agentes)
+    ]
+    db.session.add_all(agentes)
+    db.session.flush()
+    for agente in agentes:
+        for j in range(conversas_por_agente):
+            db.session.add(ConversaWhatsApp(
+                wa_id=f"5511{agente.id:05d}{j:04d}", empresa_id=empresa.id,
+                agente_atribuido_id=agente.id, assunto=assuntos[j % len(assuntos)],
+                created_at=agora, inicio=agora - timedelta(minutes=5), fim=agora
+            ))
+    db.session.commit()
+    return agentes
+
+
+def _contar_consultas(test_client, url):
+    consultas = []
+
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', _registrar)
+    try:
+        response = test_client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _registrar)
+    return response, len(consultas)
+
+
+def test_produtividade_agrega_estatisticas_por_agente(test_client):
+    """Verifica os valores agregados de atendimentos, TMA e top assuntos por agente."""
+    empresa, _ = _criar_empresa_com_admin()
+    agentes = _popular(empresa, num_agentes=2, conversas_por_agente=7)
+    test_client.post('/login', data={'email': 'admin_44@test.com', 'password': 'password123'})
+
+    response = test_client.get('/api/dashboard/produtividade')
+    assert response.status_code == 200
+    dados = response.get_json()
+
+    assert dados['totalAtendimentos'] == 14
+    assert dados['tma'] == '05:00'
+    por_id = {a['id']: a for a in dados['agentes']}
+    agente = por_id[agentes[0].id]
+    assert agente['atendimentos'] == 7
+    assert agente['tma'] == '05:00'
+    assert agente['setor'] == 'Sem Setor'
+    assert len(agente['top_assuntos']) == 5
+    assert agente['top_assuntos'][0] == {'assunto': 'Geral', 'total': 2}
+
+
+def test_produtividade_numero_de_consultas_constante(test_client):
+    """Benchmark: o número de consultas não deve crescer com a quantidade de agentes."""
+    empresa, _ = _criar_empresa_com_admin()
+    test_client.post('/login', data={'email': 'admin_44@test.com', 'password': 'password123'})
+
+    _popular(empresa, num_agentes=3, conversas_por_agente=4)
+    response, consultas_poucos_agentes = _contar_consultas(test_client, '/api/dashboard/produtividade')
+    assert response.status_code == 200
+
+    _popular(empresa, num_agentes=60, conversas_por_agente=10, prefixo="outro")
+    response, consultas_muitos_agentes = _contar_consultas(test_client, '/api/dashboard/produtividade')
+    assert response.status_code == 200
+    assert len(response.get_json()['agentes']) == 64
+
+    assert consultas_muitos_agentes == consultas_poucos_agentes
@@ -0,0 +1,189 @@
+# tests/test_envio.py
+
+import time
+from app.models import Usuario, Empresa, ConversaWhatsApp, MensagemWhatsApp
+from app.services import envio_service as envio_modulo
+from app.services.envio_service import envio_service, BaldeDeTokens
+from app import db
+from fake_provider_server import FakeProviderServer
+
+
+def _configurar(test_app, servidor, **config):
+    test_app.config.update({
+        'WHATSAPP_API_BASE_URL': servidor.base_url,
+        'SENDGRID_API_BASE_URL': servidor.base_url,
+        'OUTBOUND_RETRY_BACKOFF_SECONDS': 0.01,
+        'OUTBOUND_READ_TIMEOUT_SECONDS': 5,
+        **config
+    })
+    envio_service.init_app(test_app)
+
+
+def _empresa(sufixo, token=None):
+    empresa = Empresa(nome_empresa=f"Empresa Envio {sufixo}", cnpj=f"55.555.555/000{sufixo}-55",
+                      whatsapp_token=token if token is not None else f"token-{sufixo}",
+                      whatsapp_phone_number_id=f"10{sufixo}", email_api_key=f"sg-{sufixo}", email_sender=f"suporte{sufixo}@envio.com")
+    db.session.add(empresa)
+    db.session.commit()
+    conversa = ConversaWhatsApp(wa_id=f"551190000{sufixo}", nome_cliente=f"Cliente {sufixo}", status='ativo', empresa_id=empresa.id)
+    db.session.add(conversa)
+    db.session.commit()
+    return empresa, conversa
+
+
+def _login(test_client, empresa):
+    agente = Usuario(email=f"agente{empresa.id}@envio.com", nome="Agente", empresa_id=empresa.id, role="agente")
+    agente.set_password("password123")
+    db.session.add(agente)
+    db.session.commit()
+    test_client.post('/login', data={'email': agente.email, 'password': 'password123'})
+
+
+def test_mensagem_do_agente_enviada_em_segundo_plano_com_status_gravado(test_app, test_client, monkeypatch):
+    emitidos = []
+    monkeypatch.setattr(envio_modulo.socketio, 'emit', lambda *a, **k: emitidos.append((a, k)))
+    with FakeProviderServer() as servidor:
+        _configurar(test_app, servidor)
+        empresa, conversa = _empresa(1)
+        _login(test_client, empresa)
+
+        resposta = test_client.post(f'/api/conversa/{conversa.id}/enviar', json={'mensagem': 'Olá, como posso ajudar?'})
+        assert resposta.status_code == 202
+        dados = resposta.get_json()
+        assert dados['status'] == 'ok' and dados['status_envio'] == 'pendente'
+        # A rota não chama o provedor
+        assert servidor.requisicoes == 0
+
+        assert envio_service.drenar(test_app) == 1
+        mensagem = db.session.get(MensagemWhatsApp, dados['mensagem_id'])
+        db.session.refresh(mensagem)
+        assert (mensagem.status_envio, mensagem.tentativas_envio, mensagem.erro_envio) == ('enviada', 1, None)
+        assert mensagem.wamid == 'wamid.fake-1' and mensagem.enviada_em is not None
+
+        _, token, caminho, corpo = servidor.recebidas[0]
+        assert (token, caminho) == ('token-1', '/101/messages')
+        assert corpo['to'] == conversa.wa_id and corpo['text']['body'] == 'Olá, como posso ajudar?'
+        assert emitidos[-1][0] == ('status_mensagem', {'conversa_id': conversa.id, 'mensagem_id': mensagem.id, 'status': 'enviada'})
+
+
+def test_falhas_temporarias_repetidas_e_recusas_encerradas(test_app):
+    with FakeProviderServer() as servidor:
+        _configurar(test_app, servidor, OUTBOUND_MAX_ATTEMPTS=3)
+        _, conversa = _empresa(1)
+        _, recusada = _empresa(2)
+        _, sem_credencial = _empresa(3, token='')
+        servidor.recusar.add(recusada.wa_id)
+
+        servidor.falhas_restantes = 2
+        repetida = envio_service.enviar_whatsapp(conversa, 'Depois de duas falhas')
+        envio_service.drenar(test_app)
+        db.session.refresh(repetida)
+        assert (repetida.status_envio, repetida.tentativas_envio) == ('enviada', 3)
+
+        servidor.falhas_restantes = 3
+        esgotada = envio_service.enviar_whatsapp(conversa, 'Sempre falha')
+        envio_service.drenar(test_app)
+        nao_aceita = envio_service.enviar_whatsapp(recusada, 'Número inválido')
+        sem_envio = envio_service.enviar_whatsapp(sem_credencial, 'Sem token')
+        envio_service.drenar(test_app)
+        for mensagem in (esgotada, nao_aceita, sem_envio):
+            db.session.refresh(mensagem)
+        assert (esgotada.status_envio, esgotada.tentativas_envio) == ('falhou', 3)
+        assert 'HTTP 500' in esgotada.erro_envio
+        # 400 não é repetido
+        assert (nao_aceita.status_envio, nao_aceita.tentativas_envio) == ('falhou', 1)
+        assert 'HTTP 400' in nao_aceita.erro_envio
+        assert (sem_envio.status_envio, sem_envio.tentativas_envio) == ('falhou', 0)
+
+        metricas = envio_service.metricas(test_app)
+        assert (metricas['enviadas'], metricas['falhas'], metricas['fila'], metricas['agendados']) == (1, 3, 0, 0)
+
+
+def test_cota_por_empresa_espaca_os_envios_sem_atrasar_as_outras(test_app):
+    # A cota local fica abaixo da do provedor (rajada + reposição cabem na janela de 1 s dele)
+    with FakeProviderServer(limite_por_segundo=10) as servidor:
+        _configurar(test_app, servidor, WHATSAPP_SEND_RATE_PER_SECOND=5)
+        _, conversa_a = _empresa(1)
+        _, conversa_b = _empresa(2)
+        mensagens = [envio_service.enviar_whatsapp(conversa_a, f"A {i}") for i in range(10)]
+        mensagens += [envio_service.enviar_whatsapp(conversa_b, f"B {i}") for i in range(3)]
+
+        inicio = time.monotonic()
+        envio_service.drenar(test_app)
+        # 5 na rajada e as outras 5 espaçadas em 1 s, sem nenhuma recusa do provedor
+        assert time.monotonic() - inicio >= 0.9
+        assert servidor.limitadas == 0
+        for mensagem in mensagens:
+            db.session.refresh(mensagem)
+        assert {m.status_envio for m in mensagens} == {'enviada'}
+        # A empresa B não esperou a fila da A
+        enviadas_b = servidor.enviadas_por_token('token-2')
+        assert len(enviadas_b) == 3 and max(r[0] for r in enviadas_b) - inicio < 0.5
+
+
+def test_429_do_provedor_repetido_depois_do_retry_after(test_app):
+    with FakeProviderServer(limite_por_segundo=2) as servidor:
+        _configurar(test_app, servidor, WHATSAPP_SEND_RATE_PER_SECOND=0)
+        _, conversa = _empresa(1)
+        mensagens = [envio_service.enviar_whatsapp(conversa, f"Mensagem {i}") for i in range(4)]
+        inicio = time.monotonic()
+        envio_service.drenar(test_app)
+        assert time.monotonic() - inicio >= 1
+        for mensagem in mensagens:
+            db.session.refresh(mensagem)
+        assert servidor.limitadas == 2
+        assert [(m.status_envio, m.tentativas_envio) for m in mensagens] == [('enviada', 1)] * 2 + [('enviada', 2)] * 2
+
+
+def test_workers_limitam_concorrencia_e_reaproveitam_conexoes(test_app):
+    with FakeProviderServer(latencia=0.05) as servidor:
+        _configurar(test_app, servidor, OUTBOUND_WORKERS=4)
+        empresa, conversa = _empresa(1)
+        try:
+            mensagens = [envio_service.enviar_whatsapp(conversa, f"Mensagem {i}") for i in range(40)]
+            assert envio_service.enviar_email(empresa, 'cliente@exemplo.com', 'Protocolo', '<p>Seu protocolo: 123</p>')
+            limite = time.monotonic() + 10
+            while time.monotonic() < limite and envio_service.metricas(test_app)['enviadas'] < 41:
+                time.sleep(0.02)
+        finally:
+            envio_service.parar(test_app)
+
+        assert envio_service.metricas(test_app)['enviadas'] == 41
+        assert servidor.max_simultaneas <= 4
+        # Conexões keep-alive: no máximo uma por worker, não uma por mensagem
+        assert servidor.conexoes <= 4
+        email = [r for r in servidor.recebidas if r[2] == '/v3/mail/send']
+        assert email[0][1] == 'sg-1' and email[0][3]['from']['email'] == 'suporte1@envio.com'
+        db.session.expire_all()
+        assert {m.status_envio for m in MensagemWhatsApp.query.filter(MensagemWhatsApp.id.in_([m.id for m in mensagens]))} == {'enviada'}
+
+
+def test_pendentes_recuperados_e_enviados_uma_vez_so(test_app):
+    with FakeProviderServer() as servidor:
+        _configurar(test_app, servidor, OUTBOUND_QUEUE_MAX_SIZE=3)
+        _, conversa = _empresa(1)
+        # Só três cabem na fila; as outras ficam pendentes no banco
+        mensagens = [envio_service.enviar_whatsapp(conversa, f"Mensagem {i}") for i in range(5)]
+        assert envio_service.metricas(test_app)['fila_cheia'] == 2
+        assert envio_service.recuperar_pendentes(test_app, idade=0) == 0
+
+        assert envio_service.drenar(test_app) == 3
+        assert envio_service.recuperar_pendentes(test_app, idade=0) == 2
+        assert envio_service.drenar(test_app) == 2
+
+        # Na fila e recuperada do banco ao mesmo tempo: a reivindicação impede o envio duplicado
+        mensagens.append(envio_service.enviar_whatsapp(conversa, "Duplicada na fila"))
+        assert envio_service.recuperar_pendentes(test_app, idade=0) == 1
+        assert envio_service.drenar(test_app) == 1
+
+        for mensagem in mensagens:
+            db.session.refresh(mensagem)
+        assert {m.status_envio for m in mensagens} == {'enviada'}
+        assert servidor.requisicoes == 6
+
+
+def test_balde_de_tokens_espaca_alem_da_rajada():
+    balde = BaldeDeTokens(taxa=10, capacidade=2)
+    esperas = [balde.reservar() for _ in range(4)]
+    assert esperas[:2] == [0.0, 0.0]
+    assert 0.09 <= esperas[2] <= 0.11 and 0.19 <= esperas[3] <= 0.21
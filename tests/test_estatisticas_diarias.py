@@ -0,0 +1,125 @@
+# tests/test_estatisticas_diarias.py
+
+import time
+from datetime import datetime, timedelta
+from app.models import Usuario, Empresa, ConversaWhatsApp, Avaliacao, EstatisticaDiaria
+from app.services.whatsapp_inbox_service import whatsapp_inbox_service
+from app import db
+
+
+def _payload_webhook(wa_id, texto, msg_id="wamid.1"):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": [{
+            "id": msg_id, "from": wa_id, "timestamp": str(int(time.time())), "text": {"body": texto}
+        }]}}]}]
+    }
+
+
+def _setup(test_client):
+    empresa = Empresa(nome_empresa="Empresa Rollup", cnpj="55.555.555/0001-55")
+    db.session.add(empresa)
+    db.session.commit()
+    admin = Usuario(email="admin@rollup.com", nome="Admin Rollup", empresa_id=empresa.id, role="admin_empresa")
+    admin.set_password("password123")
+    db.session.add(admin)
+    db.session.commit()
+    test_client.post('/login', data={'email': 'admin@rollup.com', 'password': 'password123'})
+    return empresa, admin
+
+
+def _snapshot(empresa_id):
+    linhas = EstatisticaDiaria.query.filter_by(empresa_id=empresa_id).all()
+    return {
+        (l.data, l.agente_id, l.assunto, l.canal): (
+            l.atendimentos, l.mensagens_recebidas, l.conversas_finalizadas, round(l.duracao_total_segundos, 3),
+            l.avaliacoes, l.avaliacoes_com_csat, round(l.soma_csat, 3)
+        )
+        for l in linhas
+        if any([l.atendimentos, l.mensagens_recebidas, l.conversas_finalizadas, l.avaliacoes])
+    }
+
+
+def test_rollup_incremental_e_leitura_pelos_dashboards(test_app, test_client):
+    """Webhook, finalização e avaliação atualizam o rollup, lido pelos endpoints do dashboard."""
+    empresa, admin = _setup(test_client)
+
+    response = test_client.post(f'/api/webhook/{empresa.id}', json=_payload_webhook("5511999990001", "Olá"))
+    assert response.status_code == 200
+    whatsapp_inbox_service.drenar(test_app)
+    conversa = ConversaWhatsApp.query.filter_by(empresa_id=empresa.id).one()
+
+    # Atribui agente e assunto depois da criação: o rollup deve mover o atendimento de linha
+    conversa.agente_atribuido_id = admin.id
+    conversa.inicio = datetime.utcnow() - timedelta(minutes=2)
+    db.session.commit()
+    test_client.post(f'/api/conversa/{conversa.id}/definir_assunto', json={'assunto': 'Financeiro'})
+    response = test_client.post(f'/api/conversa/{conversa.id}/finalizar')
+    assert response.status_code == 200
+
+    db.session.add(Avaliacao(empresa_id=empresa.id, agente_id=admin.id, canal='whatsapp', csat=4.0))
+    db.session.add(Avaliacao(empresa_id=empresa.id, agente_id=admin.id, canal='voz', csat=5.0))
+    db.session.commit()
+
+    hoje = datetime.utcnow().date()
+    linha = EstatisticaDiaria.query.filter_by(empresa_id=empresa.id, data=hoje, agente_id=admin.id, assunto='Financeiro').one()
+    assert linha.atendimentos == 1
+    assert linha.conversas_finalizadas == 1
+    assert EstatisticaDiaria.query.filter_by(empresa_id=empresa.id, agente_id=0, assunto='Geral').one().atendimentos == 0
+
+    dados = test_client.get('/api/dashboard/produtividade').get_json()
+    assert dados['totalAtendimentos'] == 1
+    assert dados['tma'] == '02:00'
+    assert dados['csatGeral'] == 4.5
+    agente = next(a for a in dados['agentes'] if a['id'] == admin.id)
+    assert agente['top_assuntos'] == [{'assunto': 'Financeiro', 'total': 1}]
+
+    graficos = test_client.get('/api/dados_dashboard_graficos').get_json()
+    assert sorted(zip(graficos['graficoCanais']['labels'], graficos['graficoCanais']['data'])) == [('voz', 1), ('whatsapp', 1)]
+    assert graficos['graficoCsatAgente'] == {'labels': ['Admin Rollup'], 'data': [4.5]}
+
+
+def test_reconstrucao_em_lote_igual_ao_incremental(test_app, test_client):
+    """O comando de backfill deve produzir exatamente o mesmo rollup que a manutenção incremental."""
+    empresa, admin = _setup(test_client)
+    ontem = datetime.utcnow() - timedelta(days=1)
+    for i in range(5):
+        test_client.post(f'/api/webhook/{empresa.id}', json=_payload_webhook(f"55119999900{i:02d}", "Oi", f"wamid.{i}"))
+    whatsapp_inbox_service.drenar(test_app)
+    db.session.add(ConversaWhatsApp(
+        wa_id="5511888880000", empresa_id=empresa.id, agente_atribuido_id=admin.id, assunto='Suporte',
+        created_at=ontem, inicio=ontem, fim=ontem + timedelta(minutes=7)
+    ))
+    db.session.add(Avaliacao(empresa_id=empresa.id, agente_id=admin.id, canal='whatsapp', csat=3.0, created_at=ontem))
+    db.session.add(Avaliacao(empresa_id=empresa.id, agente_id=admin.id, canal='email', csat=None))
+    db.session.commit()
+
+    incremental = _snapshot(empresa.id)
+    assert incremental
+
+    EstatisticaDiaria.query.delete()
+    db.session.commit()
+    result = test_app.test_cli_runner().invoke(args=['estatisticas', 'reconstruir'])
+    assert result.exit_code == 0, result.output
+
+    assert _snapshot(empresa.id) == incremental
+
+
+def test_reatribuicao_depois_do_commit_move_o_atendimento_do_agente_anterior(test_app, test_client):
+    empresa, admin = _setup(test_client)
+    outro = Usuario(email="outro@rollup.com", nome="Outro Agente", empresa_id=empresa.id, role="agente")
+    outro.set_password("password123")
+    db.session.add(outro)
+    db.session.commit()
+    conversa = ConversaWhatsApp(wa_id="5511777770000", empresa_id=empresa.id, agente_atribuido_id=admin.id, assunto='Suporte')
+    db.session.add(conversa)
+    db.session.commit()
+
+    # Depois do commit a conversa está expirada: o agente anterior não está carregado na troca
+    conversa.agente_atribuido_id = outro.id
+    db.session.commit()
+
+    hoje = datetime.utcnow().date()
+    assert _snapshot(empresa.id) == {(hoje, outro.id, 'Suporte', ''): (1, 0, 0, 0, 0, 0, 0)}
+    assert EstatisticaDiaria.query.filter_by(empresa_id=empresa.id, agente_id=0).count() == 0
+    assert EstatisticaDiaria.query.filter_by(empresa_id=empresa.id, agente_id=admin.id).one().atendimentos == 0
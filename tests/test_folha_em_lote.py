@@ -0,0 +1,103 @@
+# tests/test_folha_em_lote.py
+
+import random
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from types import SimpleNamespace
+from app.models import Usuario, Empresa
+from app.models_rh import Funcionario, Cargo, Departamento
+from app.rh.calculos import calcular_folha_pagamento, calcular_folha_em_lote, COLUNAS_FOLHA
+from app import db
+
+# Campo do resultado em lote -> caminho no resultado de calcular_folha_pagamento
+CAMPOS = {
+    'dias_uteis_mes': ('dias_uteis_mes',),
+    'salario_base': ('proventos', 'salario_base'),
+    'vale_alimentacao': ('proventos', 'vale_alimentacao'),
+    'vale_refeicao': ('proventos', 'vale_refeicao'),
+    'vale_transporte': ('descontos', 'vale_transporte'),
+    'inss': ('descontos', 'inss'),
+    'irrf': ('descontos', 'irrf'),
+    'fgts': ('custos_empresa', 'fgts'),
+    'inss_patronal': ('custos_empresa', 'inss_patronal'),
+    'total_proventos': ('totais', 'proventos'),
+    'total_descontos': ('totais', 'descontos'),
+    'liquido_funcionario': ('totais', 'liquido_funcionario'),
+    'custo_total_empresa': ('totais', 'custo_total_empresa'),
+}
+
+
+def _funcionarios_aleatorios(quantidade, semente=7):
+    aleatorio = random.Random(semente)
+    # Salários nos limites das faixas de INSS e IRRF, além de valores aleatórios
+    salarios = ['1500.00', '1500.01', '2800.00', '4200.00', '2442.38', '2442.39', '3106.00']
+    funcionarios = []
+    for i in range(quantidade):
+        salario = salarios[i] if i < len(salarios) else f'{aleatorio.uniform(1200, 15000):.2f}'
+        funcionarios.append(SimpleNamespace(
+            salario=Decimal(salario),
+            jornada_trabalho=aleatorio.choice(['5x2', '6x1', '12x36']),
+            recebe_va=aleatorio.random() < 0.5,
+            vale_alimentacao_diario=aleatorio.choice([None, Decimal('0'), Decimal(f'{aleatorio.uniform(10, 60):.2f}')]),
+            recebe_vr=aleatorio.random() < 0.5,
+            vale_refeicao_diario=aleatorio.choice([None, Decimal(f'{aleatorio.uniform(10, 60):.2f}')]),
+            recebe_vt=aleatorio.random() < 0.5,
+            vale_transporte_diario=aleatorio.choice([None, Decimal(f'{aleatorio.uniform(5, 40):.2f}')]),
+        ))
+    return funcionarios
+
+
+def _colunas(funcionarios):
+    return {c: [getattr(f, c) for f in funcionarios] for c in COLUNAS_FOLHA}
+
+
+def test_lote_igual_ao_calculo_individual():
+    funcionarios = _funcionarios_aleatorios(500)
+    for ano, mes in [(2026, 1), (2026, 2), (2026, 10), (2024, 12)]:
+        lote = calcular_folha_em_lote(_colunas(funcionarios), ano=ano, mes=mes)
+        for i, funcionario in enumerate(funcionarios):
+            individual = calcular_folha_pagamento(funcionario, ano=ano, mes=mes)
+            assert individual['success']
+            for campo, caminho in CAMPOS.items():
+                esperado = individual
+                for chave in caminho:
+                    esperado = esperado[chave]
+                assert lote[campo][i] == esperado, (campo, i, ano, mes)
+
+
+def _centavos(valor):
+    return Decimal(valor).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def test_dashboard_financeiro_usa_o_lote(test_client):
+    empresa = Empresa(nome_empresa="Empresa Folha", cnpj="55.555.555/0001-55")
+    db.session.add(empresa)
+    db.session.commit()
+    gestor = Usuario(email="rh@folha.com", nome="RH", empresa_id=empresa.id, role="admin_empresa")
+    gestor.set_password("password123")
+    cargo = Cargo(nome="Analista", salario_base=3000, nivel="Pleno", empresa_id=empresa.id)
+    departamento = Departamento(nome="Operação", empresa_id=empresa.id)
+    db.session.add_all([gestor, cargo, departamento])
+    db.session.flush()
+    modelos = _funcionarios_aleatorios(20)
+    for i, modelo in enumerate(modelos):
+        db.session.add(Funcionario(
+            nome=f"Funcionario {i}", cpf=f"000.000.000-{i:02d}", rg=f"{i}", data_nascimento=date(1990, 1, 1),
+            sexo="F", estado_civil="Solteira", telefone="11999999999", email=f"f{i}@folha.com",
+            endereco="Rua A", cep="01000-000", cidade="São Paulo", estado="SP", matricula=f"M{i:03d}",
+            cargo_id=cargo.id, departamento_id=departamento.id, data_admissao=date(2024, 1, 1),
+            empresa_id=empresa.id, status='inativo' if i == 0 else 'ativo', **vars(modelo)
+        ))
+    db.session.commit()
+    test_client.post('/login', data={'email': 'rh@folha.com', 'password': 'password123'})
+
+    dados = test_client.get('/api/rh/dados_dashboard_financeiro').get_json()
+
+    # Como na folha gravada, cada valor é arredondado ao centavo por funcionário antes da soma
+    individuais = [calcular_folha_pagamento(f) for f in Funcionario.query.filter_by(empresa_id=empresa.id, status='ativo')]
+    assert dados['total_funcionarios'] == 19
+    assert dados['custo_total_empresa'] == float(sum(_centavos(r['totais']['custo_total_empresa']) for r in individuais))
+    assert dados['total_salarios_liquidos'] == float(sum(_centavos(r['totais']['liquido_funcionario']) for r in individuais))
+    assert dados['total_impostos'] == float(sum(
+        _centavos(r['custos_empresa']['fgts']) + _centavos(r['custos_empresa']['inss_patronal']) for r in individuais
+    ))
@@ -0,0 +1,161 @@
+# tests/test_folha_fechamento.py
+
+from datetime import date, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from app.models import Usuario, Empresa
+from app.models_rh import Funcionario, Cargo, Departamento, Afastamento, ControlePonto, FolhaPagamento
+from app.rh.calculos import calcular_folha_pagamento
+from app.services.folha_service import fechar_folha
+from app import db
+
+ANO, MES = 2026, 10  # outubro de 2026: 21 dias úteis na jornada 5x2
+
+
+def _setup(quantidade=4):
+    empresa = Empresa(nome_empresa="Empresa Fechamento", cnpj="77.777.777/0001-77")
+    db.session.add(empresa)
+    db.session.commit()
+    gestor = Usuario(email="rh@fechamento.com", nome="RH", empresa_id=empresa.id, role="admin_empresa")
+    gestor.set_password("password123")
+    cargo = Cargo(nome="Analista", salario_base=3000, nivel="Pleno", empresa_id=empresa.id)
+    departamento = Departamento(nome="Operação", empresa_id=empresa.id)
+    db.session.add_all([gestor, cargo, departamento])
+    db.session.flush()
+    funcionarios = [Funcionario(
+        nome=f"Funcionario {i}", cpf=f"111.111.111-{i:02d}", rg=f"{i}", data_nascimento=date(1990, 1, 1),
+        sexo="M", estado_civil="Solteiro", telefone="11999999999", email=f"f{i}@fechamento.com",
+        endereco="Rua A", cep="01000-000", cidade="São Paulo", estado="SP", matricula=f"F{i:03d}",
+        cargo_id=cargo.id, departamento_id=departamento.id, data_admissao=date(2024, 1, 1), empresa_id=empresa.id,
+        salario=Decimal('2000.00') + 1000 * i, jornada_trabalho='5x2' if i % 2 == 0 else '6x1',
+        recebe_va=True, vale_alimentacao_diario=Decimal('33.33'), recebe_vr=i % 2 == 0, vale_refeicao_diario=Decimal('25.50'),
+        recebe_vt=True, vale_transporte_diario=Decimal('12.35')
+    ) for i in range(quantidade)]
+    db.session.add_all(funcionarios)
+    db.session.commit()
+    return empresa, funcionarios
+
+
+def _centavos(valor):
+    return valor.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def test_fechamento_grava_a_folha_arredondada_ao_centavo(test_app):
+    empresa, funcionarios = _setup()
+    assert fechar_folha(empresa.id, ANO, MES) == {'calculados': 4, 'inalterados': 0, 'removidos': 0}
+
+    for funcionario in funcionarios:
+        folha = FolhaPagamento.query.filter_by(funcionario_id=funcionario.id, ano=ANO, mes=MES).one()
+        esperado = calcular_folha_pagamento(funcionario, ANO, MES)
+        assert folha.empresa_id == empresa.id
+        assert folha.dias_uteis == folha.dias_trabalhados == esperado['dias_uteis_mes']
+        assert folha.inss == _centavos(esperado['descontos']['inss'])
+        assert folha.irrf == _centavos(esperado['descontos']['irrf'])
+        assert folha.vale_alimentacao == _centavos(esperado['proventos']['vale_alimentacao'])
+        assert folha.salario_liquido == _centavos(esperado['totais']['liquido_funcionario'])
+        assert folha.custo_total_empresa == _centavos(esperado['totais']['custo_total_empresa'])
+
+
+def test_novo_fechamento_recalcula_so_quem_mudou(test_app):
+    empresa, funcionarios = _setup(6)
+    fechar_folha(empresa.id, ANO, MES)
+    assert fechar_folha(empresa.id, ANO, MES) == {'calculados': 0, 'inalterados': 6, 'removidos': 0}
+
+    funcionarios[0].salario = Decimal('2100.00')                         # salário
+    funcionarios[1].recebe_vr = True                                     # benefício
+    db.session.add(Afastamento(funcionario_id=funcionarios[2].id, motivo="Atestado",  # afastamento (3 dias úteis)
+                               data_inicio=date(2026, 10, 13), data_fim=date(2026, 10, 15)))
+    db.session.add(ControlePonto(funcionario_id=funcionarios[3].id, data=date(2026, 10, 5),  # ponto
+                                 entrada_1=time(8), saida_1=time(19), horas_extras=Decimal('2.50')))
+    db.session.add(Afastamento(funcionario_id=funcionarios[4].id, motivo="Férias",  # fora do mês: não muda nada
+                               data_inicio=date(2026, 8, 1), data_fim=date(2026, 8, 30)))
+    funcionarios[5].status = 'desligado'                                # demitido antes do mês
+    funcionarios[5].data_demissao = date(2026, 9, 30)
+    db.session.commit()
+
+    assert fechar_folha(empresa.id, ANO, MES) == {'calculados': 4, 'inalterados': 1, 'removidos': 1}
+    folhas = {f.funcionario_id: f for f in FolhaPagamento.query.filter_by(empresa_id=empresa.id, ano=ANO, mes=MES)}
+    assert folhas[funcionarios[0].id].salario_base == Decimal('2100.00')
+    assert folhas[funcionarios[1].id].vale_refeicao > 0
+    afastado = folhas[funcionarios[2].id]
+    assert afastado.dias_trabalhados == afastado.dias_uteis - 3
+    # VA, VR e VT pelos dias trabalhados
+    assert afastado.vale_alimentacao == _centavos(Decimal('33.33') * afastado.dias_trabalhados)
+    assert afastado.vale_refeicao == _centavos(Decimal('25.50') * afastado.dias_trabalhados)
+    # Horas extras pagas com 50% sobre a hora normal (salário / 220) e somadas à base do INSS
+    extra = folhas[funcionarios[3].id]
+    assert extra.horas_extras == Decimal('2.50')
+    assert extra.valor_horas_extras == _centavos(Decimal('5000.00') / 220 * Decimal('1.5') * Decimal('2.50'))
+    assert extra.inss == _centavos((Decimal('5000.00') + Decimal('5000.00') / 220 * Decimal('1.5') * Decimal('2.50')) * Decimal('0.14'))
+    assert extra.total_proventos == extra.salario_base + extra.valor_horas_extras + extra.vale_alimentacao
+    assert funcionarios[5].id not in folhas
+
+    assert fechar_folha(empresa.id, ANO, MES, forcar=True)['calculados'] == 5
+
+
+def test_folha_do_mes_segue_admissao_e_demissao_nao_o_status_atual(test_app):
+    empresa, funcionarios = _setup(4)
+    setembro = fechar_folha(empresa.id, ANO, MES - 1)
+    assert setembro['calculados'] == 4
+
+    # Demitido no meio do mês: continua na folha de setembro e de outubro
+    funcionarios[0].status = 'desligado'
+    funcionarios[0].data_demissao = date(2026, 10, 20)
+    # Desligado sem data registrada: não é recalculado, mas a folha já fechada não é apagada
+    funcionarios[1].status = 'desligado'
+    # Admitido depois do mês
+    funcionarios[2].data_admissao = date(2026, 11, 3)
+    db.session.commit()
+
+    assert fechar_folha(empresa.id, ANO, MES - 1) == {'calculados': 0, 'inalterados': 2, 'removidos': 1}
+    assert {f.funcionario_id for f in FolhaPagamento.query.filter_by(empresa_id=empresa.id, ano=ANO, mes=MES - 1)} == {
+        funcionarios[0].id, funcionarios[1].id, funcionarios[3].id
+    }
+    assert fechar_folha(empresa.id, ANO, MES) == {'calculados': 2, 'inalterados': 0, 'removidos': 0}
+    assert {f.funcionario_id for f in FolhaPagamento.query.filter_by(empresa_id=empresa.id, ano=ANO, mes=MES)} == {
+        funcionarios[0].id, funcionarios[3].id
+    }
+    # Os benefícios do demitido vão até a demissão: 13 dias úteis de 1 a 20/10 (12/10 é feriado) na jornada 5x2
+    demitido = FolhaPagamento.query.filter_by(funcionario_id=funcionarios[0].id, ano=ANO, mes=MES).one()
+    assert (demitido.dias_uteis, demitido.dias_trabalhados) == (21, 13)
+    assert demitido.vale_alimentacao == _centavos(Decimal('33.33') * 13)
+
+
+def test_dashboard_le_a_folha_fechada(test_app, test_client):
+    empresa, funcionarios = _setup()
+    hoje = date.today()
+    result = test_app.test_cli_runner().invoke(args=['folha', 'fechar', '--empresa-id', str(empresa.id)])
+    assert result.exit_code == 0, result.output
+    assert '4 calculados' in result.output
+
+    # Altera a folha gravada para confirmar que o dashboard não recalcula
+    folha = FolhaPagamento.query.filter_by(funcionario_id=funcionarios[0].id, ano=hoje.year, mes=hoje.month).one()
+    folha.custo_total_empresa += Decimal('1000.00')
+    db.session.commit()
+    gravado = db.session.query(db.func.sum(FolhaPagamento.custo_total_empresa)).filter_by(empresa_id=empresa.id).scalar()
+
+    test_client.post('/login', data={'email': 'rh@fechamento.com', 'password': 'password123'})
+    dados = test_client.get('/api/rh/dados_dashboard_financeiro').get_json()
+    assert dados['total_funcionarios'] == 4
+    assert dados['custo_total_empresa'] == float(gravado)
+
+
+def test_dashboard_do_mes_aberto_bate_com_o_fechamento(test_app, test_client):
+    empresa, funcionarios = _setup()
+    hoje = date.today()
+    inicio = date(hoje.year, hoje.month, 1)
+    funcionarios[0].data_admissao = inicio + timedelta(days=9)           # admitido no meio do mês
+    funcionarios[1].status = 'desligado'                                # demitido no meio do mês
+    funcionarios[1].data_demissao = inicio + timedelta(days=4)
+    db.session.add(Afastamento(funcionario_id=funcionarios[2].id, motivo="Atestado",
+                               data_inicio=inicio + timedelta(days=14), data_fim=inicio + timedelta(days=16)))
+    db.session.add(ControlePonto(funcionario_id=funcionarios[3].id, data=inicio,
+                                 entrada_1=time(8), saida_1=time(19), horas_extras=Decimal('3.00')))
+    db.session.commit()
+    test_client.post('/login', data={'email': 'rh@fechamento.com', 'password': 'password123'})
+
+    # Mês aberto (calculado na hora) e fechado (lido da folha gravada): os mesmos números
+    aberto = test_client.get('/api/rh/dados_dashboard_financeiro').get_json()
+    fechar_folha(empresa.id, hoje.year, hoje.month)
+    fechado = test_client.get('/api/rh/dados_dashboard_financeiro').get_json()
+    assert aberto['total_funcionarios'] == 4
+    assert aberto == fechado
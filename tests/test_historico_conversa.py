@@ -0,0 +1,138 @@
+# tests/test_historico_conversa.py
+
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert
+from app.models import Usuario, Empresa, ConversaWhatsApp, MensagemWhatsApp
+from app import db
+
+INICIO = datetime(2026, 10, 1, 9, 0)
+
+
+def _setup(test_client, quantidade=120):
+    empresa = Empresa(nome_empresa="Empresa Histórico", cnpj="22.222.222/0001-22")
+    db.session.add(empresa)
+    db.session.commit()
+    agente = Usuario(email="agente@historico.com", nome="Agente", empresa_id=empresa.id, role="agente")
+    agente.set_password("password123")
+    conversa = ConversaWhatsApp(wa_id="5511977770000", nome_cliente="Cliente 0000", status='ativo', empresa_id=empresa.id)
+    db.session.add_all([agente, conversa])
+    db.session.commit()
+    # Mensagens de 2 em 2 para cada minuto: o desempate pelo id é exercitado
+    db.session.execute(insert(MensagemWhatsApp), [{
+        'conversa_id': conversa.id, 'empresa_id': empresa.id, 'remetente': 'cliente' if i % 3 else 'agente',
+        'conteudo': f"Mensagem {i}", 'timestamp': INICIO + timedelta(minutes=i // 2)
+    } for i in range(quantidade)])
+    db.session.commit()
+    test_client.post('/login', data={'email': 'agente@historico.com', 'password': 'password123'})
+    return empresa, conversa
+
+
+def _conteudos(dados):
+    return [m['conteudo'] for m in dados['mensagens']]
+
+
+def test_paginacao_por_cursor_percorre_todo_o_historico(test_app, test_client):
+    _, conversa = _setup(test_client)
+    url = f'/api/conversa/{conversa.id}'
+
+    dados = test_client.get(url, query_string={'limite': 50}).get_json()
+    assert dados['cliente'] == "Cliente 0000"
+    assert _conteudos(dados) == [f"Mensagem {i}" for i in range(70, 120)]
+    assert dados['tem_mais'] is True
+
+    paginas = [dados]
+    while paginas[-1]['tem_mais']:
+        paginas.append(test_client.get(url, query_string={'limite': 50, 'antes': paginas[-1]['cursor_anterior']}).get_json())
+    assert [len(p['mensagens']) for p in paginas] == [50, 50, 20]
+    todas = [c for p in reversed(paginas) for c in _conteudos(p)]
+    assert todas == [f"Mensagem {i}" for i in range(120)]
+
+    # Nada novo desde o cursor da primeira página
+    novas = test_client.get(url, query_string={'depois': dados['cursor']}).get_json()
+    assert novas['mensagens'] == [] and novas['cursor'] == dados['cursor']
+
+    assert test_client.get(url, query_string={'antes': 'nao-e-um-cursor'}).status_code == 400
+    assert test_client.get(url, query_string={'antes': dados['cursor'], 'depois': dados['cursor']}).status_code == 400
+
+
+def test_cursor_depois_traz_so_as_mensagens_novas(test_app, test_client):
+    empresa, conversa = _setup(test_client, quantidade=10)
+    url = f'/api/conversa/{conversa.id}'
+    cursor = test_client.get(url).get_json()['cursor']
+
+    db.session.add_all([MensagemWhatsApp(
+        conversa_id=conversa.id, empresa_id=empresa.id, remetente='cliente', conteudo=f"Nova {i}",
+        timestamp=INICIO + timedelta(hours=1, minutes=i)
+    ) for i in range(5)])
+    db.session.commit()
+
+    primeira = test_client.get(url, query_string={'depois': cursor, 'limite': 3}).get_json()
+    assert _conteudos(primeira) == ["Nova 0", "Nova 1", "Nova 2"] and primeira['tem_mais'] is True
+    segunda = test_client.get(url, query_string={'depois': primeira['cursor'], 'limite': 3}).get_json()
+    assert _conteudos(segunda) == ["Nova 3", "Nova 4"] and segunda['tem_mais'] is False
+
+
+def test_etag_responde_304_sem_carregar_mensagens(test_app, test_client):
+    empresa, conversa = _setup(test_client, quantidade=30)
+    url = f'/api/conversa/{conversa.id}'
+    resposta = test_client.get(url)
+    etag = resposta.headers['ETag']
+    assert 'no-cache' in resposta.headers['Cache-Control']
+
+    executadas = []
+    ouvinte = lambda conn, cursor, statement, *args: executadas.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', ouvinte)
+    try:
+        repetida = test_client.get(url, headers={'If-None-Match': etag})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', ouvinte)
+    assert repetida.status_code == 304 and repetida.headers['ETag'] == etag
+    # Só a leitura da última mensagem (LIMIT 1); a página não é carregada
+    consultas_de_mensagens = [s for s in executadas if 'FROM mensagem_whats_app' in s]
+    assert len(consultas_de_mensagens) == 1 and 'LIMIT' in consultas_de_mensagens[0]
+
+    # Outra página tem outro ETag; uma mensagem nova invalida o da primeira página
+    assert test_client.get(url, query_string={'limite': 10}).headers['ETag'] != etag
+    db.session.add(MensagemWhatsApp(conversa_id=conversa.id, empresa_id=empresa.id, remetente='agente',
+                                    conteudo="Resposta", timestamp=INICIO + timedelta(hours=2)))
+    db.session.commit()
+    atualizada = test_client.get(url, headers={'If-None-Match': etag})
+    assert atualizada.status_code == 200 and _conteudos(atualizada.get_json())[-1] == "Resposta"
+
+
+def test_conversa_de_outra_empresa_nao_e_acessivel(test_app, test_client):
+    _setup(test_client, quantidade=1)
+    outra = Empresa(nome_empresa="Outra", cnpj="11.111.111/0001-11")
+    db.session.add(outra)
+    db.session.commit()
+    conversa = ConversaWhatsApp(wa_id="5511966660000", nome_cliente="Cliente 0000", empresa_id=outra.id)
+    db.session.add(conversa)
+    db.session.commit()
+    assert test_client.get(f'/api/conversa/{conversa.id}').status_code == 404
+
+
+def test_mensagem_gravada_depois_com_timestamp_anterior_nao_se_perde(test_app, test_client):
+    empresa, conversa = _setup(test_client, quantidade=10)
+    url = f'/api/conversa/{conversa.id}'
+    primeira = test_client.get(url)
+    cursor, etag = primeira.get_json()['cursor'], primeira.headers['ETag']
+
+    # Resposta do agente (utcnow) e, depois, a mensagem do cliente reprocessada da caixa de entrada
+    # com o timestamp da Meta, 30 s antes: gravada por último, mas anterior na ordem do timestamp
+    resposta = MensagemWhatsApp(conversa_id=conversa.id, empresa_id=empresa.id, remetente='agente',
+                                conteudo="Resposta", timestamp=INICIO + timedelta(hours=1))
+    db.session.add(resposta)
+    db.session.commit()
+    atrasada = MensagemWhatsApp(conversa_id=conversa.id, empresa_id=empresa.id, remetente='cliente',
+                                conteudo="Atrasada", timestamp=resposta.timestamp - timedelta(seconds=30))
+    db.session.add(atrasada)
+    db.session.commit()
+
+    novas = test_client.get(url, query_string={'depois': cursor}).get_json()
+    assert _conteudos(novas) == ["Resposta", "Atrasada"]
+    assert test_client.get(url, query_string={'depois': novas['cursor']}).get_json()['mensagens'] == []
+
+    # O ETag acompanha o maior id, não o maior timestamp
+    atualizada = test_client.get(url, headers={'If-None-Match': etag})
+    assert atualizada.status_code == 200 and atualizada.headers['ETag'] != etag
+    assert _conteudos(atualizada.get_json())[-2:] == ["Atrasada", "Resposta"]
@@ -0,0 +1,130 @@
+# tests/test_inactivity_scheduler.py
+
+import time
+from datetime import datetime, timedelta
+from app.models import Usuario, Empresa
+from app.services.inactivity_scheduler import inactivity_scheduler
+from app.services.presence_service import presence_service, InMemoryPresenceBackend, RedisPresenceBackend
+from app.services.productivity_ingestion_service import productivity_ingestion_service
+from app import db, socketio
+from fake_redis import FakeRedis
+
+
+def _setup(test_app, **config):
+    test_app.config.update({'PRODUCTIVITY_QUEUE_WORKERS': 0, 'INACTIVITY_THRESHOLD_SECONDS': 1, **config})
+    empresas = []
+    for i in range(2):
+        empresa = Empresa(nome_empresa=f"Empresa Inatividade {i}", cnpj=f"19.191.91{i}/0001-19")
+        db.session.add(empresa)
+        db.session.commit()
+        admin = Usuario(email=f"admin{i}@inatividade.com", nome=f"Admin {i}", empresa_id=empresa.id, role="admin_empresa")
+        admin.set_password("password123")
+        agente = Usuario(email=f"agente{i}@inatividade.com", nome=f"Agente {i}", empresa_id=empresa.id, role="agente", password_hash="x")
+        db.session.add_all([admin, agente])
+        db.session.commit()
+        empresas.append((empresa.id, agente.id))
+    return empresas
+
+
+def _conectar(test_app, email):
+    with test_app.app_context():
+        http_client = test_app.test_client()
+        http_client.post('/login', data={'email': email, 'password': 'password123'})
+        cliente = socketio.test_client(test_app, flask_test_client=http_client)
+    cliente.get_received()
+    return cliente
+
+
+def _heartbeat(test_client, email):
+    response = test_client.post('/api/productivity/log', headers={'X-API-KEY': email},
+                                json={'timestamp': datetime.utcnow().isoformat(), 'process_name': 'excel.exe'})
+    assert response.status_code == 202
+
+
+def test_heap_de_prazos():
+    backend = InMemoryPresenceBackend()
+    inicio = datetime.utcnow()
+    for i in range(50):
+        for agente in range(1, 4):
+            backend.registrar_heartbeat(agente, 1, inicio + timedelta(seconds=i + agente))
+    # Só o último heartbeat de cada agente conta; as entradas antigas saem do heap ao chegar ao topo
+    assert backend.proximo_heartbeat() == inicio + timedelta(seconds=50)
+    assert backend.expirados(inicio + timedelta(seconds=52)) == {1: 1, 2: 1}
+    assert backend.expirados(inicio + timedelta(seconds=52)) == {1: 1, 2: 1}  # consultar não consome
+    backend.marcar_inativos([1, 2])
+    assert backend.proximo_heartbeat() == inicio + timedelta(seconds=52)
+    backend.registrar_heartbeat(1, 1, inicio + timedelta(seconds=60))
+    assert backend.expirados(inicio + timedelta(seconds=60)) == {3: 1}
+    assert len(backend._prazos) <= 3
+
+
+def test_eleicao_de_lider_no_redis():
+    servidor = FakeRedis()
+    worker_1, worker_2 = RedisPresenceBackend(servidor), RedisPresenceBackend(servidor)
+    assert worker_1.tentar_lideranca('w1', ttl=30)
+    assert not worker_2.tentar_lideranca('w2', ttl=30)
+    assert worker_1.tentar_lideranca('w1', ttl=30)  # renovação
+    servidor.expira_em['presence:lider:inatividade'] = 0  # o líder caiu e o mandato venceu
+    assert worker_2.tentar_lideranca('w2', ttl=30)
+    assert not worker_1.tentar_lideranca('w1', ttl=30)
+
+
+def test_ciclo_dorme_ate_o_proximo_prazo_e_emite_so_para_a_empresa(test_app, test_client):
+    (empresa_0, agente_0), (empresa_1, agente_1) = _setup(test_app)
+    admin_0, admin_1 = _conectar(test_app, 'admin0@inatividade.com'), _conectar(test_app, 'admin1@inatividade.com')
+
+    _heartbeat(test_client, 'agente0@inatividade.com')
+    productivity_ingestion_service.drenar(test_app)
+    admin_0.get_received()
+
+    espera = inactivity_scheduler.executar_ciclo(test_app)
+    assert 0.5 < espera <= 1.02  # acorda quando o heartbeat do agente 0 passar de 1 segundo
+    time.sleep(espera)
+    inactivity_scheduler.executar_ciclo(test_app)
+
+    db.session.expire_all()
+    assert db.session.get(Usuario, agente_0).is_monitoring is False
+    assert db.session.get(Usuario, agente_0).status_agente == 'Inativo'
+    status = [e['args'][0] for e in admin_0.get_received() if e['name'] == 'agent_status_update']
+    assert status == [{'user_id': agente_0, 'status': 'Inativo', 'is_monitoring': False}]
+    assert [e for e in admin_1.get_received() if e['name'] == 'agent_status_update'] == []
+
+    # Sem agentes monitorando, dorme até a próxima renovação da liderança
+    assert inactivity_scheduler.executar_ciclo(test_app) == test_app.config['INACTIVITY_LEADER_TTL_SECONDS'] / 3
+
+
+def test_so_o_lider_faz_as_transicoes(test_app, test_client):
+    (_, agente_0), _ = _setup(test_app)
+    servidor = FakeRedis()
+    test_app.extensions['presence']['backend'] = RedisPresenceBackend(servidor)
+    servidor.set('presence:lider:inatividade', 'outro-worker', px=30000)
+
+    _heartbeat(test_client, 'agente0@inatividade.com')
+    productivity_ingestion_service.drenar(test_app)
+    time.sleep(1.1)
+    assert inactivity_scheduler.executar_ciclo(test_app) == 10
+    db.session.expire_all()
+    assert db.session.get(Usuario, agente_0).is_monitoring is True
+
+    servidor.delete('presence:lider:inatividade')  # o outro worker caiu
+    inactivity_scheduler.executar_ciclo(test_app)
+    db.session.expire_all()
+    assert db.session.get(Usuario, agente_0).is_monitoring is False
+
+
+def test_agendador_em_segundo_plano_marca_no_prazo(test_app, test_client):
+    """O agendador iniciado pelo primeiro heartbeat marca o agente logo após o limite, sem esperar um ciclo de 30s."""
+    (_, agente_0), _ = _setup(test_app, INACTIVITY_SCHEDULER_ENABLED=True)
+    _heartbeat(test_client, 'agente0@inatividade.com')
+    productivity_ingestion_service.drenar(test_app)
+    ultimo = presence_service.ultimo_heartbeat(agente_0)
+
+    prazo = time.time() + 5
+    while time.time() < prazo:
+        db.session.rollback()
+        if not db.session.get(Usuario, agente_0).is_monitoring:
+            break
+        time.sleep(0.02)
+    atraso = (datetime.utcnow() - ultimo).total_seconds() - 1
+    assert db.session.get(Usuario, agente_0).is_monitoring is False
+    assert atraso < 0.5
@@ -0,0 +1,162 @@
+# tests/test_llm_classifier.py
+
+import threading
+import time
+from datetime import datetime
+from app.models import Usuario, Empresa, ActivityLog
+from app.services.ai_productivity_service import ai_productivity_service
+from app.services.llm_classifier import llm_classifier
+from app.services.productivity_ingestion_service import productivity_ingestion_service
+from app import db
+from fake_llm_server import FakeLLMServer
+
+
+def _configurar(test_app, servidor, **config):
+    test_app.config.update({
+        'OPENAI_API_KEY': 'chave-falsa',
+        'LLM_BASE_URL': servidor.base_url,
+        'LLM_BATCH_WINDOW_SECONDS': 0.05,
+        'LLM_RETRY_BACKOFF_SECONDS': 0.01,
+        'LLM_TIMEOUT_SECONDS': 5,
+        **config
+    })
+    ai_productivity_service.init_app(test_app)
+
+
+def _rules(empresa_id):
+    return {"empresa_id": empresa_id, "versao": "v1", "process_rules": [], "url_rules": [], "custom_ai_prompt": None}
+
+
+def test_atividades_de_varios_agentes_agrupadas_em_poucos_prompts(test_app):
+    """Atividades submetidas em paralelo na mesma janela viram um prompt por empresa/bloco, com o resultado certo para cada uma."""
+    with FakeLLMServer() as servidor:
+        _configurar(test_app, servidor, LLM_BATCH_MAX_ITEMS=10)
+        sites = ['zendesk', 'youtube', 'wikipedia']
+        resultados = {}
+
+        def _agente(empresa_id, n):
+            # Títulos e caminhos distintos (sem números, que a normalização descarta)
+            atividade = {'process_name': 'chrome.exe', 'window_title': f'Aba {chr(65 + n)}', 'url': f'https://{sites[n % 3]}.com/{chr(97 + n)}'}
+            resultados[(empresa_id, n)] = llm_classifier.submeter(atividade, _rules(empresa_id))
+
+        threads = [threading.Thread(target=_agente, args=(e, n)) for e in (1, 2) for n in range(25)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for (empresa_id, n), futuro in resultados.items():
+            esperado = {0: (True, 'Trabalho'), 1: (False, 'Lazer'), 2: (None, 'Neutro')}[n % 3]
+            resultado = futuro.result(timeout=5)
+            assert (resultado['is_productive'], resultado['category']) == esperado
+        # 25 atividades por empresa em blocos de 10: 3 prompts por empresa
+        assert servidor.requisicoes == 6
+        assert servidor.atividades_recebidas == 50
+
+
+def test_atividades_repetidas_enviadas_uma_vez(test_app):
+    with FakeLLMServer() as servidor:
+        _configurar(test_app, servidor)
+        atividade = {'process_name': 'chrome.exe', 'window_title': '(2) Zendesk', 'url': 'https://zendesk.com'}
+        resultados = llm_classifier.classificar([(atividade, _rules(1))] * 30)
+        assert all(r['category'] == 'Trabalho' for r in resultados)
+        assert servidor.atividades_recebidas == 1
+
+
+def test_concorrencia_limitada(test_app):
+    with FakeLLMServer(latencia=0.1) as servidor:
+        _configurar(test_app, servidor, LLM_BATCH_MAX_ITEMS=1, LLM_MAX_CONCURRENCY=2)
+        itens = [({'process_name': f'app{i}.exe'}, _rules(1)) for i in range(8)]
+        llm_classifier.classificar(itens)
+        assert servidor.requisicoes == 8
+        assert servidor.max_simultaneas == 2
+
+
+def test_nova_tentativa_e_id_ausente(test_app):
+    with FakeLLMServer() as servidor:
+        _configurar(test_app, servidor, LLM_MAX_RETRIES=2)
+        servidor.falhas_restantes = 1
+        servidor.omitir_ids = {1}
+        resultados = llm_classifier.classificar([({'process_name': 'excel.exe'}, _rules(1)), ({'process_name': 'netflix.exe'}, _rules(1))])
+        assert servidor.requisicoes == 2  # a primeira falhou e foi repetida
+        assert resultados[0]['category'] == 'Trabalho'
+        assert resultados[1]['category'] == 'Não Classificado' and 'error' in resultados[1]
+
+
+def test_timeout_e_circuit_breaker(test_app):
+    """Com a IA fora do ar, o breaker abre e as atividades caem em "Não Classificado" sem novas chamadas."""
+    with FakeLLMServer(latencia=1.0) as servidor:
+        _configurar(test_app, servidor, LLM_TIMEOUT_SECONDS=0.2, LLM_MAX_RETRIES=0,
+                    LLM_CIRCUIT_FAILURE_THRESHOLD=2, LLM_CIRCUIT_RESET_SECONDS=60)
+        inicio = time.monotonic()
+        for i in range(2):
+            assert llm_classifier.classificar([({'process_name': f'a{i}.exe'}, _rules(1))])[0]['category'] == 'Não Classificado'
+        assert llm_classifier.breaker.estado == 'aberto'
+        requisicoes = servidor.requisicoes
+
+        resultado = ai_productivity_service.analyze_activity({'process_name': 'zendesk.exe'}, _rules(1))
+        assert resultado['category'] == 'Não Classificado'
+        assert servidor.requisicoes == requisicoes
+        assert time.monotonic() - inicio < 2.5
+
+        # Fora do ar não é cacheado: quando a IA volta (meio-aberto), a atividade é classificada
+        servidor.latencia = 0
+        llm_classifier.breaker.tempo_reabertura = 0
+        llm_classifier.breaker._aberto_ate = time.monotonic()
+        assert ai_productivity_service.analyze_activity({'process_name': 'zendesk.exe'}, _rules(1))['category'] == 'Trabalho'
+        assert llm_classifier.breaker.estado == 'fechado'
+
+
+def test_ingestao_classifica_o_lote_com_um_prompt(test_app, test_client):
+    with FakeLLMServer() as servidor:
+        _configurar(test_app, servidor, PRODUCTIVITY_QUEUE_WORKERS=0)
+        empresa = Empresa(nome_empresa="Empresa IA", cnpj="14.141.414/0001-14")
+        db.session.add(empresa)
+        db.session.commit()
+        for i in range(3):
+            db.session.add(Usuario(email=f"agente{i}@ia.com", nome=f"Agente {i}", empresa_id=empresa.id, role="agente", password_hash="x"))
+        db.session.commit()
+
+        for i, site in enumerate(['zendesk', 'youtube', 'crm']):
+            response = test_client.post('/api/productivity/log/batch', headers={'X-API-KEY': f'agente{i}@ia.com'}, json=[
+                {'timestamp': datetime.utcnow().isoformat(), 'process_name': 'chrome.exe', 'url': f'https://{site}.com', 'window_title': site},
+                {'timestamp': datetime.utcnow().isoformat(), 'process_name': 'chrome.exe', 'url': f'https://{site}.com', 'window_title': site},
+            ])
+            assert response.status_code == 202
+
+        productivity_ingestion_service.drenar(test_app)
+
+        assert servidor.requisicoes == 1
+        # As duas amostras idênticas de cada agente viram um span
+        logs = ActivityLog.query.filter_by(empresa_id=empresa.id).all()
+        assert [l.sample_count for l in logs] == [2, 2, 2]
+        assert sorted((l.window_title, l.category) for l in logs) == [('crm', 'Trabalho'), ('youtube', 'Lazer'), ('zendesk', 'Trabalho')]
+
+
+def test_duzentas_atividades_em_dez_requisicoes(test_app):
+    """200 atividades distintas em blocos de 20: 10 requisições (o tempo é medido em tests/bench_llm.py)."""
+    with FakeLLMServer(latencia=0.05) as servidor:
+        itens = [({'process_name': f'app{i}.exe', 'url': f'https://site{i}.com'}, _rules(1)) for i in range(200)]
+        _configurar(test_app, servidor, LLM_BATCH_MAX_ITEMS=20, LLM_MAX_CONCURRENCY=4, LLM_BATCH_WINDOW_SECONDS=1)
+        resultados = llm_classifier.classificar(itens)
+        assert servidor.requisicoes == 10
+        assert [r['category'] for r in resultados] == ['Neutro'] * 200
+
+
+def test_espera_limitada_e_erro_no_despacho_resolvem_com_fallback(test_app, monkeypatch):
+    with FakeLLMServer(latencia=1.0) as servidor:
+        _configurar(test_app, servidor, LLM_RESULT_TIMEOUT_SECONDS=0.3, LLM_MAX_RETRIES=0)
+        inicio = time.monotonic()
+        resultados = llm_classifier.classificar([({'process_name': f'lento{i}.exe'}, _rules(1)) for i in range(3)])
+        assert time.monotonic() - inicio < 0.8
+        assert [r['category'] for r in resultados] == ['Não Classificado'] * 3
+        assert all('error' in r for r in resultados)
+
+        # Pool encerrado entre a submissão e o despacho: a thread do Timer não deixa ninguém esperando
+        test_app.config['LLM_RESULT_TIMEOUT_SECONDS'] = 5
+        ai_productivity_service.init_app(test_app)
+        monkeypatch.setattr(llm_classifier, '_executor', None)
+        inicio = time.monotonic()
+        resultado = llm_classifier.classificar([({'process_name': 'sem_pool.exe'}, _rules(1))])[0]
+        assert resultado['category'] == 'Não Classificado' and 'error' in resultado
+        assert time.monotonic() - inicio < 1
@@ -0,0 +1,138 @@
+# tests/test_multinode.py
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+import requests
+from socketio import Client
+from werkzeug.serving import make_server
+from app import create_app, db
+from app.config import Config
+from app.models import Usuario, Empresa
+from app.services.realtime_service import criar_emissor_externo, notify_dashboard_update
+from fake_redis_server import FakeRedisServer
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Segundo worker: outro processo, com o próprio SocketIO, que só publica na fila
+WORKER = """
+import sys
+from app import create_app
+from app.services.realtime_service import notify_dashboard_update
+app = create_app()
+with app.app_context():
+    notify_dashboard_update(int(sys.argv[1]), {'agent_id': int(sys.argv[2]), 'origem': 'worker-2'})
+"""
+
+
+@pytest.fixture
+def servidor_redis():
+    with FakeRedisServer() as servidor:
+        yield servidor
+
+
+@pytest.fixture
+def worker_1(test_app, servidor_redis):
+    """
+    Este processo como o worker 1: um app com a fila de mensagens no substituto do Redis,
+    servido por HTTP de verdade (o cliente de teste do Flask-SocketIO não aceita fila).
+    """
+    class ConfigMultiNo(Config):
+        TESTING = True
+        SECRET_KEY = "test-secret-key-for-sessions"
+        WTF_CSRF_ENABLED = False
+        SOCKETIO_MESSAGE_QUEUE = servidor_redis.url
+        PRESENCE_FLUSH_INTERVAL_SECONDS = 0
+        INACTIVITY_SCHEDULER_ENABLED = False
+
+    app = create_app(ConfigMultiNo)
+    servidor = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    app.base_url = f'http://127.0.0.1:{servidor.server_port}'
+    yield app
+    servidor.shutdown()
+
+
+def _setup():
+    empresas = [Empresa(nome_empresa=f"Empresa Multi {i}", cnpj=f"21.212.12{i}/0001-21") for i in range(2)]
+    db.session.add_all(empresas)
+    db.session.commit()
+    admins = []
+    for i, empresa in enumerate(empresas):
+        admin = Usuario(email=f"admin{i}@multi.com", nome=f"Admin {i}", empresa_id=empresa.id, role="admin_empresa")
+        admin.set_password("password123")
+        admins.append(admin)
+    db.session.add_all(admins)
+    db.session.commit()
+    return [e.id for e in empresas]
+
+
+def _conectar(worker, email, servidor_redis):
+    """Navegador conectado ao worker: login por HTTP e Socket.IO por long-polling, com o cookie da sessão."""
+    sessao = requests.Session()
+    resposta = sessao.post(f'{worker.base_url}/login', data={'email': email, 'password': 'password123'}, allow_redirects=False)
+    assert resposta.status_code == 302
+    cliente = Client(http_session=sessao)
+    cliente.recebidos = []
+    cliente.on('productivity_update', cliente.recebidos.append)
+    cliente.connect(worker.base_url, transports=['polling'])
+    # A primeira conexão inicia o listener da fila neste worker
+    _esperar(lambda: servidor_redis.assinantes('flask-socketio') > 0)
+    return cliente
+
+
+def _esperar(condicao, timeout=5):
+    limite = time.monotonic() + timeout
+    while not condicao():
+        assert time.monotonic() < limite, "tempo esgotado"
+        time.sleep(0.02)
+
+
+def test_productivity_update_de_outro_worker(worker_1, servidor_redis):
+    """O worker 2 (outro processo) emite; o cliente conectado no worker 1 recebe pela fila."""
+    empresa_id, _ = _setup()
+    cliente = _conectar(worker_1, "admin0@multi.com", servidor_redis)
+    outro = _conectar(worker_1, "admin1@multi.com", servidor_redis)
+
+    env = {**os.environ, 'SOCKETIO_MESSAGE_QUEUE': servidor_redis.url, 'PYTHONPATH': RAIZ}
+    subprocess.run([sys.executable, '-c', WORKER, str(empresa_id), '7'], cwd=RAIZ, env=env, check=True, timeout=60)
+
+    _esperar(lambda: cliente.recebidos)
+    assert cliente.recebidos == [{'agent_id': 7, 'origem': 'worker-2'}]
+    assert outro.recebidos == []  # só a sala da empresa do evento
+    cliente.disconnect()
+    outro.disconnect()
+
+
+def test_emissor_sem_flask_app(worker_1, servidor_redis):
+    empresa_id, _ = _setup()
+    cliente = _conectar(worker_1, "admin0@multi.com", servidor_redis)
+
+    notify_dashboard_update(empresa_id, {'agent_id': 3}, emissor=criar_emissor_externo(servidor_redis.url))
+
+    _esperar(lambda: cliente.recebidos)
+    assert cliente.recebidos == [{'agent_id': 3}]
+    cliente.disconnect()
+
+
+def test_emits_locais_sao_publicados_na_fila(worker_1, servidor_redis):
+    empresa_id, _ = _setup()
+    cliente = _conectar(worker_1, "admin0@multi.com", servidor_redis)
+    publicadas = servidor_redis.publicadas
+
+    with worker_1.app_context():
+        notify_dashboard_update(empresa_id, {'agent_id': 5})
+    # Entregue ao cliente local e publicado uma vez para os demais workers (que ignoram a volta ao remetente)
+    _esperar(lambda: cliente.recebidos)
+    assert servidor_redis.publicadas == publicadas + 1
+    time.sleep(0.2)
+    assert cliente.recebidos == [{'agent_id': 5}]
+    cliente.disconnect()
+
+
+def test_emissor_externo_exige_fila():
+    with pytest.raises(RuntimeError):
+        criar_emissor_externo()
@@ -0,0 +1,236 @@
+# tests/test_presence.py
+
+import pytest
+import random
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app.models import Usuario, Empresa
+from app.services.presence_service import presence_service, InMemoryPresenceBackend, RedisPresenceBackend
+from app.services.productivity_ingestion_service import productivity_ingestion_service
+from app.services.realtime_service import verificar_agentes_inativos
+from app import db, socketio
+from fake_redis import FakeRedis
+
+
+@pytest.fixture(params=['memoria', 'redis'])
+def backend(request, test_app):
+    """Os testes de presença rodam com os dois backends (o Redis com o substituto local)."""
+    if request.param == 'redis':
+        test_app.extensions['presence']['backend'] = RedisPresenceBackend(FakeRedis())
+    return test_app.extensions['presence']['backend']
+
+
+def _setup(test_app, agentes=3):
+    test_app.config.update({'PRODUCTIVITY_QUEUE_WORKERS': 0, 'PRESENCE_FLUSH_INTERVAL_SECONDS': 0})
+    empresa = Empresa(nome_empresa="Empresa Presenca", cnpj="16.161.616/0001-16")
+    db.session.add(empresa)
+    db.session.commit()
+    usuarios = [
+        Usuario(email=f"agente{i}@presenca.com", nome=f"Agente {i}", empresa_id=empresa.id, role="agente",
+                status_agente="Inativo", password_hash="x")
+        for i in range(agentes)
+    ]
+    db.session.add_all(usuarios)
+    db.session.commit()
+    return empresa, usuarios
+
+
+def _updates_em_usuario():
+    updates = []
+
+    def _contar(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE usuario'):
+            updates.append(len(parameters) if executemany else 1)
+
+    event.listen(db.engine, 'before_cursor_execute', _contar)
+    return updates
+
+
+def _enviar(test_client, usuarios):
+    for usuario in usuarios:
+        response = test_client.post('/api/productivity/log', headers={'X-API-KEY': usuario.email},
+                                    json={'timestamp': datetime.utcnow().isoformat(), 'process_name': 'excel.exe'})
+        assert response.status_code == 202
+
+
+def test_heartbeats_gravados_em_lote(test_app, test_client, backend):
+    """Só a transição para "Monitorando" escreve na linha do usuário; os heartbeats seguintes vão em um UPDATE em lote."""
+    _, usuarios = _setup(test_app)
+    updates = _updates_em_usuario()
+
+    _enviar(test_client, usuarios)
+    productivity_ingestion_service.drenar(test_app)
+    transicoes = len(updates)
+    assert transicoes > 0
+
+    for _ in range(10):
+        _enviar(test_client, usuarios)
+        productivity_ingestion_service.drenar(test_app)
+    assert len(updates) == transicoes
+
+    antes = {u.id: presence_service.ultimo_heartbeat(u.id) for u in usuarios}
+    assert presence_service.descarregar(test_app) == 3
+    assert updates[transicoes:] == [3]  # um único executemany para os 3 agentes
+    db.session.expire_all()
+    for usuario in usuarios:
+        assert usuario.last_agent_activity == antes[usuario.id]
+        assert usuario.is_monitoring is True and usuario.status_agente == 'Disponível'
+
+
+def test_heartbeat_antigo_nao_volta_o_horario(test_app):
+    _, usuarios = _setup(test_app, agentes=1)
+    agora = datetime.utcnow()
+    usuarios[0].last_agent_activity = agora
+    db.session.commit()
+
+    presence_service.registrar_heartbeat(usuarios[0].id, usuarios[0].empresa_id, agora - timedelta(minutes=1))
+    presence_service.descarregar(test_app)
+    db.session.expire_all()
+    assert usuarios[0].last_agent_activity == agora
+
+
+def test_verificador_le_a_presenca(test_app, test_client, backend):
+    _, usuarios = _setup(test_app)
+    _enviar(test_client, usuarios[1:])
+    productivity_ingestion_service.drenar(test_app)
+
+    # O agente 0 parou de enviar há 5 minutos; os outros continuam ativos
+    antigo = datetime.utcnow() - timedelta(minutes=5)
+    backend.registrar_heartbeat(usuarios[0].id, usuarios[0].empresa_id, antigo)
+    usuarios[0].is_monitoring = True
+    usuarios[0].last_agent_activity = antigo
+    db.session.commit()
+    inativo_id = usuarios[0].id
+
+    consultas = []
+    event.listen(db.engine, 'before_cursor_execute', lambda conn, cursor, statement, *a: consultas.append(statement))
+    assert verificar_agentes_inativos() == [inativo_id]
+    assert all('usuario.id IN' in c or not c.startswith('SELECT') for c in consultas)
+
+    db.session.expire_all()
+    assert usuarios[0].is_monitoring is False and usuarios[0].status_agente == 'Inativo'
+    assert all(u.is_monitoring for u in usuarios[1:])
+
+    # Sem novos heartbeats, a próxima verificação nem consulta o banco
+    consultas.clear()
+    assert verificar_agentes_inativos() == []
+    assert consultas == []
+
+
+def test_heartbeat_gravado_por_outro_worker_evita_falso_inativo(test_app, backend):
+    """A presença local pode estar atrasada; o banco (já atualizado por outro worker) é consultado antes de marcar inativo."""
+    _, usuarios = _setup(test_app, agentes=1)
+    agente = usuarios[0]
+    agente.is_monitoring = True
+    agente.last_agent_activity = datetime.utcnow()
+    db.session.commit()
+    presence_service.carregar([(agente.id, agente.empresa_id, datetime.utcnow() - timedelta(minutes=10))])
+
+    assert verificar_agentes_inativos() == []
+    assert presence_service.expirados(datetime.utcnow() - timedelta(minutes=3)) == {}
+
+
+def _backends_compartilhados(tipo):
+    """Dois workers: no Redis enxergam o mesmo estado; em memória, cada um tem o seu."""
+    if tipo == 'redis':
+        servidor = FakeRedis()
+        return RedisPresenceBackend(servidor), RedisPresenceBackend(servidor)
+    backend = InMemoryPresenceBackend()
+    return backend, backend
+
+
+@pytest.mark.parametrize('tipo', ['memoria', 'redis'])
+def test_sessoes_web_e_indice_reverso(tipo):
+    worker_1, worker_2 = _backends_compartilhados(tipo)
+    assert worker_1.adicionar_sid(1, 'sid-a', 10) == 1
+    assert worker_2.adicionar_sid(1, 'sid-b', 10) == 2
+    worker_2.adicionar_sid(2, 'sid-c')  # sem empresa (ex.: super admin)
+
+    assert worker_2.total_sids(1) == 2
+    assert worker_2.remover_sid('sid-a') == (1, 10, 1)  # conectado em um worker, desconectado em outro
+    assert worker_1.remover_sid('sid-a') == (None, None, 0)
+    assert worker_1.remover_sid('sid-b') == (1, 10, 0)
+    assert worker_1.total_sids(1) == 0 and worker_1.total_sids(2) == 1
+    assert worker_1.remover_sid('sid-c') == (2, None, 0)
+
+
+@pytest.mark.parametrize('tipo', ['memoria', 'redis'])
+def test_heartbeats_e_expiracao(tipo):
+    worker_1, worker_2 = _backends_compartilhados(tipo)
+    agora = datetime.utcnow()
+    worker_1.registrar_heartbeat(1, 10, agora - timedelta(minutes=5))
+    worker_2.registrar_heartbeat(2, 10, agora)
+    worker_2.registrar_heartbeat(1, 10, agora - timedelta(minutes=6))  # atrasado: não volta o prazo
+
+    assert worker_2.status_desktop(2) == {'monitoring': True, 'last_seen': agora}
+    assert worker_1.status_desktop(1) == {'monitoring': True, 'last_seen': agora - timedelta(minutes=5)}
+    assert worker_2.expirados(agora - timedelta(minutes=3)) == {1: 10}
+    worker_2.marcar_inativos([1])
+    assert worker_1.expirados(agora - timedelta(minutes=3)) == {}
+    assert worker_1.status_desktop(1)['monitoring'] is False
+
+    pendentes = worker_1.retirar_pendentes()
+    assert pendentes == {1: agora - timedelta(minutes=5), 2: agora} and worker_2.retirar_pendentes() == {}
+    # Heartbeat que chega entre a retirada e a devolução (o flush falhou): o mais novo prevalece
+    worker_1.registrar_heartbeat(1, 10, agora + timedelta(seconds=30))
+    worker_2.devolver_pendentes(pendentes)
+    assert worker_1.retirar_pendentes() == {1: agora + timedelta(seconds=30), 2: agora}
+
+
+@pytest.mark.parametrize('tipo', ['memoria', 'redis'])
+def test_heartbeat_atrasado_nao_volta_o_ultimo(tipo):
+    worker_1, worker_2 = _backends_compartilhados(tipo)
+    agora = datetime.utcnow()
+    worker_1.registrar_heartbeat(1, 10, agora)
+    worker_2.registrar_heartbeat(1, 10, agora - timedelta(minutes=6))
+    assert worker_2.status_desktop(1) == {'monitoring': True, 'last_seen': agora}
+    assert worker_1.retirar_pendentes() == {1: agora}
+
+    # Heartbeats concorrentes, fora de ordem, em vários workers: fica o mais novo
+    horarios = [agora + timedelta(seconds=i) for i in range(40)]
+    random.Random(7).shuffle(horarios)
+    threads = [
+        threading.Thread(target=(worker_1, worker_2)[i % 2].registrar_heartbeat, args=(1, 10, quando))
+        for i, quando in enumerate(horarios)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert worker_1.status_desktop(1)['last_seen'] == max(horarios)
+    assert worker_2.retirar_pendentes() == {1: max(horarios)}
+
+
+def test_status_do_desktop_expira_pelo_ttl():
+    servidor = FakeRedis()
+    backend = RedisPresenceBackend(servidor, ttl_desktop=1)
+    backend.registrar_heartbeat(1, 10, datetime.utcnow())
+    assert backend.status_desktop(1)['monitoring'] is True
+    servidor.expira_em['presence:desktop:1'] = 0  # o TTL venceu
+    assert backend.status_desktop(1) == {'monitoring': False, 'last_seen': None}
+
+    memoria = InMemoryPresenceBackend(ttl_desktop=60)
+    memoria.registrar_heartbeat(1, 10, datetime.utcnow() - timedelta(minutes=2))
+    assert memoria.status_desktop(1) == {'monitoring': False, 'last_seen': None}
+
+
+def test_socket_usa_a_presenca_compartilhada(test_app, backend):
+    empresa, usuarios = _setup(test_app, agentes=1)
+    admin = Usuario(email="admin@presenca.com", nome="Admin", empresa_id=empresa.id, role="admin_empresa")
+    admin.set_password("password123")
+    db.session.add(admin)
+    db.session.commit()
+    admin_id = admin.id
+
+    with test_app.app_context():
+        flask_client = test_app.test_client()
+        flask_client.post('/login', data={'email': 'admin@presenca.com', 'password': 'password123'})
+        cliente = socketio.test_client(test_app, flask_test_client=flask_client)
+    assert cliente.is_connected()
+    assert presence_service.online_web(admin_id)
+    status = [m for m in cliente.get_received() if m['name'] == 'agent_status_update']
+    assert status[-1]['args'][0]['is_online_web'] is True
+
+    cliente.disconnect()
+    assert not presence_service.online_web(admin_id)
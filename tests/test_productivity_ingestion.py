@@ -0,0 +1,360 @@
+# tests/test_productivity_ingestion.py
+
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+import requests
+from sqlalchemy import event, func
+from app.models import Usuario, Empresa, ActivityLog, ProductivityRules, ProdutividadeHoraria
+from app.services import productivity_ingestion_service as ingestao
+from app.services.productivity_ingestion_service import productivity_ingestion_service, RedisQueueBackend
+from app import db
+from fake_redis import FakeRedis
+
+
+def _setup(test_app, workers=0):
+    test_app.config['PRODUCTIVITY_QUEUE_WORKERS'] = workers
+    empresa = Empresa(nome_empresa="Empresa Ingestao", cnpj="99.999.999/0001-99")
+    db.session.add(empresa)
+    db.session.commit()
+    agente = Usuario(email="agente@ingestao.com", nome="Agente", empresa_id=empresa.id, role="agente",
+                     status_agente="Inativo", password_hash="x")
+    db.session.add(agente)
+    db.session.add(ProductivityRules(
+        empresa_id=empresa.id,
+        process_rules=[{"process": "excel", "classification": "productive", "category": "Planilhas"}],
+        url_rules=[{"keyword": "youtube", "classification": "unproductive", "category": "Video"}]
+    ))
+    db.session.commit()
+    return empresa, agente
+
+
+def _enviar_logs(test_client, quantidade):
+    for i in range(quantidade):
+        response = test_client.post('/api/productivity/log', headers={'X-API-KEY': 'agente@ingestao.com'}, json={
+            'timestamp': datetime.utcnow().isoformat(),
+            'process_name': 'EXCEL.EXE' if i % 2 == 0 else 'chrome.exe',
+            'url': '' if i % 2 == 0 else 'https://youtube.com/watch',
+            'window_title': f'Janela {i}'
+        })
+        assert response.status_code == 202
+
+
+def test_log_enfileirado_e_processado_em_lote(test_app, test_client):
+    """O endpoint responde 202 sem gravar; o processamento do lote classifica e grava tudo."""
+    empresa, agente = _setup(test_app)
+    _enviar_logs(test_client, 4)
+    assert ActivityLog.query.count() == 0
+
+    productivity_ingestion_service.drenar(test_app)
+
+    logs = ActivityLog.query.filter_by(empresa_id=empresa.id).order_by(ActivityLog.window_title).all()
+    assert len(logs) == 4
+    assert [(l.is_productive, l.category) for l in logs[:2]] == [(True, 'Planilhas'), (False, 'Video')]
+    db.session.refresh(agente)  # gravado pelo processamento em outra sessão
+    assert agente.is_monitoring is True
+    assert agente.status_agente == 'Disponível'
+    assert agente.last_agent_activity is not None
+
+
+def test_log_invalido_rejeitado_sem_enfileirar(test_app, test_client):
+    _setup(test_app)
+    headers = {'X-API-KEY': 'agente@ingestao.com'}
+    assert test_client.post('/api/productivity/log', headers=headers, json={'process_name': 'x'}).status_code == 400
+    assert test_client.post('/api/productivity/log', headers=headers, json={'timestamp': 'ontem'}).status_code == 400
+
+    productivity_ingestion_service.drenar(test_app)
+    assert ActivityLog.query.count() == 0
+
+
+def test_backend_redis(test_app, test_client):
+    """O backend Redis entrega os mesmos itens (testado com um substituto local do servidor)."""
+    empresa, _ = _setup(test_app)
+    test_app.extensions['productivity_ingestion']['backend'] = RedisQueueBackend(FakeRedis())
+    _enviar_logs(test_client, 5)
+
+    productivity_ingestion_service.drenar(test_app)
+    assert ActivityLog.query.filter_by(empresa_id=empresa.id).count() == 5
+
+
+def test_pool_de_workers_drena_a_fila(test_app, test_client):
+    empresa, _ = _setup(test_app, workers=2)
+    _enviar_logs(test_client, 6)
+
+    prazo = time.time() + 5
+    while time.time() < prazo and ActivityLog.query.filter_by(empresa_id=empresa.id).count() < 6:
+        db.session.rollback()  # encerra a transação para enxergar os commits dos workers
+        time.sleep(0.05)
+    assert ActivityLog.query.filter_by(empresa_id=empresa.id).count() == 6
+
+
+def _amostras(quantidade, inicio=0):
+    return [{
+        'timestamp': datetime.utcnow().isoformat(),
+        'process_name': 'EXCEL.EXE',
+        'window_title': f'Planilha {inicio + i}'
+    } for i in range(quantidade)]
+
+
+def test_lote_compactado_gravado_com_um_insert(test_app, test_client):
+    """O endpoint de lote aceita gzip e grava todas as amostras com um único INSERT."""
+    empresa, _ = _setup(test_app)
+    response = test_client.post(
+        '/api/productivity/log/batch', data=gzip.compress(json.dumps(_amostras(30)).encode()),
+        headers={'X-API-KEY': 'agente@ingestao.com', 'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+    )
+    assert response.status_code == 202
+    assert response.get_json()['recebidos'] == 30
+
+    inserts = []
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO activity_log'):
+            inserts.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', _registrar)
+    try:
+        productivity_ingestion_service.drenar(test_app)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _registrar)
+
+    assert len(inserts) == 1
+    logs = ActivityLog.query.filter_by(empresa_id=empresa.id).all()
+    assert len(logs) == 30
+    assert all(l.category == 'Planilhas' for l in logs)
+
+
+def test_lote_invalido_rejeitado_por_inteiro(test_app, test_client):
+    _setup(test_app)
+    headers = {'X-API-KEY': 'agente@ingestao.com'}
+    amostras = _amostras(3)
+    amostras[1] = {'process_name': 'sem timestamp'}
+    response = test_client.post('/api/productivity/log/batch', json=amostras, headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['indices'] == [1]
+
+    test_app.config['PRODUCTIVITY_BATCH_MAX_SAMPLES'] = 5
+    assert test_client.post('/api/productivity/log/batch', json=_amostras(6), headers=headers).status_code == 413
+
+    productivity_ingestion_service.drenar(test_app)
+    assert ActivityLog.query.count() == 0
+
+
+def test_buffer_do_agente_reenvia_apos_queda(test_app, test_client, tmp_path, monkeypatch):
+    """O buffer do agente de desktop mantém as amostras durante a queda e as reenvia em lotes."""
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'desktop_agent'))
+    import log_buffer
+    empresa, _ = _setup(test_app)
+    servidor_fora = [True]
+
+    def _post(url, data, headers, timeout):
+        # Encaminha o POST do agente para o app de teste
+        if servidor_fora[0]:
+            raise requests.exceptions.ConnectionError("servidor fora do ar")
+        return test_client.post(url.replace('http://servidor', ''), data=data, headers=headers)
+    monkeypatch.setattr(log_buffer.requests, 'post', _post)
+
+    caminho = str(tmp_path / 'buffer.jsonl')
+    buffer = log_buffer.LogBuffer(caminho, 'http://servidor', 'agente@ingestao.com', tamanho_lote=10, idade_maxima=300)
+    for amostra in _amostras(25):
+        buffer.adicionar(amostra)
+        buffer.enviar_se_necessario()
+    assert buffer.pendentes() == 25
+
+    # O agente reinicia e recupera o buffer do disco; com o servidor de volta, envia tudo em 3 lotes
+    buffer = log_buffer.LogBuffer(caminho, 'http://servidor', 'agente@ingestao.com', tamanho_lote=10, idade_maxima=300)
+    assert buffer.pendentes() == 25
+    servidor_fora[0] = False
+    assert buffer.enviar() is True
+    assert buffer.pendentes() == 0
+
+    productivity_ingestion_service.drenar(test_app)
+    titulos = [l.window_title for l in ActivityLog.query.filter_by(empresa_id=empresa.id).order_by(ActivityLog.id)]
+    assert titulos == [f'Planilha {i}' for i in range(25)]
+
+
+def _enviar_sequencia(test_client, inicio, janelas):
+    """Uma amostra a cada 15s (o intervalo do agente), com a janela indicada (None = sem amostra nesse intervalo)."""
+    amostras = [{
+        'timestamp': (inicio + timedelta(seconds=15 * i)).isoformat(),
+        'process_name': 'EXCEL.EXE',
+        'window_title': janela
+    } for i, janela in enumerate(janelas) if janela]
+    response = test_client.post('/api/productivity/log/batch', json=amostras, headers={'X-API-KEY': 'agente@ingestao.com'})
+    assert response.status_code == 202
+
+
+def _spans(empresa):
+    return [(l.window_title, l.sample_count, l.duracao_segundos)
+            for l in ActivityLog.query.filter_by(empresa_id=empresa.id).order_by(ActivityLog.timestamp)]
+
+
+def test_amostras_identicas_estendem_o_span_aberto(test_app, test_client):
+    empresa, _ = _setup(test_app)
+    inicio = datetime(2026, 10, 18, 9, 0)
+    _enviar_sequencia(test_client, inicio, ['Planilha'] * 4)
+    productivity_ingestion_service.drenar(test_app)
+    assert _spans(empresa) == [('Planilha', 4, 60.0)]
+
+    # O lote seguinte continua o mesmo span: UPDATE no lugar, sem INSERT
+    comandos = []
+    registrar = lambda conn, cursor, statement, *a: comandos.append(' '.join(statement.split()[:3]))
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        _enviar_sequencia(test_client, inicio + timedelta(minutes=1), ['Planilha'] * 4)
+        productivity_ingestion_service.drenar(test_app)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+    assert 'INSERT INTO activity_log' not in comandos and 'UPDATE activity_log SET' in comandos
+    db.session.expire_all()
+    assert _spans(empresa) == [('Planilha', 8, 120.0)]
+
+    tempo_total = db.session.query(func.sum(ActivityLog.duracao_segundos)).filter_by(empresa_id=empresa.id).scalar()
+    assert tempo_total == 120
+
+
+def test_spans_fecham_na_troca_de_janela_e_nas_lacunas(test_app, test_client):
+    empresa, _ = _setup(test_app)
+    inicio = datetime(2026, 10, 18, 9, 0)
+    # A A B A | uma amostra perdida ainda continua o span | duas perdidas abrem outro
+    _enviar_sequencia(test_client, inicio, ['A', 'A', 'B', 'A', None, 'A', None, None, 'A'])
+    productivity_ingestion_service.drenar(test_app)
+    assert _spans(empresa) == [('A', 2, 30.0), ('B', 1, 15.0), ('A', 2, 45.0), ('A', 1, 15.0)]
+
+
+def test_span_respeita_a_duracao_maxima(test_app, test_client):
+    empresa, _ = _setup(test_app)
+    test_app.config['ACTIVITY_SPAN_MAX_SECONDS'] = 60
+    _enviar_sequencia(test_client, datetime(2026, 10, 18, 9, 0), ['Planilha'] * 6)
+    productivity_ingestion_service.drenar(test_app)
+    assert _spans(empresa) == [('Planilha', 4, 60.0), ('Planilha', 2, 30.0)]
+
+
+def test_lote_que_falha_volta_para_a_fila_e_e_descartado_depois_das_tentativas(test_app, test_client, monkeypatch):
+    empresa, _ = _setup(test_app)
+    test_app.config['PRODUCTIVITY_QUEUE_MAX_ATTEMPTS'] = 2
+    backend = test_app.extensions['productivity_ingestion']['backend']
+    original = ingestao.aplicar_deltas
+    falhas = [1]
+
+    def _aplicar_deltas(deltas):
+        # Falha depois do INSERT dos spans: o rollback não pode deixar nada gravado
+        if falhas[0]:
+            falhas[0] -= 1
+            raise RuntimeError("banco indisponível")
+        original(deltas)
+    monkeypatch.setattr(ingestao, 'aplicar_deltas', _aplicar_deltas)
+
+    _enviar_sequencia(test_client, datetime(2026, 10, 18, 9, 0), ['Planilha'] * 4)
+    productivity_ingestion_service.drenar(test_app)
+    assert _spans(empresa) == [('Planilha', 4, 60.0)]
+    assert backend.descartados == []
+
+    falhas[0] = 2
+    _enviar_sequencia(test_client, datetime(2026, 10, 18, 10, 0), ['Outra'])
+    productivity_ingestion_service.drenar(test_app)
+    db.session.expire_all()
+    assert _spans(empresa) == [('Planilha', 4, 60.0)]
+    assert [item['tentativas'] for item in backend.descartados] == [2]
+
+
+def test_worker_sobrevive_a_erro_da_fila(test_app, test_client):
+    empresa, _ = _setup(test_app, workers=1)
+    test_app.config['PRODUCTIVITY_QUEUE_RETRY_BACKOFF_SECONDS'] = 0.01
+    backend = RedisQueueBackend(FakeRedis())
+    original = backend.get_batch
+    erros = [1]
+
+    def _get_batch(max_itens, timeout):
+        if erros[0]:
+            erros[0] -= 1
+            raise ConnectionError("Redis fora do ar")
+        return original(max_itens, timeout)
+    backend.get_batch = _get_batch
+    test_app.extensions['productivity_ingestion']['backend'] = backend
+    _enviar_logs(test_client, 3)
+
+    prazo = time.time() + 5
+    while time.time() < prazo and ActivityLog.query.filter_by(empresa_id=empresa.id).count() < 3:
+        db.session.rollback()
+        time.sleep(0.05)
+    assert erros == [0]
+    assert ActivityLog.query.filter_by(empresa_id=empresa.id).count() == 3
+
+
+def test_lotes_simultaneos_do_mesmo_agente_nao_abrem_dois_spans(test_app, test_client, monkeypatch):
+    empresa, agente = _setup(test_app)
+    inicio = datetime(2026, 10, 18, 9, 0)
+    _enviar_sequencia(test_client, inicio, ['Planilha'])
+    productivity_ingestion_service.drenar(test_app)
+    itens = [{
+        'usuario_id': agente.id, 'empresa_id': empresa.id, 'recebido_em': inicio.isoformat(),
+        'amostras': [{'timestamp': (inicio + timedelta(seconds=15 * i)).isoformat(),
+                      'process_name': 'OUTLOOK.EXE', 'window_title': 'Email'}]
+    } for i in (1, 2)]
+
+    # O segundo lote só começa depois que o primeiro leu o span aberto, e quem lê espera o outro
+    # chegar à mesma leitura: sem o lock, os dois veem a 'Planilha' e abrem cada um um span de
+    # 'Email'; com o lock, o segundo só lê depois do commit do primeiro e estende o span dele
+    barreira = threading.Barrier(2, timeout=1)
+    primeiro_leu = threading.Event()
+    original = ingestao.ProductivityIngestionService._spans_abertos
+
+    def _spans_abertos(self, *args):
+        abertos = original(self, *args)
+        primeiro_leu.set()
+        try:
+            barreira.wait()
+        except threading.BrokenBarrierError:
+            pass
+        return abertos
+    monkeypatch.setattr(ingestao.ProductivityIngestionService, '_spans_abertos', _spans_abertos)
+
+    threads = [threading.Thread(target=productivity_ingestion_service.processar_lote, args=(test_app, [item])) for item in itens]
+    threads[0].start()
+    primeiro_leu.wait(5)
+    threads[1].start()
+    for t in threads:
+        t.join()
+
+    db.session.expire_all()
+    assert _spans(empresa) == [('Planilha', 1, 15.0), ('Email', 2, 30.0)]
+
+
+def test_lotes_simultaneos_do_mesmo_agente_nao_somam_o_span_duas_vezes(test_app, test_client, monkeypatch):
+    empresa, agente = _setup(test_app)
+    inicio = datetime(2026, 10, 18, 9, 0)
+    _enviar_sequencia(test_client, inicio, ['Planilha'])
+    productivity_ingestion_service.drenar(test_app)
+    itens = [{
+        'usuario_id': agente.id, 'empresa_id': empresa.id, 'recebido_em': inicio.isoformat(),
+        'amostras': [{'timestamp': (inicio + timedelta(seconds=15 * i)).isoformat(),
+                      'process_name': 'EXCEL.EXE', 'window_title': 'Planilha'}]
+    } for i in (1, 2)]
+
+    # Quem lê o span aberto espera o outro lote chegar à mesma leitura: sem o lock, os dois estendem
+    # o span a partir do mesmo fim e somam ao rollup o mesmo trecho; com o lock, o segundo só lê
+    # depois do commit do primeiro
+    barreira = threading.Barrier(2, timeout=1)
+    original = ingestao.ProductivityIngestionService._spans_abertos
+
+    def _spans_abertos(self, *args):
+        abertos = original(self, *args)
+        try:
+            barreira.wait()
+        except threading.BrokenBarrierError:
+            pass
+        return abertos
+    monkeypatch.setattr(ingestao.ProductivityIngestionService, '_spans_abertos', _spans_abertos)
+
+    threads = [threading.Thread(target=productivity_ingestion_service.processar_lote, args=(test_app, [item])) for item in itens]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    db.session.expire_all()
+    assert _spans(empresa) == [('Planilha', 3, 45.0)]
+    assert db.session.query(func.sum(ProdutividadeHoraria.segundos)).filter_by(usuario_id=agente.id).scalar() == 45.0
@@ -0,0 +1,168 @@
+# tests/test_produtividade_rollup.py
+
+import threading
+import time
+from datetime import datetime, timedelta
+from app.models import Usuario, Empresa, ProductivityRules, ProdutividadeHoraria
+from app.services import productivity_ingestion_service as ingestao
+from app.services.productivity_ingestion_service import productivity_ingestion_service
+from app.services.produtividade_rollup_service import reconstruir_produtividade
+from app import db
+
+HEADERS = {'X-API-KEY': 'agente@rollup.com'}
+
+
+def _setup(test_app):
+    test_app.config['PRODUCTIVITY_QUEUE_WORKERS'] = 0
+    empresa = Empresa(nome_empresa="Empresa Rollup", cnpj="33.333.333/0001-33")
+    db.session.add(empresa)
+    db.session.commit()
+    agente = Usuario(email="agente@rollup.com", nome="Agente", empresa_id=empresa.id, role="agente", password_hash="x")
+    agente.set_password("password123")
+    gestor = Usuario(email="gestor@rollup.com", nome="Gestor", empresa_id=empresa.id, role="admin_empresa")
+    gestor.set_password("password123")
+    db.session.add_all([agente, gestor])
+    db.session.add(ProductivityRules(
+        empresa_id=empresa.id,
+        process_rules=[{"process": "excel", "classification": "productive", "category": "Planilhas"}],
+        url_rules=[{"keyword": "youtube", "classification": "unproductive", "category": "Video"}]
+    ))
+    db.session.commit()
+    return empresa, agente, gestor
+
+
+def _enviar(test_app, test_client, inicio, atividades):
+    """Uma amostra a cada 15s: 'E' = Excel (produtivo), 'Y' = YouTube (improdutivo), None = sem amostra."""
+    amostras = [{
+        'timestamp': (inicio + timedelta(seconds=15 * i)).isoformat(),
+        'process_name': 'EXCEL.EXE' if atividade == 'E' else 'chrome.exe',
+        'url': 'https://youtube.com/watch' if atividade == 'Y' else '',
+        'window_title': atividade
+    } for i, atividade in enumerate(atividades) if atividade]
+    assert test_client.post('/api/productivity/log/batch', json=amostras, headers=HEADERS).status_code == 202
+    productivity_ingestion_service.drenar(test_app)
+
+
+def _snapshot(empresa_id):
+    return sorted(
+        (r.usuario_id, r.hora, r.categoria, r.classificacao, round(r.segundos, 6), r.amostras)
+        for r in ProdutividadeHoraria.query.filter_by(empresa_id=empresa_id)
+    )
+
+
+def test_ingestao_mantem_o_rollup_e_divide_spans_entre_horas(test_app, test_client):
+    empresa, agente, _ = _setup(test_app)
+    # Span de Excel das 9:59:00 às 10:00:30 (6 amostras), enviado em dois lotes: o segundo estende o span
+    _enviar(test_app, test_client, datetime(2026, 10, 18, 9, 59), ['E'] * 4)
+    _enviar(test_app, test_client, datetime(2026, 10, 18, 10, 0), ['E', 'E', 'Y', 'Y'])
+
+    assert _snapshot(empresa.id) == [
+        (agente.id, datetime(2026, 10, 18, 9), 'Planilhas', 'produtivo', 60.0, 6),
+        (agente.id, datetime(2026, 10, 18, 10), 'Planilhas', 'produtivo', 30.0, 0),
+        (agente.id, datetime(2026, 10, 18, 10), 'Video', 'improdutivo', 30.0, 2),
+    ]
+
+
+def test_reconstrucao_igual_ao_incremental(test_app, test_client):
+    """O catch-up (flask atividades reconstruir) produz exatamente o rollup mantido pela ingestão."""
+    empresa, _, _ = _setup(test_app)
+    _enviar(test_app, test_client, datetime(2026, 10, 17, 23, 58), ['E'] * 6 + ['Y', None, 'Y', None, None, 'E'] + ['Y'] * 5)
+    _enviar(test_app, test_client, datetime(2026, 10, 18, 0, 2, 30), ['Y'] * 3 + ['E'] * 4)
+    _enviar(test_app, test_client, datetime(2026, 10, 18, 14, 0), ['E'] * 10)
+
+    incremental = _snapshot(empresa.id)
+    assert len(incremental) > 3
+
+    ProdutividadeHoraria.query.delete()
+    db.session.commit()
+    result = test_app.test_cli_runner().invoke(args=['atividades', 'reconstruir'])
+    assert result.exit_code == 0, result.output
+    assert _snapshot(empresa.id) == incremental
+
+    # Reconstruir só um dia não duplica nem apaga as horas dos outros dias
+    result = test_app.test_cli_runner().invoke(args=['atividades', 'reconstruir', '--desde', '2026-10-18', '--ate', '2026-10-18'])
+    assert result.exit_code == 0, result.output
+    assert _snapshot(empresa.id) == incremental
+
+
+def test_serie_por_dia_semana_e_mes(test_app, test_client):
+    empresa, agente, _ = _setup(test_app)
+    _enviar(test_app, test_client, datetime(2026, 10, 14, 9, 0), ['E'] * 8)   # quarta-feira
+    _enviar(test_app, test_client, datetime(2026, 10, 18, 10, 0), ['Y'] * 4)  # domingo
+    test_client.post('/login', data={'email': 'gestor@rollup.com', 'password': 'password123'})
+
+    dia = test_client.get('/api/dashboard/produtividade/serie?periodo=dia&data=2026-10-18').get_json()
+    assert len(dia['serie']) == 24
+    assert dia['serie'][10] == {'inicio': '2026-10-18T10:00:00', 'produtivo': 0.0, 'improdutivo': 60.0, 'neutro': 0.0}
+    assert dia['categorias'] == [{'categoria': 'Video', 'classificacao': 'improdutivo', 'segundos': 60.0}]
+
+    semana = test_client.get('/api/dashboard/produtividade/serie?periodo=semana&data=2026-10-16').get_json()
+    assert [b['inicio'][:10] for b in semana['serie']][::6] == ['2026-10-12', '2026-10-18']
+    assert [(b['produtivo'], b['improdutivo']) for b in semana['serie']][2:] == [
+        (120.0, 0.0), (0.0, 0.0), (0.0, 0.0), (0.0, 0.0), (0.0, 60.0)
+    ]
+    assert semana['agentes'] == [{'usuario_id': agente.id, 'nome': 'Agente', 'produtivo': 120.0, 'improdutivo': 60.0, 'neutro': 0.0}]
+
+    mes = test_client.get('/api/dashboard/produtividade/serie?periodo=mes&data=2026-10-01').get_json()
+    assert len(mes['serie']) == 31
+    assert sum(b['produtivo'] for b in mes['serie']) == 120.0
+
+    assert test_client.get('/api/dashboard/produtividade/serie?periodo=ano').status_code == 400
+    assert test_client.get('/api/dashboard/produtividade/serie?data=18/10/2026').status_code == 400
+
+
+def test_agente_so_ve_a_propria_serie(test_app, test_client):
+    empresa, agente, gestor = _setup(test_app)
+    _enviar(test_app, test_client, datetime(2026, 10, 18, 9, 0), ['E'] * 4)
+    test_client.post('/login', data={'email': 'agente@rollup.com', 'password': 'password123'})
+
+    dados = test_client.get(f'/api/dashboard/produtividade/serie?data=2026-10-18&usuario_id={gestor.id}').get_json()
+    assert [a['usuario_id'] for a in dados['agentes']] == [agente.id]
+
+
+def test_reconstrucao_durante_um_lote_em_andamento(test_app, test_client, monkeypatch):
+    """
+    Um lote cria uma chave do rollup e ainda não fez commit quando a reconstrução começa: sem o
+    lock da tabela, o INSERT ... SELECT da reconstrução viola a chave única quando o lote termina.
+    """
+    empresa, agente, _ = _setup(test_app)
+    empresa_id = empresa.id
+    inicio = datetime(2026, 10, 18, 9, 0)
+    _enviar(test_app, test_client, inicio, ['E'] * 4)
+    ProdutividadeHoraria.query.delete()  # rollup desatualizado: o span existe, a chave não
+    db.session.commit()
+
+    gravou, liberar = threading.Event(), threading.Event()
+    original = ingestao.aplicar_deltas
+
+    def _aplicar_deltas(deltas):
+        original(deltas)
+        gravou.set()
+        liberar.wait(5)
+    monkeypatch.setattr(ingestao, 'aplicar_deltas', _aplicar_deltas)
+
+    erros = []
+
+    def _reconstruir():
+        with test_app.app_context():
+            try:
+                reconstruir_produtividade(empresa_id=empresa_id)
+            except Exception as e:
+                erros.append(e)
+
+    amostras = [{'timestamp': (inicio + timedelta(seconds=15 * i)).isoformat(), 'process_name': 'EXCEL.EXE',
+                 'url': '', 'window_title': 'E'} for i in range(4, 8)]
+    assert test_client.post('/api/productivity/log/batch', json=amostras, headers=HEADERS).status_code == 202
+    lote = threading.Thread(target=productivity_ingestion_service.drenar, args=(test_app,))
+    lote.start()
+    assert gravou.wait(5)
+    reconstrucao = threading.Thread(target=_reconstruir)
+    reconstrucao.start()
+    time.sleep(0.3)  # a reconstrução chega ao lock (ou, sem ele, ao INSERT da chave do lote)
+    liberar.set()
+    lote.join()
+    reconstrucao.join()
+
+    assert erros == []
+    db.session.expire_all()
+    assert _snapshot(empresa_id) == [(agente.id, datetime(2026, 10, 18, 9), 'Planilhas', 'produtivo', 120.0, 8)]
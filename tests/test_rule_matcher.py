@@ -0,0 +1,105 @@
+# tests/test_rule_matcher.py
+
+import random
+import string
+from app.models import Usuario, Empresa, ProductivityRules
+from app.services.ai_productivity_service import montar_regras
+from app.services.rule_matcher import CompiledRules, rule_matcher_cache
+from app import db
+
+
+def _classificar_linear(activity_data, rules):
+    """Implementação anterior (varredura linear), usada como referência."""
+    process_name = activity_data.get('process_name', '')
+    url = activity_data.get('url', '')
+    for rule in rules.get('process_rules', []):
+        if rule.get('process', '').lower() in process_name.lower():
+            return {"is_productive": rule.get('classification') == 'productive', "category": rule.get('category', 'N/A'), "reason": "Classificado por regra de processo."}
+    for rule in rules.get('url_rules', []):
+        if rule.get('keyword', '').lower() in url.lower():
+            return {"is_productive": rule.get('classification') == 'productive', "category": rule.get('category', 'N/A'), "reason": "Classificado por regra de URL."}
+    return None
+
+
+def _palavra(aleatorio, tamanho):
+    return ''.join(aleatorio.choice('abcde') for _ in range(tamanho))
+
+
+def _regras_aleatorias(aleatorio, quantidade):
+    return {
+        "process_rules": [
+            {"process": _palavra(aleatorio, aleatorio.randint(2, 5)).upper(), "classification": aleatorio.choice(['productive', 'unproductive']), "category": f"P{i}"}
+            for i in range(quantidade)
+        ],
+        "url_rules": [
+            {"keyword": _palavra(aleatorio, aleatorio.randint(3, 6)), "classification": 'productive', "category": f"U{i}"}
+            for i in range(quantidade)
+        ]
+    }
+
+
+def test_mesmo_resultado_da_varredura_linear():
+    """O autômato mantém a semântica 'primeira regra que casar vence', inclusive com palavras sobrepostas."""
+    aleatorio = random.Random(42)
+    for _ in range(30):
+        rules = _regras_aleatorias(aleatorio, aleatorio.randint(1, 40))
+        compiladas = CompiledRules(rules)
+        for _ in range(50):
+            atividade = {'process_name': _palavra(aleatorio, 12), 'url': _palavra(aleatorio, 20)}
+            assert compiladas.classificar(atividade) == _classificar_linear(atividade, rules)
+
+
+def test_casos_de_borda():
+    rules = {
+        "process_rules": [{"process": "cel", "classification": "productive", "category": "A"}, {"process": "excel", "category": "B"}],
+        "url_rules": [{"keyword": "", "classification": "unproductive", "category": "Qualquer"}]
+    }
+    compiladas = CompiledRules(rules)
+    # 'excel' contém 'cel': vence a regra que vem primeiro na lista, não a que termina antes no texto
+    assert compiladas.classificar({'process_name': 'EXCEL.EXE'})['category'] == 'A'
+    # Palavra-chave vazia casa com qualquer URL, como o `in` da versão anterior
+    assert compiladas.classificar({'process_name': 'notepad.exe', 'url': None})['category'] == 'Qualquer'
+    assert CompiledRules({}).classificar({'process_name': 'x'}) is None
+
+
+def test_regras_recompiladas_ao_salvar(test_client):
+    empresa = Empresa(nome_empresa="Empresa Regras", cnpj="13.131.313/0001-13")
+    db.session.add(empresa)
+    db.session.commit()
+    admin = Usuario(email="admin@regras.com", nome="Admin", empresa_id=empresa.id, role="admin_empresa")
+    admin.set_password("password123")
+    db.session.add(admin)
+    db.session.commit()
+    test_client.post('/login', data={'email': 'admin@regras.com', 'password': 'password123'})
+
+    test_client.post('/api/productivity/rules', json={'process_rules': [{'process': 'excel', 'classification': 'productive', 'category': 'Planilhas'}]})
+    regras = ProductivityRules.query.filter_by(empresa_id=empresa.id).one()
+    compiladas = rule_matcher_cache.obter(montar_regras(regras, empresa.id))
+    assert rule_matcher_cache.obter(montar_regras(regras, empresa.id)) is compiladas
+    assert compiladas.classificar({'process_name': 'excel.exe'})['category'] == 'Planilhas'
+
+    test_client.post('/api/productivity/rules', json={'process_rules': [{'process': 'excel', 'classification': 'unproductive', 'category': 'Jogos'}]})
+    db.session.refresh(regras)
+    novas = rule_matcher_cache.obter(montar_regras(regras, empresa.id))
+    assert novas is not compiladas
+    assert novas.classificar({'process_name': 'excel.exe'})['category'] == 'Jogos'
+
+
+def test_milhares_de_regras_iguais_a_varredura():
+    """5000 regras de processo e 5000 de URL: o autômato classifica como a varredura (o tempo é medido em tests/bench_regras.py)."""
+    aleatorio = random.Random(7)
+    alfabeto = string.ascii_lowercase + string.digits
+    rules = {
+        "process_rules": [{"process": ''.join(aleatorio.choices(alfabeto, k=10)), "category": f"P{i}"} for i in range(5000)],
+        "url_rules": [{"keyword": ''.join(aleatorio.choices(alfabeto, k=12)), "category": f"U{i}"} for i in range(5000)]
+    }
+    amostras = [
+        {'process_name': f"{''.join(aleatorio.choices(alfabeto, k=8))}.exe", 'url': f"https://{''.join(aleatorio.choices(alfabeto, k=30))}.com/x"}
+        for _ in range(200)
+    ]
+    amostras.append({'process_name': rules['process_rules'][4999]['process'] + '.exe', 'url': ''})
+
+    compiladas = CompiledRules(rules)
+    esperado = [_classificar_linear(a, rules) for a in amostras]
+    assert [compiladas.classificar(a) for a in amostras] == esperado
+    assert esperado[-1]['category'] == 'P4999'
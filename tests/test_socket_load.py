@@ -0,0 +1,92 @@
+# tests/test_socket_load.py
+
+import time
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app.models import Usuario, Empresa
+from app.services.presence_service import presence_service, RedisPresenceBackend
+from app import db, socketio
+from fake_redis import FakeRedis
+
+USUARIOS = 200
+CONEXOES_POR_USUARIO = 10
+
+
+def _criar_usuarios():
+    # Hash barato: o teste mede o Socket.IO, não o login
+    senha = generate_password_hash('password123', method='pbkdf2:sha256:1')
+    empresas = [Empresa(nome_empresa=f"Empresa Carga {i}", cnpj=f"18.{i:03d}.000/0001-{i % 100:02d}") for i in range(USUARIOS)]
+    db.session.add_all(empresas)
+    db.session.commit()
+    usuarios = [
+        Usuario(email=f"carga{i}@teste.com", nome=f"Carga {i}", empresa_id=empresa.id, role="agente", password_hash=senha)
+        for i, empresa in enumerate(empresas)
+    ]
+    db.session.add_all(usuarios)
+    db.session.commit()
+    return [(u.id, u.email) for u in usuarios]
+
+
+def _conectar_todos(test_app, usuarios):
+    clientes = []
+    for _, email in usuarios:
+        with test_app.app_context():
+            http_client = test_app.test_client()
+            http_client.post('/login', data={'email': email, 'password': 'password123'})
+            for _ in range(CONEXOES_POR_USUARIO):
+                clientes.append(socketio.test_client(test_app, flask_test_client=http_client))
+    return clientes
+
+
+def _tempestade(test_app):
+    """Conecta e desconecta USUARIOS x CONEXOES_POR_USUARIO clientes; devolve (consultas no disconnect, segundos)."""
+    usuarios = _criar_usuarios()
+    clientes = _conectar_todos(test_app, usuarios)
+    assert len(clientes) == USUARIOS * CONEXOES_POR_USUARIO
+    assert all(presence_service.online_web(uid) for uid, _ in usuarios)
+
+    consultas = []
+    contar = lambda conn, cursor, statement, *a: consultas.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', contar)
+    inicio = time.perf_counter()
+    for cliente in clientes:
+        cliente.disconnect()
+    duracao = time.perf_counter() - inicio
+    event.remove(db.engine, 'before_cursor_execute', contar)
+
+    assert not any(presence_service.online_web(uid) for uid, _ in usuarios)
+    print(f"\n{len(clientes)} desconexões em {duracao:.2f}s ({duracao / len(clientes) * 1000:.2f} ms cada)")
+    return consultas, duracao
+
+
+def test_desconexoes_em_massa_sem_acesso_ao_banco(test_app, test_client):
+    consultas, _ = _tempestade(test_app)
+    assert consultas == []
+
+
+def test_desconexoes_em_massa_com_presenca_no_redis(test_app, test_client):
+    test_app.extensions['presence']['backend'] = RedisPresenceBackend(FakeRedis())
+    consultas, _ = _tempestade(test_app)
+    assert consultas == []
+
+
+def test_admins_recebem_o_status_ao_desconectar(test_app, test_client):
+    """O disconnect continua notificando a sala da empresa, com a empresa vinda dos metadados do SID."""
+    empresa = Empresa(nome_empresa="Empresa Sala", cnpj="17.171.717/0001-17")
+    db.session.add(empresa)
+    db.session.commit()
+    senha = generate_password_hash('password123', method='pbkdf2:sha256:1')
+    db.session.add_all([
+        Usuario(email="admin@sala.com", nome="Admin", empresa_id=empresa.id, role="admin_empresa", password_hash=senha),
+        Usuario(email="agente@sala.com", nome="Agente", empresa_id=empresa.id, role="agente", password_hash=senha),
+    ])
+    db.session.commit()
+    admin = _conectar_todos(test_app, [(None, "admin@sala.com")])[0]
+    agente = _conectar_todos(test_app, [(None, "agente@sala.com")])
+    agente_id = Usuario.query.filter_by(email="agente@sala.com").one().id
+    admin.get_received()
+
+    for cliente in agente:
+        cliente.disconnect()
+    status = [e['args'][0] for e in admin.get_received() if e['name'] == 'agent_status_update']
+    assert status[-1]['agent_id'] == agente_id and status[-1]['is_online_web'] is False
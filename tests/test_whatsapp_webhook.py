@@ -0,0 +1,242 @@
+# tests/test_whatsapp_webhook.py
+
+import time
+from sqlalchemy import event
+from app.models import Usuario, Empresa, ConversaWhatsApp, MensagemWhatsApp, EstatisticaDiaria, WebhookInbox
+from app.services import whatsapp_webhook_service, whatsapp_inbox_service as inbox_modulo
+from app.services.whatsapp_inbox_service import whatsapp_inbox_service
+from app import db
+
+
+def _mensagem(wa_id, texto, wamid):
+    return {"id": wamid, "from": wa_id, "timestamp": str(int(time.time())), "text": {"body": texto}}
+
+
+def _payload(*mensagens):
+    # Como a Meta envia: mensagens espalhadas por várias entradas/alterações
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": list(mensagens[:2])}}]},
+                  {"changes": [{"value": {"statuses": []}}, {"value": {"messages": list(mensagens[2:])}}]}]
+    }
+
+
+def _setup(cnpj="44.444.444/0001-44"):
+    empresa = Empresa(nome_empresa=f"Empresa Webhook {cnpj}", cnpj=cnpj)
+    db.session.add(empresa)
+    db.session.commit()
+    existente = ConversaWhatsApp(wa_id="5511900000001", nome_cliente="Cliente 0001", status='ativo', empresa_id=empresa.id)
+    db.session.add(existente)
+    db.session.commit()
+    return empresa, existente
+
+
+def _totais_rollup(empresa_id):
+    return db.session.query(
+        db.func.sum(EstatisticaDiaria.atendimentos), db.func.sum(EstatisticaDiaria.mensagens_recebidas)
+    ).filter_by(empresa_id=empresa_id).one()
+
+
+def test_payload_gravado_em_lote_com_um_evento_por_conversa(test_app, test_client, monkeypatch):
+    empresa, existente = _setup()
+    emitidos = []
+    monkeypatch.setattr(whatsapp_webhook_service.socketio, 'emit', lambda *a, **k: emitidos.append((a, k)))
+
+    payload = _payload(
+        _mensagem("5511900000001", "Oi", "wamid.1"),
+        _mensagem("5511900000002", "Bom dia", "wamid.2"),
+        {"id": "wamid.x", "timestamp": "1"},  # malformada: ignorada sem perder as demais
+        _mensagem("5511900000002", "Preciso de ajuda", "wamid.3"),
+        _mensagem("5511900000001", "Alguém?", "wamid.4"),
+        {"id": "wamid.5", "from": "5511900000002", "timestamp": str(int(time.time())), "type": "image"},
+    )
+    response = test_client.post(f'/api/webhook/{empresa.id}', json=payload)
+    assert response.status_code == 200
+    # A resposta sai antes do processamento: só o corpo bruto foi gravado
+    assert WebhookInbox.query.filter_by(empresa_id=empresa.id, processado_em=None).count() == 1
+    assert MensagemWhatsApp.query.count() == 0
+
+    assert whatsapp_inbox_service.drenar(test_app) == 1
+    conversas = {c.wa_id: c for c in ConversaWhatsApp.query.filter_by(empresa_id=empresa.id)}
+    assert len(conversas) == 2 and conversas["5511900000001"].id == existente.id
+    nova = conversas["5511900000002"]
+    assert (nova.status, nova.nome_cliente, nova.assunto) == ('pendente', 'Cliente 0002', 'Geral')
+    assert [m.conteudo for m in MensagemWhatsApp.query.filter_by(conversa_id=nova.id).order_by(MensagemWhatsApp.id)] == [
+        "Bom dia", "Preciso de ajuda", "Mídia recebida"
+    ]
+    assert MensagemWhatsApp.query.filter_by(conversa_id=existente.id).count() == 2
+
+    eventos = {k['room']: a[1] for a, k in emitidos if a[0] == 'nova_mensagem_cliente'}
+    assert len(emitidos) == 2
+    assert [m['conteudo'] for m in eventos[f"conversa_{existente.id}"]['mensagens']] == ["Oi", "Alguém?"]
+    assert eventos[f"conversa_{nova.id}"]['conteudo'] == "Mídia recebida"
+
+    # O rollup continua correto sem os eventos do ORM
+    assert _totais_rollup(empresa.id) == (2, 5)
+
+
+def test_quantidade_de_instrucoes_nao_cresce_com_o_lote(test_app, test_client):
+    empresa, _ = _setup()
+
+    def _instrucoes(payload):
+        assert test_client.post(f'/api/webhook/{empresa.id}', json=payload).status_code == 200
+        executadas = []
+        ouvinte = lambda conn, cursor, statement, *args: executadas.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', ouvinte)
+        try:
+            whatsapp_inbox_service.drenar(test_app)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', ouvinte)
+        return [s for s in executadas if 'conversa_whats_app' in s or 'mensagem_whats_app' in s]
+
+    pequeno = _instrucoes(_payload(_mensagem("5511911110000", "Oi", "wamid.a")))
+    grande = _instrucoes(_payload(*[_mensagem(f"55119222{i % 20:05d}", f"Msg {i}", f"wamid.b{i}") for i in range(200)]))
+    assert len(grande) == len(pequeno) == 3  # consulta das conversas, INSERT das novas, INSERT das mensagens
+    assert ConversaWhatsApp.query.filter_by(empresa_id=empresa.id).count() == 21 + 1
+    assert MensagemWhatsApp.query.filter_by(empresa_id=empresa.id).count() == 201
+
+
+def test_webhook_repetido_nao_duplica_mensagens(test_app, test_client):
+    empresa, existente = _setup()
+    payload = _payload(_mensagem("5511900000001", "Oi", "wamid.r1"), _mensagem("5511900000003", "Olá", "wamid.r2"))
+    # A Meta reenvia o mesmo webhook; um reenvio pode ser processado no mesmo lote ou depois
+    test_client.post(f'/api/webhook/{empresa.id}', json=payload)
+    test_client.post(f'/api/webhook/{empresa.id}', json=payload)
+    assert whatsapp_inbox_service.drenar(test_app) == 2
+    test_client.post(f'/api/webhook/{empresa.id}', json=_payload(
+        _mensagem("5511900000003", "Olá", "wamid.r2"), _mensagem("5511900000003", "Tudo bem?", "wamid.r3")
+    ))
+    assert whatsapp_inbox_service.drenar(test_app) == 1
+
+    assert sorted(m.wamid for m in MensagemWhatsApp.query.filter_by(empresa_id=empresa.id)) == ['wamid.r1', 'wamid.r2', 'wamid.r3']
+    assert ConversaWhatsApp.query.filter_by(empresa_id=empresa.id).count() == 2
+    assert _totais_rollup(empresa.id) == (2, 3)
+    assert WebhookInbox.query.filter(WebhookInbox.processado_em.is_(None)).count() == 0
+
+    metricas = whatsapp_inbox_service.metricas(test_app)
+    assert (metricas['linhas'], metricas['mensagens'], metricas['duplicadas']) == (3, 3, 3)
+    assert metricas['pendentes'] == 0 and metricas['atraso_medio_segundos'] is not None
+
+
+def test_linha_com_falha_volta_para_a_fila_sem_bloquear_as_outras(test_app, test_client, monkeypatch):
+    test_app.config['WHATSAPP_INBOX_MAX_ATTEMPTS'] = 2
+    empresa, _ = _setup()
+    quebrada, _ = _setup("33.333.333/0001-33")
+    gravar = inbox_modulo.gravar_mensagens
+
+    def _gravar(empresa_id, mensagens):
+        if empresa_id == quebrada.id:
+            raise RuntimeError("falha simulada")
+        return gravar(empresa_id, mensagens)
+
+    monkeypatch.setattr(inbox_modulo, 'gravar_mensagens', _gravar)
+    test_client.post(f'/api/webhook/{quebrada.id}', json=_payload(_mensagem("5511900000009", "Oi", "wamid.q1")))
+    test_client.post(f'/api/webhook/{empresa.id}', json=_payload(_mensagem("5511900000001", "Oi", "wamid.q2")))
+    test_client.post(f'/api/webhook/{empresa.id}', data='{"object": ', content_type='application/json')
+
+    assert whatsapp_inbox_service.drenar(test_app) == 2  # a válida e a de corpo inválido (descartada)
+    assert MensagemWhatsApp.query.filter_by(empresa_id=empresa.id).count() == 1
+    pendente = WebhookInbox.query.filter_by(empresa_id=quebrada.id).one()
+    assert (pendente.processado_em, pendente.tentativas) == (None, 1)
+    assert 'falha simulada' in pendente.erro
+    invalida = WebhookInbox.query.filter(WebhookInbox.erro.like('Payload inválido%')).one()
+    assert invalida.processado_em is not None
+
+    # Antes do intervalo entre tentativas a linha não é reivindicada de novo; a segunda falha
+    # atinge o máximo de tentativas e tira a linha da fila
+    assert whatsapp_inbox_service.drenar(test_app) == 0
+    db.session.refresh(pendente)
+    assert pendente.tentativas == 1
+    test_app.config['WHATSAPP_INBOX_RETRY_SECONDS'] = 0
+    assert whatsapp_inbox_service.drenar(test_app) == 0
+    db.session.refresh(pendente)
+    assert pendente.tentativas == 2 and pendente.processado_em is not None
+    metricas = whatsapp_inbox_service.metricas(test_app)
+    assert (metricas['falhas'], metricas['descartadas'], metricas['pendentes']) == (2, 2, 0)
+
+
+def test_consumidores_em_segundo_plano_e_metricas(test_app, test_client):
+    test_app.config['WHATSAPP_INBOX_WORKERS'] = 2
+    empresa, _ = _setup()
+    admin = Usuario(email="super@inbox.com", nome="Super", empresa_id=empresa.id, role="super_admin")
+    admin.set_password("password123")
+    db.session.add(admin)
+    db.session.commit()
+
+    try:
+        for i in range(20):
+            test_client.post(f'/api/webhook/{empresa.id}', json=_payload(_mensagem(f"55119333{i % 5:05d}", "Oi", f"wamid.w{i}")))
+        limite = time.monotonic() + 10
+        while MensagemWhatsApp.query.filter_by(empresa_id=empresa.id).count() < 20 and time.monotonic() < limite:
+            db.session.rollback()
+            time.sleep(0.05)
+    finally:
+        whatsapp_inbox_service.parar(test_app)
+
+    assert MensagemWhatsApp.query.filter_by(empresa_id=empresa.id).count() == 20
+    assert ConversaWhatsApp.query.filter_by(empresa_id=empresa.id).count() == 1 + 5
+
+    test_client.post('/login', data={'email': 'super@inbox.com', 'password': 'password123'})
+    metricas = test_client.get('/api/webhook/inbox/metricas').get_json()
+    assert metricas['pendentes'] == 0
+    assert metricas['linhas'] == 20 and metricas['mensagens'] == 20
+    assert metricas['vazao_mensagens_por_segundo'] > 0
+
+
+def test_clientes_frequentes_resolvidos_pelo_cache(test_app, test_client):
+    empresa, existente = _setup()
+    clientes = [f"55119444{i:05d}" for i in range(10)] + [existente.wa_id]
+
+    def _instrucoes_de_conversa(rodada):
+        test_client.post(f'/api/webhook/{empresa.id}', json=_payload(*[
+            _mensagem(wa_id, "Oi", f"wamid.c{rodada}.{wa_id}") for wa_id in clientes
+        ]))
+        executadas = []
+        ouvinte = lambda conn, cursor, statement, *args: executadas.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', ouvinte)
+        try:
+            whatsapp_inbox_service.drenar(test_app)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', ouvinte)
+        return [s.split()[0] for s in executadas if 'conversa_whats_app' in s]
+
+    assert _instrucoes_de_conversa(1) == ['SELECT', 'INSERT']  # 10 clientes novos, 1 existente
+    assert _instrucoes_de_conversa(2) == ['SELECT']             # as criadas entram no cache depois do commit
+    assert _instrucoes_de_conversa(3) == []                     # todos no cache
+    assert ConversaWhatsApp.query.filter_by(empresa_id=empresa.id).count() == 11
+    assert MensagemWhatsApp.query.filter_by(empresa_id=empresa.id).count() == 33
+
+    # Conversa excluída sai do cache: a próxima mensagem do cliente abre uma nova
+    cache = whatsapp_inbox_service.metricas(test_app)['cache_conversas']
+    assert cache['itens'] == 11 and cache['hits'] >= 11
+    MensagemWhatsApp.query.filter_by(conversa_id=existente.id).delete()
+    db.session.delete(existente)
+    db.session.commit()
+    assert _instrucoes_de_conversa(4) == ['SELECT', 'INSERT']
+    assert ConversaWhatsApp.query.filter_by(empresa_id=empresa.id, wa_id="5511900000001").count() == 1
+
+
+def test_conversa_criada_em_paralelo_nao_duplica(test_app, monkeypatch):
+    empresa, _ = _setup()
+    # Outra transação cria a conversa depois da consulta e antes do INSERT: o ON CONFLICT
+    # não cria uma segunda e a existente é lida de novo
+    outra = ConversaWhatsApp(wa_id="5511955550000", nome_cliente="Cliente 0000", status='pendente', empresa_id=empresa.id)
+    db.session.add(outra)
+    db.session.commit()
+    consultar = whatsapp_webhook_service._consultar_conversas
+    chamadas = []
+
+    def _consultar(empresa_id, wa_ids):
+        chamadas.append(list(wa_ids))
+        return {} if len(chamadas) == 1 else consultar(empresa_id, wa_ids)
+
+    monkeypatch.setattr(whatsapp_webhook_service, '_consultar_conversas', _consultar)
+    resultado = whatsapp_webhook_service.gravar_mensagens(empresa.id, [{
+        'wamid': 'wamid.p1', 'wa_id': "5511955550000", 'conteudo': "Oi", 'timestamp': outra.created_at
+    }])
+    db.session.commit()
+
+    assert chamadas == [["5511955550000"], ["5511955550000"]]
+    assert resultado['conversas_novas'] == 0
+    assert ConversaWhatsApp.query.filter_by(empresa_id=empresa.id, wa_id="5511955550000").count() == 1
+    assert MensagemWhatsApp.query.filter_by(wamid='wamid.p1').one().conversa_id == outra.id